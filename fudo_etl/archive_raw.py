@@ -0,0 +1,78 @@
+# fudo_etl/archive_raw.py
+import argparse
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from modules.config import load_config
+from modules.db_maintenance import DBMaintenanceManager
+from modules.db_manager import DBManager
+from modules.raw_archive import RawArchiver
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _parse_date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _parse_month(value: str) -> date:
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+def run_archive(args: argparse.Namespace, config: dict, db_manager: DBManager) -> bool:
+    archiver = RawArchiver(db_manager, config['archive_dir'])
+    if args.before:
+        cutoff = _parse_date(args.before)
+    else:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=args.older_than_days or config['archive_older_than_days'])
+    logger.info(f"  [ARCHIVE] Archivando versiones RAW superadas o borradas extraídas antes de {cutoff.isoformat()} en '{config['archive_dir']}'.")
+    totals = archiver.archive(cutoff, tables=args.tables, branches=args.branches, dry_run=args.dry_run)
+    archived_tables = [raw_table for raw_table, count in totals.items() if count]
+    if archived_tables and not args.dry_run:
+        # Los DELETE dejan tuplas muertas: VACUUM (ANALYZE) donde superen el umbral, ANALYZE en el resto
+        DBMaintenanceManager(
+            db_manager,
+            vacuum_enabled=config['maintenance_vacuum_enabled'],
+            dead_tuple_ratio_threshold=config['maintenance_dead_tuple_ratio']
+        ).run_post_load_maintenance(archived_tables)
+    logger.info(f"  [ARCHIVE] Total: {sum(totals.values())} versiones en {len(archived_tables)} tablas RAW.")
+    return True
+
+
+def run_restore(args: argparse.Namespace, config: dict, db_manager: DBManager) -> bool:
+    archiver = RawArchiver(db_manager, config['archive_dir'])
+    month_from = _parse_month(args.month_from)
+    month_to = _parse_month(args.month_to) if args.month_to else month_from
+    restored = archiver.restore(args.table, month_from, month_to, branches=args.branches)
+    return restored > 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archivo de la historia RAW fría en Parquet (y restauración bajo demanda).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    archive_parser = subparsers.add_parser("archive", help="Exporta a Parquet y borra de Postgres las versiones RAW frías.")
+    cutoff_group = archive_parser.add_mutually_exclusive_group()
+    cutoff_group.add_argument("--before", help="Corte por fecha de extracción (ISO 8601).")
+    cutoff_group.add_argument("--older-than-days", type=int, help="Corte relativo en días (default ARCHIVE_OLDER_THAN_DAYS).")
+    archive_parser.add_argument("--tables", nargs="+", help="Tablas RAW a archivar (por defecto, todas las fudo_raw_*).")
+    archive_parser.add_argument("--branches", nargs="+", help="id_sucursal a archivar (por defecto, todas).")
+    archive_parser.add_argument("--dry-run", action="store_true", help="Solo cuenta las versiones archivables.")
+
+    restore_parser = subparsers.add_parser("restore", help="Reinserta en Postgres las versiones archivadas de un rango de meses.")
+    restore_parser.add_argument("--table", required=True, help="Tabla RAW (ej. fudo_raw_items).")
+    restore_parser.add_argument("--from", dest="month_from", required=True, help="Primer mes de extracción (YYYY-MM).")
+    restore_parser.add_argument("--to", dest="month_to", help="Último mes de extracción (YYYY-MM). Por defecto, igual a --from.")
+    restore_parser.add_argument("--branches", nargs="+", help="id_sucursal a restaurar (por defecto, todas).")
+
+    args = parser.parse_args()
+    config = load_config()
+    db_manager = DBManager(config['db_connection_string'])
+    try:
+        handler = run_archive if args.command == "archive" else run_restore
+        if not handler(args, config, db_manager):
+            raise SystemExit(1)
+    finally:
+        db_manager.close()
@@ -0,0 +1,2 @@
+# fudo_etl/benchmarks/__init__.py
+# Benchmarks reproducibles de los caminos calientes del ETL (ver run_benchmarks.py).
@@ -0,0 +1,50 @@
+# fudo_etl/benchmarks/compare.py
+"""
+Compara dos resultados de run_benchmarks (ej. el commit base y el actual) caso por caso.
+
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/nuevo.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path: str) -> tuple[dict, dict[tuple[str, str], dict]]:
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    return report, {(result['benchmark'], result['case']): result for result in report['results']}
+
+
+def compare(baseline_path: str, candidate_path: str) -> list[tuple]:
+    """Devuelve (benchmark, caso, segundos base, segundos nuevos, variación) de los casos comunes a ambos archivos."""
+    _, baseline = load_results(baseline_path)
+    _, candidate = load_results(candidate_path)
+    rows = []
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old_seconds, new_seconds = baseline[key]['seconds'], candidate[key]['seconds']
+        change = (new_seconds - old_seconds) / old_seconds if old_seconds else 0.0
+        rows.append((key[0], key[1], old_seconds, new_seconds, change))
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compara dos archivos de resultados de benchmarks.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Variación relativa a partir de la cual un caso cuenta como regresión (0.10 = +10%%).")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Sale con código 1 si hay regresiones.")
+    args = parser.parse_args(argv)
+
+    rows = compare(args.baseline, args.candidate)
+    regressions = [row for row in rows if row[4] > args.threshold]
+    print(f"{'benchmark':<26} {'caso':<48} {'base (s)':>10} {'nuevo (s)':>10} {'var.':>8}")
+    for benchmark, case, old_seconds, new_seconds, change in rows:
+        flag = "  REGRESIÓN" if change > args.threshold else ("  mejora" if change < -args.threshold else "")
+        print(f"{benchmark:<26} {case:<48} {old_seconds:>10.3f} {new_seconds:>10.3f} {change:>+8.1%}{flag}")
+    print(f"\n{len(rows)} casos comparados, {len(regressions)} regresiones por encima de {args.threshold:.0%}.")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+# fudo_etl/benchmarks/run_benchmarks.py
+"""
+Benchmarks reproducibles de los caminos calientes del ETL contra un Postgres local:
+
+- parse_fudo_date y prepare_raw_records (payload canónico + checksum md5).
+- DBManager.insert_raw_data a 10k/100k/1M filas, en una tabla estilo sales (UPSERT por checksum)
+  y una de solo-agregado (items): carga inicial, re-carga sin cambios y re-carga con cambios.
+- Construcción (CREATE) y REFRESH CONCURRENTLY de cada MV de refresh_analytics_materialized_views
+  con varios tamaños de historia.
+
+Los datos salen de devtools.synthetic_data (misma semilla = mismos datos). El resultado se guarda en
+JSON (commit, versiones, parámetros y una fila por caso) para comparar entre commits con
+benchmarks.compare.
+
+ATENCIÓN: vacía (TRUNCATE) las tablas RAW y recrea las MVs de la base indicada. Usar una base dedicada.
+
+    python -m benchmarks.run_benchmarks --db postgresql://localhost/fudo_bench --allow-truncate --deploy
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+import timeit
+from datetime import datetime, timezone
+
+from devtools.synthetic_data import CATALOG_SIZES, SyntheticFudoDataset
+from modules.db_manager import DBManager
+from modules.record_preparation import parse_fudo_date, prepare_raw_records, raw_table_for_entity
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INSERT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_HISTORY_SIZES = [10_000, 100_000]
+BENCHMARK_ENTITIES = ['sales', 'items', 'payments', 'products'] + sorted(CATALOG_SIZES)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _result(benchmark: str, case: str, seconds: float, rows: int | None = None, **extra) -> dict:
+    result = {'benchmark': benchmark, 'case': case, 'seconds': round(seconds, 6)}
+    if rows is not None:
+        result['rows'] = rows
+        result['rows_per_second'] = round(rows / seconds, 1) if seconds > 0 else None
+    result.update(extra)
+    logger.info(f"  [BENCH] {benchmark} / {case}: {seconds:.3f}s" + (f" ({result['rows_per_second']} filas/s)" if rows else ""))
+    return result
+
+
+def _iter_api_records(dataset: SyntheticFudoDataset, entity: str, limit: int, batch_size: int):
+    """Registros crudos de la API en lotes, recorriendo las sucursales sintéticas hasta completar limit."""
+    produced = 0
+    for branch_id in dataset.branch_ids:
+        total = dataset.count(branch_id, entity)
+        for first in range(0, total, batch_size):
+            size = min(batch_size, total - first, limit - produced)
+            if size <= 0:
+                return
+            yield branch_id, [dataset.record(branch_id, entity, position) for position in range(first, first + size)]
+            produced += size
+
+
+class BenchmarkSuite:
+    def __init__(self, db_manager: DBManager | None, seed: int = 42, batch_rows: int = 5000):
+        self.db_manager = db_manager
+        self.seed = seed
+        self.batch_rows = batch_rows
+        self.results = []
+
+    # --- CPU: parseo de fechas y preparación de registros ---
+    def bench_parse_fudo_date(self, iterations: int = 200_000):
+        samples = ['2024-05-01T12:34:56Z', '2024-05-01T12:34:56.123Z', None, 'fecha-invalida']
+        logging.getLogger('modules.record_preparation').setLevel(logging.ERROR)  # 'fecha-invalida' loguea un warning
+        for sample in samples:
+            seconds = timeit.timeit(lambda: parse_fudo_date(sample), number=iterations)
+            self.results.append(_result('parse_fudo_date', repr(sample), seconds, rows=iterations))
+        logging.getLogger('modules.record_preparation').setLevel(logging.NOTSET)
+
+    def bench_prepare_records(self, rows: int = 100_000):
+        dataset = SyntheticFudoDataset(seed=self.seed, branches=1, items_total=rows * 4)
+        for entity in ['sales', 'items', 'payments']:
+            pages = list(_iter_api_records(dataset, entity, rows, 500))
+            total_rows = sum(len(page) for _, page in pages)
+            start = time.perf_counter()
+            for branch_id, page in pages:
+                prepare_raw_records(entity, branch_id, page)
+            self.results.append(_result('prepare_raw_records', entity, time.perf_counter() - start, rows=total_rows))
+
+    # --- DB: carga RAW ---
+    def _truncate_raw_tables(self, entities: list[str]):
+        tables = ', '.join(f"public.{raw_table_for_entity(entity)}" for entity in entities)
+        self.db_manager.execute_query(f"TRUNCATE {tables};")
+
+    def _timed_load(self, entity: str, batches: list[tuple[str, list[dict]]]) -> tuple[float, dict]:
+        raw_table_name = raw_table_for_entity(entity)
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        seconds = 0.0
+        for branch_id, page in batches:
+            rows = prepare_raw_records(entity, branch_id, page)
+            start = time.perf_counter()
+            batch_counts = self.db_manager.insert_raw_data(raw_table_name, rows)
+            seconds += time.perf_counter() - start
+            for key, value in batch_counts.items():
+                counts[key] += value
+        return seconds, counts
+
+    def bench_insert_raw_data(self, sizes: list[int]):
+        logging.getLogger('modules.db_manager').setLevel(logging.WARNING)  # un log por lote ensucia la salida
+        for entity, style in [('sales', 'upsert_checksum'), ('items', 'append')]:
+            for size in sizes:
+                dataset = SyntheticFudoDataset(seed=self.seed, branches=4, items_total=max(size * 4, 1000))  # ~1 venta cada 4 ítems: cubre size ventas
+                self._truncate_raw_tables([entity])
+                batches = list(_iter_api_records(dataset, entity, size, self.batch_rows))
+                rows = sum(len(page) for _, page in batches)
+
+                seconds, counts = self._timed_load(entity, batches)
+                self.results.append(_result('insert_raw_data', f"{style}:{entity}:initial", seconds, rows=rows, **counts))
+                seconds, counts = self._timed_load(entity, batches)
+                self.results.append(_result('insert_raw_data', f"{style}:{entity}:reload_unchanged", seconds, rows=rows, **counts))
+                # Re-carga con un atributo cambiado en cada registro (nuevas versiones / UPDATE en sales)
+                for _, page in batches:
+                    for record in page:
+                        record['attributes']['benchmarkRevision'] = 1
+                seconds, counts = self._timed_load(entity, batches)
+                self.results.append(_result('insert_raw_data', f"{style}:{entity}:reload_changed", seconds, rows=rows, **counts))
+        self._truncate_raw_tables(['sales', 'items'])
+        logging.getLogger('modules.db_manager').setLevel(logging.NOTSET)
+
+    # --- DB: capa analítica ---
+    def _load_history(self, items_total: int):
+        logging.getLogger('modules.db_manager').setLevel(logging.WARNING)
+        dataset = SyntheticFudoDataset(seed=self.seed, branches=2, items_total=items_total)
+        self._truncate_raw_tables(BENCHMARK_ENTITIES)
+        for entity in BENCHMARK_ENTITIES:
+            for branch_id, page in _iter_api_records(dataset, entity, 10**12, self.batch_rows):
+                self.db_manager.insert_raw_data(raw_table_for_entity(entity), prepare_raw_records(entity, branch_id, page))
+        self.db_manager.execute_query(
+            "INSERT INTO public.config_fudo_branches (id_sucursal, fudo_branch_identifier, sucursal_name, "
+            "secret_manager_apikey_name, secret_manager_apisecret_name) "
+            "SELECT b, b, b, 'MOCK_APIKEY', 'MOCK_APISECRET' FROM unnest(%s::text[]) AS b ON CONFLICT (id_sucursal) DO NOTHING;",
+            (dataset.branch_ids,)
+        )
+        self.db_manager.execute_autocommit("ANALYZE;")
+        logging.getLogger('modules.db_manager').setLevel(logging.NOTSET)
+
+    def bench_materialized_views(self, history_sizes: list[int]):
+        # Import diferido: main.py configura logging y carga todos los módulos del ETL
+        from main import MATERIALIZED_VIEWS_CONFIGS, RAW_VIEWS_CONFIGS
+
+        for items_total in history_sizes:
+            self._load_history(items_total)
+            for _, create_sql in RAW_VIEWS_CONFIGS:
+                self.db_manager.execute_query(create_sql)
+            mv_names = list(dict.fromkeys(name for name, _ in MATERIALIZED_VIEWS_CONFIGS))
+            for mv_name in reversed(mv_names):
+                self.db_manager.execute_query(f"DROP MATERIALIZED VIEW IF EXISTS public.{mv_name} CASCADE;")
+
+            built = set()
+            for mv_name, create_sql in MATERIALIZED_VIEWS_CONFIGS:
+                start = time.perf_counter()
+                self.db_manager.execute_query(create_sql)
+                if mv_name not in built:
+                    built.add(mv_name)
+                    self.results.append(_result('mv_build', f"{mv_name}@{items_total}", time.perf_counter() - start,
+                                                history_items=items_total))
+            for mv_name in mv_names:
+                start = time.perf_counter()
+                self.db_manager.execute_query(f"REFRESH MATERIALIZED VIEW CONCURRENTLY public.{mv_name};")
+                self.results.append(_result('mv_refresh_concurrently', f"{mv_name}@{items_total}", time.perf_counter() - start,
+                                            history_items=items_total))
+
+    def environment(self) -> dict:
+        environment = {'python': platform.python_version(), 'platform': platform.platform()}
+        if self.db_manager:
+            environment['postgres'] = self.db_manager.fetch_one("SHOW server_version;")[0]
+        return environment
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmarks de extracción/preparación/carga/transformación del ETL de Fudo.")
+    parser.add_argument("--db", default=os.getenv("BENCHMARK_DB_CONNECTION_STRING"),
+                        help="Cadena de conexión de una base DEDICADA a benchmarks (o BENCHMARK_DB_CONNECTION_STRING).")
+    parser.add_argument("--allow-truncate", action="store_true",
+                        help="Confirma que la base puede vaciarse (obligatorio para los benchmarks de DB).")
+    parser.add_argument("--deploy", action="store_true", help="Ejecuta sql/deploy_fudo_structure.sql antes de empezar.")
+    parser.add_argument("--only", choices=["cpu", "insert", "mv"], action="append",
+                        help="Grupos a correr (repetible). Por defecto todos.")
+    parser.add_argument("--insert-sizes", default=",".join(str(size) for size in DEFAULT_INSERT_SIZES))
+    parser.add_argument("--history-sizes", default=",".join(str(size) for size in DEFAULT_HISTORY_SIZES),
+                        help="Ítems totales de historia para los benchmarks de MVs.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-rows", type=int, default=5000, help="Filas por llamada a insert_raw_data.")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto benchmarks/results/<fecha>_<commit>.json).")
+    args = parser.parse_args(argv)
+
+    groups = set(args.only or ["cpu", "insert", "mv"])
+    if groups & {"insert", "mv"}:
+        if not args.db:
+            parser.error("Los benchmarks de DB requieren --db o BENCHMARK_DB_CONNECTION_STRING.")
+        if not args.allow_truncate:
+            parser.error("Los benchmarks de DB vacían las tablas RAW: confirmar con --allow-truncate (usar una base dedicada).")
+
+    started_at = datetime.now(timezone.utc)
+    db_manager = DBManager(args.db) if groups & {"insert", "mv"} else None
+    try:
+        if db_manager and args.deploy:
+            with open(os.path.join(BASE_DIR, "sql", "deploy_fudo_structure.sql"), encoding="utf-8") as f:
+                db_manager.execute_sql_script(f.read())
+        suite = BenchmarkSuite(db_manager, seed=args.seed, batch_rows=args.batch_rows)
+        if "cpu" in groups:
+            suite.bench_parse_fudo_date()
+            suite.bench_prepare_records()
+        if "insert" in groups:
+            suite.bench_insert_raw_data([int(size) for size in args.insert_sizes.split(",")])
+        if "mv" in groups:
+            suite.bench_materialized_views([int(size) for size in args.history_sizes.split(",")])
+
+        commit = _git_commit()
+        report = {
+            'started_at_utc': started_at.isoformat(),
+            'git_commit': commit,
+            'environment': suite.environment(),
+            'parameters': {'seed': args.seed, 'batch_rows': args.batch_rows, 'groups': sorted(groups),
+                           'insert_sizes': args.insert_sizes, 'history_sizes': args.history_sizes},
+            'results': suite.results,
+        }
+        output_path = args.output or os.path.join(
+            BASE_DIR, "benchmarks", "results", f"{started_at:%Y%m%dT%H%M%S}_{commit or 'nogit'}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Resultados guardados en '{output_path}' ({len(suite.results)} casos).")
+    finally:
+        if db_manager:
+            db_manager.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,2 @@
+# fudo_etl/devtools/__init__.py
+# Herramientas de desarrollo local (no se usan en las corridas productivas).
@@ -0,0 +1,278 @@
+# fudo_etl/devtools/mock_fudo_server.py
+"""
+Servidor local que imita la API de Fudo para pruebas de carga offline (solo biblioteca estándar).
+
+    python -m devtools.mock_fudo_server --port 8080 --branches 20 --items 10000000 --latency-ms 80 --rate-429 0.02
+
+- POST {auth_path}: mismo contrato que usa FudoAuthenticator ({"apiKey", "apiSecret"} -> {"token", "exp"}).
+  apiKey es el id de la sucursal sintética (mock_01, mock_02, ...) y apiSecret el de --api-secret.
+- GET /v1alpha1/<entidad>: paginación JSON:API (page[size] <= 500, page[number]), filter[createdAt]
+  (gte.X, lte.Y, and(gte.X,lte.Y)) y fields[<tipo>] (sparse fieldsets sobre attributes).
+- Fallas inyectables: latencia base + jitter, 429 con Retry-After, 5xx, y límite de requests/s por token.
+- GET /__stats: contadores de requests servidas (para los benchmarks).
+
+--print-setup muestra el SQL y las variables de entorno para apuntar el ETL al servidor.
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .synthetic_data import CATALOG_SIZES, SyntheticFudoDataset
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 500
+VOLUME_ENTITIES = ['sales', 'items', 'payments', 'products']
+
+
+def parse_date_filter(value: str) -> tuple[datetime | None, datetime | None]:
+    """Interpreta filter[createdAt]: 'gte.X', 'lte.Y' o 'and(gte.X,lte.Y)'."""
+    since = until = None
+    if value.startswith('and(') and value.endswith(')'):
+        conditions = value[4:-1].split(',')
+    else:
+        conditions = [value]
+    for condition in conditions:
+        operator, _, ts = condition.partition('.')
+        parsed = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        if operator == 'gte':
+            since = parsed
+        elif operator == 'lte':
+            until = parsed
+        else:
+            raise ValueError(f"Operador de filtro no soportado: '{operator}'.")
+    return since, until
+
+
+class MockFudoState:
+    """Configuración, datos y contadores compartidos por todos los hilos del servidor."""
+    def __init__(self, dataset: SyntheticFudoDataset, api_secret: str = "mock-secret", token_ttl_seconds: int = 86400,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_429: float = 0.0, rate_5xx: float = 0.0,
+                 retry_after_seconds: int = 1, max_rps_per_token: float = 0.0, fault_seed: int | None = None):
+        self.dataset = dataset
+        self.api_secret = api_secret
+        self.token_ttl_seconds = token_ttl_seconds
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after_seconds = retry_after_seconds
+        self.max_rps_per_token = max_rps_per_token
+        self._random = random.Random(fault_seed)
+        self._lock = threading.Lock()
+        self._last_request_by_token = {}
+        self.stats = {'auth': 0, 'pages': 0, 'records': 0, 'bytes': 0, 'status_401': 0, 'status_429': 0, 'status_5xx': 0}
+
+    def count(self, key: str, value: int = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def issue_token(self, branch_id: str) -> tuple[str, int]:
+        exp = int(time.time()) + self.token_ttl_seconds
+        return f"mock.{branch_id}.{exp}", exp
+
+    def branch_for_token(self, authorization: str | None) -> str | None:
+        """Sucursal del Bearer token, o None si falta, es inválido o venció."""
+        if not authorization or not authorization.startswith("Bearer "):
+            return None
+        parts = authorization[len("Bearer "):].split('.')
+        if len(parts) != 3 or parts[0] != 'mock' or parts[1] not in self.dataset.branch_ids:
+            return None
+        try:
+            if int(parts[2]) < time.time():
+                return None
+        except ValueError:
+            return None
+        return parts[1]
+
+    def throttled(self, token: str) -> bool:
+        """True si el token supera max_rps_per_token (limitador simple por intervalo mínimo)."""
+        if self.max_rps_per_token <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last_request = self._last_request_by_token.get(token, 0.0)
+            if now - last_request < 1.0 / self.max_rps_per_token:
+                return True
+            self._last_request_by_token[token] = now
+        return False
+
+
+class MockFudoHandler(BaseHTTPRequestHandler):
+    server_version = "MockFudo/1.0"
+    state: MockFudoState = None
+    auth_path = "/auth"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status: int, body: dict, headers: dict | None = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        return len(payload)
+
+    def _error(self, status: int, detail: str, headers: dict | None = None):
+        self._send_json(status, {'errors': [{'status': str(status), 'detail': detail}]}, headers)
+
+    def do_POST(self):
+        if urlparse(self.path).path != self.auth_path:
+            return self._error(404, "Not found")
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except json.JSONDecodeError:
+            return self._error(400, "Invalid JSON")
+        if body.get('apiKey') not in self.state.dataset.branch_ids or body.get('apiSecret') != self.state.api_secret:
+            self.state.count('status_401')
+            return self._error(401, "Invalid credentials")
+        token, exp = self.state.issue_token(body['apiKey'])
+        self.state.count('auth')
+        self._send_json(200, {'token': token, 'exp': exp})
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == '/__stats':
+            with self.state._lock:
+                stats = dict(self.state.stats)
+            return self._send_json(200, stats)
+        if not parsed.path.startswith('/v1alpha1/'):
+            return self._error(404, "Not found")
+        entity = parsed.path[len('/v1alpha1/'):].strip('/')
+        if entity not in VOLUME_ENTITIES and entity not in CATALOG_SIZES:
+            return self._error(404, f"Unknown resource '{entity}'")
+
+        # Latencia simulada (antes de las fallas: un 429 real también tarda en llegar)
+        delay_ms = self.state.latency_ms + self.state.jitter_ms * self.state.roll()
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        authorization = self.headers.get('Authorization')
+        branch_id = self.state.branch_for_token(authorization)
+        if branch_id is None:
+            self.state.count('status_401')
+            return self._error(401, "Invalid or expired token")
+        if self.state.throttled(authorization) or self.state.roll() < self.state.rate_429:
+            self.state.count('status_429')
+            return self._error(429, "Too Many Requests", {'Retry-After': str(self.state.retry_after_seconds)})
+        if self.state.roll() < self.state.rate_5xx:
+            self.state.count('status_5xx')
+            return self._error(self.state._random.choice([500, 502, 503]), "Injected server error")
+
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        try:
+            page_size = min(int(query.get('page[size]', MAX_PAGE_SIZE)), MAX_PAGE_SIZE)
+            page_number = max(int(query.get('page[number]', 1)), 1)
+            since, until = parse_date_filter(query['filter[createdAt]']) if 'filter[createdAt]' in query else (None, None)
+        except (ValueError, KeyError) as e:
+            return self._error(400, f"Invalid parameters: {e}")
+        if any(key.startswith('filter[') and key != 'filter[createdAt]' for key in query):
+            return self._error(400, "Only filter[createdAt] is supported")
+
+        records = self.state.dataset.page(branch_id, entity, page_number, page_size, since, until)
+        sparse_fields = [value.split(',') for key, value in query.items() if key.startswith('fields[')]
+        if sparse_fields:
+            allowed = set(sparse_fields[0])
+            for record in records:
+                record['attributes'] = {k: v for k, v in record['attributes'].items() if k in allowed}
+                record['relationships'] = {k: v for k, v in record['relationships'].items() if k in allowed}
+
+        sent_bytes = self._send_json(200, {'data': records})
+        self.state.count('pages')
+        self.state.count('records', len(records))
+        self.state.count('bytes', sent_bytes)
+
+
+def build_server(state: MockFudoState, host: str = "127.0.0.1", port: int = 8080, auth_path: str = "/auth") -> ThreadingHTTPServer:
+    handler = type('ConfiguredMockFudoHandler', (MockFudoHandler,), {'state': state, 'auth_path': auth_path})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def setup_instructions(dataset: SyntheticFudoDataset, host: str, port: int, auth_path: str, api_secret: str) -> str:
+    """SQL de sucursales y variables de entorno para correr el ETL contra el servidor local."""
+    lines = [
+        "-- Sucursales sintéticas (correr el ETL con --branches para no mezclar con las reales)",
+        "INSERT INTO public.config_fudo_branches (id_sucursal, fudo_branch_identifier, sucursal_name, "
+        "secret_manager_apikey_name, secret_manager_apisecret_name) VALUES",
+        ",\n".join(
+            f"    ('{branch_id}', '{branch_id}', 'Mock {branch_id}', 'MOCK_APIKEY_{branch_id.upper()}', 'MOCK_APISECRET')"
+            for branch_id in dataset.branch_ids
+        ) + "\nON CONFLICT (id_sucursal) DO NOTHING;",
+        "",
+        "# Variables de entorno (GCP_PROJECT_ID=local-dev-project: get_secret lee los secretos del entorno)",
+        "GCP_PROJECT_ID=local-dev-project",
+        f"FUDO_AUTH_ENDPOINT=http://{host}:{port}{auth_path}",
+        f"FUDO_API_BASE_URL=http://{host}:{port}",
+        f"MOCK_APISECRET={api_secret}",
+    ] + [f"MOCK_APIKEY_{branch_id.upper()}={branch_id}" for branch_id in dataset.branch_ids] + [
+        "",
+        f"# python main.py --branches {','.join(dataset.branch_ids)}",
+    ]
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="API de Fudo simulada con datos sintéticos (pruebas de carga offline).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--auth-path", default="/auth", help="Ruta del endpoint de autenticación.")
+    parser.add_argument("--api-secret", default="mock-secret")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla de los datos (mismos datos para la misma semilla).")
+    parser.add_argument("--branches", type=int, default=20)
+    parser.add_argument("--items", type=int, default=10_000_000, help="Ítems totales repartidos entre las sucursales.")
+    parser.add_argument("--avg-items-per-sale", type=float, default=4.0)
+    parser.add_argument("--products", type=int, default=400, help="Productos por sucursal.")
+    parser.add_argument("--days", type=int, default=365, help="Días de historia (desde 2024-01-01).")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia base por request.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Latencia adicional aleatoria (0..jitter).")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probabilidad de responder 429 (con Retry-After).")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Probabilidad de responder 500/502/503.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Valor del header Retry-After de los 429.")
+    parser.add_argument("--max-rps-per-token", type=float, default=0.0, help="Límite de requests/s por token (0 = sin límite).")
+    parser.add_argument("--token-ttl", type=int, default=86400, help="Vigencia de los tokens emitidos, en segundos.")
+    parser.add_argument("--print-setup", action="store_true", help="Muestra el SQL y las variables de entorno y termina.")
+    args = parser.parse_args(argv)
+
+    dataset = SyntheticFudoDataset(seed=args.seed, branches=args.branches, items_total=args.items,
+                                   avg_items_per_sale=args.avg_items_per_sale, products_per_branch=args.products,
+                                   days=args.days)
+    if args.print_setup:
+        print(setup_instructions(dataset, args.host, args.port, args.auth_path, args.api_secret))
+        return
+
+    state = MockFudoState(dataset, api_secret=args.api_secret, token_ttl_seconds=args.token_ttl,
+                          latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_429=args.rate_429,
+                          rate_5xx=args.rate_5xx, retry_after_seconds=args.retry_after,
+                          max_rps_per_token=args.max_rps_per_token, fault_seed=args.seed)
+    server = build_server(state, args.host, args.port, args.auth_path)
+    logger.info(
+        f"API de Fudo simulada en http://{args.host}:{args.port} ({args.branches} sucursales, "
+        f"~{args.items} ítems, semilla {args.seed}, inicio {datetime.now(timezone.utc):%H:%M:%S} UTC)."
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
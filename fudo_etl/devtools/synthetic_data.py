@@ -0,0 +1,227 @@
+# fudo_etl/devtools/synthetic_data.py
+import bisect
+import struct
+from array import array
+from datetime import datetime, timedelta, timezone
+from hashlib import md5
+
+# Catálogos chicos: cantidad de registros por sucursal de las entidades sin volumen
+CATALOG_SIZES = {
+    'customers': 500, 'discounts': 10, 'expenses': 200, 'expense-categories': 12, 'ingredients': 150,
+    'kitchens': 3, 'payment-methods': 6, 'product-categories': 15, 'product-modifiers': 40,
+    'roles': 5, 'rooms': 3, 'tables': 40, 'users': 25,
+}
+PAYMENT_METHOD_NAMES = ['Efectivo', 'Tarjeta de débito', 'Tarjeta de crédito', 'Mercado Pago', 'Transferencia', 'Cuenta corriente']
+SALE_TYPES = ['EAT-IN', 'TAKEAWAY', 'DELIVERY']
+# Nombre del tipo JSON:API de cada entidad (para 'type' y para fields[...])
+ENTITY_TYPES = {
+    'sales': 'Sale', 'items': 'Item', 'payments': 'Payment', 'products': 'Product',
+    'customers': 'Customer', 'discounts': 'Discount', 'expenses': 'Expense', 'expense-categories': 'ExpenseCategory',
+    'ingredients': 'Ingredient', 'kitchens': 'Kitchen', 'payment-methods': 'PaymentMethod',
+    'product-categories': 'ProductCategory', 'product-modifiers': 'ProductModifier', 'roles': 'Role',
+    'rooms': 'Room', 'tables': 'Table', 'users': 'User',
+}
+
+
+def _format_ts(ts: datetime) -> str:
+    return ts.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class _BranchData:
+    """Índices de una sucursal: sumas acumuladas de ítems y pagos por venta (acceso O(log n) por posición)."""
+    def __init__(self, dataset: 'SyntheticFudoDataset', branch_id: str):
+        self.dataset = dataset
+        self.branch_id = branch_id
+        self.sales_count = dataset.sales_per_branch
+        self.sale_step_seconds = dataset.span_seconds / self.sales_count
+        # Offset en segundos entre ítems/pagos de una misma venta (mantiene createdAt monótono por posición)
+        max_children = max(dataset.max_items_per_sale, 2) + 1
+        self.child_step_seconds = min(1.0, self.sale_step_seconds / (2 * max_children))
+        self.items_cumulative = array('q', [0])
+        self.payments_cumulative = array('q', [0])
+        for sale_index in range(self.sales_count):
+            self.items_cumulative.append(self.items_cumulative[-1] + self.items_in_sale(sale_index))
+            self.payments_cumulative.append(self.payments_cumulative[-1] + self.payments_in_sale(sale_index))
+
+    def rand(self, *parts) -> float:
+        return self.dataset.rand(self.branch_id, *parts)
+
+    def items_in_sale(self, sale_index: int) -> int:
+        return 1 + int(self.rand('items_in_sale', sale_index) * self.dataset.max_items_per_sale)
+
+    def payments_in_sale(self, sale_index: int) -> int:
+        return 2 if self.rand('split_payment', sale_index) < 0.1 else 1
+
+    def sale_created_at(self, sale_index: int) -> datetime:
+        # Jitter dentro de la primera mitad del intervalo: createdAt queda estrictamente creciente
+        offset = (sale_index + 0.5 * self.rand('sale_jitter', sale_index)) * self.sale_step_seconds
+        return self.dataset.start + timedelta(seconds=offset)
+
+    def sale_for_child(self, cumulative: array, position: int) -> tuple[int, int]:
+        """(índice de venta, posición dentro de la venta) de un ítem/pago por su posición global."""
+        sale_index = bisect.bisect_right(cumulative, position) - 1
+        return sale_index, position - cumulative[sale_index]
+
+
+class SyntheticFudoDataset:
+    """
+    Datos sintéticos deterministas con forma de la API de Fudo (JSON:API), generados bajo demanda:
+    el registro en la posición N de una entidad siempre es el mismo para la misma semilla, sin
+    materializar los millones de filas en memoria.
+
+    - sales/items/payments: volumen configurable (items_total repartidos entre las sucursales),
+      con createdAt creciente por posición para resolver filter[createdAt] con búsqueda binaria.
+    - products y catálogos: tamaños fijos por sucursal (CATALOG_SIZES).
+    - Los ids son numéricos (las MVs los castean a INTEGER) y cada sucursal tiene su propio espacio de ids.
+    """
+    def __init__(self, seed: int = 42, branches: int = 20, items_total: int = 10_000_000,
+                 avg_items_per_sale: float = 4.0, products_per_branch: int = 400,
+                 start: datetime | None = None, days: int = 365):
+        self.seed = seed
+        self.branch_ids = [f"mock_{n:02d}" for n in range(1, branches + 1)]
+        self.max_items_per_sale = max(1, int(round(2 * avg_items_per_sale - 1)))
+        self.sales_per_branch = max(1, int(items_total / branches / avg_items_per_sale))
+        self.products_per_branch = products_per_branch
+        self.start = start or datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.span_seconds = days * 86400
+        self._branches = {}
+
+    # --- Aleatoriedad determinista ---
+    def rand(self, *parts) -> float:
+        """Número en [0, 1) derivado de (semilla, partes): estable entre procesos y corridas."""
+        digest = md5(':'.join(str(part) for part in (self.seed,) + parts).encode('utf-8')).digest()
+        return struct.unpack('>Q', digest[:8])[0] / 2**64
+
+    def branch(self, branch_id: str) -> _BranchData:
+        if branch_id not in self._branches:
+            if branch_id not in self.branch_ids:
+                raise KeyError(f"Sucursal sintética desconocida: '{branch_id}'.")
+            self._branches[branch_id] = _BranchData(self, branch_id)
+        return self._branches[branch_id]
+
+    def count(self, branch_id: str, entity: str) -> int:
+        branch = self.branch(branch_id)
+        if entity == 'sales':
+            return branch.sales_count
+        if entity == 'items':
+            return branch.items_cumulative[-1]
+        if entity == 'payments':
+            return branch.payments_cumulative[-1]
+        if entity == 'products':
+            return self.products_per_branch
+        if entity in CATALOG_SIZES:
+            return CATALOG_SIZES[entity]
+        raise KeyError(f"Entidad no soportada por el generador: '{entity}'.")
+
+    # --- Registros por posición ---
+    def created_at(self, branch_id: str, entity: str, position: int) -> datetime:
+        branch = self.branch(branch_id)
+        if entity == 'sales':
+            return branch.sale_created_at(position)
+        if entity == 'items':
+            sale_index, offset = branch.sale_for_child(branch.items_cumulative, position)
+            return branch.sale_created_at(sale_index) + timedelta(seconds=offset * branch.child_step_seconds)
+        if entity == 'payments':
+            sale_index, offset = branch.sale_for_child(branch.payments_cumulative, position)
+            # Los pagos van al final del intervalo de la venta (después de sus ítems)
+            return (branch.sale_created_at(sale_index)
+                    + timedelta(seconds=0.5 * branch.sale_step_seconds + offset * branch.child_step_seconds))
+        # Catálogos: creados a lo largo del primer mes
+        return self.start + timedelta(seconds=position * 30 * 86400 / max(self.count(branch_id, entity), 1))
+
+    def product_price(self, branch_id: str, product_index: int) -> float:
+        return round(500 + self.rand(branch_id, 'product_price', product_index) * 9500, -1)
+
+    def _item_values(self, branch: _BranchData, item_position: int) -> tuple[int, float, float]:
+        """(índice de producto, cantidad, precio) de un ítem."""
+        product_index = int(self.rand(branch.branch_id, 'item_product', item_position) * self.products_per_branch)
+        quantity = 1 + int(self.rand(branch.branch_id, 'item_quantity', item_position) ** 3 * 4)
+        return product_index, float(quantity), self.product_price(branch.branch_id, product_index)
+
+    def sale_total(self, branch_id: str, sale_index: int) -> float:
+        branch = self.branch(branch_id)
+        total = 0.0
+        for item_position in range(branch.items_cumulative[sale_index], branch.items_cumulative[sale_index + 1]):
+            _, quantity, price = self._item_values(branch, item_position)
+            total += quantity * price
+        return round(total, 2)
+
+    def record(self, branch_id: str, entity: str, position: int) -> dict:
+        branch = self.branch(branch_id)
+        created_at = self.created_at(branch_id, entity, position)
+        record = {'type': ENTITY_TYPES[entity], 'id': str(position + 1), 'attributes': {'createdAt': _format_ts(created_at)},
+                  'relationships': {}}
+        attributes, relationships = record['attributes'], record['relationships']
+
+        if entity == 'sales':
+            state_roll = self.rand(branch_id, 'sale_state', position)
+            items_range = range(branch.items_cumulative[position], branch.items_cumulative[position + 1])
+            payments_range = range(branch.payments_cumulative[position], branch.payments_cumulative[position + 1])
+            attributes.update({
+                'closedAt': _format_ts(created_at + timedelta(minutes=30 + 60 * self.rand(branch_id, 'sale_duration', position))),
+                'saleState': 'CANCELED' if state_roll < 0.03 else 'CLOSED',
+                'saleType': SALE_TYPES[int(self.rand(branch_id, 'sale_type', position) * len(SALE_TYPES))],
+                'total': self.sale_total(branch_id, position),
+                'people': 1 + int(self.rand(branch_id, 'sale_people', position) * 6),
+                'comment': None,
+                'anonymousCustomer': None,
+            })
+            relationships.update({
+                'items': {'data': [{'type': 'Item', 'id': str(i + 1)} for i in items_range]},
+                'payments': {'data': [{'type': 'Payment', 'id': str(p + 1)} for p in payments_range]},
+                'table': {'data': {'type': 'Table', 'id': str(1 + position % CATALOG_SIZES['tables'])}},
+                'waiter': {'data': {'type': 'User', 'id': str(1 + position % CATALOG_SIZES['users'])}},
+            })
+        elif entity == 'items':
+            sale_index, _ = branch.sale_for_child(branch.items_cumulative, position)
+            product_index, quantity, price = self._item_values(branch, position)
+            attributes.update({'quantity': quantity, 'price': price, 'canceled': False, 'status': 'DELIVERED', 'comment': None})
+            relationships.update({
+                'sale': {'data': {'type': 'Sale', 'id': str(sale_index + 1)}},
+                'product': {'data': {'type': 'Product', 'id': str(product_index + 1)}},
+            })
+        elif entity == 'payments':
+            sale_index, offset = branch.sale_for_child(branch.payments_cumulative, position)
+            payments_in_sale = branch.payments_in_sale(sale_index)
+            total = self.sale_total(branch_id, sale_index)
+            amount = round(total / payments_in_sale, 2) if offset < payments_in_sale - 1 else round(total - round(total / payments_in_sale, 2) * offset, 2)
+            method_index = int(self.rand(branch_id, 'payment_method', position) * len(PAYMENT_METHOD_NAMES))
+            attributes.update({'amount': amount, 'canceled': False})
+            relationships.update({
+                'sale': {'data': {'type': 'Sale', 'id': str(sale_index + 1)}},
+                'paymentMethod': {'data': {'type': 'PaymentMethod', 'id': str(method_index + 1)}},
+            })
+        elif entity == 'products':
+            category_index = position % CATALOG_SIZES['product-categories']
+            attributes.update({
+                'name': f"Producto {position + 1}", 'price': self.product_price(branch_id, position),
+                'cost': round(self.product_price(branch_id, position) * 0.35, 2), 'active': True,
+                'sellAlone': True, 'stockControl': False, 'stock': None, 'position': position,
+                'description': None, 'enableOnlineMenu': True, 'preparationTime': None,
+            })
+            relationships.update({
+                'productCategory': {'data': {'type': 'ProductCategory', 'id': str(category_index + 1)}},
+                'kitchen': {'data': {'type': 'Kitchen', 'id': str(1 + position % CATALOG_SIZES['kitchens'])}},
+            })
+        elif entity == 'payment-methods':
+            attributes.update({'name': PAYMENT_METHOD_NAMES[position % len(PAYMENT_METHOD_NAMES)], 'active': True, 'position': position})
+        else:
+            attributes.update({'name': f"{ENTITY_TYPES[entity]} {position + 1}", 'active': True})
+        return record
+
+    # --- Consultas de la API ---
+    def _position_range(self, branch_id: str, entity: str, since: datetime | None, until: datetime | None) -> tuple[int, int]:
+        """Rango [desde, hasta) de posiciones con since <= createdAt <= until (createdAt es creciente por posición)."""
+        total = self.count(branch_id, entity)
+        key = lambda position: self.created_at(branch_id, entity, position)
+        positions = range(total)
+        lo = bisect.bisect_left(positions, since, key=key) if since else 0
+        hi = bisect.bisect_right(positions, until, key=key) if until else total
+        return lo, max(lo, hi)
+
+    def page(self, branch_id: str, entity: str, page_number: int, page_size: int,
+             since: datetime | None = None, until: datetime | None = None) -> list[dict]:
+        """Una página (1-based) de la entidad, ordenada por createdAt, con el filtro de fechas aplicado."""
+        lo, hi = self._position_range(branch_id, entity, since, until)
+        first = lo + (page_number - 1) * page_size
+        return [self.record(branch_id, entity, position) for position in range(first, min(first + page_size, hi))]
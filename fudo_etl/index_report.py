@@ -0,0 +1,33 @@
+# fudo_etl/index_report.py
+import argparse
+import json
+import logging
+
+from modules.config import load_config
+from modules.db_manager import DBManager
+from modules.index_advisor import IndexAdvisor
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def generate_index_report(output_path: str | None = None):
+    config = load_config()
+    db_manager = None
+    try:
+        db_manager = DBManager(config['db_connection_string'])
+        report = IndexAdvisor(db_manager).build_report()
+        if output_path:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+            logger.info(f"Reporte de índices guardado en '{output_path}'.")
+    finally:
+        if db_manager:
+            db_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reporte de uso de índices y candidatos a índices faltantes.")
+    parser.add_argument("--output", help="Ruta opcional de un archivo JSON donde guardar el reporte.")
+    args = parser.parse_args()
+    generate_index_report(args.output)
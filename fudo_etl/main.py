@@ -1,10 +1,17 @@
 import logging
-import json
 from datetime import datetime, timezone
 import uuid
 import time
-from hashlib import md5
 import os
+import argparse
+import sys
+import hashlib
+import re
+import signal
+
+# Costo de arranque: los imports de dependencias y módulos propios se miden (ver STARTUP_BUDGET_SECONDS).
+# Para el detalle por módulo: python -X importtime main.py --help
+_IMPORTS_STARTED = time.perf_counter()
 
 import psycopg2
 
@@ -13,594 +20,659 @@ import psycopg2
 from modules.config import load_config
 from modules.db_manager import DBManager
 from modules.etl_metadata_manager import ETLMetadataManager
-from modules.fudo_auth import FudoAuthenticator
+from modules.credentials_service import CredentialsService
 from modules.fudo_api_client import FudoApiClient
+from modules.rollup_manager import RollupManager
+from modules.analytic_schema_swap import BlueGreenAnalyticsBuilder
+from modules.partitioned_facts import PartitionedFactManager, FACT_COMPAT_VIEWS
+from modules.db_maintenance import DBMaintenanceManager
+from modules.record_preparation import prepare_raw_records, raw_table_for_entity
+from modules.pipeline import ExtractLoadPipeline
+from modules.task_sharding import TaskShardCoordinator
+from modules.refresh_policy import EntityRefreshPolicy
+from modules.follow_mode import FollowModeRunner
+from modules.landing_zone import LandingZoneWriter, LandingZoneLoader
+from modules.run_scheduler import RunScheduler, RunDeadline, BranchCircuitBreaker, CRITICAL_ENTITIES
+from modules.run_ledger import RunLedger
+from modules.changelog import RawChangelog
+from modules.metrics import METRICS
+from modules.profiling import RunProfiler
+from modules.parquet_export import AnalyticParquetExporter
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORTS_STARTED
 
 # Configuración básica de logging para todo el script principal
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Función auxiliar para parsear fechas de la API
-def parse_fudo_date(date_str: str | None) -> datetime | None:
-    """
-    Parsea una cadena de fecha de Fudo (ISO 8601 con 'Z') a un objeto datetime UTC.
-    Maneja None y errores de formato.
-    """
-    if date_str is None:
-        return None
-    try:
-        # Fudo usa 'Z' para UTC, Python fromisoformat necesita '+00:00'
-        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-    except ValueError:
-        logger.warning(f"No se pudo parsear la fecha de Fudo: '{date_str}'. Retornando None.")
-        return None
+# Inicio del proceso: el límite de la corrida (RUN_DEADLINE_SECONDS) incluye el despliegue de estructura
+PROCESS_STARTED_MONOTONIC = time.monotonic()
 
-# --- FUNCIÓN PARA LA FASE DE TRANSFORMACIÓN Y CARGA AL DER ---
-def refresh_analytics_materialized_views(db_manager: DBManager):
-    logger.info("==================================================")
-    logger.info("  Iniciando fase de Transformación (Creación/Refresco de MVs y Vistas RAW)")
-    logger.info("==================================================")
+# Entidades de la API de Fudo extraídas en cada corrida (una tabla fudo_raw_* por entidad)
+ENTITIES_TO_EXTRACT = [
+    'customers', 'discounts', 'expenses', 'expense-categories', 'ingredients',
+    'items', 'kitchens', 'payments', 'payment-methods', 'product-categories',
+    'product-modifiers', 'products', 'roles', 'rooms', 'sales', 'tables', 'users'
+]
+
+# Opciones de corrida por defecto (corrida completa); el CLI las sobreescribe
+DEFAULT_RUN_OPTIONS = {
+    'branches': None,     # None = todas las sucursales activas
+    'entities': None,     # None = ENTITIES_TO_EXTRACT
+    'phase': 'all',       # 'all' | 'extract' | 'transform' | 'follow'
+    'full': False,        # True = ignora la política de refresco y --skip-completed-within
+    'since': None,        # Ventana explícita de fechas (filtro createdAt de la API)
+    'until': None,
+    'skip_deploy': False,
+    'reload_run': None,   # run_id de la zona de aterrizaje a re-cargar sin llamar a la API
+    'retry_failed': None, # run_id del ledger: solo se re-intentan sus pares (sucursal, entidad) no exitosos
+    'skip_completed_within': None,  # Minutos; None = SKIP_COMPLETED_WITHIN_MINUTES
+    'profile': False,     # True = perfila la corrida aunque PROFILE_ENABLED esté apagado
+    'profile_per_entity': False,
+    'force_deploy': False, # True = aplica el DDL aunque su checksum no haya cambiado
+}
 
-    materialized_views_configs = [
-        # MVs del DER (ya existentes)
-        ('mv_sucursales', """
-            CREATE MATERIALIZED VIEW IF NOT EXISTS public.mv_sucursales AS
-            SELECT
-                id_sucursal,
-                sucursal_name AS sucursal
-            FROM public.config_fudo_branches
-            WHERE is_active = TRUE;
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_sucursales_id ON public.mv_sucursales (id_sucursal);
-        """),
-        ('mv_rubros', """
-            DROP MATERIALIZED VIEW IF EXISTS public.mv_rubros CASCADE;
-            CREATE MATERIALIZED VIEW public.mv_rubros AS
-            SELECT DISTINCT ON (id_fudo, id_sucursal_fuente)
-                (payload_json ->> 'id')::FLOAT::INTEGER AS id_rubro_fudo, -- <--- ¡CORRECCIÓN AQUÍ!
-                id_sucursal_fuente AS id_sucursal,
-                (payload_json ->> 'id') || '-' || id_sucursal_fuente AS rubro_key,
-                (payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS rubro_name
-            FROM public.fudo_raw_product_categories
-            WHERE payload_json ->> 'id' IS NOT NULL AND payload_json -> 'attributes' ->> 'name' IS NOT NULL
-            ORDER BY id_fudo, id_sucursal_fuente, fecha_extraccion_utc DESC;
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_rubros_rubro_key ON public.mv_rubros (rubro_key);
-        """),
-        ('mv_medio_pago', """
-            DROP MATERIALIZED VIEW IF EXISTS public.mv_medio_pago CASCADE;
-            CREATE MATERIALIZED VIEW public.mv_medio_pago AS
-            SELECT DISTINCT ON (id_fudo, id_sucursal_fuente)
-                (payload_json ->> 'id')::FLOAT::INTEGER AS id_payment_fudo, -- <--- ¡CORRECCIÓN AQUÍ!
-                id_sucursal_fuente AS id_sucursal,
-                (payload_json ->> 'id') || '-' || id_sucursal_fuente AS payment_method_key,
-                (payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS payment_method
-            FROM public.fudo_raw_payment_methods
-            WHERE payload_json ->> 'id' IS NOT NULL AND payload_json -> 'attributes' ->> 'name' IS NOT NULL
-            ORDER BY id_fudo, id_sucursal_fuente, fecha_extraccion_utc DESC;
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_medio_pago_payment_method_key ON public.mv_medio_pago (payment_method_key);
-        """),
-        ('mv_productos', """
-            DROP MATERIALIZED VIEW IF EXISTS public.mv_productos CASCADE;
-            CREATE MATERIALIZED VIEW public.mv_productos AS
-            SELECT DISTINCT ON (p.id_fudo, p.id_sucursal_fuente)
-                (p.payload_json ->> 'id')::FLOAT::INTEGER AS id_product_fudo, -- <--- ¡CORRECCIÓN AQUÍ!
-                p.id_sucursal_fuente AS id_sucursal,
-                (p.payload_json ->> 'id') || '-' || p.id_sucursal_fuente AS product_key,
-                (p.payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS product_name,
-                (p.payload_json -> 'relationships' -> 'productCategory' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_rubro_fudo, -- <--- ¡CORRECCIÓN AQUÍ!
-                (
-                    (p.payload_json -> 'relationships' -> 'productCategory' -> 'data' ->> 'id') || '-' || p.id_sucursal_fuente
-                ) AS rubro_key_fk
-            FROM public.fudo_raw_products p
-            WHERE p.payload_json ->> 'id' IS NOT NULL AND p.payload_json -> 'attributes' ->> 'name' IS NOT NULL
-            ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_productos_product_key ON public.mv_productos (product_key);
-        """),
-        ('mv_sales_order', """
-    DROP MATERIALIZED VIEW IF EXISTS public.mv_sales_order CASCADE;
-    CREATE MATERIALIZED VIEW public.mv_sales_order AS
-    SELECT DISTINCT ON (s.id_fudo, s.id_sucursal_fuente)
-        (s.payload_json ->> 'id')::FLOAT::INTEGER AS id_order, -- <--- ¡CORRECCIÓN AQUÍ!
-        s.id_sucursal_fuente AS id_sucursal,
-        (s.payload_json ->> 'id') || '-' || s.id_sucursal_fuente AS order_key,
-        0.0::FLOAT AS amount_tax,
-        (s.payload_json -> 'attributes' ->> 'total')::FLOAT AS amount_total,
-        (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS date_order,
-        (s.payload_json -> 'attributes' ->> 'saleType') AS sale_type,
-        (s.payload_json -> 'relationships' -> 'table' -> 'data' ->> 'id') AS table_id,
-        (s.payload_json -> 'relationships' -> 'waiter' -> 'data' ->> 'id') AS waiter_id,
-        (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
-        (s.payload_json -> 'attributes' ->> 'closedAt')::TIMESTAMP WITH TIME ZONE AS closed_at
-    FROM public.fudo_raw_sales s
-    WHERE
-        s.payload_json ->> 'id' IS NOT NULL AND
-        s.id_sucursal_fuente IS NOT NULL AND
-        (s.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL AND
-        (s.payload_json -> 'attributes' ->> 'total') IS NOT NULL AND
-        (s.payload_json -> 'attributes' ->> 'saleState') IS NOT NULL AND
-        (s.payload_json -> 'attributes' ->> 'saleState') != 'CANCELED'
-    ORDER BY s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc DESC;
-    CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_sales_order_order_key ON public.mv_sales_order (order_key);       
-        """),
-        ('mv_pagos', """
+# --- DEFINICIONES DE LA CAPA ANALÍTICA (MVs del DER) Y VISTAS RAW DESNORMALIZADAS ---
+MATERIALIZED_VIEWS_CONFIGS = [
+    # MVs del DER (ya existentes)
+    ('mv_sucursales', """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS public.mv_sucursales AS
+        SELECT
+            id_sucursal,
+            sucursal_name AS sucursal
+        FROM public.config_fudo_branches
+        WHERE is_active = TRUE;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_sucursales_id ON public.mv_sucursales (id_sucursal);
+    """),
+    ('mv_rubros', """
+        DROP MATERIALIZED VIEW IF EXISTS public.mv_rubros CASCADE;
+        CREATE MATERIALIZED VIEW public.mv_rubros AS
+        SELECT DISTINCT ON (id_fudo, id_sucursal_fuente)
+            (payload_json ->> 'id')::FLOAT::INTEGER AS id_rubro_fudo, -- <--- ¡CORRECCIÓN AQUÍ!
+            id_sucursal_fuente AS id_sucursal,
+            (payload_json ->> 'id') || '-' || id_sucursal_fuente AS rubro_key,
+            (payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS rubro_name
+        FROM public.fudo_raw_product_categories
+        WHERE payload_json ->> 'id' IS NOT NULL AND payload_json -> 'attributes' ->> 'name' IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_product_categories' AND t.id_sucursal = public.fudo_raw_product_categories.id_sucursal_fuente AND t.id_fudo = public.fudo_raw_product_categories.id_fudo)
+        ORDER BY id_fudo, id_sucursal_fuente, fecha_extraccion_utc DESC;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_rubros_rubro_key ON public.mv_rubros (rubro_key);
+    """),
+    ('mv_medio_pago', """
+        DROP MATERIALIZED VIEW IF EXISTS public.mv_medio_pago CASCADE;
+        CREATE MATERIALIZED VIEW public.mv_medio_pago AS
+        SELECT DISTINCT ON (id_fudo, id_sucursal_fuente)
+            (payload_json ->> 'id')::FLOAT::INTEGER AS id_payment_fudo, -- <--- ¡CORRECCIÓN AQUÍ!
+            id_sucursal_fuente AS id_sucursal,
+            (payload_json ->> 'id') || '-' || id_sucursal_fuente AS payment_method_key,
+            (payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS payment_method
+        FROM public.fudo_raw_payment_methods
+        WHERE payload_json ->> 'id' IS NOT NULL AND payload_json -> 'attributes' ->> 'name' IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_payment_methods' AND t.id_sucursal = public.fudo_raw_payment_methods.id_sucursal_fuente AND t.id_fudo = public.fudo_raw_payment_methods.id_fudo)
+        ORDER BY id_fudo, id_sucursal_fuente, fecha_extraccion_utc DESC;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_medio_pago_payment_method_key ON public.mv_medio_pago (payment_method_key);
+    """),
+    ('mv_productos', """
+        DROP MATERIALIZED VIEW IF EXISTS public.mv_productos CASCADE;
+        CREATE MATERIALIZED VIEW public.mv_productos AS
+        SELECT DISTINCT ON (p.id_fudo, p.id_sucursal_fuente)
+            (p.payload_json ->> 'id')::FLOAT::INTEGER AS id_product_fudo, -- <--- ¡CORRECCIÓN AQUÍ!
+            p.id_sucursal_fuente AS id_sucursal,
+            (p.payload_json ->> 'id') || '-' || p.id_sucursal_fuente AS product_key,
+            (p.payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS product_name,
+            (p.payload_json -> 'relationships' -> 'productCategory' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_rubro_fudo, -- <--- ¡CORRECCIÓN AQUÍ!
+            (
+                (p.payload_json -> 'relationships' -> 'productCategory' -> 'data' ->> 'id') || '-' || p.id_sucursal_fuente
+            ) AS rubro_key_fk
+        FROM public.fudo_raw_products p
+        WHERE p.payload_json ->> 'id' IS NOT NULL AND p.payload_json -> 'attributes' ->> 'name' IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_products' AND t.id_sucursal = p.id_sucursal_fuente AND t.id_fudo = p.id_fudo)
+        ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_productos_product_key ON public.mv_productos (product_key);
+    """),
+    ('mv_sales_order', """
+DROP MATERIALIZED VIEW IF EXISTS public.mv_sales_order CASCADE;
+CREATE MATERIALIZED VIEW public.mv_sales_order AS
+SELECT DISTINCT ON (s.id_fudo, s.id_sucursal_fuente)
+    (s.payload_json ->> 'id')::FLOAT::INTEGER AS id_order, -- <--- ¡CORRECCIÓN AQUÍ!
+    s.id_sucursal_fuente AS id_sucursal,
+    (s.payload_json ->> 'id') || '-' || s.id_sucursal_fuente AS order_key,
+    0.0::FLOAT AS amount_tax,
+    (s.payload_json -> 'attributes' ->> 'total')::FLOAT AS amount_total,
+    (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS date_order,
+    (s.payload_json -> 'attributes' ->> 'saleType') AS sale_type,
+    (s.payload_json -> 'relationships' -> 'table' -> 'data' ->> 'id') AS table_id,
+    (s.payload_json -> 'relationships' -> 'waiter' -> 'data' ->> 'id') AS waiter_id,
+    (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
+    (s.payload_json -> 'attributes' ->> 'closedAt')::TIMESTAMP WITH TIME ZONE AS closed_at
+FROM public.fudo_raw_sales s
+WHERE
+    s.payload_json ->> 'id' IS NOT NULL AND
+    s.id_sucursal_fuente IS NOT NULL AND
+    (s.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL AND
+    (s.payload_json -> 'attributes' ->> 'total') IS NOT NULL AND
+    (s.payload_json -> 'attributes' ->> 'saleState') IS NOT NULL AND
+    (s.payload_json -> 'attributes' ->> 'saleState') != 'CANCELED'
+  AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_sales' AND t.id_sucursal = s.id_sucursal_fuente AND t.id_fudo = s.id_fudo)
+ORDER BY s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc DESC;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_sales_order_order_key ON public.mv_sales_order (order_key);       
+CREATE INDEX IF NOT EXISTS idx_mv_sales_order_sucursal_fecha ON public.mv_sales_order (id_sucursal, date_order);
+    """),
+    ('mv_pagos', """
 DROP MATERIALIZED VIEW IF EXISTS public.mv_pagos CASCADE;
 CREATE MATERIALIZED VIEW public.mv_pagos AS
 SELECT DISTINCT ON (p.id_fudo, p.id_sucursal_fuente)
-    (p.payload_json ->> 'id')::FLOAT::INTEGER AS id,
-    p.id_sucursal_fuente AS id_sucursal,
-    (p.payload_json ->> 'id') || '-' || p.id_sucursal_fuente AS payment_key,
-    (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER AS pos_order_id,
-    (p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_payment,
-    (p.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
-    
-    CASE WHEN (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') IS NOT NULL THEN 'EXPENSE'
-         WHEN (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') IS NOT NULL THEN 'SALE'
-         ELSE 'OTHER' END AS transaction_type,
-    CASE WHEN (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') IS NOT NULL THEN -((p.payload_json -> 'attributes' ->> 'amount')::FLOAT)
-         ELSE (p.payload_json -> 'attributes' ->> 'amount')::FLOAT END AS signed_amount,
-
-    (p.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS payment_date,
-    (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') AS expense_id,
-    (
-        (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') || '-' || p.id_sucursal_fuente
-    ) AS order_key_fk
+(p.payload_json ->> 'id')::FLOAT::INTEGER AS id,
+p.id_sucursal_fuente AS id_sucursal,
+(p.payload_json ->> 'id') || '-' || p.id_sucursal_fuente AS payment_key,
+(p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER AS pos_order_id,
+(p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_payment,
+(p.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
+
+CASE WHEN (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') IS NOT NULL THEN 'EXPENSE'
+     WHEN (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') IS NOT NULL THEN 'SALE'
+     ELSE 'OTHER' END AS transaction_type,
+CASE WHEN (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') IS NOT NULL THEN -((p.payload_json -> 'attributes' ->> 'amount')::FLOAT)
+     ELSE (p.payload_json -> 'attributes' ->> 'amount')::FLOAT END AS signed_amount,
+
+(p.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS payment_date,
+(p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') AS expense_id,
+(
+    (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') || '-' || p.id_sucursal_fuente
+) AS order_key_fk
 FROM public.fudo_raw_payments p
 LEFT JOIN public.fudo_raw_sales frs ON (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER = (frs.payload_json ->> 'id')::FLOAT::INTEGER
-                                    AND p.id_sucursal_fuente = frs.id_sucursal_fuente
+                                AND p.id_sucursal_fuente = frs.id_sucursal_fuente
 WHERE p.payload_json ->> 'id' IS NOT NULL 
   AND (p.payload_json -> 'attributes' ->> 'amount') IS NOT NULL 
   AND (p.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL
   AND (p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') IS NOT NULL
   AND (p.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN IS NOT TRUE
+  AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_payments' AND t.id_sucursal = p.id_sucursal_fuente AND t.id_fudo = p.id_fudo)
 ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
 CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_pagos_payment_key ON public.mv_pagos (payment_key);
-        """),
-        ('mv_sales_order_line', """
+CREATE INDEX IF NOT EXISTS idx_mv_pagos_sucursal_fecha ON public.mv_pagos (id_sucursal, payment_date);
+CREATE INDEX IF NOT EXISTS idx_mv_pagos_order_key_fk ON public.mv_pagos (order_key_fk);
+    """),
+    ('mv_sales_order_line', """
 DROP MATERIALIZED VIEW IF EXISTS public.mv_sales_order_line CASCADE;
-            CREATE MATERIALIZED VIEW public.mv_sales_order_line AS
-            SELECT DISTINCT ON (i.id_fudo, i.id_sucursal_fuente)
-                -- ID de la línea de orden (del ítem)
-                (i.payload_json ->> 'id')::FLOAT::INTEGER AS id_order_line_fudo, -- <--- ¡Asegurarnos de que este esté!
-                i.id_sucursal_fuente AS id_sucursal,
-                (i.payload_json ->> 'id') || '-' || i.id_sucursal_fuente AS order_line_key,
-                
-                -- ID de la venta (del relationships.sale)
-                (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_order_fudo, -- <--- ¡Asegurarnos de que este esté!
-                
-                (
-                    (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') || '-' || i.id_sucursal_fuente
-                ) AS order_key_fk,
-                (i.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS date_order_time,
-                (i.payload_json -> 'attributes' ->> 'createdAt')::DATE AS date_order,
-                
-                -- ID del producto (del relationships.product)
-                (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_product_fudo, -- <--- ¡Asegurarnos de que este esté!
-                
-                (
-                    (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') || '-' || i.id_sucursal_fuente
-                ) AS product_key_fk,
-                
-                -- Cantidad y precio original de la API (campos auxiliares)
-                COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) AS qty_from_api,
-                COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) AS price_from_api,
-                
-                -- Precio unitario corregido
+        CREATE MATERIALIZED VIEW public.mv_sales_order_line AS
+        SELECT DISTINCT ON (i.id_fudo, i.id_sucursal_fuente)
+            -- ID de la línea de orden (del ítem)
+            (i.payload_json ->> 'id')::FLOAT::INTEGER AS id_order_line_fudo, -- <--- ¡Asegurarnos de que este esté!
+            i.id_sucursal_fuente AS id_sucursal,
+            (i.payload_json ->> 'id') || '-' || i.id_sucursal_fuente AS order_line_key,
+            
+            -- ID de la venta (del relationships.sale)
+            (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_order_fudo, -- <--- ¡Asegurarnos de que este esté!
+            
+            (
+                (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') || '-' || i.id_sucursal_fuente
+            ) AS order_key_fk,
+            (i.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS date_order_time,
+            (i.payload_json -> 'attributes' ->> 'createdAt')::DATE AS date_order,
+            
+            -- ID del producto (del relationships.product)
+            (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_product_fudo, -- <--- ¡Asegurarnos de que este esté!
+            
+            (
+                (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') || '-' || i.id_sucursal_fuente
+            ) AS product_key_fk,
+            
+            -- Cantidad y precio original de la API (campos auxiliares)
+            COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) AS qty_from_api,
+            COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) AS price_from_api,
+            
+            -- Precio unitario corregido
+            CASE
+                WHEN COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0 
+                THEN COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) / COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0)
+                ELSE 0.0
+            END AS price_unit, 
+            
+            -- Cantidad final (siempre entero)
+            COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT::INTEGER), 0) AS qty, -- Esta línea suele estar bien, pero si Fudo manda "3.0" aquí fallaría.
+                                                                                           -- Si falla, cambiar a ::FLOAT::INTEGER también.
+            
+            -- Monto total de la línea
+            (
                 CASE
                     WHEN COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0 
                     THEN COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) / COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0)
                     ELSE 0.0
-                END AS price_unit, 
-                
-                -- Cantidad final (siempre entero)
-                COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT::INTEGER), 0) AS qty, -- Esta línea suele estar bien, pero si Fudo manda "3.0" aquí fallaría.
-                                                                                               -- Si falla, cambiar a ::FLOAT::INTEGER también.
-                
-                -- Monto total de la línea
-                (
-                    CASE
-                        WHEN COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0 
-                        THEN COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) / COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0)
-                        ELSE 0.0
-                    END
-                ) * COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) AS amount_total
-            FROM public.fudo_raw_items i
-            WHERE i.payload_json ->> 'id' IS NOT NULL 
-              AND (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') IS NOT NULL
-              AND (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') IS NOT NULL
-              AND (i.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL
-              AND (i.payload_json -> 'attributes' ->> 'price') IS NOT NULL
-              AND (i.payload_json -> 'attributes' ->> 'quantity') IS NOT NULL
-              AND (i.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN IS NOT TRUE
-              AND COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0
-            ORDER BY i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc DESC;
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_sales_order_line_order_line_key ON public.mv_sales_order_line (order_line_key);
-        """),
-          # --- AÑADIMOS EL NUEVO DER DE GASTOS ---
-        # mv_expense_categories (NUEVA MV - CON ÍNDICE ÚNICO)
-        ('mv_expense_categories', """
+                END
+            ) * COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) AS amount_total
+        FROM public.fudo_raw_items i
+        WHERE i.payload_json ->> 'id' IS NOT NULL 
+          AND (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') IS NOT NULL
+          AND (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') IS NOT NULL
+          AND (i.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL
+          AND (i.payload_json -> 'attributes' ->> 'price') IS NOT NULL
+          AND (i.payload_json -> 'attributes' ->> 'quantity') IS NOT NULL
+          AND (i.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN IS NOT TRUE
+          AND COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0
+          AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_items' AND t.id_sucursal = i.id_sucursal_fuente AND t.id_fudo = i.id_fudo)
+        ORDER BY i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc DESC;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_sales_order_line_order_line_key ON public.mv_sales_order_line (order_line_key);
+        CREATE INDEX IF NOT EXISTS idx_mv_sales_order_line_sucursal_fecha ON public.mv_sales_order_line (id_sucursal, date_order);
+        CREATE INDEX IF NOT EXISTS idx_mv_sales_order_line_order_key_fk ON public.mv_sales_order_line (order_key_fk);
+        CREATE INDEX IF NOT EXISTS idx_mv_sales_order_line_product_key_fk ON public.mv_sales_order_line (product_key_fk);
+    """),
+      # --- AÑADIMOS EL NUEVO DER DE GASTOS ---
+    # mv_expense_categories (NUEVA MV - CON ÍNDICE ÚNICO)
+    ('mv_expense_categories', """
 DROP MATERIALIZED VIEW IF EXISTS public.mv_expense_categories CASCADE;
 CREATE MATERIALIZED VIEW public.mv_expense_categories AS
 SELECT DISTINCT ON (ec.id_fudo, ec.id_sucursal_fuente)
-    (ec.payload_json ->> 'id')::FLOAT::INTEGER AS id_expense_category,
-    (ec.payload_json -> 'attributes' ->> 'name') AS expense_category_name,
-    (ec.payload_json -> 'attributes' ->> 'financialCategory') AS financial_category,
-    (ec.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
-    (ec.payload_json -> 'relationships' -> 'parentCategory' -> 'data' ->> 'id') AS parent_category_id,
-    ec.id_sucursal_fuente AS id_sucursal,
-    (ec.payload_json ->> 'id') || '-' || ec.id_sucursal_fuente AS expense_category_key
+(ec.payload_json ->> 'id')::FLOAT::INTEGER AS id_expense_category,
+(ec.payload_json -> 'attributes' ->> 'name') AS expense_category_name,
+(ec.payload_json -> 'attributes' ->> 'financialCategory') AS financial_category,
+(ec.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
+(ec.payload_json -> 'relationships' -> 'parentCategory' -> 'data' ->> 'id') AS parent_category_id,
+ec.id_sucursal_fuente AS id_sucursal,
+(ec.payload_json ->> 'id') || '-' || ec.id_sucursal_fuente AS expense_category_key
 FROM public.fudo_raw_expense_categories ec
 WHERE (ec.payload_json ->> 'id') IS NOT NULL 
   AND (ec.payload_json -> 'attributes' ->> 'name') IS NOT NULL
   AND ec.id_sucursal_fuente IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_expense_categories' AND t.id_sucursal = ec.id_sucursal_fuente AND t.id_fudo = ec.id_fudo)
 ORDER BY ec.id_fudo, ec.id_sucursal_fuente, ec.fecha_extraccion_utc DESC;
 CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_expense_categories_key ON public.mv_expense_categories (expense_category_key);
-        """),
-
-        # mv_expenses (NUEVA MV - CON ÍNDICE ÚNICO)
-        ('mv_expenses', """
-           DROP MATERIALIZED VIEW IF EXISTS public.mv_expenses CASCADE;
-            CREATE MATERIALIZED VIEW public.mv_expenses AS
-            SELECT DISTINCT ON (e.id_fudo, e.id_sucursal_fuente)
-                (e.payload_json ->> 'id')::FLOAT::INTEGER AS id_expense,
-                e.id_sucursal_fuente AS id_sucursal,
-                (e.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
-                (e.payload_json -> 'attributes' ->> 'description') AS description,
-                (e.payload_json -> 'attributes' ->> 'date')::TIMESTAMP WITH TIME ZONE AS expense_date,
-                (e.payload_json -> 'attributes' ->> 'status') AS status,
-                (e.payload_json -> 'attributes' ->> 'dueDate')::TIMESTAMP WITH TIME ZONE AS due_date,
-                (e.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
-                (e.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
-                (e.payload_json -> 'attributes' ->> 'paymentDate')::TIMESTAMP WITH TIME ZONE AS payment_date,
-                (e.payload_json -> 'attributes' ->> 'receiptNumber') AS receipt_number,
-                (e.payload_json -> 'attributes' ->> 'useInCashCount')::BOOLEAN AS use_in_cash_count,
-                (e.payload_json -> 'relationships' -> 'user' -> 'data' ->> 'id') AS user_id,
-                (e.payload_json -> 'relationships' -> 'provider' -> 'data' ->> 'id') AS provider_id,
-                (e.payload_json -> 'relationships' -> 'receiptType' -> 'data' ->> 'id') AS receipt_type_id,
-                (e.payload_json -> 'relationships' -> 'cashRegister' -> 'data' ->> 'id') AS cash_register_id,
-                (e.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') AS payment_method_id,
-                (e.payload_json -> 'relationships' -> 'expenseCategory' -> 'data' ->> 'id') AS expense_category_id,
-                (e.payload_json -> 'relationships' -> 'expenseCategory' -> 'data' ->> 'id') || '-' || e.id_sucursal_fuente AS expense_category_key
-            FROM public.fudo_raw_expenses e
-            WHERE (e.payload_json ->> 'id') IS NOT NULL
-              AND e.id_sucursal_fuente IS NOT NULL
-            ORDER BY e.id_fudo, e.id_sucursal_fuente, e.fecha_extraccion_utc DESC;
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_expenses_id_sucursal ON public.mv_expenses (id_expense, id_sucursal); 
-        """),
-        ('mv_product_categories_details', """
+    """),
+
+    # mv_expenses (NUEVA MV - CON ÍNDICE ÚNICO)
+    ('mv_expenses', """
+       DROP MATERIALIZED VIEW IF EXISTS public.mv_expenses CASCADE;
+        CREATE MATERIALIZED VIEW public.mv_expenses AS
+        SELECT DISTINCT ON (e.id_fudo, e.id_sucursal_fuente)
+            (e.payload_json ->> 'id')::FLOAT::INTEGER AS id_expense,
+            e.id_sucursal_fuente AS id_sucursal,
+            (e.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
+            (e.payload_json -> 'attributes' ->> 'description') AS description,
+            (e.payload_json -> 'attributes' ->> 'date')::TIMESTAMP WITH TIME ZONE AS expense_date,
+            (e.payload_json -> 'attributes' ->> 'status') AS status,
+            (e.payload_json -> 'attributes' ->> 'dueDate')::TIMESTAMP WITH TIME ZONE AS due_date,
+            (e.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
+            (e.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
+            (e.payload_json -> 'attributes' ->> 'paymentDate')::TIMESTAMP WITH TIME ZONE AS payment_date,
+            (e.payload_json -> 'attributes' ->> 'receiptNumber') AS receipt_number,
+            (e.payload_json -> 'attributes' ->> 'useInCashCount')::BOOLEAN AS use_in_cash_count,
+            (e.payload_json -> 'relationships' -> 'user' -> 'data' ->> 'id') AS user_id,
+            (e.payload_json -> 'relationships' -> 'provider' -> 'data' ->> 'id') AS provider_id,
+            (e.payload_json -> 'relationships' -> 'receiptType' -> 'data' ->> 'id') AS receipt_type_id,
+            (e.payload_json -> 'relationships' -> 'cashRegister' -> 'data' ->> 'id') AS cash_register_id,
+            (e.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') AS payment_method_id,
+            (e.payload_json -> 'relationships' -> 'expenseCategory' -> 'data' ->> 'id') AS expense_category_id,
+            (e.payload_json -> 'relationships' -> 'expenseCategory' -> 'data' ->> 'id') || '-' || e.id_sucursal_fuente AS expense_category_key
+        FROM public.fudo_raw_expenses e
+        WHERE (e.payload_json ->> 'id') IS NOT NULL
+          AND e.id_sucursal_fuente IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_expenses' AND t.id_sucursal = e.id_sucursal_fuente AND t.id_fudo = e.id_fudo)
+        ORDER BY e.id_fudo, e.id_sucursal_fuente, e.fecha_extraccion_utc DESC;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_expenses_id_sucursal ON public.mv_expenses (id_expense, id_sucursal); 
+        CREATE INDEX IF NOT EXISTS idx_mv_expenses_sucursal_fecha ON public.mv_expenses (id_sucursal, expense_date);
+    """),
+    ('mv_product_categories_details', """
 DROP MATERIALIZED VIEW IF EXISTS public.mv_product_categories_details CASCADE;
 CREATE MATERIALIZED VIEW public.mv_product_categories_details AS
 SELECT DISTINCT ON (pc.id_fudo, pc.id_sucursal_fuente)
-    (pc.payload_json ->> 'id')::FLOAT::INTEGER AS id_product_category,
-    (pc.payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS product_category_name,
-    (pc.payload_json -> 'attributes' ->> 'position')::INTEGER AS "position",
-    (pc.payload_json -> 'attributes' ->> 'preparationTime')::INTEGER AS preparation_time,
-    (pc.payload_json -> 'attributes' ->> 'enableOnlineMenu')::BOOLEAN AS enable_online_menu,
-    (pc.payload_json -> 'relationships' -> 'kitchen' -> 'data' ->> 'id') AS kitchen_id,
-    (pc.payload_json -> 'relationships' -> 'parentCategory' -> 'data' ->> 'id') AS parent_category_id,
-    pc.id_sucursal_fuente AS id_sucursal,
-    (pc.payload_json ->> 'id') || '-' || pc.id_sucursal_fuente AS product_category_key
+(pc.payload_json ->> 'id')::FLOAT::INTEGER AS id_product_category,
+(pc.payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS product_category_name,
+(pc.payload_json -> 'attributes' ->> 'position')::INTEGER AS "position",
+(pc.payload_json -> 'attributes' ->> 'preparationTime')::INTEGER AS preparation_time,
+(pc.payload_json -> 'attributes' ->> 'enableOnlineMenu')::BOOLEAN AS enable_online_menu,
+(pc.payload_json -> 'relationships' -> 'kitchen' -> 'data' ->> 'id') AS kitchen_id,
+(pc.payload_json -> 'relationships' -> 'parentCategory' -> 'data' ->> 'id') AS parent_category_id,
+pc.id_sucursal_fuente AS id_sucursal,
+(pc.payload_json ->> 'id') || '-' || pc.id_sucursal_fuente AS product_category_key
 FROM public.fudo_raw_product_categories pc
 WHERE (pc.payload_json ->> 'id') IS NOT NULL 
   AND (pc.payload_json -> 'attributes' ->> 'name') IS NOT NULL
   AND pc.id_sucursal_fuente IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_product_categories' AND t.id_sucursal = pc.id_sucursal_fuente AND t.id_fudo = pc.id_fudo)
 ORDER BY pc.id_fudo, pc.id_sucursal_fuente, pc.fecha_extraccion_utc DESC;
 CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_product_categories_key ON public.mv_product_categories_details (product_category_key);
-        """),
-        ('mv_productos', """
-            -- ... (definición de mv_productos - SIN CAMBIOS) ...
-            -- Asegúrate de que id_product_fudo esté en el SELECT de mv_productos
-            -- como (p.payload_json ->> 'id')::FLOAT::INTEGER AS id_product_fudo
-        """),
-        # --- NUEVA VISTA MATERIALIZADA: PRECIOS Y STOCK DE PRODUCTOS POR SUCURSAL ---
-        ('mv_product_prices_by_branch', """
-            DROP MATERIALIZED VIEW IF EXISTS public.mv_product_prices_by_branch CASCADE;
-            CREATE MATERIALIZED VIEW public.mv_product_prices_by_branch AS
-            SELECT DISTINCT ON (p.id_fudo, p.id_sucursal_fuente)
-                (p.payload_json ->> 'id')::TEXT AS id_product_fudo,     -- ID original de Fudo (FK a mv_productos)
-                p.id_sucursal_fuente AS id_sucursal,                 -- ID de Sucursal (FK a mv_sucursales)
-                (p.payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS product_name, -- Nombre del producto en esta sucursal (para referencia)
-                (p.payload_json -> 'attributes' ->> 'price')::FLOAT AS price,       -- Precio base del producto en esa sucursal
-                (p.payload_json -> 'attributes' ->> 'stock')::FLOAT AS stock,       -- Stock del producto en esa sucursal
-                (p.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS is_active_in_branch, -- Si el producto está activo en esa sucursal
-                (p.payload_json ->> 'id') || '-' || p.id_sucursal_fuente AS product_branch_key -- Clave sintética
-            FROM public.fudo_raw_products p
-            WHERE p.payload_json ->> 'id' IS NOT NULL AND p.id_sucursal_fuente IS NOT NULL
-            ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_product_prices_branch_pk ON public.mv_product_prices_by_branch (product_branch_key);
-        """),
-    ]
-
-    raw_views_configs = [
-        # fudo_view_raw_customers
-         ('fudo_view_raw_customers', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_customers;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_customers AS
-            SELECT
-                c.id_fudo, c.id_sucursal_fuente, c.fecha_extraccion_utc, c.payload_checksum,
-                (c.payload_json ->> 'id') AS customer_id, (c.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
-                (c.payload_json -> 'attributes' ->> 'address') AS address,
-                (c.payload_json -> 'attributes' ->> 'comment') AS comment,
-                (c.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
-                (c.payload_json -> 'attributes' ->> 'discountPercentage')::FLOAT AS discount_percentage,
-                (c.payload_json -> 'attributes' ->> 'email') AS email,
-                (c.payload_json -> 'attributes' ->> 'firstSaleDate')::TIMESTAMP WITH TIME ZONE AS first_sale_date,
-                (c.payload_json -> 'attributes' ->> 'historicalSalesCount')::INTEGER AS historical_sales_count,
-                (c.payload_json -> 'attributes' ->> 'historicalTotalSpent')::FLOAT AS historical_total_spent,
-                (c.payload_json -> 'attributes' ->> 'houseAccountBalance')::FLOAT AS house_account_balance,
-                (c.payload_json -> 'attributes' ->> 'houseAccountEnabled')::BOOLEAN AS house_account_enabled,
-                (c.payload_json -> 'attributes' ->> 'lastSaleDate')::TIMESTAMP WITH TIME ZONE AS last_sale_date,
-                (c.payload_json -> 'attributes' ->> 'name') AS customer_name,
-                (c.payload_json -> 'attributes' ->> 'origin') AS origin,
-                (c.payload_json -> 'attributes' ->> 'phone') AS phone,
-                (c.payload_json -> 'attributes' ->> 'salesCount')::INTEGER AS sales_count,
-                (c.payload_json -> 'attributes' ->> 'vatNumber') AS vat_number,
-                (c.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') AS payment_method_id,
-                c.payload_json AS original_payload
-            FROM public.fudo_raw_customers c
-            ORDER BY c.id_fudo, c.id_sucursal_fuente, c.fecha_extraccion_utc DESC;
-        """),
-        # fudo_view_raw_discounts (¡ACTUALIZADA!)
-        ('fudo_view_raw_discounts', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_discounts;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_discounts AS
-            SELECT
-                d.id_fudo, d.id_sucursal_fuente, d.fecha_extraccion_utc, d.payload_checksum,
-                (d.payload_json ->> 'id') AS discount_id, (d.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
-                (d.payload_json -> 'attributes' ->> 'percentage')::FLOAT AS percentage,
-                (d.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
-                (d.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') AS sale_id,
-                d.payload_json AS original_payload
-            FROM public.fudo_raw_discounts d
-            ORDER BY d.id_fudo, d.id_sucursal_fuente, d.fecha_extraccion_utc DESC;
-        """),
-        # fudo_view_raw_expenses (¡ACTUALIZADA!)
-        ('fudo_view_raw_expenses', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_expenses;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_expenses AS
-            SELECT
-                e.id_fudo, e.id_sucursal_fuente, e.fecha_extraccion_utc, e.payload_checksum,
-                (e.payload_json ->> 'id') AS expense_id,
-                (e.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
-                (e.payload_json -> 'attributes' ->> 'description') AS description,
-                (e.payload_json -> 'attributes' ->> 'date')::TIMESTAMP WITH TIME ZONE AS expense_date,
-                (e.payload_json -> 'attributes' ->> 'status') AS status,
-                (e.payload_json -> 'attributes' ->> 'dueDate')::TIMESTAMP WITH TIME ZONE AS due_date,
-                (e.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
-                (e.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
-                (e.payload_json -> 'attributes' ->> 'paymentDate')::TIMESTAMP WITH TIME ZONE AS payment_date,
-                (e.payload_json -> 'attributes' ->> 'receiptNumber') AS receipt_number,
-                (e.payload_json -> 'attributes' ->> 'useInCashCount')::BOOLEAN AS use_in_cash_count,
-                (e.payload_json -> 'relationships' -> 'user' -> 'data' ->> 'id') AS user_id,
-                (e.payload_json -> 'relationships' -> 'provider' -> 'data' ->> 'id') AS provider_id,
-                (e.payload_json -> 'relationships' -> 'receiptType' -> 'data' ->> 'id') AS receipt_type_id,
-                (e.payload_json -> 'relationships' -> 'cashRegister' -> 'data' ->> 'id') AS cash_register_id,
-                (e.payload_json -> 'relationships' -> 'expenseItems' -> 'data') AS expense_items, -- Mantener como JSONB array
-                (e.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') AS payment_method_id,
-                (e.payload_json -> 'relationships' -> 'expenseCategory' -> 'data' ->> 'id') AS expense_category_id,
-                e.payload_json AS original_payload
-            FROM public.fudo_raw_expenses e
-            ORDER BY e.id_fudo, e.id_sucursal_fuente, e.fecha_extraccion_utc DESC;
-        """),
-        # fudo_view_raw_expense_categories (Basado en ejemplo, sin 'fields')
-        ('fudo_view_raw_expense_categories', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_expense_categories;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_expense_categories AS
-            SELECT
-                ec.id_fudo, ec.id_sucursal_fuente, ec.fecha_extraccion_utc, ec.payload_checksum,
-                (ec.payload_json ->> 'id') AS category_id,
-                (ec.payload_json -> 'attributes' ->> 'name') AS category_name, -- CORREGIDO, era category_active
-                (ec.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
-                (ec.payload_json -> 'attributes' ->> 'financialCategory') AS financial_category,
-                (ec.payload_json -> 'relationships' -> 'parentCategory' -> 'data' ->> 'id') AS parent_category_id,
-                ec.payload_json AS original_payload
-            FROM public.fudo_raw_expense_categories ec
-            ORDER BY ec.id_fudo, ec.id_sucursal_fuente, ec.fecha_extraccion_utc DESC;
-        """),
-        # fudo_view_raw_ingredients (¡ACTUALIZADA!)
-        ('fudo_view_raw_ingredients', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_ingredients;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_ingredients AS
-            SELECT
-                i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc, i.payload_checksum,
-                (i.payload_json ->> 'id') AS ingredient_id, (i.payload_json -> 'attributes' ->> 'name') AS ingredient_name,
-                (i.payload_json -> 'attributes' ->> 'cost')::FLOAT AS cost,
-                (i.payload_json -> 'attributes' ->> 'stock')::FLOAT AS stock,
-                (i.payload_json -> 'attributes' ->> 'stockControl')::BOOLEAN AS stock_control,
-                (i.payload_json -> 'relationships' -> 'ingredientCategory' -> 'data' ->> 'id') AS ingredient_category_id,
-                i.payload_json AS original_payload
-            FROM public.fudo_raw_ingredients i
-            ORDER BY i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc DESC;
-        """),
-        #fudo_view_raw_items (¡ACTUALIZADA con campos completos!)
-        ('fudo_view_raw_items', """
-            drop view if exists public.fudo_view_raw_items CASCADE;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_items AS
-            SELECT
-                i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc, i.payload_checksum,
-                (i.payload_json ->> 'id') AS item_id,
-                (i.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
-                (i.payload_json -> 'attributes' ->> 'cancellationComment') AS cancellation_comment,
-                (i.payload_json -> 'attributes' ->> 'comment') AS comment,
-                (i.payload_json -> 'attributes' ->> 'cost')::FLOAT AS cost,
-                (i.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
-                (i.payload_json -> 'attributes' ->> 'price')::FLOAT AS price,
-                (i.payload_json -> 'attributes' ->> 'quantity')::FLOAT AS quantity,
-                (i.payload_json -> 'attributes' ->> 'status') AS status,
-                (i.payload_json -> 'attributes' ->> 'paid')::BOOLEAN AS paid,
-                (i.payload_json -> 'attributes' ->> 'lastStockCountAt')::TIMESTAMP WITH TIME ZONE AS last_stock_count_at,
-                (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') AS product_id,
-                (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') AS sale_id,
-                (i.payload_json -> 'relationships' -> 'priceList' -> 'data' ->> 'id') AS price_list_id,
-                (i.payload_json -> 'relationships' -> 'subitems' -> 'data') AS subitems_data,
-                i.payload_json AS original_payload
-            FROM public.fudo_raw_items i
-            ORDER BY i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc DESC;
-        """),
-        # fudo_view_raw_kitchens (Basado en ejemplo, sin 'fields')
-        ('fudo_view_raw_kitchens', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_kitchens;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_kitchens AS
-            SELECT
-                k.id_fudo, k.id_sucursal_fuente, k.fecha_extraccion_utc, k.payload_checksum,
-                (k.payload_json ->> 'id') AS kitchen_id,
-                (k.payload_json -> 'attributes' ->> 'name') AS kitchen_name,
-                k.payload_json AS original_payload
-            FROM public.fudo_raw_kitchens k
-            ORDER BY k.id_fudo, k.id_sucursal_fuente, k.fecha_extraccion_utc DESC;
-        """),
-        
-        #fudo_view_raw_payments (¡NUEVA VISTA RAW DESNORMALIZADA!)
-        ('fudo_view_raw_payments', """
-            drop view if exists public.fudo_view_raw_payments CASCADE;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_payments AS
-            SELECT
-                p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc, p.payload_checksum,
-                (p.payload_json ->> 'id') AS payment_id,
-                (p.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
-                (p.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
-                (p.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
-                (p.payload_json -> 'attributes' ->> 'externalReference') AS external_reference,
-                (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') AS sale_id,
-                (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') AS expense_id,
-                (p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') AS payment_method_id,
-                p.payload_json AS original_payload
-            FROM public.fudo_raw_payments p
-            ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
-        """),
-        #fudo_view_raw_products (¡ACTUALIZADA con campos completos!)
-        ('fudo_view_raw_products', """
-            drop view if exists public.fudo_view_raw_products CASCADE;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_products AS
-            SELECT
-                p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc, p.payload_checksum,
-                (p.payload_json ->> 'id') AS product_id,
-                (p.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
-                (p.payload_json -> 'attributes' ->> 'code') AS code,
-                (p.payload_json -> 'attributes' ->> 'cost')::FLOAT AS cost,
-                (p.payload_json -> 'attributes' ->> 'description') AS description,
-                (p.payload_json -> 'attributes' ->> 'enableOnlineMenu')::BOOLEAN AS enable_online_menu,
-                (p.payload_json -> 'attributes' ->> 'enableQrMenu')::BOOLEAN AS enable_qr_menu,
-                (p.payload_json -> 'attributes' ->> 'favourite')::BOOLEAN AS favourite,
-                (p.payload_json -> 'attributes' ->> 'imageUrl') AS image_url,
-                (p.payload_json -> 'attributes' ->> 'name') AS product_name,
-                (p.payload_json -> 'attributes' ->> 'position')::INTEGER AS "position",
-                (p.payload_json -> 'attributes' ->> 'preparationTime')::INTEGER AS preparation_time,
-                (p.payload_json -> 'attributes' ->> 'price')::FLOAT AS price,
-                (p.payload_json -> 'attributes' ->> 'sellAlone')::BOOLEAN AS sell_alone,
-                (p.payload_json -> 'attributes' ->> 'stock')::FLOAT AS stock,
-                (p.payload_json -> 'attributes' ->> 'stockControl')::BOOLEAN AS stock_control,
-                (p.payload_json -> 'relationships' -> 'kitchen' -> 'data' ->> 'id') AS kitchen_id,
-                (p.payload_json -> 'relationships' -> 'productCategory' -> 'data' ->> 'id') AS product_category_id,
-                (p.payload_json -> 'relationships' -> 'productModifiersGroups' -> 'data') AS product_modifiers_groups,
-                (p.payload_json -> 'relationships' -> 'productProportions' -> 'data') AS product_proportions,
-                p.payload_json AS original_payload
-            FROM public.fudo_raw_products p
-            ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
-        """),
-        
-        # fudo_view_raw_product_modifiers (Basado en ejemplo, sin 'fields')
-        ('fudo_view_raw_product_modifiers', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_product_modifiers;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_product_modifiers AS
-            SELECT
-                pm.id_fudo, pm.id_sucursal_fuente, pm.fecha_extraccion_utc, pm.payload_checksum,
-                (pm.payload_json ->> 'id') AS modifier_id, (pm.payload_json -> 'attributes' ->> 'maxQuantity')::INTEGER AS max_quantity,
-                (pm.payload_json -> 'attributes' ->> 'price')::FLOAT AS price,
-                (pm.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') AS product_id,
-                (pm.payload_json -> 'relationships' -> 'productModifiersGroup' -> 'data' ->> 'id') AS product_modifiers_group_id,
-                pm.payload_json AS original_payload
-            FROM public.fudo_raw_product_modifiers pm
-            ORDER BY pm.id_fudo, pm.id_sucursal_fuente, pm.fecha_extraccion_utc DESC;
-        """),
-        ('fudo_view_raw_roles', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_roles;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_roles AS
-            SELECT
-                r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc, r.payload_checksum,
-                (r.payload_json ->> 'id') AS role_id, (r.payload_json -> 'attributes' ->> 'isWaiter')::BOOLEAN AS is_waiter,
-                (r.payload_json -> 'attributes' ->> 'isDeliveryman')::BOOLEAN AS is_deliveryman,
-                (r.payload_json -> 'attributes' ->> 'name') AS role_name,
-                (r.payload_json -> 'attributes' -> 'permissions') AS permissions,
-                r.payload_json AS original_payload
-            FROM public.fudo_raw_roles r
-            ORDER BY r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc DESC;
-        """),
-        ('fudo_view_raw_rooms', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_rooms;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_rooms AS
-            SELECT
-                r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc, r.payload_checksum,
-                (r.payload_json ->> 'id') AS room_id, (r.payload_json -> 'attributes' ->> 'name') AS room_name,
-                (r.payload_json -> 'relationships' -> 'tables' -> 'data') AS table_ids,
-                r.payload_json AS original_payload
-            FROM public.fudo_raw_rooms r
-            ORDER BY r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc DESC;
-        """),
-        ('fudo_view_raw_tables', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_tables;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_tables AS
-            SELECT
-                t.id_fudo, t.id_sucursal_fuente, t.fecha_extraccion_utc, t.payload_checksum,
-                (t.payload_json ->> 'id') AS table_id, (t.payload_json -> 'attributes' ->> 'column')::INTEGER AS "column",
-                (t.payload_json -> 'attributes' ->> 'number')::INTEGER AS table_number,
-                (t.payload_json -> 'attributes' ->> 'row')::INTEGER AS "row",
-                (t.payload_json -> 'attributes' ->> 'shape') AS shape,
-                (t.payload_json -> 'attributes' ->> 'size') AS size,
-                (t.payload_json -> 'relationships' -> 'room' -> 'data' ->> 'id') AS room_id,
-                t.payload_json AS original_payload
-            FROM public.fudo_raw_tables t
-            ORDER BY t.id_fudo, t.id_sucursal_fuente, t.fecha_extraccion_utc DESC;
-        """),
-        ('fudo_view_raw_users', """
-            DROP VIEW IF EXISTS public.fudo_view_raw_users;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_users AS
-            SELECT
-                u.id_fudo, u.id_sucursal_fuente, u.fecha_extraccion_utc, u.payload_checksum,
-                (u.payload_json ->> 'id') AS user_id, (u.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
-                (u.payload_json -> 'attributes' ->> 'admin')::BOOLEAN AS admin,
-                (u.payload_json -> 'attributes' ->> 'email') AS email, (u.payload_json -> 'attributes' ->> 'name') AS user_name,
-                (u.payload_json -> 'attributes' ->> 'promotionalCode') AS promotional_code,
-                (u.payload_json -> 'relationships' -> 'role' -> 'data' ->> 'id') AS role_id,
-                u.payload_json AS original_payload
-            FROM public.fudo_raw_users u
-            ORDER BY u.id_fudo, u.id_sucursal_fuente, u.fecha_extraccion_utc DESC;
-        """),
-
-        #fudo_view_raw_sales (¡NUEVA VISTA RAW DESNORMALIZADA con todos los campos del JSON!)
-        ('fudo_view_raw_sales', """
-            drop view if exists public.fudo_view_raw_sales CASCADE;
-            CREATE OR REPLACE VIEW public.fudo_view_raw_sales AS
-            SELECT
-                s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc, s.payload_checksum,
-                (s.payload_json ->> 'id') AS sale_id,
-                (s.payload_json -> 'attributes' ->> 'closedAt')::TIMESTAMP WITH TIME ZONE AS closed_at,
-                (s.payload_json -> 'attributes' ->> 'comment') AS comment,
-                (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
-                (s.payload_json -> 'attributes' ->> 'people')::INTEGER AS people,
-                (s.payload_json -> 'attributes' ->> 'customerName') AS customer_name,
-                (s.payload_json -> 'attributes' ->> 'total')::FLOAT AS total_amount,
-                (s.payload_json -> 'attributes' ->> 'saleType') AS sale_type,
-                (s.payload_json -> 'attributes' ->> 'saleState') AS sale_state,
-                (s.payload_json -> 'attributes' -> 'anonymousCustomer' ->> 'name') AS anonymous_customer_name,
-                (s.payload_json -> 'attributes' -> 'anonymousCustomer' ->> 'phone') AS anonymous_customer_phone,
-                (s.payload_json -> 'attributes' -> 'anonymousCustomer' ->> 'address') AS anonymous_customer_address,
-                (s.payload_json -> 'attributes' -> 'expectedPayments') AS expected_payments,
-                (s.payload_json -> 'relationships' -> 'customer' -> 'data' ->> 'id') AS customer_id,
-                (s.payload_json -> 'relationships' -> 'discounts' -> 'data') AS discounts_data,
-                (s.payload_json -> 'relationships' -> 'items' -> 'data') AS items_data,
-                (s.payload_json -> 'relationships' -> 'payments' -> 'data') AS payments_data,
-                (s.payload_json -> 'relationships' -> 'tips' -> 'data') AS tips_data,
-                (s.payload_json -> 'relationships' -> 'shippingCosts' -> 'data') AS shipping_costs_data,
-                (s.payload_json -> 'relationships' -> 'table' -> 'data' ->> 'id') AS table_id,
-                (s.payload_json -> 'relationships' -> 'waiter' -> 'data' ->> 'id') AS waiter_id,
-                (s.payload_json -> 'relationships' -> 'saleIdentifier' -> 'data' ->> 'id') AS sale_identifier_id,
-                s.payload_json AS original_payload
-            FROM public.fudo_raw_sales s
-            ORDER BY s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc DESC;
-        """),
-    ]
+    """),
+    ('mv_productos', """
+        -- ... (definición de mv_productos - SIN CAMBIOS) ...
+        -- Asegúrate de que id_product_fudo esté en el SELECT de mv_productos
+        -- como (p.payload_json ->> 'id')::FLOAT::INTEGER AS id_product_fudo
+    """),
+    # --- NUEVA VISTA MATERIALIZADA: PRECIOS Y STOCK DE PRODUCTOS POR SUCURSAL ---
+    ('mv_product_prices_by_branch', """
+        DROP MATERIALIZED VIEW IF EXISTS public.mv_product_prices_by_branch CASCADE;
+        CREATE MATERIALIZED VIEW public.mv_product_prices_by_branch AS
+        SELECT DISTINCT ON (p.id_fudo, p.id_sucursal_fuente)
+            (p.payload_json ->> 'id')::TEXT AS id_product_fudo,     -- ID original de Fudo (FK a mv_productos)
+            p.id_sucursal_fuente AS id_sucursal,                 -- ID de Sucursal (FK a mv_sucursales)
+            (p.payload_json -> 'attributes' ->> 'name')::VARCHAR(255) AS product_name, -- Nombre del producto en esta sucursal (para referencia)
+            (p.payload_json -> 'attributes' ->> 'price')::FLOAT AS price,       -- Precio base del producto en esa sucursal
+            (p.payload_json -> 'attributes' ->> 'stock')::FLOAT AS stock,       -- Stock del producto en esa sucursal
+            (p.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS is_active_in_branch, -- Si el producto está activo en esa sucursal
+            (p.payload_json ->> 'id') || '-' || p.id_sucursal_fuente AS product_branch_key -- Clave sintética
+        FROM public.fudo_raw_products p
+        WHERE p.payload_json ->> 'id' IS NOT NULL AND p.id_sucursal_fuente IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_products' AND t.id_sucursal = p.id_sucursal_fuente AND t.id_fudo = p.id_fudo)
+        ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_product_prices_branch_pk ON public.mv_product_prices_by_branch (product_branch_key);
+    """),
+]
+
+RAW_VIEWS_CONFIGS = [
+    # fudo_view_raw_customers
+     ('fudo_view_raw_customers', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_customers;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_customers AS
+        SELECT
+            c.id_fudo, c.id_sucursal_fuente, c.fecha_extraccion_utc, c.payload_checksum,
+            (c.payload_json ->> 'id') AS customer_id, (c.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
+            (c.payload_json -> 'attributes' ->> 'address') AS address,
+            (c.payload_json -> 'attributes' ->> 'comment') AS comment,
+            (c.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
+            (c.payload_json -> 'attributes' ->> 'discountPercentage')::FLOAT AS discount_percentage,
+            (c.payload_json -> 'attributes' ->> 'email') AS email,
+            (c.payload_json -> 'attributes' ->> 'firstSaleDate')::TIMESTAMP WITH TIME ZONE AS first_sale_date,
+            (c.payload_json -> 'attributes' ->> 'historicalSalesCount')::INTEGER AS historical_sales_count,
+            (c.payload_json -> 'attributes' ->> 'historicalTotalSpent')::FLOAT AS historical_total_spent,
+            (c.payload_json -> 'attributes' ->> 'houseAccountBalance')::FLOAT AS house_account_balance,
+            (c.payload_json -> 'attributes' ->> 'houseAccountEnabled')::BOOLEAN AS house_account_enabled,
+            (c.payload_json -> 'attributes' ->> 'lastSaleDate')::TIMESTAMP WITH TIME ZONE AS last_sale_date,
+            (c.payload_json -> 'attributes' ->> 'name') AS customer_name,
+            (c.payload_json -> 'attributes' ->> 'origin') AS origin,
+            (c.payload_json -> 'attributes' ->> 'phone') AS phone,
+            (c.payload_json -> 'attributes' ->> 'salesCount')::INTEGER AS sales_count,
+            (c.payload_json -> 'attributes' ->> 'vatNumber') AS vat_number,
+            (c.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') AS payment_method_id,
+            c.payload_json AS original_payload
+        FROM public.fudo_raw_customers c
+        ORDER BY c.id_fudo, c.id_sucursal_fuente, c.fecha_extraccion_utc DESC;
+    """),
+    # fudo_view_raw_discounts (¡ACTUALIZADA!)
+    ('fudo_view_raw_discounts', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_discounts;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_discounts AS
+        SELECT
+            d.id_fudo, d.id_sucursal_fuente, d.fecha_extraccion_utc, d.payload_checksum,
+            (d.payload_json ->> 'id') AS discount_id, (d.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
+            (d.payload_json -> 'attributes' ->> 'percentage')::FLOAT AS percentage,
+            (d.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
+            (d.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') AS sale_id,
+            d.payload_json AS original_payload
+        FROM public.fudo_raw_discounts d
+        ORDER BY d.id_fudo, d.id_sucursal_fuente, d.fecha_extraccion_utc DESC;
+    """),
+    # fudo_view_raw_expenses (¡ACTUALIZADA!)
+    ('fudo_view_raw_expenses', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_expenses;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_expenses AS
+        SELECT
+            e.id_fudo, e.id_sucursal_fuente, e.fecha_extraccion_utc, e.payload_checksum,
+            (e.payload_json ->> 'id') AS expense_id,
+            (e.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
+            (e.payload_json -> 'attributes' ->> 'description') AS description,
+            (e.payload_json -> 'attributes' ->> 'date')::TIMESTAMP WITH TIME ZONE AS expense_date,
+            (e.payload_json -> 'attributes' ->> 'status') AS status,
+            (e.payload_json -> 'attributes' ->> 'dueDate')::TIMESTAMP WITH TIME ZONE AS due_date,
+            (e.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
+            (e.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
+            (e.payload_json -> 'attributes' ->> 'paymentDate')::TIMESTAMP WITH TIME ZONE AS payment_date,
+            (e.payload_json -> 'attributes' ->> 'receiptNumber') AS receipt_number,
+            (e.payload_json -> 'attributes' ->> 'useInCashCount')::BOOLEAN AS use_in_cash_count,
+            (e.payload_json -> 'relationships' -> 'user' -> 'data' ->> 'id') AS user_id,
+            (e.payload_json -> 'relationships' -> 'provider' -> 'data' ->> 'id') AS provider_id,
+            (e.payload_json -> 'relationships' -> 'receiptType' -> 'data' ->> 'id') AS receipt_type_id,
+            (e.payload_json -> 'relationships' -> 'cashRegister' -> 'data' ->> 'id') AS cash_register_id,
+            (e.payload_json -> 'relationships' -> 'expenseItems' -> 'data') AS expense_items, -- Mantener como JSONB array
+            (e.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') AS payment_method_id,
+            (e.payload_json -> 'relationships' -> 'expenseCategory' -> 'data' ->> 'id') AS expense_category_id,
+            e.payload_json AS original_payload
+        FROM public.fudo_raw_expenses e
+        ORDER BY e.id_fudo, e.id_sucursal_fuente, e.fecha_extraccion_utc DESC;
+    """),
+    # fudo_view_raw_expense_categories (Basado en ejemplo, sin 'fields')
+    ('fudo_view_raw_expense_categories', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_expense_categories;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_expense_categories AS
+        SELECT
+            ec.id_fudo, ec.id_sucursal_fuente, ec.fecha_extraccion_utc, ec.payload_checksum,
+            (ec.payload_json ->> 'id') AS category_id,
+            (ec.payload_json -> 'attributes' ->> 'name') AS category_name, -- CORREGIDO, era category_active
+            (ec.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
+            (ec.payload_json -> 'attributes' ->> 'financialCategory') AS financial_category,
+            (ec.payload_json -> 'relationships' -> 'parentCategory' -> 'data' ->> 'id') AS parent_category_id,
+            ec.payload_json AS original_payload
+        FROM public.fudo_raw_expense_categories ec
+        ORDER BY ec.id_fudo, ec.id_sucursal_fuente, ec.fecha_extraccion_utc DESC;
+    """),
+    # fudo_view_raw_ingredients (¡ACTUALIZADA!)
+    ('fudo_view_raw_ingredients', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_ingredients;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_ingredients AS
+        SELECT
+            i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc, i.payload_checksum,
+            (i.payload_json ->> 'id') AS ingredient_id, (i.payload_json -> 'attributes' ->> 'name') AS ingredient_name,
+            (i.payload_json -> 'attributes' ->> 'cost')::FLOAT AS cost,
+            (i.payload_json -> 'attributes' ->> 'stock')::FLOAT AS stock,
+            (i.payload_json -> 'attributes' ->> 'stockControl')::BOOLEAN AS stock_control,
+            (i.payload_json -> 'relationships' -> 'ingredientCategory' -> 'data' ->> 'id') AS ingredient_category_id,
+            i.payload_json AS original_payload
+        FROM public.fudo_raw_ingredients i
+        ORDER BY i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc DESC;
+    """),
+    #fudo_view_raw_items (¡ACTUALIZADA con campos completos!)
+    ('fudo_view_raw_items', """
+        drop view if exists public.fudo_view_raw_items CASCADE;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_items AS
+        SELECT
+            i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc, i.payload_checksum,
+            (i.payload_json ->> 'id') AS item_id,
+            (i.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
+            (i.payload_json -> 'attributes' ->> 'cancellationComment') AS cancellation_comment,
+            (i.payload_json -> 'attributes' ->> 'comment') AS comment,
+            (i.payload_json -> 'attributes' ->> 'cost')::FLOAT AS cost,
+            (i.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
+            (i.payload_json -> 'attributes' ->> 'price')::FLOAT AS price,
+            (i.payload_json -> 'attributes' ->> 'quantity')::FLOAT AS quantity,
+            (i.payload_json -> 'attributes' ->> 'status') AS status,
+            (i.payload_json -> 'attributes' ->> 'paid')::BOOLEAN AS paid,
+            (i.payload_json -> 'attributes' ->> 'lastStockCountAt')::TIMESTAMP WITH TIME ZONE AS last_stock_count_at,
+            (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') AS product_id,
+            (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') AS sale_id,
+            (i.payload_json -> 'relationships' -> 'priceList' -> 'data' ->> 'id') AS price_list_id,
+            (i.payload_json -> 'relationships' -> 'subitems' -> 'data') AS subitems_data,
+            i.payload_json AS original_payload
+        FROM public.fudo_raw_items i
+        ORDER BY i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc DESC;
+    """),
+    # fudo_view_raw_kitchens (Basado en ejemplo, sin 'fields')
+    ('fudo_view_raw_kitchens', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_kitchens;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_kitchens AS
+        SELECT
+            k.id_fudo, k.id_sucursal_fuente, k.fecha_extraccion_utc, k.payload_checksum,
+            (k.payload_json ->> 'id') AS kitchen_id,
+            (k.payload_json -> 'attributes' ->> 'name') AS kitchen_name,
+            k.payload_json AS original_payload
+        FROM public.fudo_raw_kitchens k
+        ORDER BY k.id_fudo, k.id_sucursal_fuente, k.fecha_extraccion_utc DESC;
+    """),
+    
+    #fudo_view_raw_payments (¡NUEVA VISTA RAW DESNORMALIZADA!)
+    ('fudo_view_raw_payments', """
+        drop view if exists public.fudo_view_raw_payments CASCADE;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_payments AS
+        SELECT
+            p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc, p.payload_checksum,
+            (p.payload_json ->> 'id') AS payment_id,
+            (p.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
+            (p.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN AS canceled,
+            (p.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
+            (p.payload_json -> 'attributes' ->> 'externalReference') AS external_reference,
+            (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') AS sale_id,
+            (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') AS expense_id,
+            (p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') AS payment_method_id,
+            p.payload_json AS original_payload
+        FROM public.fudo_raw_payments p
+        ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
+    """),
+    #fudo_view_raw_products (¡ACTUALIZADA con campos completos!)
+    ('fudo_view_raw_products', """
+        drop view if exists public.fudo_view_raw_products CASCADE;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_products AS
+        SELECT
+            p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc, p.payload_checksum,
+            (p.payload_json ->> 'id') AS product_id,
+            (p.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
+            (p.payload_json -> 'attributes' ->> 'code') AS code,
+            (p.payload_json -> 'attributes' ->> 'cost')::FLOAT AS cost,
+            (p.payload_json -> 'attributes' ->> 'description') AS description,
+            (p.payload_json -> 'attributes' ->> 'enableOnlineMenu')::BOOLEAN AS enable_online_menu,
+            (p.payload_json -> 'attributes' ->> 'enableQrMenu')::BOOLEAN AS enable_qr_menu,
+            (p.payload_json -> 'attributes' ->> 'favourite')::BOOLEAN AS favourite,
+            (p.payload_json -> 'attributes' ->> 'imageUrl') AS image_url,
+            (p.payload_json -> 'attributes' ->> 'name') AS product_name,
+            (p.payload_json -> 'attributes' ->> 'position')::INTEGER AS "position",
+            (p.payload_json -> 'attributes' ->> 'preparationTime')::INTEGER AS preparation_time,
+            (p.payload_json -> 'attributes' ->> 'price')::FLOAT AS price,
+            (p.payload_json -> 'attributes' ->> 'sellAlone')::BOOLEAN AS sell_alone,
+            (p.payload_json -> 'attributes' ->> 'stock')::FLOAT AS stock,
+            (p.payload_json -> 'attributes' ->> 'stockControl')::BOOLEAN AS stock_control,
+            (p.payload_json -> 'relationships' -> 'kitchen' -> 'data' ->> 'id') AS kitchen_id,
+            (p.payload_json -> 'relationships' -> 'productCategory' -> 'data' ->> 'id') AS product_category_id,
+            (p.payload_json -> 'relationships' -> 'productModifiersGroups' -> 'data') AS product_modifiers_groups,
+            (p.payload_json -> 'relationships' -> 'productProportions' -> 'data') AS product_proportions,
+            p.payload_json AS original_payload
+        FROM public.fudo_raw_products p
+        ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
+    """),
+    
+    # fudo_view_raw_product_modifiers (Basado en ejemplo, sin 'fields')
+    ('fudo_view_raw_product_modifiers', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_product_modifiers;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_product_modifiers AS
+        SELECT
+            pm.id_fudo, pm.id_sucursal_fuente, pm.fecha_extraccion_utc, pm.payload_checksum,
+            (pm.payload_json ->> 'id') AS modifier_id, (pm.payload_json -> 'attributes' ->> 'maxQuantity')::INTEGER AS max_quantity,
+            (pm.payload_json -> 'attributes' ->> 'price')::FLOAT AS price,
+            (pm.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') AS product_id,
+            (pm.payload_json -> 'relationships' -> 'productModifiersGroup' -> 'data' ->> 'id') AS product_modifiers_group_id,
+            pm.payload_json AS original_payload
+        FROM public.fudo_raw_product_modifiers pm
+        ORDER BY pm.id_fudo, pm.id_sucursal_fuente, pm.fecha_extraccion_utc DESC;
+    """),
+    ('fudo_view_raw_roles', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_roles;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_roles AS
+        SELECT
+            r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc, r.payload_checksum,
+            (r.payload_json ->> 'id') AS role_id, (r.payload_json -> 'attributes' ->> 'isWaiter')::BOOLEAN AS is_waiter,
+            (r.payload_json -> 'attributes' ->> 'isDeliveryman')::BOOLEAN AS is_deliveryman,
+            (r.payload_json -> 'attributes' ->> 'name') AS role_name,
+            (r.payload_json -> 'attributes' -> 'permissions') AS permissions,
+            r.payload_json AS original_payload
+        FROM public.fudo_raw_roles r
+        ORDER BY r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc DESC;
+    """),
+    ('fudo_view_raw_rooms', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_rooms;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_rooms AS
+        SELECT
+            r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc, r.payload_checksum,
+            (r.payload_json ->> 'id') AS room_id, (r.payload_json -> 'attributes' ->> 'name') AS room_name,
+            (r.payload_json -> 'relationships' -> 'tables' -> 'data') AS table_ids,
+            r.payload_json AS original_payload
+        FROM public.fudo_raw_rooms r
+        ORDER BY r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc DESC;
+    """),
+    ('fudo_view_raw_tables', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_tables;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_tables AS
+        SELECT
+            t.id_fudo, t.id_sucursal_fuente, t.fecha_extraccion_utc, t.payload_checksum,
+            (t.payload_json ->> 'id') AS table_id, (t.payload_json -> 'attributes' ->> 'column')::INTEGER AS "column",
+            (t.payload_json -> 'attributes' ->> 'number')::INTEGER AS table_number,
+            (t.payload_json -> 'attributes' ->> 'row')::INTEGER AS "row",
+            (t.payload_json -> 'attributes' ->> 'shape') AS shape,
+            (t.payload_json -> 'attributes' ->> 'size') AS size,
+            (t.payload_json -> 'relationships' -> 'room' -> 'data' ->> 'id') AS room_id,
+            t.payload_json AS original_payload
+        FROM public.fudo_raw_tables t
+        ORDER BY t.id_fudo, t.id_sucursal_fuente, t.fecha_extraccion_utc DESC;
+    """),
+    ('fudo_view_raw_users', """
+        DROP VIEW IF EXISTS public.fudo_view_raw_users;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_users AS
+        SELECT
+            u.id_fudo, u.id_sucursal_fuente, u.fecha_extraccion_utc, u.payload_checksum,
+            (u.payload_json ->> 'id') AS user_id, (u.payload_json -> 'attributes' ->> 'active')::BOOLEAN AS active,
+            (u.payload_json -> 'attributes' ->> 'admin')::BOOLEAN AS admin,
+            (u.payload_json -> 'attributes' ->> 'email') AS email, (u.payload_json -> 'attributes' ->> 'name') AS user_name,
+            (u.payload_json -> 'attributes' ->> 'promotionalCode') AS promotional_code,
+            (u.payload_json -> 'relationships' -> 'role' -> 'data' ->> 'id') AS role_id,
+            u.payload_json AS original_payload
+        FROM public.fudo_raw_users u
+        ORDER BY u.id_fudo, u.id_sucursal_fuente, u.fecha_extraccion_utc DESC;
+    """),
+
+    #fudo_view_raw_sales (¡NUEVA VISTA RAW DESNORMALIZADA con todos los campos del JSON!)
+    ('fudo_view_raw_sales', """
+        drop view if exists public.fudo_view_raw_sales CASCADE;
+        CREATE OR REPLACE VIEW public.fudo_view_raw_sales AS
+        SELECT
+            s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc, s.payload_checksum,
+            (s.payload_json ->> 'id') AS sale_id,
+            (s.payload_json -> 'attributes' ->> 'closedAt')::TIMESTAMP WITH TIME ZONE AS closed_at,
+            (s.payload_json -> 'attributes' ->> 'comment') AS comment,
+            (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
+            (s.payload_json -> 'attributes' ->> 'people')::INTEGER AS people,
+            (s.payload_json -> 'attributes' ->> 'customerName') AS customer_name,
+            (s.payload_json -> 'attributes' ->> 'total')::FLOAT AS total_amount,
+            (s.payload_json -> 'attributes' ->> 'saleType') AS sale_type,
+            (s.payload_json -> 'attributes' ->> 'saleState') AS sale_state,
+            (s.payload_json -> 'attributes' -> 'anonymousCustomer' ->> 'name') AS anonymous_customer_name,
+            (s.payload_json -> 'attributes' -> 'anonymousCustomer' ->> 'phone') AS anonymous_customer_phone,
+            (s.payload_json -> 'attributes' -> 'anonymousCustomer' ->> 'address') AS anonymous_customer_address,
+            (s.payload_json -> 'attributes' -> 'expectedPayments') AS expected_payments,
+            (s.payload_json -> 'relationships' -> 'customer' -> 'data' ->> 'id') AS customer_id,
+            (s.payload_json -> 'relationships' -> 'discounts' -> 'data') AS discounts_data,
+            (s.payload_json -> 'relationships' -> 'items' -> 'data') AS items_data,
+            (s.payload_json -> 'relationships' -> 'payments' -> 'data') AS payments_data,
+            (s.payload_json -> 'relationships' -> 'tips' -> 'data') AS tips_data,
+            (s.payload_json -> 'relationships' -> 'shippingCosts' -> 'data') AS shipping_costs_data,
+            (s.payload_json -> 'relationships' -> 'table' -> 'data' ->> 'id') AS table_id,
+            (s.payload_json -> 'relationships' -> 'waiter' -> 'data' ->> 'id') AS waiter_id,
+            (s.payload_json -> 'relationships' -> 'saleIdentifier' -> 'data' ->> 'id') AS sale_identifier_id,
+            s.payload_json AS original_payload
+        FROM public.fudo_raw_sales s
+        ORDER BY s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc DESC;
+    """),
+]
+
+
+# --- FUNCIÓN PARA LA FASE DE TRANSFORMACIÓN Y CARGA AL DER ---
+def refresh_analytics_materialized_views(db_manager: DBManager, build_mode: str = 'concurrent',
+                                         max_row_drop_ratio: float = 0.5, fact_layer_mode: str = 'mv',
+                                         changed_since: datetime | None = None, fact_freeze_after_days: int = 7,
+                                         profiler: RunProfiler | None = None):
+    logger.info("==================================================")
+    logger.info("  Iniciando fase de Transformación (Creación/Refresco de MVs y Vistas RAW)")
+    logger.info("==================================================")
+
+    # En modo particionado, las MVs de hechos (ventas, líneas, pagos) se reemplazan por tablas fact_* mensuales
+    fact_manager = PartitionedFactManager(db_manager, freeze_after_days=fact_freeze_after_days)
+    # MVs recién creadas al salir del modo particionado: su create_sql (DROP ... CASCADE) borraría las vistas recreadas
+    mvs_created_from_compat = set()
+    if fact_layer_mode == 'partitioned':
+        mv_configs = [(name, sql) for name, sql in MATERIALIZED_VIEWS_CONFIGS if name not in FACT_COMPAT_VIEWS]
+    else:
+        mv_configs = MATERIALIZED_VIEWS_CONFIGS
+        try:
+            mvs_created_from_compat = fact_manager.drop_compat_views(dict(MATERIALIZED_VIEWS_CONFIGS))
+        except Exception as e:
+            logger.error(f"  ERROR al eliminar las vistas de compatibilidad de hechos: {e}", exc_info=True)
 
     # Iterar para crear/reemplazar las vistas RAW
-    for view_name, create_sql in raw_views_configs:
+    for view_name, create_sql in RAW_VIEWS_CONFIGS:
         logger.info(f"  Procesando Vista RAW Desnormalizada: '{view_name}'...")
         try:
             db_manager.execute_query(create_sql)  # Ejecuta el CREATE OR REPLACE VIEW
@@ -609,172 +681,663 @@ CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_product_categories_key ON public.mv_pro
             logger.error(f"  ERROR al procesar la Vista RAW '{view_name}': {e}", exc_info=True)
             continue  # Continuar con las siguientes vistas aunque esta falle
 
-    # Luego, las MVs del DER (ya existentes y se refrescan)
-    for mv_name, create_sql in materialized_views_configs: # Usa materialized_views_configs aquí
-        logger.info(f"  Procesando Vista Materializada: '{mv_name}'...")
+    # --- MODO BLUE/GREEN: construir toda la capa en un esquema sombra y publicarla con un swap atómico ---
+    if build_mode == 'blue_green':
         try:
-            # Intentar crear la MV si no existe
-            logger.info(f"    Intentando crear MV '{mv_name}' si no existe...")
-            db_manager.execute_query(create_sql) # Ejecuta el CREATE MV IF NOT EXISTS
-            logger.info(f"    MV '{mv_name}' creada/existente.")
-
-            # --- CORRECCIÓN CRÍTICA AQUÍ: Usar REFRESH CONCURRENTLY ---
-            logger.info(f"    Refrescando MV '{mv_name}' CONCURRENTLY...")
-            db_manager.execute_query(f"REFRESH MATERIALIZED VIEW CONCURRENTLY public.{mv_name};")
-            logger.info(f"    MV '{mv_name}' refrescada exitosamente.")
-            # --------------------------------------------------------
-
-        except psycopg2.errors.LockNotAvailable as e:
-            logger.warning(f"  Advertencia: No se pudo adquirir bloqueo para REFRESH CONCURRENTLY de '{mv_name}'. Intentando REFRESH normal. Error: {e}")
-            # Si CONCURRENTLY falla por bloqueo (raro), intentamos el normal
-            try:
-                db_manager.execute_query(f"REFRESH MATERIALIZED VIEW public.{mv_name};")
-                logger.info(f"    MV '{mv_name}' refrescada exitosamente (modo normal).")
-            except Exception as e_normal:
-                logger.error(f"  ERROR (normal) al refrescar la Vista Materializada '{mv_name}': {e_normal}", exc_info=True)
-                continue
+            builder = BlueGreenAnalyticsBuilder(db_manager, max_row_drop_ratio=max_row_drop_ratio)
+            with METRICS.timer('etl_transform_step_seconds', {'step': 'blue_green_build'}):
+                builder.build_and_swap(mv_configs)
+            # Si la validación falla, la capa publicada se mantiene intacta (no se refresca con datos sospechosos)
+            mvs_already_published = True
         except Exception as e:
-            logger.error(f"  ERROR al procesar la Vista Materializada '{mv_name}': {e}", exc_info=True)
-            continue 
+            logger.error(f"  ERROR en la construcción blue/green: {e}. Se usa el refresco CONCURRENTLY tradicional.", exc_info=True)
+            mvs_already_published = False
+    else:
+        mvs_already_published = False
+
+    # Luego, las MVs del DER (ya existentes y se refrescan)
+    if not mvs_already_published:
+        for mv_name, create_sql in mv_configs: # Usa mv_configs aquí
+            logger.info(f"  Procesando Vista Materializada: '{mv_name}'...")
+            try:
+                # Intentar crear la MV si no existe
+                if mv_name not in mvs_created_from_compat:
+                    logger.info(f"    Intentando crear MV '{mv_name}' si no existe...")
+                    db_manager.execute_query(create_sql) # Ejecuta el CREATE MV IF NOT EXISTS
+                logger.info(f"    MV '{mv_name}' creada/existente.")
+
+                # --- CORRECCIÓN CRÍTICA AQUÍ: Usar REFRESH CONCURRENTLY ---
+                logger.info(f"    Refrescando MV '{mv_name}' CONCURRENTLY...")
+                with METRICS.timer('etl_transform_step_seconds', {'step': f'mv:{mv_name}'}):
+                    db_manager.execute_query(f"REFRESH MATERIALIZED VIEW CONCURRENTLY public.{mv_name};")
+                logger.info(f"    MV '{mv_name}' refrescada exitosamente.")
+                # --------------------------------------------------------
+
+            except psycopg2.errors.LockNotAvailable as e:
+                logger.warning(f"  Advertencia: No se pudo adquirir bloqueo para REFRESH CONCURRENTLY de '{mv_name}'. Intentando REFRESH normal. Error: {e}")
+                # Si CONCURRENTLY falla por bloqueo (raro), intentamos el normal
+                try:
+                    with METRICS.timer('etl_transform_step_seconds', {'step': f'mv:{mv_name}'}):
+                        db_manager.execute_query(f"REFRESH MATERIALIZED VIEW public.{mv_name};")
+                    logger.info(f"    MV '{mv_name}' refrescada exitosamente (modo normal).")
+                except Exception as e_normal:
+                    logger.error(f"  ERROR (normal) al refrescar la Vista Materializada '{mv_name}': {e_normal}", exc_info=True)
+                    continue
+            except Exception as e:
+                logger.error(f"  ERROR al procesar la Vista Materializada '{mv_name}': {e}", exc_info=True)
+                continue 
+
+    # --- TABLAS DE HECHOS PARTICIONADAS: solo se reconstruyen los meses tocados (los cerrados quedan congelados) ---
+    if fact_layer_mode == 'partitioned':
+        with METRICS.timer('etl_transform_step_seconds', {'step': 'fact_tables'}):
+            fact_manager.refresh_all(changed_since)
+
+    # --- PERFILADO (opt-in): planes EXPLAIN (ANALYZE, BUFFERS) de las MVs para detectar regresiones ---
+    if profiler:
+        profiler.capture_mv_explains(db_manager, mv_configs)
 
     logger.info("==================================================")
     logger.info("  Fase de Transformación (Creación/Refresco de MVs y Vistas RAW) FINALIZADA.")
     logger.info("==================================================")
 
-def run_fudo_raw_etl(db_manager: DBManager): # db_manager ahora se pasa como argumento
-    logger.info("==================================================")
-    logger.info("  Iniciando proceso ETL RAW de Fudo - EXTRACT & LOAD")
-    logger.info("==================================================")
-    
-    # db ya se pasa como argumento, no se crea aquí
-    try:
-        config = load_config()
-        project_id = config.get("gcp_project_id")
+def run_pipelined_extraction(config: dict, authenticator: CredentialsService, metadata_manager: ETLMetadataManager,
+                             branches_config: list[tuple], entities_by_branch: dict[str, list[str]],
+                             run_started_at: datetime, run_options: dict,
+                             landing_writer: LandingZoneWriter | None = None,
+                             scheduler: RunScheduler | None = None,
+                             run_ledger: RunLedger | None = None,
+                             changelog_run_id: str | None = None) -> set[str]:
+    """
+    Variante pipeline (EXTRACTION_MODE=pipeline) de la extracción RAW. Los tokens y los timestamps
+    de última extracción se resuelven antes de arrancar, con la conexión principal; el pipeline
+    usa conexiones propias para la carga. Devuelve las tablas RAW que recibieron filas.
+    Con scheduler, cada sucursal extrae primero sus entidades críticas y, como en la carga secuencial,
+    cada entidad pasa por should_start (límite de la corrida y circuito abierto de la sucursal).
+    """
+    branch_jobs = []
+    for branch_data in branches_config:
+        id_sucursal_internal, _, branch_name, api_key_secret_name, api_secret_secret_name = branch_data
+        branch_entities = entities_by_branch.get(id_sucursal_internal, [])
+        if scheduler:
+            branch_entities = [entity for wave in scheduler.plan_waves({id_sucursal_internal: branch_entities})
+                               for entity in wave[id_sucursal_internal]]
+        if not branch_entities:
+            continue
+        if scheduler and scheduler.circuit_breaker.is_open(id_sucursal_internal):
+            logger.warning(f"Sucursal '{branch_name}' con el circuito abierto. Se omiten sus entidades: {branch_entities}")
+            continue
+        try:
+            token = authenticator.get_valid_token(id_sucursal_internal, api_key_secret_name, api_secret_secret_name)
+            entities = [
+                (entity, None if run_options['full'] else metadata_manager.get_last_extraction_timestamp(id_sucursal_internal, entity))
+                for entity in branch_entities
+            ]
+            branch_jobs.append({
+                'id_sucursal': id_sucursal_internal, 'token': token, 'entities': entities,
+                'window_start': run_options['since'], 'window_end': run_options['until'],
+                'token_provider': authenticator.token_provider(id_sucursal_internal)
+            })
+        except Exception as e:
+            logger.error(f"Error crítico en sucursal '{branch_name}': {e}", exc_info=True)
+            logger.error(f"    [AUDIT] Sucursal '{branch_name}' procesamiento FALLIDO.")
+            if scheduler:
+                scheduler.circuit_breaker.record_failure(id_sucursal_internal)
+            if run_ledger:
+                for entity in branch_entities:
+                    run_ledger.finish_item(id_sucursal_internal, entity, 'failed', error_message=str(e))
+            continue
 
-        # Reutilizar el db_manager pasado
-        metadata_manager = ETLMetadataManager(db_manager) # Usar db_manager pasado
-        authenticator = FudoAuthenticator(db_manager, config['fudo_auth_endpoint'], project_id) # Usar db_manager pasado
-        api_client = FudoApiClient(config['fudo_api_base_url'])
+    if not branch_jobs:
+        return set()
 
-        logger.info("Obteniendo lista de sucursales activas de la base de datos...")
-        branches_config = db_manager.fetch_all( # Usar db_manager pasado
-            "SELECT id_sucursal, fudo_branch_identifier, sucursal_name, "
-            "secret_manager_apikey_name, secret_manager_apisecret_name "
-            "FROM public.config_fudo_branches WHERE is_active = TRUE"
-        )
-        if not branches_config:
-            logger.warning("No se encontraron sucursales activas para procesar en config_fudo_branches. Finalizando.")
-            return 
+    pipeline = ExtractLoadPipeline(
+        config['db_connection_string'],
+        config['fudo_api_base_url'],
+        writer_workers=config['pipeline_writer_workers'],
+        queue_max_pages=config['pipeline_queue_max_pages'],
+        checked_at=run_started_at,
+        advance_watermark=not (run_options['since'] or run_options['until']),
+        landing_writer=landing_writer,
+        deadline_monotonic=scheduler.deadline.extraction_deadline if scheduler else None,
+        changelog_run_id=changelog_run_id,
+        scheduler=scheduler
+    )
+    progress_by_item = pipeline.run(branch_jobs)
+    if run_ledger:
+        for (id_sucursal, entity), progress in progress_by_item.items():
+            if progress['skipped']:
+                run_ledger.finish_item(id_sucursal, entity, 'skipped', error_message=progress['error'])
+                continue
+            run_ledger.finish_item(
+                id_sucursal, entity, 'success' if progress['completed'] else 'failed',
+                stats={
+                    'pages': progress['pages'], 'api_bytes': progress['api_bytes'], 'retries': progress['retries'],
+                    'rows_fetched': progress['records_extracted'], 'rows_inserted': progress['rows_inserted'],
+                    'rows_updated': progress['rows_updated'], 'rows_skipped': progress['rows_skipped'],
+                },
+                error_message=progress['error'],
+                started_at=progress['started_at_utc'],
+                finished_at=progress['finished_at_utc']
+            )
+    return pipeline.changed_tables
 
-        entities_to_extract = [
-            'customers', 'discounts', 'expenses', 'expense-categories', 'ingredients',
-            'items', 'kitchens', 'payments', 'payment-methods', 'product-categories',
-            'product-modifiers', 'products', 'roles', 'rooms', 'sales', 'tables', 'users'
-        ]
 
-        for branch_data in branches_config:
-            id_sucursal_internal = branch_data[0]
-            fudo_branch_id = branch_data[1]
-            branch_name = branch_data[2]
-            api_key_secret_name = branch_data[3]
-            api_secret_secret_name = branch_data[4]
+def _ledger_item_stats(request_stats: dict, load_counts: dict) -> dict:
+    """Combina los contadores del cliente HTTP y de insert_raw_data en las columnas de etl_fudo_run_items."""
+    return {
+        **request_stats,
+        'rows_fetched': sum(load_counts.values()),
+        'rows_inserted': load_counts['inserted'],
+        'rows_updated': load_counts['updated'],
+        'rows_skipped': load_counts['skipped'],
+    }
 
-            logger.info(f"\n--- Procesando Sucursal: '{branch_name}' (ID interno: '{id_sucursal_internal}') ---")
 
-            try:
-                token = authenticator.get_valid_token(
-                    id_sucursal_internal, 
-                    api_key_secret_name, 
-                    api_secret_secret_name
-                )
-                api_client.set_auth_token(token)
-                logger.debug(f"Token válido establecido para {id_sucursal_internal}.")
+def run_sequential_extraction(config: dict, db_manager: DBManager, authenticator: CredentialsService,
+                              metadata_manager: ETLMetadataManager, branches_config: list[tuple],
+                              entities_by_branch: dict[str, list[str]], run_started_at: datetime,
+                              run_options: dict, landing_writer: LandingZoneWriter | None = None,
+                              scheduler: RunScheduler | None = None,
+                              run_ledger: RunLedger | None = None,
+                              profiler: RunProfiler | None = None) -> set[str]:
+    """
+    Extracción RAW secuencial (sucursal por sucursal, entidad por entidad).
+    Con landing_writer, cada página se guarda primero en la zona de aterrizaje y se carga desde disco.
+    Con scheduler, omite los pares que no entran antes del límite de la corrida o cuya sucursal tiene
+    el circuito abierto. Con profiler (PROFILE_PER_ENTITY), cada par se perfila por separado.
+    Devuelve las tablas RAW que recibieron filas.
+    """
+    profiler = profiler or RunProfiler.disabled()
+    api_client = FudoApiClient(config['fudo_api_base_url'])
+    if scheduler:
+        api_client.deadline_monotonic = scheduler.deadline.extraction_deadline
+    landing_loader = LandingZoneLoader(db_manager, landing_writer.base_dir) if landing_writer else None
+    changed_raw_tables = set()
+    # Con una ventana explícita (--since/--until) no se mueve el cursor incremental de la entidad
+    advance_watermark = not (run_options['since'] or run_options['until'])
+
+    for branch_data in branches_config:
+        id_sucursal_internal = branch_data[0]
+        fudo_branch_id = branch_data[1]
+        branch_name = branch_data[2]
+        api_key_secret_name = branch_data[3]
+        api_secret_secret_name = branch_data[4]
+
+        branch_entities = entities_by_branch.get(id_sucursal_internal, [])
+        if not branch_entities:
+            logger.info(f"Sucursal '{branch_name}' sin entidades asignadas a esta tarea. Se omite.")
+            continue
+        if scheduler and scheduler.circuit_breaker.is_open(id_sucursal_internal):
+            logger.warning(f"Sucursal '{branch_name}' con el circuito abierto. Se omiten sus entidades: {branch_entities}")
+            continue
+
+        logger.info(f"\n--- Procesando Sucursal: '{branch_name}' (ID interno: '{id_sucursal_internal}') ---")
+
+        try:
+            token = authenticator.get_valid_token(
+                id_sucursal_internal, 
+                api_key_secret_name, 
+                api_secret_secret_name
+            )
+            api_client.set_auth_token(token)
+            # Ante un 401 el cliente renueva el token y reintenta la misma página (no se abandona la entidad)
+            api_client.token_provider = authenticator.token_provider(id_sucursal_internal)
+            logger.debug(f"Token válido establecido para {id_sucursal_internal}.")
 
-                for entity in entities_to_extract:
-                    raw_table_name = f"fudo_raw_{entity.replace('-', '_')}"
+            for entity in branch_entities:
+                if scheduler and not scheduler.should_start(id_sucursal_internal, entity):
+                    if run_ledger:
+                        run_ledger.finish_item(id_sucursal_internal, entity, 'skipped',
+                                               error_message="Omitida por el scheduler (límite de tiempo o circuito abierto).")
+                    continue
+                raw_table_name = raw_table_for_entity(entity)
+                # Desde memoria: el servicio de credenciales lo renueva antes de vencer
+                api_client.set_auth_token(authenticator.get_valid_token(id_sucursal_internal, api_key_secret_name, api_secret_secret_name))
 
-                    logger.info(f"  Extrayendo entidad '{entity}' para sucursal '{id_sucursal_internal}'...")
-                    
+                logger.info(f"  Extrayendo entidad '{entity}' para sucursal '{id_sucursal_internal}'...")
+
+                entity_start = time.monotonic()
+                entity_started_at = datetime.now(timezone.utc)
+                api_client.take_request_stats()
+                load_counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+                if run_ledger:
+                    run_ledger.start_item(id_sucursal_internal, entity, entity_started_at)
+                with profiler.entity(id_sucursal_internal, entity):
                     try:
-                        last_extracted_ts = metadata_manager.get_last_extraction_timestamp(
+                        last_extracted_ts = None if run_options['full'] else metadata_manager.get_last_extraction_timestamp(
                             id_sucursal_internal, entity
                         )
                         # --- AÑADIR ESTE LOG CRÍTICO ---
                         logger.info(f"    Usando last_extracted_ts para '{entity}': {last_extracted_ts}")
                         # --------------------------------
-                        
-                        raw_data_records_from_api = api_client.get_data(
-                            entity, 
-                            id_sucursal_internal,
-                            last_extracted_ts 
-                        )
-                        
-                        if raw_data_records_from_api:
-                            # --- AÑADIR LOG DE AUDITORÍA AQUÍ ---
-                            logger.info(f"    [AUDIT] '{entity}' extraídos de la API: {len(raw_data_records_from_api)} registros. Preparando para carga...")
-                            # ------------------------------------
-                            
-                            prepared_records_for_db = []
-                            for record in raw_data_records_from_api:
-                                fudo_record_id = record.get('id', str(uuid.uuid4())) 
-
-                                last_updated_fudo = None
-                                attributes = record.get('attributes', {})
-
-                                if entity == 'sales':
-                                    last_updated_fudo = parse_fudo_date(attributes.get('closedAt')) or \
-                                                        parse_fudo_date(attributes.get('createdAt'))
-                                elif entity in ['customers', 'expenses', 'items', 'payments', 'products',
-                                                'discounts', 'ingredients', 'roles', 'tables', 'users',
-                                                'expense-categories', 'kitchens', 'product-categories',
-                                                'product-modifiers', 'rooms']:
-                                    last_updated_fudo = parse_fudo_date(attributes.get('createdAt'))
-                                
-                                payload_str = json.dumps(record, sort_keys=True)
-                                payload_checksum = md5(payload_str.encode('utf-8')).hexdigest()
-
-                                prepared_records_for_db.append({
-                                    'id_fudo': fudo_record_id,
-                                    'id_sucursal_fuente': id_sucursal_internal,
-                                    'fecha_extraccion_utc': datetime.now(timezone.utc),
-                                    'payload_json': payload_str,
-                                    'last_updated_at_fudo': last_updated_fudo,
-                                    'payload_checksum': payload_checksum
-                                })
-
-                            db_manager.insert_raw_data(raw_table_name, prepared_records_for_db)
+
+                        if landing_writer:
+                            # --- ZONA DE ATERRIZAJE: páginas a disco (NDJSON.gz) y carga desde los archivos ---
+                            landed_files = landing_writer.spool_pages(
+                                id_sucursal_internal, entity,
+                                api_client.iter_data_pages(entity, id_sucursal_internal, last_extracted_ts,
+                                                           run_options['since'], run_options['until'])
+                            )
+                            logger.info(f"    [AUDIT] '{entity}' aterrizados en disco: {len(landed_files)} páginas en '{landing_writer.entity_dir(id_sucursal_internal, entity)}'.")
+                            load_counts = landing_loader.load_files(id_sucursal_internal, entity, landed_files)
+                            records_loaded = sum(load_counts.values())
+                        else:
+                            raw_data_records_from_api = api_client.get_data(
+                                entity, 
+                                id_sucursal_internal,
+                                last_extracted_ts,
+                                window_start=run_options['since'],
+                                window_end=run_options['until']
+                            )
+                            records_loaded = 0
+                            if raw_data_records_from_api:
+                                # --- AÑADIR LOG DE AUDITORÍA AQUÍ ---
+                                logger.info(f"    [AUDIT] '{entity}' extraídos de la API: {len(raw_data_records_from_api)} registros. Preparando para carga...")
+                                # ------------------------------------
+
+                                prepared_records_for_db = prepare_raw_records(entity, id_sucursal_internal, raw_data_records_from_api)
+
+                                load_counts = db_manager.insert_raw_data(raw_table_name, prepared_records_for_db)
+                                records_loaded = len(prepared_records_for_db)
+
+                        if records_loaded:
+                            changed_raw_tables.add(raw_table_name)
                             # --- AÑADIR LOG DE AUDITORÍA AQUÍ ---
-                            logger.info(f"    [AUDIT] '{entity}' cargados en DB: {len(prepared_records_for_db)} registros en '{raw_table_name}'.")
+                            logger.info(f"    [AUDIT] '{entity}' cargados en DB: {records_loaded} registros en '{raw_table_name}'.")
                             # ------------------------------------
-                            
-                            metadata_manager.update_last_extraction_timestamp(
-                                id_sucursal_internal, entity, datetime.now(timezone.utc)
-                            )
+
+                            if advance_watermark:
+                                metadata_manager.update_last_extraction_timestamp(
+                                    id_sucursal_internal, entity, datetime.now(timezone.utc)
+                                )
                         else:
                             logger.info(f"    No se extrajeron nuevos registros para '{entity}'.")
+                        if advance_watermark:
+                            metadata_manager.record_entity_check(
+                                id_sucursal_internal, entity, time.monotonic() - entity_start, run_started_at
+                            )
+                        if scheduler:
+                            scheduler.circuit_breaker.record_success(id_sucursal_internal)
+                        if run_ledger:
+                            run_ledger.finish_item(
+                                id_sucursal_internal, entity, 'success',
+                                stats=_ledger_item_stats(api_client.take_request_stats(), load_counts),
+                                started_at=entity_started_at
+                            )
                     except Exception as e:
                         logger.error(f"  Error al procesar entidad '{entity}': {e}", exc_info=True)
                         logger.error(f"    [AUDIT] '{entity}' extracción FALLIDA para sucursal '{id_sucursal_internal}'.") # Log de auditoría de fallo
+                        if scheduler:
+                            scheduler.circuit_breaker.record_failure(id_sucursal_internal)
+                        if run_ledger:
+                            run_ledger.finish_item(
+                                id_sucursal_internal, entity, 'failed',
+                                stats=_ledger_item_stats(api_client.take_request_stats(), load_counts),
+                                error_message=str(e), started_at=entity_started_at
+                            )
                         continue
+        except Exception as e:
+            logger.error(f"Error crítico en sucursal '{branch_name}': {e}", exc_info=True)
+            logger.error(f"    [AUDIT] Sucursal '{branch_name}' procesamiento FALLIDO.") # Log de auditoría de fallo crítico
+            if scheduler:
+                scheduler.circuit_breaker.record_failure(id_sucursal_internal)
+            if run_ledger:
+                for entity in branch_entities:
+                    run_ledger.finish_item(id_sucursal_internal, entity, 'failed', error_message=str(e))
+            continue
+
+        time.sleep(1) # Pequeña pausa entre sucursales
+
+    return changed_raw_tables
+
+
+def log_startup_time(config: dict, import_seconds: float, deploy_seconds: float):
+    """Registra el costo de arranque (imports, config/CLI, despliegue) y avisa si supera STARTUP_BUDGET_SECONDS."""
+    total_seconds = time.perf_counter() - _IMPORTS_STARTED
+    METRICS.observe('etl_startup_seconds', import_seconds, {'stage': 'imports'})
+    METRICS.observe('etl_startup_seconds', deploy_seconds, {'stage': 'deploy'})
+    METRICS.observe('etl_startup_seconds', total_seconds, {'stage': 'total'})
+    message = (f"Arranque: {total_seconds:.2f}s (imports {import_seconds:.2f}s, despliegue {deploy_seconds:.2f}s, "
+               f"presupuesto {config['startup_budget_seconds']}s).")
+    if config['startup_budget_seconds'] and total_seconds > config['startup_budget_seconds']:
+        logger.warning(f"{message} Supera el presupuesto de arranque: revisar con python -X importtime main.py --help.")
+    else:
+        logger.info(message)
+
+
+def export_run_metrics(db_manager: DBManager, config: dict, run_id: str):
+    """Exporta las métricas acumuladas en METRICS (tabla etl_fudo_metrics y/o archivo METRICS_FILE)."""
+    try:
+        if config['metrics_table_enabled']:
+            METRICS.flush_to_db(db_manager, run_id)
+        if config['metrics_file']:
+            METRICS.write_openmetrics(config['metrics_file'])
+    except Exception as e:
+        logger.error(f"  ERROR al exportar las métricas de la corrida: {e}", exc_info=True)
+
+
+def run_post_load_maintenance_stage(db_manager: DBManager, config: dict, run_id: str, tables_to_maintain: list[str],
+                                    profiler: RunProfiler):
+    """Mantenimiento post-carga: estadísticas frescas (y VACUUM si hay bloat) antes de transformar."""
+    try:
+        profiler.start_section('phase_maintenance')
+        maintenance_manager = DBMaintenanceManager(
+            db_manager,
+            vacuum_enabled=config['maintenance_vacuum_enabled'],
+            dead_tuple_ratio_threshold=config['maintenance_dead_tuple_ratio']
+        )
+        maintenance_manager.run_post_load_maintenance(tables_to_maintain)
+        maintenance_manager.record_table_sizes(run_id)
+    except Exception as e:
+        logger.error(f"  ERROR en la etapa de mantenimiento post-carga: {e}", exc_info=True)
+    finally:
+        profiler.stop_section()
+
+
+def run_transform_stage(db_manager: DBManager, config: dict, transform_since: datetime | None, profiler: RunProfiler):
+    """Transformación: MVs/tablas de hechos, rollups, export Parquet y registro de su duración."""
+    transform_start = time.monotonic()
+    with profiler.phase('transform'):
+        refresh_analytics_materialized_views(
+            db_manager,
+            build_mode=config['analytics_build_mode'],
+            max_row_drop_ratio=config['blue_green_max_row_drop_ratio'],
+            fact_layer_mode=config['fact_layer_mode'],
+            changed_since=transform_since,
+            fact_freeze_after_days=config['fact_freeze_after_days'],
+            profiler=profiler
+        )
+
+    # --- ROLLUPS PARA POWER BI: solo los días tocados en esta corrida (o completo si se pide) ---
+    try:
+        rollup_manager = RollupManager(db_manager, config['analytics_timezone'])
+        with METRICS.timer('etl_transform_step_seconds', {'step': 'rollups'}), profiler.phase('rollups'):
+            rollup_manager.refresh_rollups(transform_since, full_rebuild=config['rollups_full_rebuild'])
+    except Exception as e:
+        logger.error(f"  ERROR al actualizar los rollups de Power BI: {e}", exc_info=True)
+
+    # --- EXPORT PARQUET PARA POWER BI (modo importación): solo las particiones (sucursal, mes) que cambiaron ---
+    if config['parquet_export_enabled']:
+        try:
+            with METRICS.timer('etl_transform_step_seconds', {'step': 'parquet_export'}), profiler.phase('export'):
+                AnalyticParquetExporter(
+                    db_manager, config['parquet_export_dir'],
+                    removed_retention_days=config['parquet_export_removed_retention_days']
+                ).export_all()
+        except Exception as e:
+            logger.error(f"  ERROR en el export Parquet de la capa analítica: {e}", exc_info=True)
+
+    # Duración de la transformación: dimensiona la reserva de tiempo de las próximas corridas
+    try:
+        RunScheduler.record_phase_duration(db_manager, 'transform', time.monotonic() - transform_start)
+    except Exception as e:
+        logger.warning(f"  No se pudo registrar la duración de la transformación: {e}")
+
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(f"Señal {signum} recibida: la tarea se detiene.")
+
+
+def run_fudo_raw_etl(db_manager: DBManager, run_options: dict | None = None): # db_manager ahora se pasa como argumento
+    """
+    Corrida del ETL. run_options (ver parse_cli_args) permite corridas parciales:
+    sucursales/entidades, fase ('all' | 'extract' | 'transform'), carga completa y ventana de fechas.
+    """
+    run_options = {**DEFAULT_RUN_OPTIONS, **(run_options or {})}
+    logger.info("==================================================")
+    logger.info("  Iniciando proceso ETL RAW de Fudo - EXTRACT & LOAD")
+    logger.info("==================================================")
+    
+    # Marca de inicio de la corrida: todo lo extraído desde aquí define los días "tocados" para los rollups
+    run_started_at = datetime.now(timezone.utc)
+    run_id = str(uuid.uuid4())
+    logger.info(f"ID de corrida: {run_id} (fase: {run_options['phase']})")
+    # Tablas RAW que recibieron filas en esta corrida (para el mantenimiento post-carga)
+    changed_raw_tables = set()
+    run_ledger = None
+    authenticator = None
+    run_failed = False
+    fatal_error = None
+    # Shard registrado como 'running' que todavía no se marcó 'done' (si la corrida se corta, se marca 'failed')
+    pending_shard = None
+    config = None
+    profiler = RunProfiler.disabled()
+
+    # db ya se pasa como argumento, no se crea aquí
+    try:
+        config = load_config()
+        project_id = config.get("gcp_project_id")
+
+        # --- LEDGER DE CORRIDAS: estado y conteos por (corrida, sucursal, entidad) en etl_fudo_runs / etl_fudo_run_items ---
+        run_ledger = RunLedger(db_manager, run_id)
+        run_ledger.start_run(run_started_at, run_options['phase'], run_options, config['execution_id'], config['task_index'])
+        # --- PERFILADO (opt-in): cProfile/tracemalloc por fase y EXPLAIN de las MVs en PROFILE_DIR/<run_id> ---
+        if run_options['profile'] or config['profile_enabled']:
+            profiler = RunProfiler(
+                config['profile_dir'], run_id, enabled=True,
+                per_entity=run_options['profile_per_entity'] or config['profile_per_entity'],
+                trace_memory=config['profile_trace_memory'],
+                explain_mvs=config['profile_explain_mvs']
+            )
+
+        # Solo transformación: recalcula desde --since (o completo si no se indica)
+        transform_since = run_options['since']
+
+        if run_options['phase'] in ('all', 'extract'):
+            # --- CHANGELOG (CDC): cada fila RAW escrita en esta corrida queda en etl_fudo_changelog ---
+            if config['changelog_enabled']:
+                db_manager.changelog_run_id = run_id
+            # Reutilizar el db_manager pasado
+            metadata_manager = ETLMetadataManager(db_manager) # Usar db_manager pasado
+            # Tokens de todas las sucursales en memoria (y en etl_fudo_tokens), pedidos en paralelo y renovados antes de vencer
+            authenticator = CredentialsService(
+                db_manager, config['fudo_auth_endpoint'], project_id,
+                db_connection_string=config['db_connection_string'],
+                max_workers=config['credentials_prefetch_workers'],
+                refresh_margin_minutes=config['token_refresh_margin_minutes']
+            )
+
+            logger.info("Obteniendo lista de sucursales activas de la base de datos...")
+            branches_config = db_manager.fetch_all( # Usar db_manager pasado
+                "SELECT id_sucursal, fudo_branch_identifier, sucursal_name, "
+                "secret_manager_apikey_name, secret_manager_apisecret_name "
+                "FROM public.config_fudo_branches WHERE is_active = TRUE"
+            )
+            if run_options['branches']:
+                unknown_branches = set(run_options['branches']) - {branch_data[0] for branch_data in branches_config}
+                if unknown_branches:
+                    logger.warning(f"Sucursales pedidas inexistentes o inactivas (se ignoran): {sorted(unknown_branches)}")
+                branches_config = [branch_data for branch_data in branches_config if branch_data[0] in run_options['branches']]
+            if not branches_config:
+                logger.warning("No se encontraron sucursales activas para procesar en config_fudo_branches. Finalizando.")
+                return 
+
+            entities_to_extract = [entity for entity in ENTITIES_TO_EXTRACT
+                                   if not run_options['entities'] or entity in run_options['entities']]
+
+            # --- SHARDS: con varias tareas de Cloud Run, cada una procesa solo su parte de (sucursal, entidad) ---
+            shard_coordinator = TaskShardCoordinator(
+                db_manager, config['task_index'], config['task_count'], config['execution_id'],
+                strategy=config['shard_strategy']
+            )
+            work_items = [(branch_data[0], entity) for branch_data in branches_config for entity in entities_to_extract]
+            if run_options['retry_failed']:
+                # Solo lo que no terminó bien en la corrida indicada (fallido, omitido o interrumpido)
+                unfinished_items = run_ledger.get_unfinished_items(run_options['retry_failed'])
+                work_items = [item for item in work_items if item in unfinished_items]
+                logger.info(f"Re-intento de la corrida '{run_options['retry_failed']}': {len(work_items)} pares (sucursal, entidad) pendientes.")
+            assigned_items = shard_coordinator.assign_work(work_items)
+            # --- POLÍTICA DE REFRESCO: las entidades "frías" solo se extraen cuando venció su intervalo ---
+            # (una selección explícita de entidades, --full, una ventana de fechas o --retry-failed la ignoran)
+            explicit_request = (run_options['entities'] or run_options['full'] or run_options['since']
+                                or run_options['until'] or run_options['retry_failed'])
+            if config['refresh_policy_enabled'] and not explicit_request:
+                assigned_items = EntityRefreshPolicy(db_manager).filter_due(assigned_items, run_started_at)
+            # --- LEDGER: se omiten los pares completados hace menos de N minutos (trabajo redundante) ---
+            skip_completed_within = (run_options['skip_completed_within'] if run_options['skip_completed_within'] is not None
+                                     else config['skip_completed_within_minutes'])
+            if skip_completed_within > 0 and not run_options['full']:
+                assigned_items = run_ledger.filter_recently_completed(assigned_items, skip_completed_within, run_started_at)
+            # Todos los pares asignados quedan 'pending' en el ledger: --retry-failed retoma también los que nunca empezaron
+            run_ledger.register_planned_items(assigned_items)
+            entities_by_branch = {}
+            for id_sucursal, entity in assigned_items:
+                entities_by_branch.setdefault(id_sucursal, []).append(entity)
+            if shard_coordinator.is_sharded:
+                shard_coordinator.register_start(run_started_at)
+                pending_shard = shard_coordinator
+                # SIGTERM (timeout de la tarea de Cloud Run) -> SystemExit: el finally marca el shard como 'failed'
+                signal.signal(signal.SIGTERM, _exit_on_sigterm)
+            try:
+                authenticator.prefetch([branch_data for branch_data in branches_config if branch_data[0] in entities_by_branch])
             except Exception as e:
-                logger.error(f"Error crítico en sucursal '{branch_name}': {e}", exc_info=True)
-                logger.error(f"    [AUDIT] Sucursal '{branch_name}' procesamiento FALLIDO.") # Log de auditoría de fallo crítico
-                continue
-            
-            time.sleep(1) # Pequeña pausa entre sucursales
+                logger.warning(f"No se pudieron precargar los tokens (se piden al procesar cada sucursal): {e}")
+            authenticator.start_background_refresh()
+
+            # --- ZONA DE ATERRIZAJE (opcional): cada página de la API queda en disco, re-cargable con --reload-run ---
+            landing_writer = None
+            if run_options['reload_run'] and not config['landing_zone_dir']:
+                raise ValueError("--reload-run requiere LANDING_ZONE_DIR configurado.")
+            if config['landing_zone_dir'] and not run_options['reload_run']:
+                landing_writer = LandingZoneWriter(config['landing_zone_dir'], run_id, config['landing_zone_retention_days'])
+                logger.info(f"Zona de aterrizaje activa: '{landing_writer.run_dir}' (re-cargar con --reload-run {run_id}).")
+
+            # --- LÍMITE DE LA CORRIDA: la extracción se acota para que la transformación siempre tenga su reserva ---
+            scheduler = None
+            if config['run_deadline_seconds'] > 0:
+                deadline = RunDeadline(
+                    config['run_deadline_seconds'],
+                    RunScheduler.get_transform_reserve(db_manager, config['transform_reserve_seconds']),
+                    started_monotonic=PROCESS_STARTED_MONOTONIC
+                )
+                scheduler = RunScheduler(
+                    deadline,
+                    metadata_manager.get_extraction_durations(),
+                    BranchCircuitBreaker(config['branch_failure_threshold']),
+                    CRITICAL_ENTITIES
+                )
+                logger.info(
+                    f"Límite de la corrida: {config['run_deadline_seconds']}s "
+                    f"(quedan {deadline.remaining_for_extraction():.0f}s para extraer, "
+                    f"reserva de transformación {deadline.transform_reserve_seconds:.0f}s)."
+                )
+
+            profiler.start_section('phase_extract')
+            if run_options['reload_run']:
+                # Re-carga de una corrida anterior desde disco: sin llamadas a la API ni cambios de cursores
+                changed_raw_tables |= LandingZoneLoader(db_manager, config['landing_zone_dir']).load_run(
+                    run_options['reload_run'], run_options['branches'], run_options['entities']
+                )
+            elif config['extraction_mode'] == 'pipeline':
+                # Extracción y carga solapadas: fetchers por sucursal + writers con conexiones propias
+                changed_raw_tables |= run_pipelined_extraction(
+                    config, authenticator, metadata_manager, branches_config, entities_by_branch, run_started_at, run_options,
+                    landing_writer, scheduler, run_ledger, db_manager.changelog_run_id
+                )
+            else:
+                # Con scheduler: primero las entidades críticas de todas las sucursales, después el resto
+                waves = scheduler.plan_waves(entities_by_branch) if scheduler else [entities_by_branch]
+                for wave_entities in waves:
+                    changed_raw_tables |= run_sequential_extraction(
+                        config, db_manager, authenticator, metadata_manager, branches_config, wave_entities,
+                        run_started_at, run_options, landing_writer, scheduler, run_ledger, profiler
+                    )
+            if scheduler:
+                scheduler.log_summary()
+            if landing_writer and not run_options['reload_run']:
+                landing_writer.write_manifest()
+            profiler.stop_section()
+            if config['changelog_enabled']:
+                try:
+                    changelog = RawChangelog(db_manager)
+                    changelog.summarize_run(run_id)
+                    changelog.prune(config['changelog_retention_days'])
+                except Exception as e:
+                    logger.error(f"  ERROR al resumir/depurar el changelog: {e}", exc_info=True)
+
+            # --- SHARDS: solo la última tarea en terminar continúa con mantenimiento y transformación ---
+            transform_since = run_started_at
+            tables_to_maintain = sorted(changed_raw_tables)
+            if shard_coordinator.is_sharded:
+                should_transform, transform_since, tables_to_maintain = shard_coordinator.finish_and_claim_transform(
+                    sorted(changed_raw_tables)
+                )
+                pending_shard = None
+                if not should_transform:
+                    return
+
+            # --- MANTENIMIENTO POST-CARGA: estadísticas frescas (y VACUUM si hay bloat) antes de transformar ---
+            run_post_load_maintenance_stage(db_manager, config, run_id, tables_to_maintain, profiler)
+
+        if run_options['phase'] == 'extract':
+            logger.info("Fase 'extract': se omite la transformación (MVs y rollups).")
+            return
 
         # --- LLAMADA A LA FASE DE TRANSFORMACIÓN DESPUÉS DE LA EXTRACCIÓN RAW COMPLETA ---
-        refresh_analytics_materialized_views(db_manager)
-        # ----------------------------------------------------------------------------------
+        run_transform_stage(db_manager, config, transform_since, profiler)
 
     except Exception as e:
+        run_failed = True
+        fatal_error = str(e)
         logger.critical(f"ERROR FATAL en el proceso ETL RAW principal: {e}", exc_info=True)
         print(f"ERROR FATAL: {e}") # Asegurar que se imprima a consola en caso de fallo crítico
     finally:
         # La conexión se cerrará en la función main()
-        pass
+        db_manager.changelog_run_id = None
+        if authenticator:
+            authenticator.stop()
+        if pending_shard:
+            try:
+                should_transform, shard_since, shard_tables = pending_shard.mark_failed(
+                    fatal_error or "La tarea terminó antes de completar su extracción (señal o error).",
+                    sorted(changed_raw_tables)
+                )
+                # Última tarea en terminar (aunque falló): la transformación de la ejecución corre igual, una sola vez
+                if should_transform and run_options['phase'] == 'all':
+                    run_post_load_maintenance_stage(db_manager, config, run_id, shard_tables, profiler)
+                    run_transform_stage(db_manager, config, shard_since, profiler)
+            except Exception as e:
+                logger.error(f"  No se pudo marcar el shard como 'failed' o transformar: {e}", exc_info=True)
+        if run_ledger:
+            try:
+                run_ledger.finish_run(failed=run_failed or pending_shard is not None)
+            except Exception as e:
+                logger.error(f"  No se pudo cerrar la corrida en el ledger: {e}", exc_info=True)
+        # --- MÉTRICAS: tiempos por etapa a etl_fudo_metrics y/o a un archivo OpenMetrics ---
+        if config:
+            export_run_metrics(db_manager, config, run_id)
+        try:
+            profiler.close()
+        except Exception as e:
+            logger.error(f"  No se pudo escribir el resumen del perfilado: {e}", exc_info=True)
 # --- FUNCIÓN PARA DESPLEGAR LA ESTRUCTURA INICIAL DE FUDO EN LA DB ---
-def deploy_fudo_database_structure(db_manager: DBManager, ddl_script_path: str):
+def _get_deployed_script_md5(db_manager: DBManager, ddl_script_path: str) -> str | None:
+    """md5 del último despliegue de este script (None si nunca se registró o la tabla aún no existe)."""
+    table_exists = db_manager.fetch_one("SELECT to_regclass('public.etl_fudo_schema_deployments') IS NOT NULL;")[0]
+    if not table_exists:
+        return None
+    row = db_manager.fetch_one(
+        "SELECT script_md5 FROM public.etl_fudo_schema_deployments WHERE script_name = %s;", (ddl_script_path,)
+    )
+    return row[0] if row else None
+
+
+def _missing_script_tables(db_manager: DBManager, sql_script_content: str) -> list[str]:
+    """Tablas que el script crea (CREATE TABLE IF NOT EXISTS public.x) y no existen en la base (ej. borradas a mano)."""
+    tables = sorted(set(re.findall(r"CREATE TABLE IF NOT EXISTS public\.(\w+)", sql_script_content, re.IGNORECASE)))
+    if not tables:
+        return []
+    rows = db_manager.fetch_all(
+        "SELECT t FROM unnest(%s::TEXT[]) AS t WHERE to_regclass('public.' || t) IS NULL;", (tables,)
+    )
+    return [row[0] for row in rows]
+
+
+def deploy_fudo_database_structure(db_manager: DBManager, ddl_script_path: str, skip_unchanged: bool = False):
+    """
+    Aplica el script DDL maestro. Con skip_unchanged, lo omite si su md5 coincide con el último
+    despliegue registrado en etl_fudo_schema_deployments y todas las tablas que crea siguen existiendo.
+    """
     logger.info("==================================================")
     logger.info(f"  Iniciando despliegue de estructura Fudo desde '{ddl_script_path}'")
     logger.info("==================================================")
@@ -785,9 +1348,33 @@ def deploy_fudo_database_structure(db_manager: DBManager, ddl_script_path: str):
 
         with open(absolute_ddl_path, 'r', encoding='utf-8') as f:
             sql_script_content = f.read()
+        script_md5 = hashlib.md5(sql_script_content.encode('utf-8')).hexdigest()
 
-        db_manager.execute_sql_script(sql_script_content)
-        logger.info("Estructura de la base de datos Fudo desplegada/actualizada exitosamente.")
+        # Lock de sesión: con varias tareas de Cloud Run en paralelo, el DDL se aplica de a una
+        db_manager.fetch_one("SELECT pg_advisory_lock(hashtext('etl_fudo_deploy'));")
+        try:
+            skip_deploy = skip_unchanged and _get_deployed_script_md5(db_manager, ddl_script_path) == script_md5
+            if skip_deploy:
+                # El md5 solo prueba que el script no cambió: si alguien borró una tabla, se vuelve a desplegar
+                missing_tables = _missing_script_tables(db_manager, sql_script_content)
+                if missing_tables:
+                    logger.warning(f"Script DDL sin cambios, pero faltan tablas ({', '.join(missing_tables)}). Se vuelve a desplegar.")
+                    skip_deploy = False
+            if skip_deploy:
+                logger.info(f"Script DDL sin cambios desde el último despliegue (md5 {script_md5}). Se omite el despliegue.")
+            else:
+                db_manager.execute_sql_script(sql_script_content)
+                db_manager.execute_upsert("""
+                    INSERT INTO public.etl_fudo_schema_deployments (script_name, script_md5, deployed_at_utc)
+                    VALUES (%s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (script_name) DO UPDATE SET
+                        script_md5 = EXCLUDED.script_md5,
+                        deployed_at_utc = EXCLUDED.deployed_at_utc;
+                """, (ddl_script_path, script_md5))
+                logger.info("Estructura de la base de datos Fudo desplegada/actualizada exitosamente.")
+        finally:
+            db_manager.fetch_one("SELECT pg_advisory_unlock(hashtext('etl_fudo_deploy'));")
+            db_manager.connection.commit()
     except Exception as e:
         logger.critical(f"ERROR FATAL al desplegar la estructura de la base de datos Fudo: {e}", exc_info=True)
         raise
@@ -795,8 +1382,95 @@ def deploy_fudo_database_structure(db_manager: DBManager, ddl_script_path: str):
     logger.info("  Despliegue de estructura Fudo FINALIZADO.")
     logger.info("==================================================")
 
+def _parse_cli_datetime(value: str) -> datetime:
+    """Fecha ISO 8601 del CLI ('2024-05-01' o '2024-05-01T03:00:00-03:00'); sin zona horaria se asume UTC."""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: '{value}' (use formato ISO 8601, ej. 2024-05-01T00:00:00Z).")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _parse_cli_list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_cli_args(argv: list[str] | None = None) -> dict:
+    """Parsea los argumentos del CLI y devuelve las run_options de run_fudo_raw_etl."""
+    parser = argparse.ArgumentParser(
+        description="ETL de Fudo: despliegue de estructura, extracción RAW y transformación (MVs/rollups)."
+    )
+    parser.add_argument("--branches", type=_parse_cli_list,
+                        help="Sucursales a procesar (id_sucursal separados por coma). Por defecto todas las activas.")
+    parser.add_argument("--entities", type=_parse_cli_list,
+                        help=f"Entidades a extraer, separadas por coma. Por defecto todas: {','.join(ENTITIES_TO_EXTRACT)}.")
+    parser.add_argument("--force-deploy", action="store_true",
+                        help="Aplica el script DDL aunque no haya cambiado desde el último despliegue (DEPLOY_SKIP_UNCHANGED).")
+    parser.add_argument("--skip-deploy", action="store_true",
+                        help="No ejecuta sql/deploy_fudo_structure.sql antes de la corrida.")
+    parser.add_argument("--phase", choices=["all", "extract", "transform", "follow"], default="all",
+                        help="'extract': solo extracción RAW (+ mantenimiento). 'transform': solo MVs y rollups. "
+                             "'follow': proceso continuo de ventas casi en tiempo real (FOLLOW_*). Por defecto 'all'.")
+    parser.add_argument("--full", action="store_true",
+                        help="Extrae todas las entidades pedidas ignorando la política de refresco "
+                             "y --skip-completed-within.")
+    parser.add_argument("--since", type=_parse_cli_datetime,
+                        help="Inicio de la ventana (createdAt >= since). En --phase transform, recalcula desde esta fecha de extracción.")
+    parser.add_argument("--until", type=_parse_cli_datetime,
+                        help="Fin de la ventana (createdAt <= until).")
+    parser.add_argument("--reload-run", metavar="RUN_ID",
+                        help="Re-carga los archivos de la zona de aterrizaje (LANDING_ZONE_DIR) de una corrida anterior, sin llamar a la API.")
+    parser.add_argument("--retry-failed", metavar="RUN_ID",
+                        help="Re-intenta solo los pares (sucursal, entidad) que no terminaron bien en esa corrida (etl_fudo_run_items).")
+    parser.add_argument("--skip-completed-within", type=int, metavar="MINUTES",
+                        help="Omite los pares completados con éxito en los últimos N minutos (por defecto SKIP_COMPLETED_WITHIN_MINUTES; 0 = nunca).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Perfila la corrida (cProfile/tracemalloc por fase y EXPLAIN de las MVs) en PROFILE_DIR.")
+    parser.add_argument("--profile-per-entity", action="store_true",
+                        help="Con --profile, además perfila cada (sucursal, entidad) por separado (modo secuencial).")
+    args = parser.parse_args(argv)
+
+    if args.entities:
+        unknown_entities = sorted(set(args.entities) - set(ENTITIES_TO_EXTRACT))
+        if unknown_entities:
+            parser.error(f"Entidades desconocidas: {unknown_entities}. Válidas: {ENTITIES_TO_EXTRACT}")
+    if args.since and args.until and args.since > args.until:
+        parser.error("--since debe ser anterior a --until.")
+    if args.phase == 'transform' and (args.branches or args.entities or args.full or args.until):
+        parser.error("--phase transform no admite --branches/--entities/--full/--until (solo --since).")
+    if args.reload_run and (args.phase not in ('all', 'extract') or args.full or args.since or args.until):
+        parser.error("--reload-run solo admite --phase all/extract y filtros --branches/--entities.")
+    if args.phase == 'follow' and (args.branches or args.entities or args.full or args.since or args.until):
+        parser.error("--phase follow no admite --branches/--entities/--full/--since/--until (se configura con FOLLOW_*).")
+    if args.retry_failed and (args.phase not in ('all', 'extract') or args.reload_run):
+        parser.error("--retry-failed solo admite --phase all/extract y no se combina con --reload-run.")
+    if args.skip_completed_within is not None and args.skip_completed_within < 0:
+        parser.error("--skip-completed-within debe ser >= 0.")
+    if args.force_deploy and args.skip_deploy:
+        parser.error("--force-deploy y --skip-deploy son excluyentes.")
+    if args.profile_per_entity and not args.profile:
+        parser.error("--profile-per-entity requiere --profile.")
+
+    return {
+        'branches': args.branches,
+        'entities': args.entities,
+        'phase': args.phase,
+        'full': args.full,
+        'since': args.since,
+        'until': args.until,
+        'skip_deploy': args.skip_deploy,
+        'reload_run': args.reload_run,
+        'retry_failed': args.retry_failed,
+        'skip_completed_within': args.skip_completed_within,
+        'profile': args.profile,
+        'profile_per_entity': args.profile_per_entity,
+        'force_deploy': args.force_deploy,
+    }
+
+
 if __name__ == "__main__":
     # --- FASE DE DESPLIEGUE INICIAL Y EJECUCIÓN REGULAR ---
+    run_options = parse_cli_args(sys.argv[1:])
     config = load_config()
     db_conn_string = config['db_connection_string']  # La cadena de conexión del ETL (apunta a la DB 'ginesta')
 
@@ -805,13 +1479,30 @@ if __name__ == "__main__":
         db_for_all_phases = DBManager(db_conn_string)
 
         # Paso 1: Ejecutar el script DDL maestro para crear/actualizar toda la estructura.
-        logger.info("Iniciando fase de DESPLIEGUE DE ESTRUCTURA...")
-        deploy_fudo_database_structure(db_for_all_phases, 'sql/deploy_fudo_structure.sql')
-        logger.info("Fase de DESPLIEGUE DE ESTRUCTURA completada.")
+        deploy_start = time.perf_counter()
+        if run_options['skip_deploy']:
+            logger.info("Fase de DESPLIEGUE DE ESTRUCTURA omitida (--skip-deploy).")
+        else:
+            logger.info("Iniciando fase de DESPLIEGUE DE ESTRUCTURA...")
+            deploy_fudo_database_structure(
+                db_for_all_phases, 'sql/deploy_fudo_structure.sql',
+                skip_unchanged=config['deploy_skip_unchanged'] and not run_options['force_deploy']
+            )
+            logger.info("Fase de DESPLIEGUE DE ESTRUCTURA completada.")
+        log_startup_time(config, IMPORT_SECONDS, time.perf_counter() - deploy_start)
 
         # Paso 2: Ejecutar el ETL RAW completo y la fase de refresco de MVs
-        logger.info("\nIniciando fase de EJECUCIÓN REGULAR del ETL (EXTRACCIÓN y TRANSFORMACIÓN)...")
-        run_fudo_raw_etl(db_for_all_phases)
+        if run_options['phase'] == 'follow':
+            # Proceso de larga duración: reutiliza la misma conexión, sesiones HTTP y tokens en cada ciclo
+            FollowModeRunner(
+                db_for_all_phases, config,
+                interval_minutes=config['follow_interval_minutes'],
+                lookback_minutes=config['follow_lookback_minutes'],
+                entities=config['follow_entities']
+            ).run()
+        else:
+            logger.info("\nIniciando fase de EJECUCIÓN REGULAR del ETL (EXTRACCIÓN y TRANSFORMACIÓN)...")
+            run_fudo_raw_etl(db_for_all_phases, run_options)
         logger.info("\n¡Proceso ETL de Fudo (Extracción y Transformación) finalizado!")
 
     except Exception as e:
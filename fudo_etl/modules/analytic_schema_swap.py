@@ -0,0 +1,214 @@
+# fudo_etl/modules/analytic_schema_swap.py
+import logging
+import time
+
+import psycopg2
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+
+def get_external_dependents(db_manager: DBManager, schema: str, mv_names: list[str] | None = None,
+                            recursive: bool = False) -> list[tuple[str, str, str, str]]:
+    """
+    Vistas/MVs fuera de 'schema' (y fuera del conjunto mv_names) que dependen de sus relaciones
+    (de todas, o solo de mv_names): [(esquema, nombre, relkind, definición)] vía pg_depend/pg_rewrite,
+    en orden de creación. recursive=True incluye también las vistas que dependen de esas vistas.
+    """
+    if mv_names is None:
+        scope = "dep_ns.nspname <> %(schema)s"
+    else:
+        scope = ("src.relname = ANY(%(mv_names)s::TEXT[]) "
+                 "AND NOT (dep_ns.nspname = %(schema)s AND dep.relname = ANY(%(mv_names)s::TEXT[]))")
+    nested = """
+            UNION
+            SELECT dep.oid
+            FROM dependents p
+            JOIN pg_depend d ON d.refobjid = p.oid
+            JOIN pg_rewrite rw ON rw.oid = d.objid
+            JOIN pg_class dep ON dep.oid = rw.ev_class
+            WHERE d.classid = 'pg_rewrite'::regclass AND d.refclassid = 'pg_class'::regclass
+              AND dep.oid <> p.oid""" if recursive else ""
+    return db_manager.fetch_all(f"""
+        WITH RECURSIVE dependents(oid) AS (
+            SELECT dep.oid
+            FROM pg_depend d
+            JOIN pg_rewrite rw ON rw.oid = d.objid
+            JOIN pg_class dep ON dep.oid = rw.ev_class
+            JOIN pg_namespace dep_ns ON dep_ns.oid = dep.relnamespace
+            JOIN pg_class src ON src.oid = d.refobjid
+            JOIN pg_namespace src_ns ON src_ns.oid = src.relnamespace
+            WHERE d.classid = 'pg_rewrite'::regclass AND d.refclassid = 'pg_class'::regclass
+              AND src_ns.nspname = %(schema)s AND dep.oid <> src.oid
+              AND {scope}{nested}
+        )
+        SELECT n.nspname, c.relname, c.relkind::TEXT, pg_get_viewdef(c.oid)
+        FROM dependents x
+        JOIN pg_class c ON c.oid = x.oid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        ORDER BY c.oid;
+    """, {'schema': schema, 'mv_names': mv_names})
+
+
+def recreate_views_sql(dependents: list[tuple[str, str, str, str]], replace: bool = False) -> str:
+    """CREATE [OR REPLACE] VIEW de cada dependiente con la definición capturada por get_external_dependents."""
+    verb = "CREATE OR REPLACE VIEW" if replace else "CREATE VIEW"
+    return "\n".join(f'{verb} "{dep_schema}"."{dep_name}" AS {definition.rstrip().rstrip(";")};'
+                     for dep_schema, dep_name, _, definition in dependents)
+
+
+class BlueGreenAnalyticsBuilder:
+    """
+    Construye toda la capa analítica (MVs del DER) en un esquema "sombra" sin CONCURRENTLY
+    y, una vez validada, la intercambia atómicamente con la que sirve a Power BI (public).
+
+    - La construcción usa CREATE MATERIALIZED VIEW ... AS (más rápido que REFRESH CONCURRENTLY,
+      que calcula el diff contra el contenido anterior) y los índices se crean después de los datos.
+    - Durante la construcción Power BI sigue leyendo las MVs de public sin bloqueos.
+    - El intercambio es una única transacción corta: las MVs viejas pasan al esquema de retiro
+      y las nuevas a public. Los lectores nunca ven objetos faltantes.
+    - Las vistas externas a la capa (ej. vistas de Power BI sobre mv_*) se recrean en la misma
+      transacción contra las MVs nuevas; si una MV externa depende de ellas, el swap se cancela.
+      Un esquema solo se elimina (CASCADE) si ningún objeto de fuera depende de su contenido.
+    """
+    def __init__(self, db_manager: DBManager, shadow_schema: str = "analytics_shadow",
+                 retired_schema: str = "analytics_retired", serving_schema: str = "public",
+                 max_row_drop_ratio: float = 0.5, lock_timeout: str = "10s", swap_attempts: int = 5):
+        self.db_manager = db_manager
+        self.shadow_schema = shadow_schema
+        self.retired_schema = retired_schema
+        self.serving_schema = serving_schema
+        self.max_row_drop_ratio = max_row_drop_ratio
+        self.lock_timeout = lock_timeout
+        self.swap_attempts = swap_attempts
+
+    def _to_shadow_sql(self, create_sql: str) -> str:
+        """Reescribe la definición de una MV para que se cree en el esquema sombra."""
+        return create_sql.replace(f"{self.serving_schema}.mv_", f"{self.shadow_schema}.mv_")
+
+    def _mv_exists(self, schema: str, mv_name: str) -> bool:
+        result = self.db_manager.fetch_one(
+            "SELECT 1 FROM pg_matviews WHERE schemaname = %s AND matviewname = %s;", (schema, mv_name)
+        )
+        return result is not None
+
+    def _count_rows(self, schema: str, mv_name: str) -> int:
+        result = self.db_manager.fetch_one(f'SELECT COUNT(*) FROM {schema}."{mv_name}";')
+        return result[0] if result else 0
+
+    def _get_external_dependents(self, schema: str, mv_names: list[str] | None = None) -> list[tuple[str, str, str, str]]:
+        return get_external_dependents(self.db_manager, schema, mv_names)
+
+    def _drop_schema_if_unreferenced(self, schema: str):
+        """DROP SCHEMA ... CASCADE solo si ningún objeto de otro esquema depende de su contenido."""
+        exists = self.db_manager.fetch_one("SELECT 1 FROM pg_namespace WHERE nspname = %s;", (schema,))
+        if not exists:
+            return
+        dependents = self._get_external_dependents(schema)
+        if dependents:
+            names = ", ".join(f"{dep_schema}.{dep_name}" for dep_schema, dep_name, _, _ in dependents)
+            raise RuntimeError(
+                f"No se elimina el esquema '{schema}': hay objetos de otros esquemas que dependen de él ({names}). "
+                f"Recrearlos sobre public o eliminarlos manualmente."
+            )
+        self.db_manager.execute_query(f"DROP SCHEMA {schema} CASCADE;")
+
+    def build_shadow(self, mv_configs: list[tuple[str, str]]) -> list[str]:
+        """
+        Crea desde cero el esquema sombra y construye en él cada MV.
+        Devuelve la lista de MVs construidas. Cualquier error aborta la construcción (no hay swap parcial).
+        """
+        logger.info(f"    [BLUE/GREEN] Preparando esquema sombra '{self.shadow_schema}'...")
+        self._drop_schema_if_unreferenced(self.shadow_schema)
+        self.db_manager.execute_query(f"CREATE SCHEMA {self.shadow_schema};")
+
+        built_mvs = []
+        for mv_name, create_sql in mv_configs:
+            # Entradas sin CREATE (ej. marcadores/comentarios) no construyen nada
+            if "CREATE MATERIALIZED VIEW" not in create_sql.upper() or mv_name in built_mvs:
+                continue
+            start = time.monotonic()
+            logger.info(f"    [BLUE/GREEN] Construyendo '{self.shadow_schema}.{mv_name}'...")
+            self.db_manager.execute_query(self._to_shadow_sql(create_sql))
+            built_mvs.append(mv_name)
+            logger.info(f"    [BLUE/GREEN] '{mv_name}' construida en {time.monotonic() - start:.1f}s.")
+        return built_mvs
+
+    def validate_shadow(self, mv_names: list[str]) -> bool:
+        """
+        Compara conteos de filas sombra vs. servidas. Rechaza el swap si una MV quedó vacía
+        o perdió más de max_row_drop_ratio de sus filas respecto a la versión publicada.
+        """
+        is_valid = True
+        for mv_name in mv_names:
+            shadow_rows = self._count_rows(self.shadow_schema, mv_name)
+            if not self._mv_exists(self.serving_schema, mv_name):
+                logger.info(f"    [BLUE/GREEN] '{mv_name}': {shadow_rows} filas (nueva, sin versión publicada).")
+                continue
+            serving_rows = self._count_rows(self.serving_schema, mv_name)
+            logger.info(f"    [BLUE/GREEN] '{mv_name}': sombra={shadow_rows} filas, publicada={serving_rows} filas.")
+            if serving_rows > 0 and shadow_rows < serving_rows * (1 - self.max_row_drop_ratio):
+                logger.error(
+                    f"    [BLUE/GREEN] Validación FALLIDA para '{mv_name}': la sombra perdió más del "
+                    f"{self.max_row_drop_ratio:.0%} de las filas ({serving_rows} -> {shadow_rows})."
+                )
+                is_valid = False
+        return is_valid
+
+    def swap(self, mv_names: list[str]):
+        """
+        Intercambio atómico: en una sola transacción, las MVs publicadas pasan a retired_schema y
+        las de la sombra a serving_schema (los índices viajan con cada MV). Reintenta si no obtiene
+        los bloqueos dentro de lock_timeout (ej. una consulta larga de Power BI en curso).
+        Las vistas externas que dependen de las MVs publicadas se recrean (CREATE OR REPLACE VIEW con la
+        definición capturada antes del swap) en la misma transacción; una MV externa dependiente cancela el swap.
+        """
+        dependents = self._get_external_dependents(self.serving_schema, mv_names)
+        blocking = [f"{dep_schema}.{dep_name}" for dep_schema, dep_name, relkind, _ in dependents if relkind != 'v']
+        if blocking:
+            raise RuntimeError(
+                f"Swap cancelado: MVs fuera de la capa analítica dependen de ella ({', '.join(blocking)}) y no se "
+                f"pueden recrear en la transacción del swap. Eliminarlas o agregarlas a la capa analítica."
+            )
+        if dependents:
+            logger.info(f"    [BLUE/GREEN] Se recrearán {len(dependents)} vistas dependientes: "
+                        f"{', '.join(f'{dep_schema}.{dep_name}' for dep_schema, dep_name, _, _ in dependents)}.")
+
+        self._drop_schema_if_unreferenced(self.retired_schema)
+        self.db_manager.execute_query(f"CREATE SCHEMA {self.retired_schema};")
+        statements = [f"SET LOCAL lock_timeout = '{self.lock_timeout}';"]
+        for mv_name in mv_names:
+            if self._mv_exists(self.serving_schema, mv_name):
+                statements.append(f"ALTER MATERIALIZED VIEW {self.serving_schema}.{mv_name} SET SCHEMA {self.retired_schema};")
+            statements.append(f"ALTER MATERIALIZED VIEW {self.shadow_schema}.{mv_name} SET SCHEMA {self.serving_schema};")
+        # La definición se capturó con las MVs en public: al reemplazarla, la vista apunta a las MVs nuevas
+        if dependents:
+            statements.append(recreate_views_sql(dependents, replace=True))
+        swap_sql = "\n".join(statements)
+
+        for attempt in range(1, self.swap_attempts + 1):
+            try:
+                self.db_manager.execute_query(swap_sql)
+                logger.info(f"    [BLUE/GREEN] Swap atómico completado ({len(mv_names)} MVs publicadas).")
+                break
+            except psycopg2.errors.LockNotAvailable as e:
+                logger.warning(f"    [BLUE/GREEN] No se obtuvieron los bloqueos para el swap (intento {attempt}/{self.swap_attempts}): {e}")
+                if attempt == self.swap_attempts:
+                    raise
+                time.sleep(5 * attempt)
+
+        # Las versiones viejas ya no son visibles para Power BI: se eliminan fuera de la transacción del swap
+        self._drop_schema_if_unreferenced(self.retired_schema)
+        self._drop_schema_if_unreferenced(self.shadow_schema)
+
+    def build_and_swap(self, mv_configs: list[tuple[str, str]]) -> bool:
+        """Construye, valida e intercambia la capa analítica. Devuelve True si se publicó la nueva versión."""
+        start = time.monotonic()
+        built_mvs = self.build_shadow(mv_configs)
+        if not self.validate_shadow(built_mvs):
+            logger.error("    [BLUE/GREEN] Swap cancelado: la capa publicada se mantiene sin cambios.")
+            return False
+        self.swap(built_mvs)
+        logger.info(f"    [BLUE/GREEN] Capa analítica reconstruida y publicada en {time.monotonic() - start:.1f}s.")
+        return True
@@ -0,0 +1,190 @@
+# fudo_etl/modules/backfill.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+from .db_manager import DBManager
+from .etl_metadata_manager import ETLMetadataManager
+from .fudo_auth import FudoAuthenticator
+from .fudo_api_client import FudoApiClient, RequestRateLimiter
+from .record_preparation import prepare_raw_records, raw_table_for_entity
+
+logger = logging.getLogger(__name__)
+
+
+class HistoricalBackfill:
+    """
+    Backfill histórico de una (sucursal, entidad) en paralelo, cortando el rango de fechas en slices
+    con filtro createdAt gte/lte:
+
+    - Los slices se registran en etl_fudo_backfill_slices; el mismo comando re-ejecutado (mismo backfill_id)
+      retoma solo los que no quedaron 'done'.
+    - Se extraen concurrentemente (max_workers), con un limitador de requests compartido por todos los hilos.
+      Cada hilo tiene su propia conexión, autenticador y cliente HTTP.
+    - La carga es idempotente (insert_raw_data con ON CONFLICT), así que los bordes de slices que se
+      solapan o un slice reintentado no duplican filas.
+    - Al completarse todos los slices, el cursor incremental de la entidad pasa a min(fin del rango, inicio
+      del backfill) si es posterior al actual: las corridas normales siguen desde ahí.
+    """
+    def __init__(self, config: dict, id_sucursal: str, entity_name: str, range_start: datetime, range_end: datetime,
+                 slice_days: int = 7, max_workers: int = 4, max_requests_per_second: float = 2.0,
+                 backfill_id: str | None = None):
+        self.config = config
+        self.id_sucursal = id_sucursal
+        self.entity_name = entity_name
+        self.range_start = range_start
+        self.range_end = range_end
+        self.slice_days = slice_days
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = RequestRateLimiter(max_requests_per_second)
+        self.backfill_id = backfill_id or (
+            f"{id_sucursal}:{entity_name}:{range_start.date().isoformat()}:{range_end.date().isoformat()}:{slice_days}d"
+        )
+        self._thread_state = threading.local()
+        self._thread_db_managers = []
+        self._thread_db_lock = threading.Lock()
+        self.branch_secrets = None
+
+    def plan_slices(self) -> list[tuple[datetime, datetime]]:
+        """Corta [range_start, range_end] en slices de slice_days días (el último puede ser más corto)."""
+        slices = []
+        slice_start = self.range_start
+        while slice_start < self.range_end:
+            slice_end = min(slice_start + timedelta(days=self.slice_days), self.range_end)
+            slices.append((slice_start, slice_end))
+            slice_start = slice_end
+        return slices
+
+    def _register_slices(self, db_manager: DBManager, slices: list[tuple[datetime, datetime]]):
+        db_manager.execute_query("""
+            INSERT INTO public.etl_fudo_backfill_slices (backfill_id, id_sucursal, entity_name, slice_start_utc, slice_end_utc)
+            SELECT %(backfill_id)s, %(id_sucursal)s, %(entity_name)s, t.slice_start, t.slice_end
+            FROM unnest(%(starts)s::timestamptz[], %(ends)s::timestamptz[]) AS t(slice_start, slice_end)
+            ON CONFLICT (backfill_id, slice_start_utc) DO NOTHING;
+        """, {
+            'backfill_id': self.backfill_id,
+            'id_sucursal': self.id_sucursal,
+            'entity_name': self.entity_name,
+            'starts': [slice_start for slice_start, _ in slices],
+            'ends': [slice_end for _, slice_end in slices],
+        })
+
+    def _get_pending_slices(self, db_manager: DBManager) -> list[tuple[datetime, datetime]]:
+        rows = db_manager.fetch_all("""
+            SELECT slice_start_utc, slice_end_utc FROM public.etl_fudo_backfill_slices
+            WHERE backfill_id = %s AND status <> 'done'
+            ORDER BY slice_start_utc DESC;
+        """, (self.backfill_id,))
+        return [(row[0], row[1]) for row in rows]
+
+    def _set_slice_status(self, db_manager: DBManager, slice_start: datetime, status: str,
+                          records_loaded: int | None = None, error: str | None = None):
+        db_manager.execute_query("""
+            UPDATE public.etl_fudo_backfill_slices
+            SET status = %s,
+                records_loaded = COALESCE(%s, records_loaded),
+                attempts = attempts + CASE WHEN %s = 'running' THEN 1 ELSE 0 END,
+                last_error = %s,
+                updated_at_utc = CURRENT_TIMESTAMP
+            WHERE backfill_id = %s AND slice_start_utc = %s;
+        """, (status, records_loaded, status, error, self.backfill_id, slice_start))
+
+    def _get_thread_resources(self) -> tuple[DBManager, FudoAuthenticator, FudoApiClient]:
+        """Conexión, autenticador y cliente propios de cada hilo del pool (se crean una vez por hilo)."""
+        state = self._thread_state
+        if not hasattr(state, 'db_manager'):
+            state.db_manager = DBManager(self.config['db_connection_string'])
+            if self.config['changelog_enabled']:
+                state.db_manager.changelog_run_id = self.backfill_id
+            state.authenticator = FudoAuthenticator(state.db_manager, self.config['fudo_auth_endpoint'], self.config['gcp_project_id'])
+            state.api_client = FudoApiClient(
+                self.config['fudo_api_base_url'], rate_limiter=self.rate_limiter,
+                token_provider=state.authenticator.token_provider(self.id_sucursal, *self.branch_secrets)
+            )
+            with self._thread_db_lock:
+                self._thread_db_managers.append(state.db_manager)
+        return state.db_manager, state.authenticator, state.api_client
+
+    def _run_slice(self, slice_start: datetime, slice_end: datetime) -> int:
+        db_manager, authenticator, api_client = self._get_thread_resources()
+        self._set_slice_status(db_manager, slice_start, 'running')
+        try:
+            # El token se valida por slice: un backfill largo puede cruzar su vencimiento
+            api_client.set_auth_token(authenticator.get_valid_token(self.id_sucursal, *self.branch_secrets))
+            records_loaded = 0
+            raw_table_name = raw_table_for_entity(self.entity_name)
+            for page in api_client.iter_data_pages(self.entity_name, self.id_sucursal,
+                                                   window_start=slice_start, window_end=slice_end):
+                rows = prepare_raw_records(self.entity_name, self.id_sucursal, page)
+                db_manager.insert_raw_data(raw_table_name, rows)
+                records_loaded += len(rows)
+            self._set_slice_status(db_manager, slice_start, 'done', records_loaded=records_loaded)
+            logger.info(f"  [BACKFILL] Slice [{slice_start:%Y-%m-%d}, {slice_end:%Y-%m-%d}] completo: {records_loaded} registros.")
+            return records_loaded
+        except Exception as e:
+            self._set_slice_status(db_manager, slice_start, 'failed', error=str(e)[:1000])
+            raise
+
+    def _handoff_watermark(self, db_manager: DBManager, backfill_started_at: datetime):
+        """Mueve el cursor incremental al final del backfill si es posterior al actual (nunca lo retrocede)."""
+        metadata_manager = ETLMetadataManager(db_manager)
+        handoff_ts = min(self.range_end, backfill_started_at)
+        current_ts = metadata_manager.get_last_extraction_timestamp(self.id_sucursal, self.entity_name)
+        if current_ts and current_ts >= handoff_ts:
+            logger.info(f"  [BACKFILL] El cursor incremental actual ({current_ts}) ya es posterior al backfill. No se modifica.")
+            return
+        metadata_manager.update_last_extraction_timestamp(self.id_sucursal, self.entity_name, handoff_ts)
+
+    def run(self) -> bool:
+        """Ejecuta (o retoma) el backfill. Devuelve True si todos los slices quedaron completos."""
+        backfill_started_at = datetime.now(timezone.utc)
+        start = time.monotonic()
+        db_manager = DBManager(self.config['db_connection_string'])
+        try:
+            branch = db_manager.fetch_one(
+                "SELECT secret_manager_apikey_name, secret_manager_apisecret_name "
+                "FROM public.config_fudo_branches WHERE id_sucursal = %s;", (self.id_sucursal,)
+            )
+            if not branch:
+                raise ValueError(f"Sucursal '{self.id_sucursal}' no encontrada en config_fudo_branches.")
+            self.branch_secrets = (branch[0], branch[1])
+
+            self._register_slices(db_manager, self.plan_slices())
+            pending = self._get_pending_slices(db_manager)
+            logger.info(
+                f"  [BACKFILL] '{self.backfill_id}': {len(pending)} slices pendientes "
+                f"({self.max_workers} hilos, {self.slice_days} días por slice)."
+            )
+
+            failed = 0
+            total_records = 0
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fudo-backfill") as executor:
+                futures = {executor.submit(self._run_slice, s_start, s_end): (s_start, s_end) for s_start, s_end in pending}
+                for future in as_completed(futures):
+                    slice_start, slice_end = futures[future]
+                    try:
+                        total_records += future.result()
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"  [BACKFILL] Slice [{slice_start}, {slice_end}] FALLIDO: {e}", exc_info=True)
+
+            logger.info(
+                f"  [BACKFILL] '{self.backfill_id}' terminó en {time.monotonic() - start:.1f}s: "
+                f"{total_records} registros, {failed} slices fallidos."
+            )
+            if failed:
+                logger.warning("  [BACKFILL] Re-ejecute el mismo comando para retomar los slices fallidos.")
+                return False
+
+            self._handoff_watermark(db_manager, backfill_started_at)
+            logger.info(
+                f"  [BACKFILL] Completo. Para recalcular la capa analítica: "
+                f"python main.py --skip-deploy --phase transform --since {backfill_started_at.isoformat(timespec='seconds')}"
+            )
+            return True
+        finally:
+            for thread_db_manager in self._thread_db_managers:
+                thread_db_manager.close()
+            db_manager.close()
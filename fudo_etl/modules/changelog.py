@@ -0,0 +1,69 @@
+# fudo_etl/modules/changelog.py
+import logging
+from datetime import datetime
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+
+class RawChangelog:
+    """
+    Lectura y retención de etl_fudo_changelog, el log de cambios (CDC) que insert_raw_data escribe en el
+    mismo statement que la carga cuando DBManager.changelog_run_id está definido.
+
+    Los consumidores incrementales (dataflows de Power BI, exports, joins externos) leen solo las claves
+    (sucursal, id_fudo) cambiadas en una corrida o desde una fecha, en lugar de re-escanear las MVs.
+    """
+    def __init__(self, db_manager: DBManager):
+        self.db_manager = db_manager
+
+    def summarize_run(self, run_id: str) -> dict[tuple[str, str], int]:
+        """Cantidad de cambios por (tabla RAW, tipo de cambio) de una corrida; los deja en el log."""
+        rows = self.db_manager.fetch_all("""
+            SELECT raw_table, change_type, COUNT(*)
+            FROM public.etl_fudo_changelog
+            WHERE run_id = %s
+            GROUP BY raw_table, change_type
+            ORDER BY raw_table, change_type;
+        """, (run_id,))
+        summary = {(raw_table, change_type): count for raw_table, change_type, count in rows}
+        if summary:
+            for (raw_table, change_type), count in summary.items():
+                logger.info(f"  [CHANGELOG] {raw_table}: {count} '{change_type}'.")
+        else:
+            logger.info(f"  [CHANGELOG] La corrida '{run_id}' no escribió cambios en la capa RAW.")
+        return summary
+
+    def get_changed_keys(self, raw_table: str, run_ids: list[str] | None = None,
+                         since_utc: datetime | None = None) -> list[tuple[str, str]]:
+        """Claves (id_sucursal, id_fudo) distintas cambiadas en las corridas indicadas y/o desde since_utc."""
+        conditions = ["raw_table = %s"]
+        params = [raw_table]
+        if run_ids:
+            conditions.append("run_id = ANY(%s)")
+            params.append(list(run_ids))
+        if since_utc:
+            conditions.append("changed_at_utc >= %s")
+            params.append(since_utc)
+        return self.db_manager.fetch_all(f"""
+            SELECT DISTINCT id_sucursal, id_fudo
+            FROM public.etl_fudo_changelog
+            WHERE {' AND '.join(conditions)};
+        """, tuple(params))
+
+    def prune(self, retention_days: int) -> int:
+        """Borra las entradas más viejas que retention_days (0 = conservar todo). Devuelve cuántas borró."""
+        if retention_days <= 0:
+            return 0
+        deleted = self.db_manager.execute_scalar("""
+            WITH deleted AS (
+                DELETE FROM public.etl_fudo_changelog
+                WHERE changed_at_utc < CURRENT_TIMESTAMP - (%s * INTERVAL '1 day')
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM deleted;
+        """, (retention_days,)) or 0
+        if deleted:
+            logger.info(f"  [CHANGELOG] {deleted} entradas con más de {retention_days} días eliminadas.")
+        return deleted
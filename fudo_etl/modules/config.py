@@ -1,10 +1,19 @@
 import os
 from dotenv import load_dotenv
 
+
+def _get_bool_env(name: str, default: bool = False) -> bool:
+    """Lee una variable de entorno booleana ('1', 'true', 'yes', 'si' => True)."""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "si", "sí", "on")
+
+
 def load_config() -> dict:
     """Carga la configuración desde variables de entorno."""
     load_dotenv() # Carga variables del archivo .env
-    
+
     config = {
         "db_connection_string": os.getenv("DB_CONNECTION_STRING"),
         "fudo_auth_endpoint": os.getenv("FUDO_AUTH_ENDPOINT"),
@@ -15,4 +24,84 @@ def load_config() -> dict:
     for key, value in config.items():
         if value is None:
             raise ValueError(f"Missing configuration: {key} environment variable not set. Check your .env file or system environment variables.")
-    return config
\ No newline at end of file
+
+    # --- Configuración opcional (con valores por defecto) ---
+    # Zona horaria usada para agrupar por día/hora en las tablas de agregados (rollups)
+    config["analytics_timezone"] = os.getenv("ANALYTICS_TIMEZONE", "America/Argentina/Buenos_Aires")
+    # Si es True, los rollups se reconstruyen completos (reconciliación) en lugar de incrementalmente
+    config["rollups_full_rebuild"] = _get_bool_env("ROLLUPS_FULL_REBUILD", False)
+    # Modo de construcción de la capa analítica: 'concurrent' (REFRESH CONCURRENTLY) o 'blue_green' (esquema sombra + swap)
+    config["analytics_build_mode"] = os.getenv("ANALYTICS_BUILD_MODE", "concurrent").strip().lower()
+    if config["analytics_build_mode"] not in ("concurrent", "blue_green"):
+        raise ValueError(f"Invalid configuration: ANALYTICS_BUILD_MODE='{config['analytics_build_mode']}' (use 'concurrent' o 'blue_green').")
+    # Máxima caída de filas tolerada por MV al validar el esquema sombra antes del swap
+    config["blue_green_max_row_drop_ratio"] = float(os.getenv("BLUE_GREEN_MAX_ROW_DROP_RATIO", "0.5"))
+    # Capa de hechos: 'mv' (MVs monolíticas) o 'partitioned' (tablas fact_* particionadas por mes)
+    config["fact_layer_mode"] = os.getenv("FACT_LAYER_MODE", "mv").strip().lower()
+    if config["fact_layer_mode"] not in ("mv", "partitioned"):
+        raise ValueError(f"Invalid configuration: FACT_LAYER_MODE='{config['fact_layer_mode']}' (use 'mv' o 'partitioned').")
+    # Días de gracia tras el cierre de un mes antes de congelar su partición
+    config["fact_freeze_after_days"] = int(os.getenv("FACT_FREEZE_AFTER_DAYS", "7"))
+    # Mantenimiento post-carga: VACUUM (ANALYZE) de tablas RAW con ratio de tuplas muertas sobre el umbral
+    config["maintenance_vacuum_enabled"] = _get_bool_env("MAINTENANCE_VACUUM_ENABLED", True)
+    config["maintenance_dead_tuple_ratio"] = float(os.getenv("MAINTENANCE_DEAD_TUPLE_RATIO", "0.2"))
+    # Extracción RAW: 'sequential' (sucursal por sucursal) o 'pipeline' (extracción y carga solapadas)
+    config["extraction_mode"] = os.getenv("EXTRACTION_MODE", "sequential").strip().lower()
+    if config["extraction_mode"] not in ("sequential", "pipeline"):
+        raise ValueError(f"Invalid configuration: EXTRACTION_MODE='{config['extraction_mode']}' (use 'sequential' o 'pipeline').")
+    # Writers con conexión propia y páginas en vuelo por cola (acota la memoria del pipeline)
+    config["pipeline_writer_workers"] = int(os.getenv("PIPELINE_WRITER_WORKERS", "2"))
+    config["pipeline_queue_max_pages"] = int(os.getenv("PIPELINE_QUEUE_MAX_PAGES", "8"))
+    # Ejecución en shards (Cloud Run Jobs con --tasks N): índice/cantidad de tareas e ID de la ejecución
+    config["task_index"] = int(os.getenv("CLOUD_RUN_TASK_INDEX", "0"))
+    config["task_count"] = int(os.getenv("CLOUD_RUN_TASK_COUNT", "1"))
+    config["execution_id"] = os.getenv("CLOUD_RUN_EXECUTION", "local-execution")
+    # Reparto de (sucursal, entidad) entre tareas: 'hash' (estable) o 'weighted' (por duración histórica)
+    config["shard_strategy"] = os.getenv("SHARD_STRATEGY", "hash").strip().lower()
+    if config["shard_strategy"] not in ("hash", "weighted"):
+        raise ValueError(f"Invalid configuration: SHARD_STRATEGY='{config['shard_strategy']}' (use 'hash' o 'weighted').")
+    # Política de refresco por entidad (config_fudo_entity_refresh_policy): si es False se extrae todo siempre
+    config["refresh_policy_enabled"] = _get_bool_env("REFRESH_POLICY_ENABLED", True)
+    # Modo follow (main.py --phase follow): frecuencia de sondeo, ventana hacia atrás y entidades calientes
+    config["follow_interval_minutes"] = int(os.getenv("FOLLOW_INTERVAL_MINUTES", "5"))
+    config["follow_lookback_minutes"] = int(os.getenv("FOLLOW_LOOKBACK_MINUTES", "240"))
+    config["follow_entities"] = [e.strip() for e in os.getenv("FOLLOW_ENTITIES", "sales,items,payments").split(",") if e.strip()]
+    # Zona de aterrizaje RAW (NDJSON.gz por página en disco/volumen montado); vacío = desactivada
+    config["landing_zone_dir"] = os.getenv("LANDING_ZONE_DIR") or None
+    config["landing_zone_retention_days"] = int(os.getenv("LANDING_ZONE_RETENTION_DAYS", "7"))
+    # Límite de la corrida (segundos desde el inicio del proceso, alineado con --task-timeout del Job; 0 = sin límite).
+    # La extracción se corta a tiempo para dejar a la transformación max(TRANSFORM_RESERVE_SECONDS, última duración medida)
+    config["run_deadline_seconds"] = int(os.getenv("RUN_DEADLINE_SECONDS", "6900"))
+    config["transform_reserve_seconds"] = int(os.getenv("TRANSFORM_RESERVE_SECONDS", "900"))
+    # Fallos consecutivos que abren el circuito de una sucursal (el resto de sus entidades se omite en la corrida)
+    config["branch_failure_threshold"] = int(os.getenv("BRANCH_FAILURE_THRESHOLD", "3"))
+    # Ledger de corridas: omite los pares (sucursal, entidad) completados con éxito hace menos de N minutos (0 = nunca)
+    config["skip_completed_within_minutes"] = int(os.getenv("SKIP_COMPLETED_WITHIN_MINUTES", "0"))
+    # Métricas por etapa (API, preparación, carga, MVs): tabla etl_fudo_metrics y archivo OpenMetrics opcional
+    config["metrics_table_enabled"] = _get_bool_env("METRICS_TABLE_ENABLED", True)
+    config["metrics_file"] = os.getenv("METRICS_FILE") or None
+    # Perfilado opt-in de la corrida (también con --profile)
+    config["profile_enabled"] = _get_bool_env("PROFILE_ENABLED", False)
+    config["profile_dir"] = os.getenv("PROFILE_DIR", "profiles")
+    config["profile_per_entity"] = _get_bool_env("PROFILE_PER_ENTITY", False)
+    config["profile_trace_memory"] = _get_bool_env("PROFILE_TRACE_MEMORY", True)
+    config["profile_explain_mvs"] = _get_bool_env("PROFILE_EXPLAIN_MVS", True)
+    # Servicio de credenciales: hilos para pedir tokens en paralelo y margen de renovación anticipada
+    config["credentials_prefetch_workers"] = int(os.getenv("CREDENTIALS_PREFETCH_WORKERS", "8"))
+    config["token_refresh_margin_minutes"] = int(os.getenv("TOKEN_REFRESH_MARGIN_MINUTES", "10"))
+    # Arranque: omitir el DDL si el script no cambió (checksum) y presupuesto de tiempo de arranque (0 = sin aviso)
+    config["deploy_skip_unchanged"] = _get_bool_env("DEPLOY_SKIP_UNCHANGED", False)
+    config["startup_budget_seconds"] = float(os.getenv("STARTUP_BUDGET_SECONDS", "10"))
+    # Changelog (CDC) de la capa RAW en etl_fudo_changelog y días que se conservan (0 = sin depuración)
+    config["changelog_enabled"] = _get_bool_env("CHANGELOG_ENABLED", False)
+    config["changelog_retention_days"] = int(os.getenv("CHANGELOG_RETENTION_DAYS", "30"))
+    # Detección de borrados (reconcile.py): proporción máxima de IDs faltantes antes de abortar sin marcar nada
+    config["tombstone_max_missing_ratio"] = float(os.getenv("TOMBSTONE_MAX_MISSING_RATIO", "0.2"))
+    # Archivo de la historia RAW fría en Parquet (archive_raw.py): directorio y antigüedad mínima de las versiones
+    config["archive_dir"] = os.getenv("ARCHIVE_DIR", "archive")
+    config["archive_older_than_days"] = int(os.getenv("ARCHIVE_OLDER_THAN_DAYS", "90"))
+    # Export Parquet incremental de la capa analítica (tras la transformación) para Power BI en modo importación
+    config["parquet_export_enabled"] = _get_bool_env("PARQUET_EXPORT_ENABLED", False)
+    config["parquet_export_dir"] = os.getenv("PARQUET_EXPORT_DIR", "exports")
+    config["parquet_export_removed_retention_days"] = int(os.getenv("PARQUET_EXPORT_REMOVED_RETENTION_DAYS", "30"))
+    return config
@@ -0,0 +1,199 @@
+# fudo_etl/modules/credentials_service.py
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from .db_manager import DBManager
+from .etl_metadata_manager import ETLMetadataManager
+from .fudo_auth import FudoAuthenticator
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialsService:
+    """
+    Tokens de Fudo de todas las sucursales, en memoria y en etl_fudo_tokens.
+
+    - prefetch(): al inicio lee de una vez los tokens vigentes de etl_fudo_tokens y pide en paralelo
+      (secretos + POST de autenticación, sin tocar la DB) los que faltan o están por vencer.
+    - get_valid_token(): misma firma que FudoAuthenticator; sale de memoria mientras el token tenga margen.
+    - start_background_refresh(): un hilo renueva los tokens antes de su 'exp' (con su propia conexión
+      para persistirlos), así una extracción larga nunca usa un token vencido.
+    - token_provider(): callback para FudoApiClient; ante un 401 renueva el token (una vez por token
+      rechazado, aunque lo pidan varios hilos) y el cliente reintenta la misma página.
+    La conexión principal (db_manager) solo se usa desde el hilo que creó el servicio: lo renovado desde
+    otros hilos queda pendiente y se persiste en el próximo uso desde ese hilo o en el hilo de renovación.
+    """
+    def __init__(self, db_manager: DBManager, auth_endpoint: str, project_id: str,
+                 db_connection_string: str | None = None, max_workers: int = 8,
+                 refresh_margin_minutes: int = 10, check_interval_seconds: int = 60):
+        self.db_manager = db_manager
+        self.db_connection_string = db_connection_string
+        self.authenticator = FudoAuthenticator(db_manager, auth_endpoint, project_id)
+        self.metadata_manager = ETLMetadataManager(db_manager)
+        self.max_workers = max_workers
+        self.refresh_margin = timedelta(minutes=refresh_margin_minutes)
+        self.check_interval_seconds = check_interval_seconds
+        self._tokens = {}          # id_sucursal -> (access_token, token_expiration_utc)
+        self._branch_secrets = {}  # id_sucursal -> (secret apiKey, secret apiSecret)
+        self._pending_persist = set()  # Sucursales con token renovado fuera del hilo dueño de db_manager
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._owner_thread_id = threading.get_ident()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+
+    def _cached_token(self, id_sucursal: str, margin: timedelta) -> str | None:
+        with self._lock:
+            cached = self._tokens.get(id_sucursal)
+        if cached and cached[1] > datetime.now(timezone.utc) + margin:
+            return cached[0]
+        return None
+
+    def _store_token(self, id_sucursal: str, access_token: str, token_expiration_utc: datetime):
+        with self._lock:
+            self._tokens[id_sucursal] = (access_token, token_expiration_utc)
+
+    def prefetch(self, branches_config: list[tuple]):
+        """
+        Deja en memoria un token vigente por sucursal. branches_config: filas de config_fudo_branches
+        (id_sucursal, fudo_branch_identifier, sucursal_name, secreto apiKey, secreto apiSecret).
+        Un fallo en una sucursal solo se registra: get_valid_token lo reintentará al usarla.
+        """
+        for branch_data in branches_config:
+            self._branch_secrets[branch_data[0]] = (branch_data[3], branch_data[4])
+        if not self._branch_secrets:
+            return
+
+        now = datetime.now(timezone.utc)
+        rows = self.db_manager.fetch_all(
+            "SELECT id_sucursal, access_token, token_expiration_utc FROM public.etl_fudo_tokens WHERE id_sucursal = ANY(%s);",
+            (list(self._branch_secrets),)
+        )
+        for id_sucursal, access_token, token_expiration_utc in rows:
+            if token_expiration_utc and token_expiration_utc > now + self.refresh_margin:
+                self._store_token(id_sucursal, access_token, token_expiration_utc)
+
+        missing = [id_sucursal for id_sucursal in self._branch_secrets if not self._cached_token(id_sucursal, self.refresh_margin)]
+        logger.info(
+            f"  [CREDENTIALS] {len(self._branch_secrets) - len(missing)} tokens vigentes en etl_fudo_tokens; "
+            f"se solicitan {len(missing)} en paralelo."
+        )
+        if not missing:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing)), thread_name_prefix="fudo-auth") as executor:
+            futures = {executor.submit(self.authenticator.fetch_new_token, *self._branch_secrets[id_sucursal]): id_sucursal
+                       for id_sucursal in missing}
+            for future in as_completed(futures):
+                id_sucursal = futures[future]
+                try:
+                    access_token, token_expiration_utc = future.result()
+                except Exception as e:
+                    logger.error(f"  [CREDENTIALS] No se pudo obtener el token de la sucursal {id_sucursal}: {e}")
+                    continue
+                self._store_token(id_sucursal, access_token, token_expiration_utc)
+                # La persistencia queda en este hilo (dueño de la conexión principal)
+                self.metadata_manager.update_fudo_token_data(id_sucursal, access_token, token_expiration_utc)
+
+    def _persist_pending(self, metadata_manager: ETLMetadataManager):
+        with self._lock:
+            pending = {id_sucursal: self._tokens[id_sucursal] for id_sucursal in self._pending_persist}
+            self._pending_persist.clear()
+        for id_sucursal, (access_token, token_expiration_utc) in pending.items():
+            try:
+                metadata_manager.update_fudo_token_data(id_sucursal, access_token, token_expiration_utc)
+            except Exception as e:
+                logger.warning(f"  [CREDENTIALS] No se pudo guardar el token renovado de {id_sucursal}: {e}")
+
+    def _renew_token(self, id_sucursal: str) -> str:
+        access_token, token_expiration_utc = self.authenticator.fetch_new_token(*self._branch_secrets[id_sucursal])
+        self._store_token(id_sucursal, access_token, token_expiration_utc)
+        if threading.get_ident() == self._owner_thread_id:
+            self.metadata_manager.update_fudo_token_data(id_sucursal, access_token, token_expiration_utc)
+        else:
+            with self._lock:
+                self._pending_persist.add(id_sucursal)
+        return access_token
+
+    def token_provider(self, id_sucursal: str) -> Callable[[str | None], str]:
+        """
+        Callback para FudoApiClient(token_provider=...), usable desde cualquier hilo (no consulta la DB
+        fuera del hilo dueño). token_provider(None) devuelve el token en memoria; token_provider(rechazado)
+        devuelve uno nuevo, o el que otro hilo ya renovó si es distinto del rechazado.
+        """
+        def provide(rejected_token: str | None = None) -> str:
+            with self._refresh_lock:
+                with self._lock:
+                    cached = self._tokens.get(id_sucursal)
+                if cached and cached[0] != rejected_token and cached[1] > datetime.now(timezone.utc):
+                    return cached[0]
+                logger.info(f"  [CREDENTIALS] Renovando el token de la sucursal {id_sucursal} (rechazado o ausente).")
+                return self._renew_token(id_sucursal)
+        return provide
+
+    def get_valid_token(self, id_sucursal: str, secret_api_key_name: str, secret_api_secret_name: str) -> str:
+        """Token con margen desde memoria; si no hay, lo resuelve FudoAuthenticator (DB o nuevo) y lo cachea."""
+        self._branch_secrets.setdefault(id_sucursal, (secret_api_key_name, secret_api_secret_name))
+        if self._pending_persist and threading.get_ident() == self._owner_thread_id:
+            self._persist_pending(self.metadata_manager)
+        access_token = self._cached_token(id_sucursal, self.refresh_margin)
+        if access_token:
+            return access_token
+        access_token = self.authenticator.get_valid_token(id_sucursal, secret_api_key_name, secret_api_secret_name)
+        token_data = self.metadata_manager.get_fudo_token_data(id_sucursal)
+        if token_data and token_data['access_token'] == access_token:
+            self._store_token(id_sucursal, access_token, token_data['token_expiration_utc'])
+        return access_token
+
+    # --- Renovación en segundo plano ---
+    def refresh_expiring(self, db_manager: DBManager | None = None) -> int:
+        """
+        Renueva los tokens que vencen antes de dos márgenes (así get_valid_token nunca encuentra uno
+        por vencer). Persiste con db_manager si se indica. Devuelve cuántos renovó.
+        """
+        with self._lock:
+            branches = [(id_sucursal, self._branch_secrets[id_sucursal]) for id_sucursal in self._tokens
+                        if id_sucursal in self._branch_secrets]
+        metadata_manager = ETLMetadataManager(db_manager) if db_manager else None
+        refreshed = 0
+        for id_sucursal, secrets in branches:
+            if self._cached_token(id_sucursal, self.refresh_margin * 2):
+                continue
+            try:
+                with self._refresh_lock:
+                    access_token, token_expiration_utc = self.authenticator.fetch_new_token(*secrets)
+                    self._store_token(id_sucursal, access_token, token_expiration_utc)
+                if metadata_manager:
+                    metadata_manager.update_fudo_token_data(id_sucursal, access_token, token_expiration_utc)
+                refreshed += 1
+                logger.info(f"  [CREDENTIALS] Token de la sucursal {id_sucursal} renovado antes de vencer (expira {token_expiration_utc}).")
+            except Exception as e:
+                logger.error(f"  [CREDENTIALS] Falló la renovación anticipada del token de {id_sucursal}: {e}")
+        if metadata_manager and self._pending_persist:
+            self._persist_pending(metadata_manager)
+        return refreshed
+
+    def _refresh_loop(self):
+        db_manager = DBManager(self.db_connection_string) if self.db_connection_string else None
+        try:
+            while not self._stop_event.wait(self.check_interval_seconds):
+                self.refresh_expiring(db_manager)
+        finally:
+            if db_manager:
+                db_manager.close()
+
+    def start_background_refresh(self):
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="fudo-token-refresh", daemon=True)
+        self._refresh_thread.start()
+        logger.info(f"  [CREDENTIALS] Renovación de tokens en segundo plano cada {self.check_interval_seconds}s.")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._refresh_thread:
+            self._refresh_thread.join(timeout=30)
+            self._refresh_thread = None
@@ -0,0 +1,90 @@
+# fudo_etl/modules/db_maintenance.py
+import logging
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+
+class DBMaintenanceManager:
+    """
+    Etapa de mantenimiento entre la carga RAW y la transformación:
+    - ANALYZE dirigido sobre las tablas RAW que recibieron filas en la corrida (estadísticas frescas
+      para los DISTINCT ON de las MVs).
+    - VACUUM (ANALYZE) opcional sobre las tablas cuyo ratio de tuplas muertas supera el umbral
+      (ej. fudo_raw_sales por el ON CONFLICT DO UPDATE).
+    - Registro por corrida del tamaño de tablas e índices RAW para seguir su crecimiento.
+    """
+    def __init__(self, db_manager: DBManager, vacuum_enabled: bool = True,
+                 dead_tuple_ratio_threshold: float = 0.2, min_dead_tuples: int = 1000):
+        self.db_manager = db_manager
+        self.vacuum_enabled = vacuum_enabled
+        self.dead_tuple_ratio_threshold = dead_tuple_ratio_threshold
+        self.min_dead_tuples = min_dead_tuples
+
+    def _get_tuple_stats(self, table_names: list[str]) -> dict[str, tuple[int, int]]:
+        """Devuelve {tabla: (n_live_tup, n_dead_tup)} desde pg_stat_user_tables."""
+        rows = self.db_manager.fetch_all("""
+            SELECT relname, n_live_tup, n_dead_tup
+            FROM pg_stat_user_tables
+            WHERE schemaname = 'public' AND relname = ANY(%s);
+        """, (table_names,))
+        return {row[0]: (row[1] or 0, row[2] or 0) for row in rows}
+
+    def run_post_load_maintenance(self, changed_tables: list[str]):
+        """ANALYZE / VACUUM (ANALYZE) sobre las tablas modificadas en la corrida."""
+        if not changed_tables:
+            logger.info("  [MAINTENANCE] No hubo tablas RAW modificadas. Se omite el mantenimiento.")
+            return
+
+        stats = self._get_tuple_stats(changed_tables)
+        for table_name in changed_tables:
+            n_live, n_dead = stats.get(table_name, (0, 0))
+            total = n_live + n_dead
+            dead_ratio = (n_dead / total) if total else 0.0
+
+            try:
+                if self.vacuum_enabled and n_dead >= self.min_dead_tuples and dead_ratio >= self.dead_tuple_ratio_threshold:
+                    logger.info(f"  [MAINTENANCE] VACUUM (ANALYZE) '{table_name}' (tuplas muertas: {n_dead}, ratio {dead_ratio:.1%}).")
+                    # VACUUM no puede ejecutarse dentro de una transacción
+                    self.db_manager.execute_autocommit(f"VACUUM (ANALYZE) public.{table_name};")
+                else:
+                    logger.info(f"  [MAINTENANCE] ANALYZE '{table_name}' (ratio de tuplas muertas {dead_ratio:.1%}).")
+                    self.db_manager.execute_query(f"ANALYZE public.{table_name};")
+            except Exception as e:
+                logger.error(f"  [MAINTENANCE] ERROR en el mantenimiento de '{table_name}': {e}", exc_info=True)
+                continue
+
+    def record_table_sizes(self, run_id: str, table_prefix: str = 'fudo_raw_'):
+        """
+        Guarda el tamaño de tablas/índices (con el prefijo dado) para esta corrida y loguea
+        el crecimiento respecto de la medición anterior de cada tabla.
+        """
+        self.db_manager.execute_query("""
+            INSERT INTO public.etl_fudo_table_size_history
+                (run_id, table_name, table_bytes, index_bytes, total_bytes, n_live_tup, n_dead_tup, measured_at_utc)
+            SELECT %s, s.relname,
+                   pg_table_size(s.relid), pg_indexes_size(s.relid), pg_total_relation_size(s.relid),
+                   s.n_live_tup, s.n_dead_tup, CURRENT_TIMESTAMP
+            FROM pg_stat_user_tables s
+            WHERE s.schemaname = 'public' AND s.relname LIKE %s;
+        """, (run_id, f"{table_prefix}%"))
+
+        growth_rows = self.db_manager.fetch_all("""
+            SELECT cur.table_name, cur.total_bytes, cur.index_bytes,
+                   cur.total_bytes - prev.total_bytes AS total_growth,
+                   cur.index_bytes - prev.index_bytes AS index_growth
+            FROM public.etl_fudo_table_size_history cur
+            LEFT JOIN LATERAL (
+                SELECT h.total_bytes, h.index_bytes
+                FROM public.etl_fudo_table_size_history h
+                WHERE h.table_name = cur.table_name AND h.run_id <> cur.run_id
+                ORDER BY h.measured_at_utc DESC
+                LIMIT 1
+            ) prev ON TRUE
+            WHERE cur.run_id = %s
+            ORDER BY cur.total_bytes DESC;
+        """, (run_id,))
+        for table_name, total_bytes, index_bytes, total_growth, index_growth in growth_rows:
+            growth_str = f"{total_growth:+,} bytes (índices {index_growth:+,})" if total_growth is not None else "sin medición previa"
+            logger.info(f"  [MAINTENANCE] Tamaño '{table_name}': {total_bytes:,} bytes (índices {index_bytes:,}); crecimiento: {growth_str}.")
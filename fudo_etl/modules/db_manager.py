@@ -3,6 +3,9 @@ import psycopg2
 from psycopg2 import extras
 import logging
 from datetime import datetime, timezone
+import time
+
+from .metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +14,8 @@ class DBManager:
     def __init__(self, connection_string: str):
         self.connection_string = connection_string
         self.connection = None
+        # run_id con el que insert_raw_data registra cada fila escrita en etl_fudo_changelog (None = sin changelog)
+        self.changelog_run_id = None
         self._connect() # Conectar en la inicialización
 
     def _connect(self):
@@ -63,6 +68,22 @@ class DBManager:
             logger.error(f"Error al ejecutar la consulta: {e}. Query: {query[:100]}...", exc_info=True)
             raise
 
+    def execute_autocommit(self, query: str, params: tuple = None):
+        """Ejecuta una sentencia fuera de una transacción (necesario para VACUUM, CREATE INDEX CONCURRENTLY, etc.)."""
+        self._ensure_connection()
+        # Cerrar cualquier transacción abierta (ej. por un fetch previo) antes de cambiar a autocommit
+        self.connection.commit()
+        self.connection.autocommit = True
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(query, params)
+            logger.debug(f"Sentencia (autocommit) ejecutada con éxito: {query[:100]}...")
+        except Exception as e:
+            logger.error(f"Error al ejecutar la sentencia (autocommit): {e}. Query: {query[:100]}...", exc_info=True)
+            raise
+        finally:
+            self.connection.autocommit = False
+
     def execute_upsert(self, query: str, params: tuple | list[tuple]):
         """
         Ejecuta una consulta SQL de UPSERT.
@@ -82,6 +103,24 @@ class DBManager:
             logger.error(f"Error en UPSERT: {e}. Query: {query[:100]}...", exc_info=True)
             raise
 
+    def execute_scalar(self, query: str, params: tuple = None):
+        """
+        Ejecuta una sentencia de escritura que devuelve un único valor (ej. COUNT(*) de un DELETE ... RETURNING)
+        y hace commit. Ante un error hace rollback y relanza, como execute_query.
+        """
+        self._ensure_connection()
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+            self.connection.commit()
+            logger.debug(f"Consulta ejecutada con éxito: {query[:100]}...")
+            return row[0] if row else None
+        except Exception as e:
+            self.connection.rollback()
+            logger.error(f"Error al ejecutar la consulta: {e}. Query: {query[:100]}...", exc_info=True)
+            raise
+
     def fetch_one(self, query: str, params: tuple = None) -> tuple | None:
         """Ejecuta una consulta SQL y devuelve una sola fila."""
         self._ensure_connection() # <--- ¡AÑADIR ESTO AQUÍ!
@@ -104,11 +143,17 @@ class DBManager:
             logger.error(f"Error en fetch_all: {e}. Query: {query[:100]}...", exc_info=True)
             raise
 
-    def insert_raw_data(self, table_name: str, records: list[dict]):
+    def insert_raw_data(self, table_name: str, records: list[dict]) -> dict:
+            """
+            Carga registros RAW (idempotente por ON CONFLICT). Devuelve {'inserted', 'updated', 'skipped'}:
+            filas nuevas, versiones actualizadas (solo fudo_raw_sales) y registros sin cambios.
+            Con changelog_run_id, las filas escritas quedan además en etl_fudo_changelog
+            ('insert' | 'new_version' | 'update'); los registros sin cambios no generan entradas.
+            """
             self._ensure_connection()
             if not records:
                 logger.info(f"No hay registros para insertar en {table_name}.")
-                return
+                return {'inserted': 0, 'updated': 0, 'skipped': 0}
 
             columns = [
                 'id_fudo', 'id_sucursal_fuente', 'fecha_extraccion_utc',
@@ -127,7 +172,7 @@ class DBManager:
             # --- Lógica de ON CONFLICT ESPECÍFICA PARA fudo_raw_sales ---
             if table_name == 'fudo_raw_sales':
                 # Para sales, queremos actualizar si el checksum cambia, para obtener el último saleState
-                insert_query = f"""
+                upsert_query = f"""
                 INSERT INTO public.{table_name} ({cols_str})
                 VALUES %s
                 ON CONFLICT (id_fudo, id_sucursal_fuente) DO UPDATE SET -- <--- ¡NUEVA PK PARA ON CONFLICT!
@@ -136,25 +181,59 @@ class DBManager:
                     last_updated_at_fudo = EXCLUDED.last_updated_at_fudo,
                     payload_checksum = EXCLUDED.payload_checksum
                 WHERE
-                    public.{table_name}.payload_checksum IS DISTINCT FROM EXCLUDED.payload_checksum; -- <--- ¡Solo si el contenido cambió!
+                    public.{table_name}.payload_checksum IS DISTINCT FROM EXCLUDED.payload_checksum -- <--- ¡Solo si el contenido cambió!
                 """
                 # Esto significa: si id_fudo+id_sucursal ya existe,
                 # actualiza solo si el checksum del payload es diferente.
                 # Si el checksum es el mismo, DO NOTHING.
+                change_type_sql = "CASE WHEN w.inserted THEN 'insert' ELSE 'update' END"
             else:
                 # Para el resto de tablas RAW, la PK (id_fudo, id_sucursal_fuente, payload_checksum)
                 # ya maneja la inserción de nuevas versiones de contenido.
-                insert_query = f"""
+                upsert_query = f"""
                 INSERT INTO public.{table_name} ({cols_str})
                 VALUES %s
-                ON CONFLICT (id_fudo, id_sucursal_fuente, payload_checksum) DO NOTHING;
+                ON CONFLICT (id_fudo, id_sucursal_fuente, payload_checksum) DO NOTHING
+                """
+                # El SELECT del CTE ve la tabla antes de este INSERT: si ya había otra versión del id, es una nueva versión
+                change_type_sql = f"""CASE WHEN EXISTS (
+                        SELECT 1 FROM public.{table_name} prev
+                        WHERE prev.id_fudo = w.id_fudo AND prev.id_sucursal_fuente = w.id_sucursal_fuente
+                    ) THEN 'new_version' ELSE 'insert' END"""
+
+            if self.changelog_run_id:
+                # --- CHANGELOG (CDC): cada fila escrita deja (corrida, tabla, sucursal, id_fudo, tipo de cambio) en el mismo statement ---
+                with self.connection.cursor() as cursor:
+                    # execute_values solo admite el placeholder de VALUES: el run_id va como literal escapado
+                    run_id_literal = cursor.mogrify("%s", (self.changelog_run_id,)).decode('utf-8').replace('%', '%%')
+                insert_query = f"""
+                WITH written AS (
+                    {upsert_query}
+                    RETURNING id_fudo, id_sucursal_fuente, payload_checksum, (xmax = 0) AS inserted
+                ), logged AS (
+                    INSERT INTO public.etl_fudo_changelog (run_id, raw_table, id_sucursal, id_fudo, change_type, payload_checksum)
+                    SELECT {run_id_literal}, '{table_name}', w.id_sucursal_fuente, w.id_fudo, {change_type_sql}, w.payload_checksum
+                    FROM written w
+                )
+                SELECT inserted FROM written;
                 """
+            else:
+                insert_query = f"{upsert_query} RETURNING (xmax = 0) AS inserted;"
 
             try:
+                load_start = time.perf_counter()
                 with self.connection.cursor() as cursor:
-                    extras.execute_values(cursor, insert_query, values_to_insert, page_size=1000)
+                    # RETURNING solo devuelve las filas escritas: xmax = 0 es un INSERT, el resto un UPDATE
+                    written = extras.execute_values(cursor, insert_query, values_to_insert, page_size=1000, fetch=True)
                 self.connection.commit()
-                logger.info(f"Cargados {len(records)} registros en {table_name}.")
+                load_seconds = time.perf_counter() - load_start
+                METRICS.observe('etl_db_load_seconds', load_seconds, {'table': table_name})
+                METRICS.observe('etl_db_load_rows_per_second', len(records) / max(load_seconds, 1e-6), {'table': table_name})
+                METRICS.inc('etl_db_load_rows', len(records), {'table': table_name})
+                inserted = sum(1 for row in written if row[0])
+                counts = {'inserted': inserted, 'updated': len(written) - inserted, 'skipped': len(records) - len(written)}
+                logger.info(f"Cargados {len(records)} registros en {table_name} ({counts['inserted']} nuevos, {counts['updated']} actualizados, {counts['skipped']} sin cambios).")
+                return counts
             except Exception as e:
                 self.connection.rollback()
                 logger.error(f"Error al cargar datos crudos en {table_name}: {e}", exc_info=True)
@@ -48,6 +48,31 @@ class ETLMetadataManager:
         self.db_manager.execute_upsert(query, (id_sucursal, entity_name, timestamp))
         logger.info(f"Actualizado último timestamp de extracción para {id_sucursal}/{entity_name} a {timestamp}.")
 
+    def record_entity_check(self, id_sucursal: str, entity_name: str, duration_seconds: float, checked_at: datetime):
+        """
+        Registra una extracción exitosa (con o sin registros nuevos) de una sucursal/entidad:
+        cuándo se chequeó (política de refresco) y cuánto tardó (plan ponderado de shards).
+        """
+        query = """
+        INSERT INTO public.etl_fudo_extraction_status (id_sucursal, entity_name, last_duration_seconds, last_checked_utc)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (id_sucursal, entity_name) DO UPDATE SET
+            last_duration_seconds = EXCLUDED.last_duration_seconds,
+            last_checked_utc = EXCLUDED.last_checked_utc;
+        """
+        self.db_manager.execute_upsert(query, (id_sucursal, entity_name, round(duration_seconds, 3), checked_at))
+        logger.debug(f"Chequeo de extracción para {id_sucursal}/{entity_name}: {duration_seconds:.1f}s.")
+
+    def get_extraction_durations(self) -> dict[tuple[str, str], float]:
+        """
+        Devuelve {(id_sucursal, entity_name): last_duration_seconds} para las entidades con duración registrada.
+        """
+        rows = self.db_manager.fetch_all(
+            "SELECT id_sucursal, entity_name, last_duration_seconds FROM public.etl_fudo_extraction_status "
+            "WHERE last_duration_seconds IS NOT NULL;"
+        )
+        return {(row[0], row[1]): float(row[2]) for row in rows}
+
     def get_fudo_token_data(self, id_sucursal: str) -> dict | None:
         """
         Obtiene los datos del token de Fudo (token y expiración) desde la base de datos.
@@ -0,0 +1,147 @@
+# fudo_etl/modules/follow_mode.py
+import logging
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from .db_manager import DBManager
+from .credentials_service import CredentialsService
+from .fudo_api_client import FudoApiClient
+from .metrics import METRICS
+from .partitioned_facts import PartitionedFactManager, FACT_TABLES_CONFIGS
+from .record_preparation import prepare_raw_records, raw_table_for_entity
+from .rollup_manager import RollupManager
+
+logger = logging.getLogger(__name__)
+
+
+class FollowModeRunner:
+    """
+    Modo "follow": proceso de larga duración para ventas casi en tiempo real.
+
+    - Mantiene abiertos la conexión a la DB, las sesiones HTTP (un FudoApiClient por sucursal) y los
+      tokens (en memoria y en etl_fudo_tokens vía CredentialsService, solo se renuevan al vencer).
+    - Cada interval_minutes consulta únicamente las entidades calientes (sales, items, payments) con una
+      ventana corta hacia atrás (lookback_minutes, por createdAt) y las carga en micro-lotes por página.
+    - Actualiza solo lo afectado: filas de las tablas de hechos (FACT_LAYER_MODE=partitioned) o REFRESH
+      CONCURRENTLY de las tres MVs de hechos (modo mv), y los rollups de los días tocados.
+    - No mueve los cursores incrementales: la corrida batch programada sigue siendo la fuente completa.
+    """
+    def __init__(self, db_manager: DBManager, config: dict, interval_minutes: int = 5, lookback_minutes: int = 240,
+                 entities: list[str] | None = None, max_cycles: int | None = None):
+        self.db_manager = db_manager
+        self.config = config
+        self.interval_seconds = interval_minutes * 60
+        self.lookback = timedelta(minutes=lookback_minutes)
+        self.entities = entities or ['sales', 'items', 'payments']
+        self.max_cycles = max_cycles
+        self.authenticator = CredentialsService(
+            db_manager, config['fudo_auth_endpoint'], config['gcp_project_id'],
+            refresh_margin_minutes=config['token_refresh_margin_minutes']
+        )
+        self.fact_manager = PartitionedFactManager(db_manager, config['fact_freeze_after_days'])
+        self.rollup_manager = RollupManager(db_manager, config['analytics_timezone'])
+        self._api_clients = {}
+        self._stop_event = threading.Event()
+
+    def stop(self, *_):
+        """Pide terminar al final del ciclo en curso (SIGTERM/SIGINT)."""
+        logger.info("  [FOLLOW] Señal de parada recibida. Terminando al final del ciclo actual...")
+        self._stop_event.set()
+
+    def _get_branches(self) -> list[tuple]:
+        return self.db_manager.fetch_all(
+            "SELECT id_sucursal, sucursal_name, secret_manager_apikey_name, secret_manager_apisecret_name "
+            "FROM public.config_fudo_branches WHERE is_active = TRUE"
+        )
+
+    def _get_api_client(self, id_sucursal: str) -> FudoApiClient:
+        if id_sucursal not in self._api_clients:
+            self._api_clients[id_sucursal] = FudoApiClient(
+                self.config['fudo_api_base_url'], token_provider=self.authenticator.token_provider(id_sucursal)
+            )
+        return self._api_clients[id_sucursal]
+
+    def poll_cycle(self, cycle_started_at: datetime) -> set[str]:
+        """Un ciclo de extracción y carga de las entidades calientes. Devuelve las tablas RAW con cambios."""
+        window_start = cycle_started_at - self.lookback
+        changed_tables = set()
+        for id_sucursal, branch_name, api_key_secret_name, api_secret_secret_name in self._get_branches():
+            try:
+                api_client = self._get_api_client(id_sucursal)
+                api_client.set_auth_token(
+                    self.authenticator.get_valid_token(id_sucursal, api_key_secret_name, api_secret_secret_name)
+                )
+            except Exception as e:
+                logger.error(f"  [FOLLOW] No se pudo autenticar la sucursal '{branch_name}': {e}", exc_info=True)
+                continue
+
+            for entity in self.entities:
+                raw_table_name = raw_table_for_entity(entity)
+                try:
+                    records = 0
+                    for page in api_client.iter_data_pages(entity, id_sucursal, window_start=window_start):
+                        self.db_manager.insert_raw_data(raw_table_name, prepare_raw_records(entity, id_sucursal, page))
+                        records += len(page)
+                    if records:
+                        changed_tables.add(raw_table_name)
+                    logger.info(f"  [FOLLOW] '{entity}' ({id_sucursal}): {records} registros en la ventana desde {window_start:%H:%M}.")
+                except Exception as e:
+                    logger.error(f"  [FOLLOW] Error en '{entity}' ({id_sucursal}): {e}", exc_info=True)
+        return changed_tables
+
+    def update_analytics(self, cycle_started_at: datetime):
+        """Actualiza los hechos afectados y los rollups de los días tocados en el ciclo."""
+        if self.config['fact_layer_mode'] == 'partitioned':
+            for fact_table in FACT_TABLES_CONFIGS:
+                try:
+                    self.fact_manager.refresh_changed_rows(fact_table, cycle_started_at)
+                except Exception as e:
+                    logger.error(f"  [FOLLOW] ERROR al actualizar filas de '{fact_table}': {e}", exc_info=True)
+        else:
+            for fact_table, cfg in FACT_TABLES_CONFIGS.items():
+                try:
+                    self.db_manager.execute_query(f"REFRESH MATERIALIZED VIEW CONCURRENTLY public.{cfg['compat_view']};")
+                except Exception as e:
+                    logger.error(f"  [FOLLOW] ERROR al refrescar '{cfg['compat_view']}': {e}", exc_info=True)
+        try:
+            self.rollup_manager.refresh_rollups(cycle_started_at)
+        except Exception as e:
+            logger.error(f"  [FOLLOW] ERROR al actualizar rollups: {e}", exc_info=True)
+
+    def run(self):
+        """Bucle principal: un ciclo cada interval_minutes hasta recibir SIGTERM/SIGINT (o max_cycles)."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info(
+            f"  [FOLLOW] Iniciado: entidades {self.entities}, cada {self.interval_seconds // 60} min, "
+            f"ventana de {self.lookback} hacia atrás."
+        )
+        cycles = 0
+        while not self._stop_event.is_set():
+            cycle_started_at = datetime.now(timezone.utc)
+            start = time.monotonic()
+            if self.config['changelog_enabled']:
+                # Cada ciclo es una "corrida" del changelog: la corrida batch verá estas filas como sin cambios
+                self.db_manager.changelog_run_id = f"follow-{cycle_started_at:%Y%m%dT%H%M%SZ}"
+            try:
+                changed_tables = self.poll_cycle(cycle_started_at)
+                if changed_tables:
+                    self.update_analytics(cycle_started_at)
+                logger.info(f"  [FOLLOW] Ciclo completo en {time.monotonic() - start:.1f}s (tablas con cambios: {sorted(changed_tables)}).")
+            except Exception as e:
+                logger.error(f"  [FOLLOW] ERROR en el ciclo: {e}", exc_info=True)
+            if self.config['metrics_file']:
+                # Acumulado desde el inicio del proceso: un scraper lee el archivo en cada ciclo
+                try:
+                    METRICS.write_openmetrics(self.config['metrics_file'])
+                except Exception as e:
+                    logger.error(f"  [FOLLOW] ERROR al escribir las métricas: {e}", exc_info=True)
+
+            cycles += 1
+            if self.max_cycles and cycles >= self.max_cycles:
+                break
+            # Espera interrumpible hasta el próximo ciclo
+            self._stop_event.wait(max(0.0, self.interval_seconds - (time.monotonic() - start)))
+        logger.info(f"  [FOLLOW] Finalizado tras {cycles} ciclos.")
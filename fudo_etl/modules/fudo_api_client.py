@@ -2,18 +2,52 @@
 import requests
 import time
 import logging
-from datetime import datetime, timezone
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from .metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
+
+class RequestRateLimiter:
+    """
+    Limitador compartido entre hilos: espacia las requests a la API para no superar
+    max_requests_per_second en total (ej. varios slices de backfill de la misma sucursal).
+    """
+    def __init__(self, max_requests_per_second: float):
+        self.min_interval = 1.0 / max_requests_per_second if max_requests_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_request_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_seconds = max(0.0, self._next_request_at - now)
+            self._next_request_at = max(now, self._next_request_at) + self.min_interval
+        if wait_seconds:
+            time.sleep(wait_seconds)
+
+
 class FudoApiClient:
-    def __init__(self, api_base_url: str):
+    def __init__(self, api_base_url: str, rate_limiter: RequestRateLimiter | None = None,
+                 token_provider: Callable[[str | None], str] | None = None):
         self.api_base_url = api_base_url
         self.auth_token = None
+        # Callback opcional: token_provider(None) da un token válido; token_provider(token_rechazado) fuerza
+        # uno nuevo. Con él, un 401 renueva el token y reintenta la misma página en lugar de abandonar la entidad
+        self.token_provider = token_provider
+        # Limitador opcional compartido con otros clientes (extracciones concurrentes)
+        self.rate_limiter = rate_limiter
         self.max_retries = 15
         self.initial_backoff_delay = 5
         self.max_backoff_delay = 300
         self.inter_page_delay = 1.0
+        # Límite de la extracción (time.monotonic()) fijado por el RunScheduler: ningún backoff lo cruza
+        self.deadline_monotonic = None
+        # Contadores de requests para el ledger de corridas (ver take_request_stats)
+        self.request_stats = {'pages': 0, 'api_bytes': 0, 'retries': 0}
         
         # --- Mapeo EXPLÍCITO: SOLO PARA ENTIDADES QUE SOPORTAN 'fields' ---
         self.fields_key_mapping = {
@@ -26,83 +60,216 @@ class FudoApiClient:
             'expenseCategory': ('active,financialCategory,name,parentCategory'),
         }
 
+        # Fieldset mínimo para los escaneos de solo IDs (iter_entity_ids): un único atributo liviano
+        self.id_scan_fields_parameters = {
+            'expense': 'createdAt',
+            'expenseCategory': 'name',
+        }
+
         # --- ENTIDADES CON FILTRO INCREMENTAL POR 'createdAt' ---
         self.incremental_filter_entities = {
             'sales': 'createdAt',
         }
 
+        # --- ENTIDADES CON FILTRO POR VENTANA EXPLÍCITA (backfill, modo follow, --since/--until) ---
+        # Solo se usan cuando se pide una ventana; no cambian la estrategia incremental/full de las corridas normales.
+        # items/payments: cada página se verifica contra la ventana (_check_window); si la API ignorara el filtro, se aborta
+        self.window_filter_entities = {
+            'sales': 'createdAt',
+            'items': 'createdAt',
+            'payments': 'createdAt',
+        }
+
+        # Sesión HTTP reutilizada entre requests (keep-alive): evita un handshake TLS por página
+        self.session = requests.Session()
+
+    def _sleep_before_retry(self, delay: float, entity_name: str, current_page: int):
+        """Espera el backoff, salvo que termine después del límite de la corrida: en ese caso corta con TimeoutError."""
+        if self.deadline_monotonic is not None and time.monotonic() + delay >= self.deadline_monotonic:
+            logger.error(f"Límite de tiempo de la corrida alcanzado en '{entity_name}' (pág {current_page}). Se abandonan los reintentos.")
+            raise TimeoutError(f"Límite de tiempo de la corrida alcanzado extrayendo '{entity_name}'.")
+        time.sleep(delay)
+        METRICS.inc('fudo_api_throttle_sleep_seconds', delay, {'entity': entity_name, 'reason': 'backoff'})
+
+    def take_request_stats(self) -> dict:
+        """Devuelve los contadores acumulados desde la última llamada (páginas, bytes de la API, reintentos) y los reinicia."""
+        stats = self.request_stats
+        self.request_stats = {'pages': 0, 'api_bytes': 0, 'retries': 0}
+        return stats
+
     def set_auth_token(self, token: str):
         self.auth_token = token
         logger.debug("Token de autenticación establecido para FudoApiClient.")
 
-    def get_data(self, entity_name: str, id_sucursal: str, last_extracted_ts: datetime = None) -> list[dict]:
+    @staticmethod
+    def _format_filter_ts(ts: datetime) -> str:
+        formatted_ts = ts.astimezone(timezone.utc).isoformat(timespec='seconds')
+        if formatted_ts.endswith('+00:00'):
+            formatted_ts = formatted_ts[:-6]
+        return formatted_ts + 'Z'
+
+    def _build_date_filter(self, since: datetime = None, until: datetime = None) -> str:
+        """Valor del filtro de fecha de la API: 'gte.X', 'lte.Y' o 'and(gte.X,lte.Y)'."""
+        if since and until:
+            return f"and(gte.{self._format_filter_ts(since)},lte.{self._format_filter_ts(until)})"
+        if since:
+            return f"gte.{self._format_filter_ts(since)}"
+        return f"lte.{self._format_filter_ts(until)}"
+
+    @staticmethod
+    def _check_window(data: list[dict], filter_field: str, since: datetime | None, until: datetime | None,
+                      entity_name: str, id_sucursal: str, current_page: int):
         """
-        Extrae datos paginados de la API de Fudo.
-        En esta versión, 'sales' siempre hace full load completo.
+        Verifica que la API haya respetado el filtro de fecha: un registro fuera de la ventana indica que
+        el filtro se ignoró y la extracción no sería la pedida, así que se aborta la entidad con ValueError.
         """
+        for record in data:
+            value = (record.get('attributes') or {}).get(filter_field)
+            if not value:
+                continue
+            try:
+                record_ts = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                continue
+            if record_ts.tzinfo is None:
+                record_ts = record_ts.replace(tzinfo=timezone.utc)
+            # La API filtra con precisión de segundos (_format_filter_ts)
+            if (since and record_ts < since.replace(microsecond=0)) or (until and record_ts > until.replace(microsecond=0) + timedelta(seconds=1)):
+                logger.error(
+                    f"La API devolvió '{entity_name}' {record.get('id')} ({id_sucursal}, pág {current_page}) con "
+                    f"{filter_field}={value}, fuera de la ventana [{since}, {until}]: el filtro por fecha no se aplicó. "
+                    f"Se aborta la extracción de la entidad."
+                )
+                raise ValueError(f"La API ignoró filter[{filter_field}] para '{entity_name}' ({id_sucursal}).")
+
+    def _build_extraction_request(self, entity_name: str, id_sucursal: str, last_extracted_ts: datetime = None,
+                                  window_start: datetime = None, window_end: datetime = None) -> dict:
+        """
+        Arma los argumentos de paginación para una entidad.
+        En esta versión, 'sales' siempre hace full load completo, salvo que se pida una ventana
+        explícita (window_start/window_end, ej. --since/--until del CLI).
+        """
+        if not self.auth_token and self.token_provider:
+            self.auth_token = self.token_provider(None)
         if not self.auth_token:
             raise ValueError("Token de autenticación no establecido. Llama a set_auth_token primero.")
 
-        request_url = f"{self.api_base_url}/v1alpha1/{entity_name}"
-        page_size = 500
-        headers = {
-            "Authorization": f"Bearer {self.auth_token}",
-            "Accept": "application/json"
+        request_args = {
+            'request_url': f"{self.api_base_url}/v1alpha1/{entity_name}",
+            'headers': {
+                "Authorization": f"Bearer {self.auth_token}",
+                "Accept": "application/json"
+            },
+            'page_size': 500,
+            'entity_name': entity_name,
+            'id_sucursal': id_sucursal,
+            'start_page': 1,
+            'max_pages': -1  # Sin límite: trae todo
         }
 
+        # --- Ventana explícita: filtra por fecha de creación (incluida 'sales') ---
+        if window_start or window_end:
+            if not self.window_filter_entities.get(entity_name):
+                logger.warning(f"  '{entity_name}' no admite filtro por fecha en la API: se ignora la ventana y se extrae completa.")
+            fields_key = self.fields_key_mapping.get(entity_name)
+            request_args.update({
+                'apply_incremental_filter': True,
+                'filter_field': self.window_filter_entities.get(entity_name),
+                'incremental_filter_ts': window_start,
+                'incremental_filter_until': window_end,
+                'fields_key': fields_key,
+                'fields_params': self.fields_parameters.get(fields_key),
+            })
+            return request_args
+
         # --- FULL LOAD permanente para 'sales' ---
         if entity_name == 'sales':
-            logger.info(f"\n--- EJECUCIÓN DE FULL LOAD: Extracción completa de '{entity_name}' para sucursal '{id_sucursal}'. ---")
-            all_sales = self._get_paginated_data_generic(
-                request_url=request_url,
-                headers=headers,
-                page_size=page_size,
-                entity_name=entity_name,
-                id_sucursal=id_sucursal,
-                apply_incremental_filter=False,  # Ignora el filtro incremental
-                start_page=1,
-                max_pages=-1  # Sin límite: trae todo
-            )
-            logger.info(f"  Total de ventas únicas extraídas (carga completa): {len(all_sales)}")
-            return all_sales
+            request_args['apply_incremental_filter'] = False  # Ignora el filtro incremental
+            return request_args
 
         # --- Lógica genérica para otras entidades ---
-        logger.info(f"  Iniciando extracción de '{entity_name}' para sucursal '{id_sucursal}' con estrategia incremental/full.")
-        return self._get_paginated_data_generic(
-            request_url=request_url,
-            headers=headers,
-            page_size=page_size,
-            entity_name=entity_name,
-            id_sucursal=id_sucursal,
-            apply_incremental_filter=bool(last_extracted_ts),
-            incremental_filter_ts=last_extracted_ts,
-            fields_key=self.fields_key_mapping.get(entity_name),
-            fields_params=self.fields_parameters.get(self.fields_key_mapping.get(entity_name)),
-            start_page=1,
-            max_pages=-1
-        )
+        fields_key = self.fields_key_mapping.get(entity_name)
+        request_args.update({
+            'apply_incremental_filter': bool(last_extracted_ts),
+            'incremental_filter_ts': last_extracted_ts,
+            'fields_key': fields_key,
+            'fields_params': self.fields_parameters.get(fields_key),
+        })
+        return request_args
+
+    def iter_data_pages(self, entity_name: str, id_sucursal: str, last_extracted_ts: datetime = None,
+                        window_start: datetime = None, window_end: datetime = None):
+        """
+        Igual que get_data, pero entrega los registros página por página (generador).
+        Permite solapar la extracción con la preparación/carga (pipeline productor/consumidor).
+        """
+        request_args = self._build_extraction_request(entity_name, id_sucursal, last_extracted_ts, window_start, window_end)
+        if window_start or window_end:
+            logger.info(f"  Extracción de '{entity_name}' para sucursal '{id_sucursal}' en ventana [{window_start}, {window_end}].")
+        elif entity_name == 'sales':
+            logger.info(f"\n--- EJECUCIÓN DE FULL LOAD: Extracción completa de '{entity_name}' para sucursal '{id_sucursal}'. ---")
+        else:
+            logger.info(f"  Iniciando extracción de '{entity_name}' para sucursal '{id_sucursal}' con estrategia incremental/full.")
+        yield from self._iter_paginated_data_generic(**request_args)
+
+    def iter_entity_ids(self, entity_name: str, id_sucursal: str, window_start: datetime = None):
+        """
+        Escaneo de solo IDs para detectar borrados: entrega la lista de 'id' de cada página, sin filtro
+        incremental (siempre la entidad completa, o desde window_start si la entidad admite ventana).
+        Donde la API admite 'fields' pide un único atributo; en el resto la página llega completa pero
+        solo se conservan los IDs.
+        """
+        request_args = self._build_extraction_request(entity_name, id_sucursal, None, window_start, None)
+        fields_key = self.fields_key_mapping.get(entity_name)
+        request_args.update({
+            'apply_incremental_filter': bool(window_start),
+            'fields_key': fields_key,
+            'fields_params': self.id_scan_fields_parameters.get(fields_key),
+        })
+        logger.info(f"  Escaneo de IDs de '{entity_name}' para sucursal '{id_sucursal}'" +
+                    (f" desde {window_start}." if window_start else "."))
+        for page in self._iter_paginated_data_generic(**request_args):
+            yield [str(record['id']) for record in page if record.get('id') is not None]
+
+    def get_data(self, entity_name: str, id_sucursal: str, last_extracted_ts: datetime = None,
+                 window_start: datetime = None, window_end: datetime = None) -> list[dict]:
+        """
+        Extrae datos paginados de la API de Fudo.
+        En esta versión, 'sales' siempre hace full load completo (salvo ventana explícita).
+        """
+        all_items = []
+        for page in self.iter_data_pages(entity_name, id_sucursal, last_extracted_ts, window_start, window_end):
+            all_items.extend(page)
+        if entity_name == 'sales':
+            logger.info(f"  Total de ventas únicas extraídas (carga completa): {len(all_items)}")
+        return all_items
 
     # --- MÉTODO AUXILIAR genérico con paginación y reintentos ---
-    def _get_paginated_data_generic(self, request_url: str, headers: dict, page_size: int,
-                                    entity_name: str, id_sucursal: str,
-                                    apply_incremental_filter: bool, incremental_filter_ts: datetime = None,
-                                    fields_key: str = None, fields_params: str = None,
-                                    start_page: int = 1, max_pages: int = -1) -> list[dict]:
+    def _get_paginated_data_generic(self, **kwargs) -> list[dict]:
+        """Versión no-generadora de _iter_paginated_data_generic: devuelve todos los ítems en una lista."""
+        all_items = []
+        for page in self._iter_paginated_data_generic(**kwargs):
+            all_items.extend(page)
+        return all_items
+
+    def _iter_paginated_data_generic(self, request_url: str, headers: dict, page_size: int,
+                                     entity_name: str, id_sucursal: str,
+                                     apply_incremental_filter: bool, incremental_filter_ts: datetime = None,
+                                     incremental_filter_until: datetime = None, filter_field: str = None, fields_key: str = None, fields_params: str = None,
+                                     start_page: int = 1, max_pages: int = -1):
         """
         Extrae datos paginados de la API de Fudo con control de reintentos y backoff exponencial.
+        Entrega (yield) la lista de ítems de cada página a medida que se obtiene.
         """
-        all_items = []
         current_page = start_page
         
         params = {}
         # Filtro incremental si corresponde
-        if apply_incremental_filter and incremental_filter_ts and self.incremental_filter_entities.get(entity_name):
-            filter_field = self.incremental_filter_entities.get(entity_name)
-            formatted_ts = incremental_filter_ts.astimezone(timezone.utc).isoformat(timespec='seconds')
-            if not formatted_ts.endswith('Z'):
-                formatted_ts += 'Z'
-            params[f'filter[{filter_field}]'] = f"gte.{formatted_ts}"
-            logger.debug(f"  Aplicando filtro incremental '{filter_field} >= {formatted_ts}' para {entity_name}.")
+        filter_field = filter_field or self.incremental_filter_entities.get(entity_name)
+        date_filter_applied = bool(apply_incremental_filter and (incremental_filter_ts or incremental_filter_until) and filter_field)
+        if date_filter_applied:
+            params[f'filter[{filter_field}]'] = self._build_date_filter(incremental_filter_ts, incremental_filter_until)
+            logger.debug(f"  Aplicando filtro incremental '{filter_field}={params[f'filter[{filter_field}]']}' para {entity_name}.")
         
         # Campos 'fields'
         if fields_key and fields_params:
@@ -116,6 +283,7 @@ class FudoApiClient:
             
             retries = 0
             delay = self.initial_backoff_delay
+            token_refreshed = False  # Una sola renovación de token por página
 
             while retries < self.max_retries:
                 try:
@@ -124,29 +292,52 @@ class FudoApiClient:
                     current_params['page[number]'] = current_page
 
                     logger.debug(f"GET {request_url} params={current_params} (Intento {retries+1}/{self.max_retries}, pág {current_page})")
-                    response = requests.get(request_url, params=current_params, headers=headers, timeout=60)
+                    if self.rate_limiter:
+                        wait_start = time.perf_counter()
+                        self.rate_limiter.wait()
+                        METRICS.inc('fudo_api_throttle_sleep_seconds', time.perf_counter() - wait_start,
+                                    {'entity': entity_name, 'reason': 'rate_limiter'})
+                    with METRICS.timer('fudo_api_request_seconds', {'entity': entity_name}):
+                        response = self.session.get(request_url, params=current_params, headers=headers, timeout=60)
                     response.raise_for_status()
+                    self.request_stats['pages'] += 1
+                    self.request_stats['api_bytes'] += len(response.content)
+                    METRICS.inc('fudo_api_pages', 1, {'entity': entity_name})
 
-                    data = response.json().get('data', [])
+                    with METRICS.timer('fudo_api_json_parse_seconds', {'entity': entity_name}):
+                        data = response.json().get('data', [])
                     logger.debug(f"Página {current_page}: {len(data)} ítems recuperados para '{entity_name}' ({id_sucursal}).")
 
-                    all_items.extend(data)
+                    if data and date_filter_applied:
+                        self._check_window(data, filter_field, incremental_filter_ts, incremental_filter_until,
+                                           entity_name, id_sucursal, current_page)
+                    if data:
+                        yield data
 
                     if not data or len(data) < page_size:
                         logger.debug(f"  Última página o página incompleta. Extracción de '{entity_name}' finalizada.")
-                        return all_items
+                        return
 
                     current_page += 1
                     time.sleep(self.inter_page_delay)
+                    METRICS.inc('fudo_api_throttle_sleep_seconds', self.inter_page_delay, {'entity': entity_name, 'reason': 'inter_page_delay'})
                     break
 
                 except requests.exceptions.HTTPError as e:
                     status = e.response.status_code
                     if status in [429, 500, 502, 503, 504]:
                         retries += 1
+                        self.request_stats['retries'] += 1
+                        METRICS.inc('fudo_api_retries', 1, {'entity': entity_name, 'status': status})
                         logger.warning(f"HTTP {status} en '{entity_name}' (pág {current_page}). Reintentando en {delay}s ({retries}/{self.max_retries})...")
-                        time.sleep(delay)
+                        self._sleep_before_retry(delay, entity_name, current_page)
                         delay = min(delay * 2, self.max_backoff_delay)
+                    elif status == 401 and self.token_provider and not token_refreshed:
+                        token_refreshed = True
+                        METRICS.inc('fudo_api_retries', 1, {'entity': entity_name, 'status': status})
+                        logger.warning(f"HTTP 401 en '{entity_name}' (pág {current_page}): token vencido o revocado. Se renueva y se reintenta la misma página.")
+                        self.auth_token = self.token_provider(self.auth_token)
+                        headers = {**headers, "Authorization": f"Bearer {self.auth_token}"}
                     elif status == 401:
                         logger.error("Token expirado o inválido (401). No reintentar.")
                         raise
@@ -159,12 +350,12 @@ class FudoApiClient:
 
                 except requests.exceptions.RequestException as e:
                     retries += 1
+                    self.request_stats['retries'] += 1
+                    METRICS.inc('fudo_api_retries', 1, {'entity': entity_name, 'status': 'connection_error'})
                     logger.warning(f"Error de conexión en '{entity_name}' (pág {current_page}). Reintentando en {delay}s ({retries}/{self.max_retries})... {e}")
-                    time.sleep(delay)
+                    self._sleep_before_retry(delay, entity_name, current_page)
                     delay = min(delay * 2, self.max_backoff_delay)
 
             else:
                 logger.error(f"Máximo de reintentos ({self.max_retries}) alcanzado para '{entity_name}' ({id_sucursal}) en la pág {current_page}.")
                 raise ConnectionError(f"Fallo al extraer '{entity_name}' tras {self.max_retries} reintentos.")
-        
-        return all_items
@@ -2,7 +2,9 @@
 import requests
 import json
 import logging
+import threading
 from datetime import datetime, timedelta, timezone
+from typing import Callable
 
 from .db_manager import DBManager
 from .etl_metadata_manager import ETLMetadataManager
@@ -16,13 +18,29 @@ class FudoAuthenticator:
         self.auth_endpoint = auth_endpoint
         self.project_id = project_id
         self.metadata_manager = ETLMetadataManager(db_manager) # Usa el metadata manager aquí
+        # apiKey/apiSecret ya leídos (las renovaciones de token no vuelven a Secret Manager)
+        self._credentials_cache = {}
+        self._credentials_lock = threading.Lock()
 
     def _get_credentials_from_secret_source(self, secret_api_key_name: str, secret_api_secret_name: str) -> tuple[str, str]:
-        """Obtiene apiKey y apiSecret de Secret Manager (o ENV local)."""
+        """Obtiene apiKey y apiSecret de Secret Manager (o ENV local), cacheados en memoria."""
+        cache_key = (secret_api_key_name, secret_api_secret_name)
+        with self._credentials_lock:
+            if cache_key in self._credentials_cache:
+                return self._credentials_cache[cache_key]
         api_key = get_secret(secret_api_key_name, self.project_id)
         api_secret = get_secret(secret_api_secret_name, self.project_id)
+        with self._credentials_lock:
+            self._credentials_cache[cache_key] = (api_key, api_secret)
         return api_key, api_secret
 
+    def fetch_new_token(self, secret_api_key_name: str, secret_api_secret_name: str) -> tuple[str, datetime]:
+        """Credenciales + POST de autenticación, sin tocar la DB (seguro desde varios hilos)."""
+        api_key, api_secret = self._get_credentials_from_secret_source(secret_api_key_name, secret_api_secret_name)
+        new_token_data = self._request_new_token(api_key, api_secret)
+        # El 'exp' de Fudo es un timestamp de segundos desde Epoch
+        return new_token_data['token'], datetime.fromtimestamp(new_token_data['exp'], tz=timezone.utc)
+
     def _request_new_token(self, api_key: str, api_secret: str) -> dict:
         """Solicita un nuevo token a la API de autenticación de Fudo."""
         headers = {
@@ -72,14 +90,8 @@ class FudoAuthenticator:
         if not token_is_valid:
             logger.info(f"Solicitando nuevo token para sucursal {id_sucursal}.")
             try:
-                api_key, api_secret = self._get_credentials_from_secret_source(secret_api_key_name, secret_api_secret_name)
-                
-                new_token_data = self._request_new_token(api_key, api_secret)
-                access_token = new_token_data['token']
-                
-                # El 'exp' de Fudo es un timestamp de segundos desde Epoch
-                token_expiration_utc = datetime.fromtimestamp(new_token_data['exp'], tz=timezone.utc)
-                
+                access_token, token_expiration_utc = self.fetch_new_token(secret_api_key_name, secret_api_secret_name)
+
                 # Actualizar/insertar en la base de datos a través del metadata_manager
                 self.metadata_manager.update_fudo_token_data(id_sucursal, access_token, token_expiration_utc)
                 logger.info(f"Nuevo token obtenido y guardado para sucursal {id_sucursal}. Expira: {token_expiration_utc}")
@@ -90,4 +102,18 @@ class FudoAuthenticator:
         if not access_token:
             raise ValueError(f"No se pudo obtener un token válido para la sucursal {id_sucursal}.")
             
-        return access_token
\ No newline at end of file
+        return access_token
+
+    def token_provider(self, id_sucursal: str, secret_api_key_name: str, secret_api_secret_name: str) -> Callable[[str | None], str]:
+        """
+        Callback para FudoApiClient(token_provider=...): sin token rechazado devuelve uno válido; tras un 401
+        pide uno nuevo aunque el guardado parezca vigente. Usa la conexión de este autenticador (mismo hilo).
+        """
+        def provide(rejected_token: str | None = None) -> str:
+            if rejected_token is None:
+                return self.get_valid_token(id_sucursal, secret_api_key_name, secret_api_secret_name)
+            logger.info(f"Token rechazado por la API para sucursal {id_sucursal}. Solicitando uno nuevo.")
+            access_token, token_expiration_utc = self.fetch_new_token(secret_api_key_name, secret_api_secret_name)
+            self.metadata_manager.update_fudo_token_data(id_sucursal, access_token, token_expiration_utc)
+            return access_token
+        return provide
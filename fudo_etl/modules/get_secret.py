@@ -1,10 +1,26 @@
 # fudo_etl/modules/get_secret.py
 import os
 import logging
-from google.cloud import secretmanager # <--- ¡DESCOMENTAR ESTA LÍNEA!
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Un único cliente de Secret Manager por proceso (crearlo abre un canal gRPC y resuelve credenciales)
+_secret_manager_client = None
+_secret_manager_client_lock = threading.Lock()
+
+
+def _get_secret_manager_client():
+    global _secret_manager_client
+    with _secret_manager_client_lock:
+        if _secret_manager_client is None:
+            # Import diferido: google-cloud-secret-manager (gRPC, protobuf, google-auth) pesa en el arranque
+            # y en local (GCP_PROJECT_ID="local-dev-project") no se usa
+            from google.cloud import secretmanager
+            _secret_manager_client = secretmanager.SecretManagerServiceClient()
+        return _secret_manager_client
+
+
 def get_secret(secret_name: str, project_id: str = None) -> str:
     """
     Accede a un secreto. En local (GCP_PROJECT_ID="local-dev-project"), lee de variables de entorno.
@@ -23,7 +39,7 @@ def get_secret(secret_name: str, project_id: str = None) -> str:
     # --- ESTA SECCIÓN DEBE ESTAR DESCOMENTADA PARA GCP ---
     else: # Esto se ejecutará si project_id NO es "local-dev-project" (es decir, es un ID real de GCP)
         try:
-            client = secretmanager.SecretManagerServiceClient()
+            client = _get_secret_manager_client()
             name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
             response = client.access_secret_version(name=name)
             logger.info(f"Secret '{secret_name}' obtenido de Google Secret Manager.")
@@ -0,0 +1,129 @@
+# fudo_etl/modules/index_advisor.py
+import logging
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+
+class IndexAdvisor:
+    """
+    Reporte de uso de índices y candidatos a índices faltantes a partir de las estadísticas de Postgres
+    (pg_stat_user_indexes, pg_stat_user_tables y, si está instalada, pg_stat_statements).
+    """
+    def __init__(self, db_manager: DBManager, min_table_rows: int = 10000, top_statements: int = 10):
+        self.db_manager = db_manager
+        self.min_table_rows = min_table_rows
+        self.top_statements = top_statements
+
+    def get_index_usage(self) -> list[dict]:
+        """Uso y tamaño de cada índice del esquema public. Marca como 'unused' los no únicos sin escaneos."""
+        rows = self.db_manager.fetch_all("""
+            SELECT s.relname, s.indexrelname, s.idx_scan, s.idx_tup_read,
+                   pg_relation_size(s.indexrelid) AS index_bytes, i.indisunique, i.indisprimary
+            FROM pg_stat_user_indexes s
+            JOIN pg_index i ON i.indexrelid = s.indexrelid
+            WHERE s.schemaname = 'public'
+            ORDER BY pg_relation_size(s.indexrelid) DESC;
+        """)
+        return [
+            {
+                'table_name': row[0],
+                'index_name': row[1],
+                'idx_scan': row[2],
+                'idx_tup_read': row[3],
+                'index_bytes': row[4],
+                'is_unique': row[5],
+                'is_primary': row[6],
+                'unused': row[2] == 0 and not row[5] and not row[6],
+            }
+            for row in rows
+        ]
+
+    def get_missing_index_candidates(self) -> list[dict]:
+        """Tablas grandes leídas mayormente por seq scan: candidatas a un índice que hoy no existe."""
+        rows = self.db_manager.fetch_all("""
+            SELECT relname, seq_scan, seq_tup_read, COALESCE(idx_scan, 0), n_live_tup,
+                   pg_total_relation_size(relid) AS total_bytes
+            FROM pg_stat_user_tables
+            WHERE schemaname = 'public'
+              AND n_live_tup >= %s
+              AND seq_scan > COALESCE(idx_scan, 0)
+            ORDER BY seq_tup_read DESC;
+        """, (self.min_table_rows,))
+        return [
+            {
+                'table_name': row[0],
+                'seq_scan': row[1],
+                'seq_tup_read': row[2],
+                'idx_scan': row[3],
+                'n_live_tup': row[4],
+                'total_bytes': row[5],
+                'avg_rows_per_seq_scan': int(row[2] / row[1]) if row[1] else 0,
+            }
+            for row in rows
+        ]
+
+    def get_top_statements(self) -> list[dict]:
+        """Consultas más costosas según pg_stat_statements (vacío si la extensión no está instalada)."""
+        has_extension = self.db_manager.fetch_one(
+            "SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements';"
+        )
+        if not has_extension:
+            logger.warning("  [INDEX REPORT] pg_stat_statements no está instalada. Se omite el análisis de consultas.")
+            return []
+
+        # PG13+ usa total_exec_time/mean_exec_time; versiones anteriores total_time/mean_time
+        columns = {row[0] for row in self.db_manager.fetch_all(
+            "SELECT attname FROM pg_attribute WHERE attrelid = 'pg_stat_statements'::regclass AND attnum > 0;"
+        )}
+        total_col, mean_col = ('total_exec_time', 'mean_exec_time') if 'total_exec_time' in columns else ('total_time', 'mean_time')
+        rows = self.db_manager.fetch_all(f"""
+            SELECT LEFT(query, 300), calls, {total_col}, {mean_col}, rows, shared_blks_read, shared_blks_hit
+            FROM pg_stat_statements
+            WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+            ORDER BY {total_col} DESC
+            LIMIT %s;
+        """, (self.top_statements,))
+        return [
+            {
+                'query': row[0],
+                'calls': row[1],
+                'total_ms': float(row[2]),
+                'mean_ms': float(row[3]),
+                'rows': row[4],
+                'shared_blks_read': row[5],
+                'shared_blks_hit': row[6],
+            }
+            for row in rows
+        ]
+
+    def build_report(self) -> dict:
+        """Arma el reporte completo y lo loguea en formato legible."""
+        index_usage = self.get_index_usage()
+        candidates = self.get_missing_index_candidates()
+        top_statements = self.get_top_statements()
+
+        logger.info("==================================================")
+        logger.info("  REPORTE DE ÍNDICES")
+        logger.info("==================================================")
+        unused = [idx for idx in index_usage if idx['unused']]
+        logger.info(f"  Índices en public: {len(index_usage)} ({len(unused)} sin uso).")
+        for idx in unused:
+            logger.info(f"    [SIN USO] {idx['index_name']} en '{idx['table_name']}' ({idx['index_bytes']:,} bytes).")
+        for cand in candidates:
+            logger.info(
+                f"    [CANDIDATO] '{cand['table_name']}': {cand['seq_scan']} seq scans vs {cand['idx_scan']} index scans, "
+                f"~{cand['avg_rows_per_seq_scan']:,} filas leídas por seq scan ({cand['n_live_tup']:,} filas vivas)."
+            )
+        for stmt in top_statements:
+            logger.info(
+                f"    [TOP SQL] total={stmt['total_ms']:.0f}ms media={stmt['mean_ms']:.1f}ms llamadas={stmt['calls']} "
+                f"blks_read={stmt['shared_blks_read']}: {stmt['query'][:120]!r}"
+            )
+
+        return {
+            'index_usage': index_usage,
+            'missing_index_candidates': candidates,
+            'top_statements': top_statements,
+        }
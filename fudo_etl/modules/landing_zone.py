@@ -0,0 +1,147 @@
+# fudo_etl/modules/landing_zone.py
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+from .db_manager import DBManager
+from .record_preparation import prepare_raw_records, raw_table_for_entity
+
+logger = logging.getLogger(__name__)
+
+PAGE_FILE_PATTERN = "page_{page_number:05d}.ndjson.gz"
+
+
+class LandingZoneWriter:
+    """
+    Zona de aterrizaje RAW en disco local (o un volumen montado): cada página de la API se guarda
+    tal cual como NDJSON comprimido en {base_dir}/{run_id}/{id_sucursal}/{entity}/page_NNNNN.ndjson.gz.
+
+    - Escritura atómica (archivo temporal + os.replace): un archivo presente siempre está completo.
+    - Un manifest.json por corrida resume archivos y registros (auditoría; el loader no depende de él).
+    - Thread-safe: lo pueden compartir los fetchers del pipeline.
+    """
+    def __init__(self, base_dir: str, run_id: str, retention_days: int | None = None):
+        self.base_dir = base_dir
+        self.run_id = run_id
+        self.run_dir = os.path.join(base_dir, run_id)
+        self._lock = threading.Lock()
+        self._manifest = []
+        os.makedirs(self.run_dir, exist_ok=True)
+        if retention_days:
+            self.prune_old_runs(retention_days)
+
+    def entity_dir(self, id_sucursal: str, entity: str) -> str:
+        return os.path.join(self.run_dir, id_sucursal, entity)
+
+    def write_page(self, id_sucursal: str, entity: str, page_number: int, records: list[dict]) -> str:
+        """Guarda una página y devuelve la ruta del archivo."""
+        target_dir = self.entity_dir(id_sucursal, entity)
+        os.makedirs(target_dir, exist_ok=True)
+        path = os.path.join(target_dir, PAGE_FILE_PATTERN.format(page_number=page_number))
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._manifest.append({
+                'id_sucursal': id_sucursal,
+                'entity': entity,
+                'page': page_number,
+                'file': os.path.relpath(path, self.run_dir),
+                'records': len(records),
+                'bytes': os.path.getsize(path),
+                'written_at_utc': datetime.now(timezone.utc).isoformat(),
+            })
+        return path
+
+    def spool_pages(self, id_sucursal: str, entity: str, pages) -> list[str]:
+        """Consume un iterable de páginas (ej. FudoApiClient.iter_data_pages) y las guarda todas."""
+        return [self.write_page(id_sucursal, entity, page_number, page)
+                for page_number, page in enumerate(pages, start=1)]
+
+    def write_manifest(self) -> str:
+        with self._lock:
+            manifest = {
+                'run_id': self.run_id,
+                'files': sorted(self._manifest, key=lambda item: item['file']),
+                'total_records': sum(item['records'] for item in self._manifest),
+                'written_at_utc': datetime.now(timezone.utc).isoformat(),
+            }
+        path = os.path.join(self.run_dir, "manifest.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        logger.info(f"  [LANDING] Manifest de la corrida '{self.run_id}': {len(manifest['files'])} archivos, {manifest['total_records']} registros.")
+        return path
+
+    def prune_old_runs(self, retention_days: int):
+        """Elimina los directorios de corridas más viejos que retention_days."""
+        cutoff = time.time() - retention_days * 86400
+        for run_dir in glob.glob(os.path.join(self.base_dir, "*")):
+            if os.path.isdir(run_dir) and run_dir != self.run_dir and os.path.getmtime(run_dir) < cutoff:
+                logger.info(f"  [LANDING] Eliminando corrida vieja '{os.path.basename(run_dir)}'.")
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+
+class LandingZoneLoader:
+    """
+    Carga en las tablas RAW los archivos de la zona de aterrizaje (sin llamadas a la API).
+    Agrupa varias páginas por inserción (batch_rows) y usa insert_raw_data, así que re-cargar
+    una corrida es idempotente.
+    """
+    def __init__(self, db_manager: DBManager, base_dir: str, batch_rows: int = 5000):
+        self.db_manager = db_manager
+        self.base_dir = base_dir
+        self.batch_rows = batch_rows
+
+    @staticmethod
+    def read_page(path: str) -> list[dict]:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def load_files(self, id_sucursal: str, entity: str, paths: list[str]) -> dict:
+        """
+        Carga los archivos de una (sucursal, entidad).
+        Devuelve los conteos acumulados de insert_raw_data ({'inserted', 'updated', 'skipped'}).
+        """
+        raw_table_name = raw_table_for_entity(entity)
+        batch, counts = [], {'inserted': 0, 'updated': 0, 'skipped': 0}
+        for path in sorted(paths):
+            batch.extend(prepare_raw_records(entity, id_sucursal, self.read_page(path)))
+            if len(batch) >= self.batch_rows:
+                for key, value in self.db_manager.insert_raw_data(raw_table_name, batch).items():
+                    counts[key] += value
+                batch = []
+        if batch:
+            for key, value in self.db_manager.insert_raw_data(raw_table_name, batch).items():
+                counts[key] += value
+        return counts
+
+    def load_run(self, run_id: str, branches: list[str] | None = None, entities: list[str] | None = None) -> set[str]:
+        """Re-carga todos los archivos de una corrida pasada. Devuelve las tablas RAW con filas cargadas."""
+        run_dir = os.path.join(self.base_dir, run_id)
+        if not os.path.isdir(run_dir):
+            raise FileNotFoundError(f"No existe la corrida '{run_id}' en la zona de aterrizaje '{self.base_dir}'.")
+
+        changed_tables = set()
+        for entity_dir in sorted(glob.glob(os.path.join(run_dir, "*", "*"))):
+            id_sucursal, entity = os.path.basename(os.path.dirname(entity_dir)), os.path.basename(entity_dir)
+            if (branches and id_sucursal not in branches) or (entities and entity not in entities):
+                continue
+            paths = glob.glob(os.path.join(entity_dir, "page_*.ndjson.gz"))
+            try:
+                loaded = sum(self.load_files(id_sucursal, entity, paths).values())
+            except Exception as e:
+                logger.error(f"  [LANDING] Error re-cargando '{entity}' ({id_sucursal}) de la corrida '{run_id}': {e}", exc_info=True)
+                continue
+            if loaded:
+                changed_tables.add(raw_table_for_entity(entity))
+            logger.info(f"  [LANDING] '{entity}' ({id_sucursal}): {loaded} registros re-cargados desde {len(paths)} archivos.")
+        return changed_tables
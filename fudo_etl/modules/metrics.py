@@ -0,0 +1,165 @@
+# fudo_etl/modules/metrics.py
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # db_manager importa este módulo (instrumenta insert_raw_data)
+    from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+# Buckets (límites superiores) de los histogramas; +Inf se agrega siempre al exportar
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+THROUGHPUT_BUCKETS = (10, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+# Métricas conocidas: (tipo, ayuda, buckets). Las no declaradas se tratan como histogramas de latencia.
+METRIC_DEFINITIONS = {
+    'fudo_api_request_seconds': ('histogram', "Latencia de cada GET paginado a la API de Fudo (espera de red).", LATENCY_BUCKETS),
+    'fudo_api_json_parse_seconds': ('histogram', "Tiempo de parseo JSON de cada página de la API.", LATENCY_BUCKETS),
+    'fudo_api_throttle_sleep_seconds': ('counter', "Segundos dormidos por throttling (delay entre páginas, limitador y backoff).", None),
+    'fudo_api_pages': ('counter', "Páginas obtenidas de la API.", None),
+    'fudo_api_retries': ('counter', "Reintentos por HTTP 429/5xx o errores de conexión.", None),
+    'etl_prepare_seconds': ('histogram', "Preparación de registros RAW (payload canónico + checksum md5) por página.", LATENCY_BUCKETS),
+    'etl_db_load_seconds': ('histogram', "Duración de cada insert_raw_data.", LATENCY_BUCKETS),
+    'etl_db_load_rows_per_second': ('histogram', "Filas por segundo de cada insert_raw_data.", THROUGHPUT_BUCKETS),
+    'etl_db_load_rows': ('counter', "Filas enviadas a insert_raw_data.", None),
+    'etl_startup_seconds': ('histogram', "Costo de arranque del proceso por etapa (imports, despliegue DDL, total).", LATENCY_BUCKETS),
+    'etl_transform_step_seconds': ('histogram', "Duración de cada paso de transformación (MV, tabla de hechos, rollups).", LATENCY_BUCKETS),
+}
+
+
+def _labels_key(labels: dict | None) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in (labels or {}).items()))
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """
+    Registro en memoria de contadores e histogramas de la corrida (thread-safe: lo usan los hilos
+    del pipeline y del backfill). Se exporta como texto OpenMetrics (para un scraper o el
+    textfile collector de node_exporter) y a la tabla etl_fudo_metrics.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def inc(self, name: str, value: float = 1, labels: dict | None = None):
+        with self._lock:
+            key = (name, _labels_key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: dict | None = None):
+        buckets = METRIC_DEFINITIONS.get(name, ('histogram', '', LATENCY_BUCKETS))[2] or LATENCY_BUCKETS
+        with self._lock:
+            key = (name, _labels_key(labels))
+            series = self._histograms.get(key)
+            if series is None:
+                series = {'buckets': buckets, 'bucket_counts': [0] * len(buckets), 'count': 0, 'sum': 0.0,
+                          'min': math.inf, 'max': 0.0}
+                self._histograms[key] = series
+            for i, upper_bound in enumerate(buckets):
+                if value <= upper_bound:
+                    series['bucket_counts'][i] += 1
+            series['count'] += 1
+            series['sum'] += value
+            series['min'] = min(series['min'], value)
+            series['max'] = max(series['max'], value)
+
+    @contextmanager
+    def timer(self, name: str, labels: dict | None = None):
+        """Mide el bloque y lo registra en el histograma name (en segundos)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    # --- Exportación ---
+    @staticmethod
+    def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        return "{" + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in items) + "}"
+
+    def render_openmetrics(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: {**series, 'bucket_counts': list(series['bucket_counts'])}
+                          for key, series in self._histograms.items()}
+
+        lines = []
+        for name in sorted({key[0] for key in counters} | {key[0] for key in histograms}):
+            metric_type, help_text, _ = METRIC_DEFINITIONS.get(name, ('histogram', '', None))
+            lines.append(f"# TYPE {name} {metric_type}")
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f"{name}_total{self._format_labels(labels)} {value}")
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                for upper_bound, bucket_count in zip(series['buckets'], series['bucket_counts']):
+                    lines.append(f"{name}_bucket{self._format_labels(labels, (('le', upper_bound),))} {bucket_count}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {series['count']}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {series['sum']:.6f}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_openmetrics(self, path: str) -> str:
+        """Escribe el texto OpenMetrics de forma atómica (un scraper nunca lee un archivo a medias)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_openmetrics())
+        os.replace(tmp_path, path)
+        logger.info(f"  [METRICS] Métricas OpenMetrics escritas en '{path}'.")
+        return path
+
+    def flush_to_db(self, db_manager: 'DBManager', run_id: str):
+        """Guarda un resumen por serie (count/sum/min/max y buckets) en etl_fudo_metrics."""
+        with self._lock:
+            rows = [
+                (run_id, name, json.dumps(dict(labels)), 'counter', 1, value, None, None, None)
+                for (name, labels), value in self._counters.items()
+            ] + [
+                (run_id, name, json.dumps(dict(labels)), 'histogram', series['count'], series['sum'],
+                 series['min'], series['max'],
+                 json.dumps({str(upper_bound): count for upper_bound, count in zip(series['buckets'], series['bucket_counts'])}))
+                for (name, labels), series in self._histograms.items()
+            ]
+        if not rows:
+            return
+        db_manager.execute_upsert("""
+            INSERT INTO public.etl_fudo_metrics
+                (run_id, metric_name, labels, metric_type, sample_count, sample_sum, sample_min, sample_max, buckets)
+            VALUES %s
+            ON CONFLICT (run_id, metric_name, labels) DO UPDATE SET
+                sample_count = EXCLUDED.sample_count,
+                sample_sum = EXCLUDED.sample_sum,
+                sample_min = EXCLUDED.sample_min,
+                sample_max = EXCLUDED.sample_max,
+                buckets = EXCLUDED.buckets,
+                recorded_at_utc = CURRENT_TIMESTAMP;
+        """, rows)
+        logger.info(f"  [METRICS] {len(rows)} series guardadas en etl_fudo_metrics para la corrida '{run_id}'.")
+
+
+# Registro del proceso: los módulos instrumentados registran aquí y main.py lo exporta al final de la corrida
+METRICS = MetricsRegistry()
@@ -0,0 +1,286 @@
+# fudo_etl/modules/parquet_export.py
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+# Tablas/MVs analíticas exportadas. month_expr: mes de la partición (None = solo por sucursal, ej. catálogos).
+# sources: tablas RAW de las que sale la MV y el atributo del payload del que se deriva su mes (el mismo que usa la MV).
+# Con FACT_LAYER_MODE=partitioned, mv_sales_order/mv_sales_order_line/mv_pagos son vistas sobre fact_*: se exportan igual.
+PARQUET_EXPORT_CONFIGS = {
+    'mv_sales_order': {'month_expr': "date_trunc('month', date_order AT TIME ZONE 'UTC')::DATE",
+                       'sources': {'fudo_raw_sales': 'createdAt'}},
+    'mv_sales_order_line': {'month_expr': "date_trunc('month', date_order)::DATE",
+                            'sources': {'fudo_raw_items': 'createdAt'}},
+    'mv_pagos': {'month_expr': "date_trunc('month', payment_date AT TIME ZONE 'UTC')::DATE",
+                 'sources': {'fudo_raw_payments': 'createdAt', 'fudo_raw_sales': 'createdAt'}},
+    'mv_expenses': {'month_expr': "date_trunc('month', expense_date AT TIME ZONE 'UTC')::DATE",
+                    'sources': {'fudo_raw_expenses': 'date'}},
+    'mv_productos': {'month_expr': None, 'sources': {'fudo_raw_products': None}},
+    'mv_product_prices_by_branch': {'month_expr': None, 'sources': {'fudo_raw_products': None}},
+}
+
+# Margen hacia atrás sobre el inicio del export anterior: cubre filas RAW extraídas antes de ese instante
+# pero confirmadas después (cargas concurrentes, ej. modo follow)
+TOUCHED_LOOKBACK = timedelta(hours=1)
+
+PARTITION_FILE_NAME = "data.parquet"
+NULL_PARTITION_VALUE = "__HIVE_DEFAULT_PARTITION__"
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def _import_pyarrow():
+    # Import diferido: pyarrow solo se carga si el export está activo
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+def _column_spec(pg_type: str):
+    """(cast SQL, tipo Arrow) estable para un tipo de Postgres: el esquema no depende de los valores de cada partición."""
+    pa, _ = _import_pyarrow()
+    if pg_type in ('smallint', 'integer', 'bigint'):
+        return '::BIGINT', pa.int64()
+    if pg_type in ('double precision', 'real') or pg_type.startswith('numeric'):
+        return '::DOUBLE PRECISION', pa.float64()
+    if pg_type == 'boolean':
+        return '', pa.bool_()
+    if pg_type == 'timestamp with time zone':
+        return '', pa.timestamp('us', tz='UTC')
+    if pg_type == 'timestamp without time zone':
+        return '', pa.timestamp('us')
+    if pg_type == 'date':
+        return '', pa.date32()
+    return '::TEXT', pa.string()  # text, varchar, json/jsonb (como texto JSON), etc.
+
+
+class AnalyticParquetExporter:
+    """
+    Export incremental de la capa analítica a Parquet (zstd) para el modo importación de Power BI, tras la transformación:
+    {base_dir}/{mv}/id_sucursal={sucursal}/month={YYYY-MM}/data.parquet (o solo id_sucursal= para catálogos).
+
+    - Huella por partición (filas + suma de md5 de cada fila): solo se reescriben las particiones nuevas o
+      cuya huella cambió; las que ya no tienen filas se borran.
+    - Solo se calcula la huella de las particiones tocadas desde el export anterior (versiones RAW extraídas
+      o tombstones detectados desde entonces, mes derivado del payload como en las MVs); el resto conserva
+      la huella del manifest. El primer export de una MV o un cambio de columnas recorren la MV completa.
+    - Esquema Arrow fijo derivado de los tipos de Postgres de la MV (no de los valores de cada partición).
+    - manifest.json (escritura atómica) lista cada partición con su huella, filas y export_id/exported_at_utc,
+      y en 'removed' las particiones eliminadas con el export_id que las borró: un lector aplica las particiones y
+      las bajas con export_id mayor al último leído. Las bajas se conservan removed_retention_days días, así un
+      lector que se saltea exports no pierde borrados.
+    """
+    def __init__(self, db_manager: DBManager, base_dir: str, compression: str = 'zstd', removed_retention_days: int = 30):
+        self.db_manager = db_manager
+        self.base_dir = base_dir
+        self.compression = compression
+        self.removed_retention_days = removed_retention_days
+        self.manifest_path = os.path.join(base_dir, MANIFEST_FILE_NAME)
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {'tables': {}}
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _get_columns(self, mv_name: str) -> list[tuple[str, str]]:
+        return self.db_manager.fetch_all("""
+            SELECT attname, format_type(atttypid, atttypmod)
+            FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum;
+        """, (f"public.{mv_name}",))
+
+    def _get_touched_partitions(self, mv_name: str, since: datetime) -> set[tuple]:
+        """
+        (id_sucursal, mes) que pueden haber cambiado desde 'since': versiones RAW extraídas o tombstones
+        detectados desde entonces en las tablas fuente de la MV. Se incluyen los meses de ±1 día alrededor
+        de la fecha del payload: la MV puede agrupar por otra zona horaria (ej. date_order::DATE).
+        """
+        config = PARQUET_EXPORT_CONFIGS[mv_name]
+        by_month = config['month_expr'] is not None
+        touched = set()
+        for raw_table, date_attribute in config['sources'].items():
+            date_select = (f"(r.payload_json -> 'attributes' ->> '{date_attribute}')::TIMESTAMP WITH TIME ZONE"
+                           if by_month and date_attribute else "NULL::TIMESTAMP WITH TIME ZONE")
+            rows = self.db_manager.fetch_all(f"""
+                SELECT DISTINCT c.id_sucursal, date_trunc('month', m.ts)::DATE
+                FROM (
+                    SELECT r.id_sucursal_fuente AS id_sucursal, {date_select} AS ts
+                    FROM public.{raw_table} r
+                    WHERE r.fecha_extraccion_utc >= %(since)s
+                    UNION ALL
+                    SELECT r.id_sucursal_fuente, {date_select}
+                    FROM public.etl_fudo_tombstones t
+                    JOIN public.{raw_table} r ON r.id_sucursal_fuente = t.id_sucursal AND r.id_fudo = t.id_fudo
+                    WHERE t.raw_table = %(raw_table)s AND t.detected_at_utc >= %(since)s
+                ) c
+                CROSS JOIN LATERAL (VALUES (c.ts - INTERVAL '1 day'), (c.ts + INTERVAL '1 day')) AS m(ts);
+            """, {'since': since, 'raw_table': raw_table})
+            touched.update((id_sucursal, month if by_month else None) for id_sucursal, month in rows)
+        return touched
+
+    def _get_fingerprints(self, mv_name: str, month_expr: str | None,
+                          touched: set[tuple] | None = None) -> dict[str, tuple]:
+        """{clave de partición: (id_sucursal, mes, filas, huella)} de la MV (solo de las particiones 'touched' si se indican)."""
+        month_select = month_expr or "NULL::DATE"
+        touched_filter = ""
+        params = None
+        if touched is not None:
+            if not touched:
+                return {}
+            touched_filter = f"""
+            WHERE EXISTS (
+                SELECT 1 FROM unnest(%(branches)s::TEXT[], %(months)s::DATE[]) AS k(id_sucursal, partition_month)
+                WHERE k.id_sucursal IS NOT DISTINCT FROM t.id_sucursal
+                  AND k.partition_month IS NOT DISTINCT FROM {month_select}
+            )"""
+            params = {'branches': [branch for branch, _ in touched], 'months': [month for _, month in touched]}
+        rows = self.db_manager.fetch_all(f"""
+            SELECT t.id_sucursal, {month_select} AS partition_month, COUNT(*),
+                   SUM(('x' || substr(md5(t::TEXT), 1, 16))::BIT(64)::BIGINT)
+            FROM public.{mv_name} t{touched_filter}
+            GROUP BY 1, 2;
+        """, params)
+        partitions = {}
+        for id_sucursal, month, row_count, row_hash_sum in rows:
+            partitions[self._partition_key(id_sucursal, month, month_expr is not None)] = (
+                id_sucursal, month, row_count, f"{row_count}:{row_hash_sum}"
+            )
+        return partitions
+
+    @staticmethod
+    def _partition_key(id_sucursal: str | None, month, by_month: bool) -> str:
+        key = f"id_sucursal={id_sucursal if id_sucursal is not None else NULL_PARTITION_VALUE}"
+        if by_month:
+            key += f"/month={month.strftime('%Y-%m') if month else NULL_PARTITION_VALUE}"
+        return key
+
+    def _write_partition(self, mv_name: str, columns: list[tuple[str, str]], month_expr: str | None,
+                         id_sucursal: str | None, month, path: str) -> int:
+        pa, pq = _import_pyarrow()
+        specs = [(name, *_column_spec(pg_type)) for name, pg_type in columns]
+        select_list = ", ".join(f'"{name}"{cast}' for name, cast, _ in specs)
+        conditions = ["id_sucursal IS NOT DISTINCT FROM %s"]
+        params = [id_sucursal]
+        if month_expr:
+            conditions.append(f"{month_expr} IS NOT DISTINCT FROM %s")
+            params.append(month)
+        rows = self.db_manager.fetch_all(
+            f"SELECT {select_list} FROM public.{mv_name} WHERE {' AND '.join(conditions)};", tuple(params)
+        )
+        values = list(zip(*rows)) if rows else [[] for _ in specs]
+        schema = pa.schema([(name, arrow_type) for name, _, arrow_type in specs])
+        table = pa.Table.from_arrays(
+            [pa.array(column, type=arrow_type) for column, (_, _, arrow_type) in zip(values, specs)], schema=schema
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path, compression=self.compression)
+        os.replace(tmp_path, path)
+        return len(rows)
+
+    def export_table(self, mv_name: str, manifest: dict, export_id: str, full: bool = False) -> tuple[int, int]:
+        """
+        Sincroniza las particiones de una MV con su huella actual. Devuelve (reescritas, eliminadas).
+        full=True (o primer export / cambio de columnas) calcula la huella de toda la MV.
+        """
+        month_expr = PARQUET_EXPORT_CONFIGS[mv_name]['month_expr']
+        scan_started_at = datetime.now(timezone.utc)
+        columns = self._get_columns(mv_name)
+        schema_signature = [f"{name}:{pg_type}" for name, pg_type in columns]
+        table_state = manifest['tables'].setdefault(mv_name, {'schema': schema_signature, 'partitions': {}})
+        if table_state.get('schema') != schema_signature:
+            logger.info(f"  [EXPORT] '{mv_name}' cambió de columnas: se reescriben todas sus particiones.")
+            table_state['schema'] = schema_signature
+            table_state['partitions'] = {key: {**entry, 'fingerprint': None} for key, entry in table_state['partitions'].items()}
+            full = True
+
+        previous = table_state['partitions']
+        last_scan = table_state.get('scanned_at_utc')
+        if full or not last_scan:
+            current = self._get_fingerprints(mv_name, month_expr)
+            stale_keys = set(previous) - set(current)
+        else:
+            touched = self._get_touched_partitions(mv_name, datetime.fromisoformat(last_scan) - TOUCHED_LOOKBACK)
+            current = self._get_fingerprints(mv_name, month_expr, touched)
+            touched_keys = {self._partition_key(id_sucursal, month, month_expr is not None) for id_sucursal, month in touched}
+            # Las particiones no tocadas conservan la huella del manifest; las tocadas sin filas se borran
+            stale_keys = (touched_keys & set(previous)) - set(current)
+            logger.info(f"  [EXPORT] '{mv_name}': {len(touched_keys)} particiones tocadas desde el export anterior.")
+        rewritten = 0
+        for key, (id_sucursal, month, _, fingerprint) in sorted(current.items()):
+            if previous.get(key, {}).get('fingerprint') == fingerprint:
+                continue
+            relative_path = os.path.join(mv_name, key, PARTITION_FILE_NAME)
+            row_count = self._write_partition(mv_name, columns, month_expr, id_sucursal, month,
+                                              os.path.join(self.base_dir, relative_path))
+            previous[key] = {
+                'path': relative_path, 'rows': row_count, 'fingerprint': fingerprint,
+                'export_id': export_id, 'exported_at_utc': datetime.now(timezone.utc).isoformat(),
+            }
+            rewritten += 1
+
+        removed = 0
+        for key in sorted(stale_keys):
+            shutil.rmtree(os.path.join(self.base_dir, mv_name, key), ignore_errors=True)
+            del previous[key]
+            manifest['removed'].append({
+                'table': mv_name, 'partition': key, 'export_id': export_id,
+                'removed_at_utc': datetime.now(timezone.utc).isoformat(),
+            })
+            removed += 1
+        table_state['scanned_at_utc'] = scan_started_at.isoformat()
+        return rewritten, removed
+
+    def _prune_removed(self, removed: list[dict]) -> list[dict]:
+        """Descarta las bajas más viejas que removed_retention_days (0 = conservar todas)."""
+        if self.removed_retention_days <= 0:
+            return removed
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.removed_retention_days)
+        # Las entradas sin removed_at_utc (manifests anteriores) se fechan por su export_id
+        return [
+            entry for entry in removed
+            if (datetime.fromisoformat(entry['removed_at_utc']) if entry.get('removed_at_utc')
+                else datetime.strptime(entry['export_id'], '%Y%m%dT%H%M%S%fZ').replace(tzinfo=timezone.utc)) >= cutoff
+        ]
+
+    def export_all(self, tables: list[str] | None = None, full: bool = False) -> dict[str, tuple[int, int]]:
+        """Exporta las MVs configuradas y escribe el manifest. Un error en una MV no frena al resto."""
+        _import_pyarrow()  # Sin pyarrow (requirements-parquet.txt) falla una sola vez, antes de tocar ninguna MV
+        os.makedirs(self.base_dir, exist_ok=True)
+        manifest = self._load_manifest()
+        export_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        manifest['removed'] = self._prune_removed(manifest.get('removed', []))
+        results = {}
+        for mv_name in tables or PARQUET_EXPORT_CONFIGS:
+            start = time.monotonic()
+            try:
+                results[mv_name] = self.export_table(mv_name, manifest, export_id, full=full)
+            except Exception as e:
+                self.db_manager.connection.rollback()
+                logger.error(f"  [EXPORT] ERROR exportando '{mv_name}' a Parquet: {e}", exc_info=True)
+                continue
+            rewritten, removed = results[mv_name]
+            total = len(manifest['tables'][mv_name]['partitions'])
+            logger.info(
+                f"  [EXPORT] '{mv_name}': {rewritten} particiones reescritas, {removed} eliminadas, "
+                f"{total - rewritten} sin cambios ({time.monotonic() - start:.1f}s)."
+            )
+        manifest['export_id'] = export_id
+        manifest['updated_at_utc'] = datetime.now(timezone.utc).isoformat()
+        self._write_manifest(manifest)
+        return results
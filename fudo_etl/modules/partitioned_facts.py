@@ -0,0 +1,404 @@
+# fudo_etl/modules/partitioned_facts.py
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from .analytic_schema_swap import get_external_dependents, recreate_views_sql
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+# Tablas de hechos particionadas por mes (RANGE sobre la fecha de creación en UTC).
+# Cada SELECT replica la lógica de la MV equivalente del DER y recibe el filtro mensual
+# en {month_filter}. El prefiltro por texto (ISO 8601 'Z') usa el índice de expresión
+# sobre attributes.createdAt de la tabla RAW; el filtro por timestamp garantiza los límites exactos.
+FACT_TABLES_CONFIGS = {
+    'fact_sales_order': {
+        'raw_table': 'fudo_raw_sales',
+        'compat_view': 'mv_sales_order',
+        'select_sql': """
+            SELECT DISTINCT ON (s.id_fudo, s.id_sucursal_fuente)
+                (s.payload_json ->> 'id')::FLOAT::INTEGER AS id_order,
+                s.id_sucursal_fuente AS id_sucursal,
+                (s.payload_json ->> 'id') || '-' || s.id_sucursal_fuente AS order_key,
+                0.0::FLOAT AS amount_tax,
+                (s.payload_json -> 'attributes' ->> 'total')::FLOAT AS amount_total,
+                (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS date_order,
+                (s.payload_json -> 'attributes' ->> 'saleType') AS sale_type,
+                (s.payload_json -> 'relationships' -> 'table' -> 'data' ->> 'id') AS table_id,
+                (s.payload_json -> 'relationships' -> 'waiter' -> 'data' ->> 'id') AS waiter_id,
+                (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
+                (s.payload_json -> 'attributes' ->> 'closedAt')::TIMESTAMP WITH TIME ZONE AS closed_at
+            FROM public.fudo_raw_sales s
+            WHERE
+                s.payload_json ->> 'id' IS NOT NULL AND
+                s.id_sucursal_fuente IS NOT NULL AND
+                (s.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL AND
+                (s.payload_json -> 'attributes' ->> 'total') IS NOT NULL AND
+                (s.payload_json -> 'attributes' ->> 'saleState') IS NOT NULL AND
+                (s.payload_json -> 'attributes' ->> 'saleState') != 'CANCELED'
+                AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_sales' AND t.id_sucursal = s.id_sucursal_fuente AND t.id_fudo = s.id_fudo)
+                {month_filter}
+            ORDER BY s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc DESC
+        """,
+        'alias': 's',
+        'key_column': 'order_key',
+    },
+    'fact_sales_order_line': {
+        'raw_table': 'fudo_raw_items',
+        'compat_view': 'mv_sales_order_line',
+        'select_sql': """
+            SELECT DISTINCT ON (i.id_fudo, i.id_sucursal_fuente)
+                (i.payload_json ->> 'id')::FLOAT::INTEGER AS id_order_line_fudo,
+                i.id_sucursal_fuente AS id_sucursal,
+                (i.payload_json ->> 'id') || '-' || i.id_sucursal_fuente AS order_line_key,
+                (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_order_fudo,
+                (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') || '-' || i.id_sucursal_fuente AS order_key_fk,
+                (i.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS date_order_time,
+                (i.payload_json -> 'attributes' ->> 'createdAt')::DATE AS date_order,
+                (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_product_fudo,
+                (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') || '-' || i.id_sucursal_fuente AS product_key_fk,
+                COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) AS qty_from_api,
+                COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) AS price_from_api,
+                CASE
+                    WHEN COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0
+                    THEN COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) / COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0)
+                    ELSE 0.0
+                END AS price_unit,
+                COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT::INTEGER), 0) AS qty,
+                (
+                    CASE
+                        WHEN COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0
+                        THEN COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) / COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0)
+                        ELSE 0.0
+                    END
+                ) * COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) AS amount_total
+            FROM public.fudo_raw_items i
+            WHERE i.payload_json ->> 'id' IS NOT NULL
+              AND (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') IS NOT NULL
+              AND (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') IS NOT NULL
+              AND (i.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL
+              AND (i.payload_json -> 'attributes' ->> 'price') IS NOT NULL
+              AND (i.payload_json -> 'attributes' ->> 'quantity') IS NOT NULL
+              AND (i.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN IS NOT TRUE
+              AND COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0
+              AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_items' AND t.id_sucursal = i.id_sucursal_fuente AND t.id_fudo = i.id_fudo)
+              {month_filter}
+            ORDER BY i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc DESC
+        """,
+        'alias': 'i',
+        'key_column': 'order_line_key',
+    },
+    'fact_pagos': {
+        'raw_table': 'fudo_raw_payments',
+        'compat_view': 'mv_pagos',
+        'select_sql': """
+            SELECT DISTINCT ON (p.id_fudo, p.id_sucursal_fuente)
+                (p.payload_json ->> 'id')::FLOAT::INTEGER AS id,
+                p.id_sucursal_fuente AS id_sucursal,
+                (p.payload_json ->> 'id') || '-' || p.id_sucursal_fuente AS payment_key,
+                (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER AS pos_order_id,
+                (p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_payment,
+                (p.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
+                CASE WHEN (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') IS NOT NULL THEN 'EXPENSE'
+                     WHEN (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') IS NOT NULL THEN 'SALE'
+                     ELSE 'OTHER' END AS transaction_type,
+                CASE WHEN (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') IS NOT NULL THEN -((p.payload_json -> 'attributes' ->> 'amount')::FLOAT)
+                     ELSE (p.payload_json -> 'attributes' ->> 'amount')::FLOAT END AS signed_amount,
+                (p.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS payment_date,
+                (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') AS expense_id,
+                (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') || '-' || p.id_sucursal_fuente AS order_key_fk
+            FROM public.fudo_raw_payments p
+            WHERE p.payload_json ->> 'id' IS NOT NULL
+              AND (p.payload_json -> 'attributes' ->> 'amount') IS NOT NULL
+              AND (p.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL
+              AND (p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') IS NOT NULL
+              AND (p.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN IS NOT TRUE
+              AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_tombstones t WHERE t.raw_table = 'fudo_raw_payments' AND t.id_sucursal = p.id_sucursal_fuente AND t.id_fudo = p.id_fudo)
+              {month_filter}
+            ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC
+        """,
+        'alias': 'p',
+        'key_column': 'payment_key',
+    },
+}
+
+# Nombres de las MVs monolíticas reemplazadas por vistas sobre las tablas de hechos en modo particionado
+FACT_COMPAT_VIEWS = {cfg['compat_view'] for cfg in FACT_TABLES_CONFIGS.values()}
+
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+class PartitionedFactManager:
+    """
+    Mantiene las tablas de hechos particionadas por mes (fact_sales_order, fact_sales_order_line, fact_pagos).
+    - Solo se reconstruyen las particiones (meses) con filas RAW extraídas desde 'since'.
+    - Los meses cerrados hace más de freeze_after_days quedan congelados y no se vuelven a reconstruir
+      (salvo force_rebuild_frozen).
+    - Las MVs monolíticas del DER (mv_sales_order, mv_sales_order_line, mv_pagos) se reemplazan por
+      vistas sobre las tablas de hechos, así Power BI no cambia de objeto y gana poda por fecha.
+    """
+    def __init__(self, db_manager: DBManager, freeze_after_days: int = 7):
+        self.db_manager = db_manager
+        self.freeze_after_days = freeze_after_days
+
+    @staticmethod
+    def partition_name(fact_table: str, month: date) -> str:
+        return f"{fact_table}_p{month.strftime('%Y%m')}"
+
+    def _is_closed_month(self, month: date) -> bool:
+        """Un mes está cerrado cuando pasaron freeze_after_days desde su último día (margen para ediciones tardías)."""
+        month_end = datetime.combine(_next_month(month), datetime.min.time(), tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) >= month_end + timedelta(days=self.freeze_after_days)
+
+    def _get_registered_partitions(self, fact_table: str) -> dict[date, bool]:
+        rows = self.db_manager.fetch_all(
+            "SELECT partition_month, is_frozen FROM public.etl_fudo_fact_partitions WHERE fact_table = %s;",
+            (fact_table,)
+        )
+        return {row[0]: row[1] for row in rows}
+
+    def _get_touched_months(self, raw_table: str, since: datetime | None) -> list[date]:
+        """Meses (UTC, por attributes.createdAt) con filas RAW extraídas desde 'since' (o todos si since es None)."""
+        since_filter = "AND fecha_extraccion_utc >= %s" if since else ""
+        rows = self.db_manager.fetch_all(f"""
+            SELECT DISTINCT date_trunc('month', ((payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE) AT TIME ZONE 'UTC')::DATE
+            FROM public.{raw_table}
+            WHERE (payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL {since_filter};
+        """, (since,) if since else None)
+        return sorted(row[0] for row in rows if row[0] is not None)
+
+    def _create_partition_sql(self, fact_table: str, month: date) -> str:
+        month_start = datetime.combine(month, datetime.min.time(), tzinfo=timezone.utc)
+        month_end = datetime.combine(_next_month(month), datetime.min.time(), tzinfo=timezone.utc)
+        return f"""
+            CREATE TABLE IF NOT EXISTS public.{self.partition_name(fact_table, month)} PARTITION OF public.{fact_table}
+                FOR VALUES FROM ('{month_start.isoformat()}') TO ('{month_end.isoformat()}');
+        """
+
+    def rebuild_partition(self, fact_table: str, month: date):
+        """Crea (si falta) y reconstruye una partición mensual en una sola transacción (DELETE + INSERT)."""
+        cfg = FACT_TABLES_CONFIGS[fact_table]
+        alias = cfg['alias']
+        partition = self.partition_name(fact_table, month)
+        month_start = datetime.combine(month, datetime.min.time(), tzinfo=timezone.utc)
+        month_end = datetime.combine(_next_month(month), datetime.min.time(), tzinfo=timezone.utc)
+        created_expr = f"({alias}.payload_json -> 'attributes' ->> 'createdAt')"
+        month_filter = (
+            f"AND {created_expr} >= %(prefilter_from)s AND {created_expr} < %(prefilter_to)s "
+            f"AND {created_expr}::TIMESTAMP WITH TIME ZONE >= %(month_start)s "
+            f"AND {created_expr}::TIMESTAMP WITH TIME ZONE < %(month_end)s"
+        )
+        params = {
+            # Prefiltro textual con un día de margen para cubrir offsets distintos de 'Z'
+            'prefilter_from': (month_start - timedelta(days=1)).strftime('%Y-%m-%d'),
+            'prefilter_to': (month_end + timedelta(days=1)).strftime('%Y-%m-%d'),
+            'month_start': month_start,
+            'month_end': month_end,
+            'fact_table': fact_table,
+            'partition_month': month,
+            'partition_name': partition,
+            'is_frozen': self._is_closed_month(month),
+        }
+        sql = f"""
+            {self._create_partition_sql(fact_table, month)}
+            DELETE FROM public.{partition};
+            INSERT INTO public.{partition}
+            {cfg['select_sql'].format(month_filter=month_filter)};
+            INSERT INTO public.etl_fudo_fact_partitions (fact_table, partition_month, partition_name, is_frozen, row_count, last_rebuilt_utc)
+            VALUES (%(fact_table)s, %(partition_month)s, %(partition_name)s, %(is_frozen)s,
+                    (SELECT COUNT(*) FROM public.{partition}), CURRENT_TIMESTAMP)
+            ON CONFLICT (fact_table, partition_month) DO UPDATE SET
+                partition_name = EXCLUDED.partition_name,
+                is_frozen = EXCLUDED.is_frozen,
+                row_count = EXCLUDED.row_count,
+                last_rebuilt_utc = EXCLUDED.last_rebuilt_utc;
+        """
+        self.db_manager.execute_query(sql, params)
+
+    def refresh_fact_table(self, fact_table: str, since: datetime | None, force_rebuild_frozen: bool = False) -> int:
+        """Reconstruye las particiones tocadas de una tabla de hechos. Devuelve la cantidad reconstruida."""
+        cfg = FACT_TABLES_CONFIGS[fact_table]
+        registered = self._get_registered_partitions(fact_table)
+        # Sin particiones registradas (primera construcción): se construye todo el historial
+        effective_since = since if registered else None
+        touched_months = self._get_touched_months(cfg['raw_table'], effective_since)
+
+        rebuilt = 0
+        for month in touched_months:
+            if registered.get(month) and not force_rebuild_frozen:
+                logger.info(f"    [FACT] '{self.partition_name(fact_table, month)}' congelada (mes cerrado). Se omite.")
+                continue
+            start = time.monotonic()
+            self.rebuild_partition(fact_table, month)
+            rebuilt += 1
+            logger.info(f"    [FACT] Partición '{self.partition_name(fact_table, month)}' reconstruida en {time.monotonic() - start:.1f}s.")
+        logger.info(f"  [FACT] '{fact_table}': {rebuilt} particiones reconstruidas de {len(touched_months)} meses tocados.")
+        return rebuilt
+
+    def refresh_changed_rows(self, fact_table: str, since: datetime) -> bool:
+        """
+        Actualización a nivel de fila (modo follow): reemplaza en la tabla de hechos solo las filas cuyos
+        registros RAW se extrajeron desde 'since' (DELETE por clave + INSERT del SELECT filtrado a esas claves),
+        en una transacción. Las filas que dejaron de cumplir los filtros (ej. ventas canceladas) quedan borradas.
+        Si la tabla todavía no tiene particiones registradas, hace la construcción completa por meses.
+        Devuelve True si hubo filas RAW cambiadas.
+        """
+        cfg = FACT_TABLES_CONFIGS[fact_table]
+        if not self._get_registered_partitions(fact_table):
+            self.refresh_fact_table(fact_table, None)
+            return True
+
+        touched_months = self._get_touched_months(cfg['raw_table'], since)
+        if not touched_months:
+            return False
+
+        alias = cfg['alias']
+        key_filter = (
+            f"AND EXISTS (SELECT 1 FROM tmp_fact_changed_keys k "
+            f"WHERE k.id_fudo = {alias}.id_fudo AND k.id_sucursal_fuente = {alias}.id_sucursal_fuente)"
+        )
+        create_partitions = "\n".join(self._create_partition_sql(fact_table, month) for month in touched_months)
+        sql = f"""
+            {create_partitions}
+            CREATE TEMP TABLE tmp_fact_changed_keys ON COMMIT DROP AS
+                SELECT DISTINCT id_fudo, id_sucursal_fuente
+                FROM public.{cfg['raw_table']}
+                WHERE fecha_extraccion_utc >= %(since)s;
+            DELETE FROM public.{fact_table} f
+            USING tmp_fact_changed_keys k
+            WHERE f.{cfg['key_column']} = k.id_fudo || '-' || k.id_sucursal_fuente;
+            INSERT INTO public.{fact_table}
+            {cfg['select_sql'].format(month_filter=key_filter)};
+        """
+        start = time.monotonic()
+        self.db_manager.execute_query(sql, {'since': since})
+        logger.info(f"    [FACT] '{fact_table}': filas cambiadas desde {since} actualizadas en {time.monotonic() - start:.1f}s.")
+        return True
+
+    def purge_tombstoned_rows(self, detected_since: datetime) -> int:
+        """
+        Borra de las tablas de hechos las filas marcadas en etl_fudo_tombstones desde 'detected_since'.
+        Los borrados no tocan la capa RAW, así que ningún mes queda "tocado": sin esto las particiones
+        congeladas conservarían las filas. Devuelve la cantidad de filas borradas.
+        """
+        deleted = 0
+        for fact_table, cfg in FACT_TABLES_CONFIGS.items():
+            if not self._get_registered_partitions(fact_table):
+                continue
+            deleted += self.db_manager.execute_scalar(f"""
+                WITH deleted AS (
+                    DELETE FROM public.{fact_table} f
+                    USING public.etl_fudo_tombstones t
+                    WHERE t.raw_table = %s AND t.detected_at_utc >= %s
+                      AND f.{cfg['key_column']} = t.id_fudo || '-' || t.id_sucursal
+                    RETURNING 1
+                )
+                SELECT COUNT(*) FROM deleted;
+            """, (cfg['raw_table'], detected_since)) or 0
+        if deleted:
+            logger.info(f"  [FACT] {deleted} filas borradas en Fudo eliminadas de las tablas de hechos.")
+        return deleted
+
+    def rebuild_resurrected_partitions(self, resurrected_keys: dict[str, list[tuple[str, str]]]) -> int:
+        """
+        Registros que reaparecieron en la API (tombstone eliminado): purge_tombstoned_rows ya los borró de las
+        tablas de hechos y sus meses no quedan "tocados". Se reconstruyen esos meses aunque estén congelados
+        (como force_rebuild_frozen). resurrected_keys: {tabla RAW: [(id_sucursal, id_fudo)]}. Devuelve las particiones reconstruidas.
+        """
+        rebuilt = 0
+        for fact_table, cfg in FACT_TABLES_CONFIGS.items():
+            keys = resurrected_keys.get(cfg['raw_table'])
+            if not keys or not self._get_registered_partitions(fact_table):
+                continue
+            rows = self.db_manager.fetch_all(f"""
+                SELECT DISTINCT date_trunc('month', ((r.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE) AT TIME ZONE 'UTC')::DATE
+                FROM public.{cfg['raw_table']} r
+                JOIN unnest(%s::TEXT[], %s::TEXT[]) AS k(id_sucursal, id_fudo)
+                  ON r.id_sucursal_fuente = k.id_sucursal AND r.id_fudo = k.id_fudo
+                WHERE (r.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL;
+            """, ([key[0] for key in keys], [key[1] for key in keys]))
+            for month in sorted(row[0] for row in rows if row[0] is not None):
+                self.rebuild_partition(fact_table, month)
+                rebuilt += 1
+                logger.info(f"    [FACT] Partición '{self.partition_name(fact_table, month)}' reconstruida por registros reaparecidos.")
+        return rebuilt
+
+    def _dependent_views(self, relation_name: str) -> list[tuple[str, str, str, str]]:
+        """Vistas (directas y anidadas) que dependen de public.relation_name; una MV dependiente aborta el cambio."""
+        dependents = get_external_dependents(self.db_manager, 'public', [relation_name], recursive=True)
+        blocking = [f"{dep_schema}.{dep_name}" for dep_schema, dep_name, relkind, _ in dependents if relkind != 'v']
+        if blocking:
+            raise RuntimeError(
+                f"No se reemplaza '{relation_name}': MVs que dependen de él ({', '.join(blocking)}) no se pueden "
+                f"recrear automáticamente. Eliminarlas y volver a crearlas tras el cambio de FACT_LAYER_MODE."
+            )
+        return dependents
+
+    @staticmethod
+    def _drop_views_sql(dependents: list[tuple[str, str, str, str]]) -> str:
+        # Un único DROP con todas las dependientes: las dependencias entre ellas no requieren CASCADE
+        if not dependents:
+            return ""
+        return "DROP VIEW " + ", ".join(f'"{dep_schema}"."{dep_name}"' for dep_schema, dep_name, _, _ in dependents) + ";"
+
+    def ensure_compat_views(self):
+        """
+        Reemplaza las MVs monolíticas por vistas con el mismo nombre sobre las tablas de hechos.
+        Las vistas que dependen de la MV (ej. de Power BI) se recrean en la misma transacción sobre la vista nueva.
+        """
+        for fact_table, cfg in FACT_TABLES_CONFIGS.items():
+            view_name = cfg['compat_view']
+            is_matview = self.db_manager.fetch_one(
+                "SELECT 1 FROM pg_matviews WHERE schemaname = 'public' AND matviewname = %s;", (view_name,)
+            )
+            dependents = self._dependent_views(view_name) if is_matview else []
+            drop_sql = f"{self._drop_views_sql(dependents)} DROP MATERIALIZED VIEW public.{view_name};" if is_matview else ""
+            self.db_manager.execute_query(f"""
+                {drop_sql}
+                CREATE OR REPLACE VIEW public.{view_name} AS SELECT * FROM public.{fact_table};
+                {recreate_views_sql(dependents)}
+            """)
+            if dependents:
+                logger.info(f"  [FACT] '{view_name}': {len(dependents)} vistas dependientes recreadas sobre la vista de compatibilidad.")
+
+    def drop_compat_views(self, mv_create_sqls: dict[str, str]) -> set[str]:
+        """
+        Vuelve al modo de MVs monolíticas: en una transacción por vista elimina la vista de compatibilidad,
+        crea la MV con su definición (mv_create_sqls) y recrea sobre ella las vistas dependientes.
+        Devuelve las MVs creadas.
+        """
+        created = set()
+        for view_name in FACT_COMPAT_VIEWS:
+            exists = self.db_manager.fetch_one(
+                "SELECT 1 FROM pg_views WHERE schemaname = 'public' AND viewname = %s;", (view_name,)
+            )
+            if not exists:
+                continue
+            logger.info(f"  [FACT] Reemplazando la vista de compatibilidad '{view_name}' por su MV (modo no particionado).")
+            dependents = self._dependent_views(view_name)
+            self.db_manager.execute_query(f"""
+                {self._drop_views_sql(dependents)}
+                DROP VIEW public.{view_name};
+                {mv_create_sqls[view_name]}
+                {recreate_views_sql(dependents)}
+            """)
+            created.add(view_name)
+        return created
+
+    def refresh_all(self, since: datetime | None, force_rebuild_frozen: bool = False):
+        """Refresca todas las tablas de hechos y asegura las vistas de compatibilidad."""
+        logger.info("  [FACT] Actualizando tablas de hechos particionadas por mes...")
+        for fact_table in FACT_TABLES_CONFIGS:
+            try:
+                self.refresh_fact_table(fact_table, since, force_rebuild_frozen)
+            except Exception as e:
+                logger.error(f"  [FACT] ERROR al actualizar '{fact_table}': {e}", exc_info=True)
+                continue
+        self.ensure_compat_views()
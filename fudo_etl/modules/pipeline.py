@@ -0,0 +1,293 @@
+# fudo_etl/modules/pipeline.py
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from .db_manager import DBManager
+from .etl_metadata_manager import ETLMetadataManager
+from .fudo_api_client import FudoApiClient
+from .landing_zone import LandingZoneWriter
+from .record_preparation import prepare_raw_records, raw_table_for_entity
+from .run_scheduler import RunScheduler
+
+logger = logging.getLogger(__name__)
+
+# Marcador de fin de cola
+_STOP = object()
+
+
+class ExtractLoadPipeline:
+    """
+    Pipeline productor/consumidor que solapa la extracción de la API con la carga en la DB:
+
+        fetchers (1 hilo por sucursal) --> [cola de páginas] --> preparación --> [cola de filas] --> writers (N hilos)
+
+    - Cada fetcher pagina sus entidades con su propio FudoApiClient (respeta el delay entre páginas
+      y los reintentos por sucursal) y encola cada página apenas llega.
+    - La etapa de preparación arma las filas RAW (payload canónico + checksum) fuera de los hilos de red.
+    - Cada writer tiene su propia conexión (DBManager) y carga las páginas con insert_raw_data.
+    - Las colas son acotadas: si la DB se atrasa, los fetchers se bloquean (backpressure) y la memoria
+      queda limitada a ~queue_max_pages páginas en vuelo por etapa.
+    - El timestamp de última extracción de una entidad solo avanza cuando TODAS sus páginas se
+      escribieron sin error (misma semántica que la carga secuencial).
+    - Si un writer no logra abrir su conexión, el pipeline se aborta: los fetchers se detienen y el
+      writer sigue consumiendo su cola marcando las entidades como fallidas hasta el fin.
+    - Con scheduler, cada fetcher consulta should_start antes de cada entidad (límite de la corrida y
+      circuito de la sucursal) y registra el éxito/fallo de cada extracción en el circuit breaker.
+    """
+    def __init__(self, db_connection_string: str, api_base_url: str,
+                 writer_workers: int = 2, queue_max_pages: int = 8, checked_at: datetime = None,
+                 advance_watermark: bool = True, landing_writer: LandingZoneWriter | None = None,
+                 deadline_monotonic: float | None = None, changelog_run_id: str | None = None,
+                 scheduler: RunScheduler | None = None):
+        self.db_connection_string = db_connection_string
+        # Marca registrada como last_checked_utc de cada entidad completa (inicio de la corrida)
+        self.checked_at = checked_at or datetime.now(timezone.utc)
+        # False en extracciones por ventana explícita: no mueven el cursor incremental
+        self.advance_watermark = advance_watermark
+        # Zona de aterrizaje opcional: cada página se guarda en disco antes de encolarse (re-carga sin API)
+        self.landing_writer = landing_writer
+        # Límite de la extracción (RunScheduler): no se empiezan entidades ni reintentos después de él
+        self.deadline_monotonic = deadline_monotonic
+        # Scheduler opcional: omite entidades que no entran en el tiempo restante o de sucursales con el circuito abierto
+        self.scheduler = scheduler
+        # run_id del changelog (etl_fudo_changelog) que usan las conexiones de los writers
+        self.changelog_run_id = changelog_run_id
+        self.api_base_url = api_base_url
+        self.writer_workers = max(1, writer_workers)
+        self.page_queue = queue.Queue(maxsize=queue_max_pages)
+        self.row_queue = queue.Queue(maxsize=queue_max_pages)
+        self._lock = threading.Lock()
+        self._progress = {}
+        # Se activa si un writer no puede conectarse: los fetchers dejan de extraer y las colas se vacían
+        # marcando las entidades como fallidas (nadie queda bloqueado en un put() sobre una cola llena)
+        self._abort = threading.Event()
+        self.changed_tables = set()
+
+    # --- Seguimiento por (sucursal, entidad) ---
+    def _register(self, id_sucursal: str, entity: str):
+        with self._lock:
+            self._progress[(id_sucursal, entity)] = {
+                'pages_sent': None,       # Se conoce recién cuando el fetcher termina la entidad
+                'pages_written': 0,
+                'records_extracted': 0,
+                'records_written': 0,
+                'failed': False,
+                'completed': False,
+                'skipped': False,         # Omitida por el scheduler (no cuenta como fallo en el ledger)
+                'started_at': None,       # time.monotonic() al empezar la extracción (duración histórica)
+                # Para el ledger de corridas (etl_fudo_run_items)
+                'started_at_utc': None,
+                'finished_at_utc': None,
+                'pages': 0,
+                'api_bytes': 0,
+                'retries': 0,
+                'rows_inserted': 0,
+                'rows_updated': 0,
+                'rows_skipped': 0,
+                'error': None,
+            }
+
+    def _mark_failed(self, key: tuple[str, str], error: str | None = None):
+        with self._lock:
+            self._progress[key]['failed'] = True
+            if error and not self._progress[key]['error']:
+                self._progress[key]['error'] = error
+
+    def _try_complete(self, key: tuple[str, str], metadata_manager: ETLMetadataManager):
+        """Si todas las páginas de la entidad fueron escritas, avanza su timestamp de extracción (una sola vez)."""
+        with self._lock:
+            progress = self._progress[key]
+            ready = (not progress['failed'] and not progress['completed']
+                     and progress['pages_sent'] is not None
+                     and progress['pages_written'] == progress['pages_sent'])
+            if ready:
+                progress['completed'] = True
+        if not ready:
+            return
+
+        id_sucursal, entity = key
+        if self.advance_watermark:
+            metadata_manager.record_entity_check(id_sucursal, entity, time.monotonic() - progress['started_at'], self.checked_at)
+        if progress['pages_sent'] == 0:
+            logger.info(f"    No se extrajeron nuevos registros para '{entity}' ({id_sucursal}).")
+            return
+        logger.info(
+            f"    [AUDIT] '{entity}' cargados en DB: {progress['records_written']} registros en "
+            f"'{raw_table_for_entity(entity)}' ({progress['pages_written']} páginas, sucursal '{id_sucursal}')."
+        )
+        if self.advance_watermark:
+            metadata_manager.update_last_extraction_timestamp(id_sucursal, entity, datetime.now(timezone.utc))
+
+    # --- Etapas ---
+    def _fetch_branch(self, job: dict):
+        """Productor: extrae todas las entidades de una sucursal y encola cada página."""
+        id_sucursal = job['id_sucursal']
+        api_client = FudoApiClient(self.api_base_url, token_provider=job.get('token_provider'))
+        api_client.set_auth_token(job['token'])
+        api_client.deadline_monotonic = self.deadline_monotonic
+
+        for entity, last_extracted_ts in job['entities']:
+            key = (id_sucursal, entity)
+            if self._abort.is_set():
+                self._mark_failed(key, "Pipeline abortado: sin conexión a la base de datos en un writer.")
+                with self._lock:
+                    self._progress[key]['pages_sent'] = 0
+                continue
+            if self.deadline_monotonic is not None and time.monotonic() >= self.deadline_monotonic:
+                logger.warning(f"  [PIPELINE] Límite de tiempo de la corrida alcanzado: se omite '{entity}' ({id_sucursal}).")
+                self._mark_failed(key, "Límite de tiempo de la corrida alcanzado antes de empezar.")
+                with self._lock:
+                    self._progress[key]['pages_sent'] = 0
+                continue
+            if self.scheduler and not self.scheduler.should_start(id_sucursal, entity):
+                with self._lock:
+                    self._progress[key].update({
+                        'skipped': True, 'pages_sent': 0,
+                        'error': "Omitida por el scheduler (límite de tiempo o circuito abierto).",
+                    })
+                continue
+            logger.info(f"  [PIPELINE] Extrayendo '{entity}' para sucursal '{id_sucursal}' (last_extracted_ts: {last_extracted_ts})...")
+            pages_sent = 0
+            api_client.take_request_stats()
+            with self._lock:
+                self._progress[key]['started_at'] = time.monotonic()
+                self._progress[key]['started_at_utc'] = datetime.now(timezone.utc)
+            try:
+                for page in api_client.iter_data_pages(entity, id_sucursal, last_extracted_ts,
+                                                       job.get('window_start'), job.get('window_end')):
+                    if self._abort.is_set():
+                        raise RuntimeError("Pipeline abortado: sin conexión a la base de datos en un writer.")
+                    pages_sent += 1
+                    if self.landing_writer:
+                        self.landing_writer.write_page(id_sucursal, entity, pages_sent, page)
+                    self.page_queue.put((key, page))
+                    with self._lock:
+                        self._progress[key]['records_extracted'] += len(page)
+            except Exception as e:
+                logger.error(f"  [PIPELINE] Error al extraer '{entity}' ({id_sucursal}): {e}", exc_info=True)
+                logger.error(f"    [AUDIT] '{entity}' extracción FALLIDA para sucursal '{id_sucursal}'.")
+                self._mark_failed(key, str(e))
+                if self.scheduler:
+                    self.scheduler.circuit_breaker.record_failure(id_sucursal)
+                continue
+            finally:
+                request_stats = api_client.take_request_stats()
+                with self._lock:
+                    self._progress[key]['pages_sent'] = pages_sent
+                    self._progress[key]['finished_at_utc'] = datetime.now(timezone.utc)
+                    self._progress[key].update(request_stats)
+            logger.info(f"    [AUDIT] '{entity}' extraídos de la API: {self._progress[key]['records_extracted']} registros ({pages_sent} páginas).")
+            if self.scheduler:
+                self.scheduler.circuit_breaker.record_success(id_sucursal)
+            # Marcador de fin de entidad: permite cerrarla aunque no haya tenido páginas
+            self.page_queue.put((key, None))
+
+    def _prepare_worker(self):
+        """Etapa intermedia: convierte páginas crudas en filas RAW listas para insertar."""
+        while True:
+            item = self.page_queue.get()
+            if item is _STOP:
+                for _ in range(self.writer_workers):
+                    self.row_queue.put(_STOP)
+                return
+            key, page = item
+            if page is None:
+                self.row_queue.put((key, None))
+                continue
+            if self._abort.is_set():
+                self._mark_failed(key, "Pipeline abortado: la página no se cargó.")
+                continue
+            try:
+                rows = prepare_raw_records(key[1], key[0], page)
+                self.row_queue.put((key, rows))
+            except Exception as e:
+                logger.error(f"  [PIPELINE] Error preparando una página de '{key[1]}' ({key[0]}): {e}", exc_info=True)
+                self._mark_failed(key, str(e))
+
+    def _drain_rows(self, error: str):
+        """Consume la cola de filas hasta el fin sin cargar nada, marcando como fallidas las entidades recibidas."""
+        while True:
+            item = self.row_queue.get()
+            if item is _STOP:
+                return
+            self._mark_failed(item[0], error)
+
+    def _writer_worker(self, worker_number: int):
+        """Consumidor: carga las filas con su propia conexión y cierra las entidades completas."""
+        try:
+            db_manager = DBManager(self.db_connection_string)
+        except Exception as e:
+            logger.error(f"  [PIPELINE] Writer {worker_number}: no se pudo conectar a la base de datos ({e}). Se aborta el pipeline.")
+            self._abort.set()
+            self._drain_rows("Pipeline abortado: sin conexión a la base de datos en un writer.")
+            return
+        db_manager.changelog_run_id = self.changelog_run_id
+        metadata_manager = ETLMetadataManager(db_manager)
+        try:
+            while True:
+                item = self.row_queue.get()
+                if item is _STOP:
+                    return
+                key, rows = item
+                try:
+                    if rows:
+                        raw_table_name = raw_table_for_entity(key[1])
+                        counts = db_manager.insert_raw_data(raw_table_name, rows)
+                        with self._lock:
+                            self._progress[key]['pages_written'] += 1
+                            self._progress[key]['records_written'] += len(rows)
+                            for count_key, value in counts.items():
+                                self._progress[key][f'rows_{count_key}'] += value
+                            self.changed_tables.add(raw_table_name)
+                    self._try_complete(key, metadata_manager)
+                except Exception as e:
+                    logger.error(f"  [PIPELINE] Writer {worker_number}: error al cargar '{key[1]}' ({key[0]}): {e}", exc_info=True)
+                    logger.error(f"    [AUDIT] '{key[1]}' carga FALLIDA para sucursal '{key[0]}'.")
+                    self._mark_failed(key, str(e))
+        finally:
+            db_manager.close()
+
+    def run(self, branch_jobs: list[dict]) -> dict:
+        """
+        Ejecuta el pipeline completo.
+        branch_jobs: [{'id_sucursal': str, 'token': str, 'entities': [(entity, last_extracted_ts), ...],
+                       'window_start': datetime | None, 'window_end': datetime | None,
+                       'token_provider': callable opcional para renovar el token ante un 401}, ...]
+        Devuelve el progreso final por (sucursal, entidad).
+        """
+        start = time.monotonic()
+        for job in branch_jobs:
+            for entity, _ in job['entities']:
+                self._register(job['id_sucursal'], entity)
+
+        writers = [
+            threading.Thread(target=self._writer_worker, args=(n,), name=f"fudo-writer-{n}", daemon=True)
+            for n in range(1, self.writer_workers + 1)
+        ]
+        preparer = threading.Thread(target=self._prepare_worker, name="fudo-prepare", daemon=True)
+        fetchers = [
+            threading.Thread(target=self._fetch_branch, args=(job,), name=f"fudo-fetch-{job['id_sucursal']}", daemon=True)
+            for job in branch_jobs
+        ]
+        for thread in writers + [preparer] + fetchers:
+            thread.start()
+
+        for thread in fetchers:
+            thread.join()
+        self.page_queue.put(_STOP)
+        preparer.join()
+        for thread in writers:
+            thread.join()
+
+        failed = [key for key, progress in self._progress.items() if not progress['completed']]
+        total_records = sum(progress['records_written'] for progress in self._progress.values())
+        logger.info(
+            f"  [PIPELINE] Finalizado en {time.monotonic() - start:.1f}s: {total_records} registros cargados, "
+            f"{len(self._progress) - len(failed)}/{len(self._progress)} entidades completas."
+        )
+        for id_sucursal, entity in failed:
+            logger.warning(f"  [PIPELINE] '{entity}' ({id_sucursal}) incompleta: su timestamp de extracción no se actualizó.")
+        return self._progress
@@ -0,0 +1,240 @@
+# fudo_etl/modules/profiling.py
+import cProfile
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+# Extrae el SELECT de un "CREATE MATERIALIZED VIEW ... AS <select>;" (el resto del bloque son índices)
+MV_SELECT_PATTERN = re.compile(r"CREATE\s+MATERIALIZED\s+VIEW\s+(?:IF\s+NOT\s+EXISTS\s+)?\S+\s+AS\s+(.*?);", re.IGNORECASE | re.DOTALL)
+
+
+def _plan_signature(plan: dict) -> str:
+    """Firma de la forma del plan (tipos de nodo, relaciones e índices), sin costos ni tiempos."""
+    def walk(node: dict) -> list:
+        shape = [node.get('Node Type'), node.get('Relation Name'), node.get('Index Name'), node.get('Join Type')]
+        return [shape] + [walk(child) for child in node.get('Plans', [])]
+    return hashlib.md5(json.dumps(walk(plan['Plan'])).encode('utf-8')).hexdigest()
+
+
+class RunProfiler:
+    """
+    Perfilado opt-in de una corrida (PROFILE_ENABLED / --profile). Deshabilitado, todos los métodos son no-ops.
+
+    - Cada fase (y opcionalmente cada (sucursal, entidad)) corre bajo cProfile y, si se pide, con
+      snapshots de tracemalloc. Un perfil anidado pausa al de la fase: los tiempos no se cuentan dos veces.
+      cProfile solo ve el hilo que lo activa: en EXTRACTION_MODE=pipeline el perfil de 'extract' cubre el
+      hilo principal; para el detalle por entidad usar el modo secuencial.
+    - Tras la transformación captura EXPLAIN (ANALYZE, BUFFERS) de cada MV (vuelve a ejecutar su consulta).
+    - Artefactos en {base_dir}/{run_id}/: *.prof (abrir con pstats/snakeviz), top de funciones y de
+      memoria en texto, planes JSON y summary.json/summary.txt con los hotspots y las MVs cuyo plan o
+      duración empeoró respecto de la corrida perfilada anterior.
+    """
+    def __init__(self, base_dir: str | None = None, run_id: str | None = None, enabled: bool = False,
+                 per_entity: bool = False, trace_memory: bool = True, explain_mvs: bool = True,
+                 regression_ratio: float = 0.25, regression_min_seconds: float = 0.5, top_n: int = 15):
+        self.enabled = enabled
+        self.base_dir = base_dir
+        self.run_id = run_id
+        self.per_entity = per_entity
+        self.trace_memory = trace_memory
+        self.explain_mvs = explain_mvs
+        self.regression_ratio = regression_ratio
+        self.regression_min_seconds = regression_min_seconds
+        self.top_n = top_n
+        self.run_dir = os.path.join(base_dir, run_id) if enabled else None
+        self._stack = []  # [(nombre, cProfile.Profile, inicio, snapshot inicial)]
+        self._sections = []
+        self._mv_plans = {}
+        if enabled:
+            os.makedirs(self.run_dir, exist_ok=True)
+            logger.info(f"  [PROFILE] Perfilado activo: artefactos en '{self.run_dir}'.")
+
+    @classmethod
+    def disabled(cls) -> 'RunProfiler':
+        return cls(enabled=False)
+
+    # --- Secciones perfiladas ---
+    def start_section(self, name: str):
+        if not self.enabled:
+            return
+        if self._stack:
+            self._stack[-1][1].disable()  # Pausa la sección contenedora
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot() if self.trace_memory else None
+        profiler = cProfile.Profile()
+        self._stack.append((name, profiler, time.perf_counter(), snapshot))
+        profiler.enable()
+
+    def stop_section(self):
+        if not self.enabled or not self._stack:
+            return
+        name, profiler, started, start_snapshot = self._stack.pop()
+        profiler.disable()
+        duration = time.perf_counter() - started
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+        profile_path = os.path.join(self.run_dir, f"{safe_name}.prof")
+        profiler.dump_stats(profile_path)
+
+        stats = pstats.Stats(profiler)
+        hotspots = sorted(
+            ({'function': f"{func[0]}:{func[1]}({func[2]})", 'calls': values[1], 'tottime': round(values[2], 4),
+              'cumtime': round(values[3], 4)} for func, values in stats.stats.items()),
+            key=lambda item: item['tottime'], reverse=True
+        )[:self.top_n]
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(40)
+        with open(os.path.join(self.run_dir, f"{safe_name}_cpu.txt"), 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
+
+        section = {'name': name, 'seconds': round(duration, 3), 'profile': os.path.basename(profile_path), 'hotspots': hotspots}
+        if start_snapshot is not None:
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            top_allocations = tracemalloc.take_snapshot().compare_to(start_snapshot, 'lineno')[:self.top_n]
+            with open(os.path.join(self.run_dir, f"{safe_name}_memory.txt"), 'w', encoding='utf-8') as f:
+                f.write("\n".join(str(stat) for stat in top_allocations))
+            section['memory_peak_mb'] = round(peak_bytes / 1024 / 1024, 2)
+            section['memory_top'] = [str(stat) for stat in top_allocations[:5]]
+        self._sections.append(section)
+        logger.info(f"  [PROFILE] '{name}': {duration:.1f}s (perfil en '{profile_path}').")
+
+        if self._stack:
+            self._stack[-1][1].enable()  # Reanuda la sección contenedora
+        elif self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str):
+        self.start_section(f"phase_{name}")
+        try:
+            yield
+        finally:
+            self.stop_section()
+
+    @contextmanager
+    def entity(self, id_sucursal: str, entity_name: str):
+        if not self.per_entity:
+            yield
+            return
+        self.start_section(f"entity_{id_sucursal}_{entity_name}")
+        try:
+            yield
+        finally:
+            self.stop_section()
+
+    # --- Planes de las MVs ---
+    def capture_mv_explains(self, db_manager: DBManager, mv_configs: list[tuple[str, str]]):
+        """EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) del SELECT de cada MV (solo lectura, se descarta la transacción)."""
+        if not (self.enabled and self.explain_mvs):
+            return
+        explain_dir = os.path.join(self.run_dir, "explain")
+        os.makedirs(explain_dir, exist_ok=True)
+        for mv_name, create_sql in mv_configs:
+            match = MV_SELECT_PATTERN.search(create_sql)
+            if not match or mv_name in self._mv_plans:
+                continue
+            try:
+                row = db_manager.fetch_one(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {match.group(1)}")
+                db_manager.connection.rollback()
+                plan = row[0][0] if isinstance(row[0], list) else json.loads(row[0])[0]
+            except Exception as e:
+                logger.error(f"  [PROFILE] No se pudo capturar el EXPLAIN de '{mv_name}': {e}")
+                db_manager.connection.rollback()
+                continue
+            with open(os.path.join(explain_dir, f"{mv_name}.json"), 'w', encoding='utf-8') as f:
+                json.dump(plan, f, indent=2)
+            self._mv_plans[mv_name] = {
+                'execution_ms': round(plan.get('Execution Time', 0.0), 2),
+                'planning_ms': round(plan.get('Planning Time', 0.0), 2),
+                'shared_read_blocks': plan['Plan'].get('Shared Read Blocks'),
+                'shared_hit_blocks': plan['Plan'].get('Shared Hit Blocks'),
+                'plan_signature': _plan_signature(plan),
+            }
+        logger.info(f"  [PROFILE] EXPLAIN capturado para {len(self._mv_plans)} MVs.")
+
+    # --- Resumen ---
+    def _load_previous_summary(self) -> dict | None:
+        summaries = []
+        for path in glob.glob(os.path.join(self.base_dir, "*", "summary.json")):
+            if os.path.dirname(path) == self.run_dir:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    summaries.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                continue
+        return max(summaries, key=lambda summary: summary.get('finished_at_utc', ''), default=None)
+
+    def _mv_regressions(self, previous: dict | None) -> list[dict]:
+        if not previous:
+            return []
+        regressions = []
+        for mv_name, current in self._mv_plans.items():
+            before = previous.get('mv_plans', {}).get(mv_name)
+            if not before:
+                continue
+            reasons = []
+            delta_seconds = (current['execution_ms'] - before['execution_ms']) / 1000
+            if (delta_seconds > self.regression_min_seconds
+                    and current['execution_ms'] > before['execution_ms'] * (1 + self.regression_ratio)):
+                reasons.append(f"duración {before['execution_ms']:.0f} ms -> {current['execution_ms']:.0f} ms")
+            if current['plan_signature'] != before['plan_signature']:
+                reasons.append("cambió la forma del plan")
+            if reasons:
+                regressions.append({'mv': mv_name, 'reasons': reasons, 'previous_run_id': previous.get('run_id')})
+        return regressions
+
+    def close(self) -> dict | None:
+        """Cierra las secciones abiertas (ej. tras un error) y escribe summary.json / summary.txt."""
+        if not self.enabled:
+            return None
+        while self._stack:
+            self.stop_section()
+
+        hotspots = {}
+        for section in self._sections:
+            for hotspot in section['hotspots']:
+                aggregated = hotspots.setdefault(hotspot['function'], {**hotspot, 'tottime': 0.0, 'calls': 0})
+                aggregated['tottime'] = round(aggregated['tottime'] + hotspot['tottime'], 4)
+                aggregated['calls'] += hotspot['calls']
+        summary = {
+            'run_id': self.run_id,
+            'finished_at_utc': datetime.now(timezone.utc).isoformat(),
+            'sections': [{key: value for key, value in section.items() if key != 'hotspots'} for section in self._sections],
+            'top_hotspots': sorted(hotspots.values(), key=lambda item: item['tottime'], reverse=True)[:self.top_n],
+            'mv_plans': self._mv_plans,
+        }
+        summary['mv_regressions'] = self._mv_regressions(self._load_previous_summary())
+
+        with open(os.path.join(self.run_dir, "summary.json"), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        lines = [f"Perfil de la corrida {self.run_id}", "", "Secciones:"]
+        lines += [f"  {section['name']:<50} {section['seconds']:>9.1f}s" +
+                  (f"  pico {section['memory_peak_mb']} MB" if 'memory_peak_mb' in section else "")
+                  for section in summary['sections']]
+        lines += ["", "Funciones más costosas (tottime):"]
+        lines += [f"  {item['tottime']:>9.2f}s  {item['calls']:>10} llamadas  {item['function']}" for item in summary['top_hotspots']]
+        lines += ["", "MVs con regresiones respecto de la corrida perfilada anterior:"]
+        lines += [f"  {item['mv']}: {'; '.join(item['reasons'])}" for item in summary['mv_regressions']] or ["  (ninguna)"]
+        with open(os.path.join(self.run_dir, "summary.txt"), 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+
+        for regression in summary['mv_regressions']:
+            logger.warning(f"  [PROFILE] Regresión en '{regression['mv']}': {'; '.join(regression['reasons'])}.")
+        logger.info(f"  [PROFILE] Resumen escrito en '{os.path.join(self.run_dir, 'summary.txt')}'.")
+        return summary
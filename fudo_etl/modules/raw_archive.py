@@ -0,0 +1,249 @@
+# fudo_etl/modules/raw_archive.py
+import logging
+import os
+import time
+from datetime import date, datetime, timezone
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE_PATTERN = "part-{archive_id}.parquet"
+
+# Columnas de todas las tablas fudo_raw_* (mismo esquema Parquet para todas las entidades)
+ARCHIVE_COLUMNS = ['id_fudo', 'id_sucursal_fuente', 'fecha_extraccion_utc', 'payload_json', 'last_updated_at_fudo', 'payload_checksum']
+
+
+def _import_pyarrow():
+    # Import diferido: pyarrow solo lo usan el archivado y la restauración, no las corridas del ETL
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+def archive_schema():
+    """Esquema Parquet estable de las versiones RAW archivadas (payload como texto JSON canónico)."""
+    pa, _ = _import_pyarrow()
+    return pa.schema([
+        ('id_fudo', pa.string()),
+        ('id_sucursal_fuente', pa.string()),
+        ('fecha_extraccion_utc', pa.timestamp('us', tz='UTC')),
+        ('payload_json', pa.string()),
+        ('last_updated_at_fudo', pa.timestamp('us', tz='UTC')),
+        ('payload_checksum', pa.string()),
+    ])
+
+
+def _month_start(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month_start(month: date) -> datetime:
+    return datetime(month.year + (month.month // 12), month.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+class RawArchiver:
+    """
+    Archivo de la historia fría de la capa RAW en Parquet (zstd) sobre disco local o un volumen montado:
+    {base_dir}/{tabla RAW}/id_sucursal={sucursal}/month={YYYY-MM}/part-{archive_id}.parquet
+
+    - Se archivan las versiones extraídas antes del corte que ya no usa ninguna MV: versiones superadas
+      (existe una extracción posterior del mismo id) y registros marcados en etl_fudo_tombstones.
+      La versión vigente de cada id nunca se archiva: las extracciones completas no la vuelven a insertar
+      y las MVs (DISTINCT ON por la última extracción) no cambian.
+    - Por (tabla, sucursal, mes): las versiones se leen con un cursor del servidor y se escriben en lotes
+      (row groups) con ParquetWriter, sin cargar la partición en memoria (solo se retienen sus claves).
+      Escritura atómica del archivo (temporal + os.replace), verificación del conteo leyendo su metadata,
+      y recién entonces DELETE por clave + registro en etl_fudo_raw_archive en una misma transacción.
+    - restore() reinserta un rango de meses desde los archivos registrados (idempotente, ON CONFLICT DO NOTHING).
+    """
+    def __init__(self, db_manager: DBManager, base_dir: str, compression: str = 'zstd', batch_size: int = 10000):
+        self.db_manager = db_manager
+        self.base_dir = base_dir
+        self.compression = compression
+        self.batch_size = batch_size
+
+    def list_raw_tables(self) -> list[str]:
+        rows = self.db_manager.fetch_all(
+            "SELECT tablename FROM pg_tables WHERE schemaname = 'public' AND tablename LIKE %s ORDER BY tablename;",
+            ('fudo\\_raw\\_%',)
+        )
+        return [row[0] for row in rows]
+
+    def partition_dir(self, raw_table: str, id_sucursal: str, month: date) -> str:
+        return os.path.join(self.base_dir, raw_table, f"id_sucursal={id_sucursal}", f"month={month.strftime('%Y-%m')}")
+
+    @staticmethod
+    def _cold_condition(raw_table: str) -> str:
+        return f"""
+            r.fecha_extraccion_utc < %(cutoff)s
+            AND (
+                EXISTS (
+                    SELECT 1 FROM public.{raw_table} n
+                    WHERE n.id_fudo = r.id_fudo AND n.id_sucursal_fuente = r.id_sucursal_fuente
+                      AND n.fecha_extraccion_utc > r.fecha_extraccion_utc
+                )
+                OR EXISTS (
+                    SELECT 1 FROM public.etl_fudo_tombstones t
+                    WHERE t.raw_table = '{raw_table}' AND t.id_sucursal = r.id_sucursal_fuente AND t.id_fudo = r.id_fudo
+                )
+            )
+        """
+
+    def _get_cold_partitions(self, raw_table: str, cutoff: datetime, branches: list[str] | None) -> list[tuple[str, date, int]]:
+        """(sucursal, mes de extracción, filas) con versiones archivables."""
+        branch_filter = "AND r.id_sucursal_fuente = ANY(%(branches)s)" if branches else ""
+        return self.db_manager.fetch_all(f"""
+            SELECT r.id_sucursal_fuente, date_trunc('month', r.fecha_extraccion_utc AT TIME ZONE 'UTC')::DATE, COUNT(*)
+            FROM public.{raw_table} r
+            WHERE {self._cold_condition(raw_table)} {branch_filter}
+            GROUP BY 1, 2
+            ORDER BY 1, 2;
+        """, {'cutoff': cutoff, 'branches': branches})
+
+    def _stream_to_parquet(self, query: str, params: dict, path: str) -> dict | None:
+        """
+        Ejecuta 'query' con un cursor del servidor y escribe el resultado en 'path' (atómico) por lotes.
+        Devuelve las claves archivadas (ids, checksums), el rango de fecha_extraccion_utc y el conteo leído
+        de la metadata del archivo; None si la consulta no devolvió filas.
+        """
+        pa, pq = _import_pyarrow()
+        schema = archive_schema()
+        tmp_path = f"{path}.tmp"
+        keys = {'ids': [], 'checksums': [], 'min_fecha': None, 'max_fecha': None}
+        writer = None
+        try:
+            with self.db_manager.connection.cursor(name="raw_archive_partition") as cursor:
+                cursor.itersize = self.batch_size
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    if writer is None:
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        writer = pq.ParquetWriter(tmp_path, schema, compression=self.compression)
+                    columns = list(zip(*rows))
+                    writer.write_table(pa.Table.from_arrays(
+                        [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+                    ))
+                    keys['ids'].extend(columns[0])
+                    keys['checksums'].extend(columns[5])
+                    batch_min, batch_max = min(columns[2]), max(columns[2])
+                    keys['min_fecha'] = batch_min if keys['min_fecha'] is None else min(keys['min_fecha'], batch_min)
+                    keys['max_fecha'] = batch_max if keys['max_fecha'] is None else max(keys['max_fecha'], batch_max)
+        except Exception:
+            if writer is not None:
+                writer.close()
+                os.remove(tmp_path)
+            raise
+        if writer is None:
+            return None
+        writer.close()
+        os.replace(tmp_path, path)
+        keys['written'] = pq.read_metadata(path).num_rows
+        return keys
+
+    def archive_partition(self, raw_table: str, id_sucursal: str, month: date, cutoff: datetime, archive_id: str) -> int:
+        """Archiva y borra las versiones frías de una (tabla, sucursal, mes de extracción). Devuelve las filas archivadas."""
+        params = {
+            'cutoff': cutoff, 'id_sucursal': id_sucursal,
+            'month_start': _month_start(month), 'month_end': _next_month_start(month),
+        }
+        path = os.path.join(self.partition_dir(raw_table, id_sucursal, month), ARCHIVE_FILE_PATTERN.format(archive_id=archive_id))
+        keys = self._stream_to_parquet(f"""
+            SELECT r.id_fudo, r.id_sucursal_fuente, r.fecha_extraccion_utc, r.payload_json::TEXT,
+                   r.last_updated_at_fudo, r.payload_checksum
+            FROM public.{raw_table} r
+            WHERE r.id_sucursal_fuente = %(id_sucursal)s
+              AND r.fecha_extraccion_utc >= %(month_start)s AND r.fecha_extraccion_utc < %(month_end)s
+              AND {self._cold_condition(raw_table)}
+            ORDER BY r.id_fudo, r.fecha_extraccion_utc;
+        """, params, path)
+        if keys is None:
+            return 0
+
+        written = keys['written']
+        if written != len(keys['ids']):
+            os.remove(path)
+            raise IOError(f"El archivo '{path}' tiene {written} filas y se esperaban {len(keys['ids'])}. No se borra nada de Postgres.")
+
+        try:
+            self._delete_archived(raw_table, id_sucursal, month, archive_id, keys, path)
+        except Exception:
+            # Sin el borrado registrado el archivo sería un duplicado huérfano: se descarta y se reintenta en otra corrida
+            os.remove(path)
+            raise
+        return written
+
+    def _delete_archived(self, raw_table: str, id_sucursal: str, month: date, archive_id: str, keys: dict, path: str):
+        self.db_manager.execute_query(f"""
+            DELETE FROM public.{raw_table} r
+            USING unnest(%(ids)s::TEXT[], %(checksums)s::TEXT[]) AS k(id_fudo, payload_checksum)
+            WHERE r.id_sucursal_fuente = %(id_sucursal)s
+              AND r.id_fudo = k.id_fudo AND r.payload_checksum = k.payload_checksum;
+            INSERT INTO public.etl_fudo_raw_archive
+                (archive_id, raw_table, id_sucursal, partition_month, file_path, row_count,
+                 min_fecha_extraccion_utc, max_fecha_extraccion_utc)
+            VALUES (%(archive_id)s, %(raw_table)s, %(id_sucursal)s, %(partition_month)s, %(file_path)s, %(row_count)s,
+                    %(min_fecha)s, %(max_fecha)s);
+        """, {
+            'ids': keys['ids'], 'checksums': keys['checksums'],
+            'id_sucursal': id_sucursal, 'archive_id': archive_id, 'raw_table': raw_table,
+            'partition_month': month, 'file_path': os.path.relpath(path, self.base_dir), 'row_count': keys['written'],
+            'min_fecha': keys['min_fecha'], 'max_fecha': keys['max_fecha'],
+        })
+
+    def archive(self, cutoff: datetime, tables: list[str] | None = None, branches: list[str] | None = None,
+                dry_run: bool = False) -> dict[str, int]:
+        """Archiva las versiones frías anteriores a 'cutoff'. Devuelve {tabla RAW: filas archivadas (o archivables en dry-run)}."""
+        archive_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        totals = {}
+        for raw_table in tables or self.list_raw_tables():
+            start = time.monotonic()
+            partitions = self._get_cold_partitions(raw_table, cutoff, branches)
+            if dry_run:
+                totals[raw_table] = sum(count for _, _, count in partitions)
+                logger.info(f"  [ARCHIVE] (dry-run) '{raw_table}': {totals[raw_table]} versiones archivables en {len(partitions)} particiones.")
+                continue
+            archived = 0
+            for id_sucursal, month, _ in partitions:
+                try:
+                    archived += self.archive_partition(raw_table, id_sucursal, month, cutoff, archive_id)
+                except Exception as e:
+                    self.db_manager.connection.rollback()
+                    logger.error(f"  [ARCHIVE] ERROR archivando '{raw_table}' ({id_sucursal}, {month:%Y-%m}): {e}", exc_info=True)
+                    continue
+            totals[raw_table] = archived
+            logger.info(f"  [ARCHIVE] '{raw_table}': {archived} versiones archivadas y borradas de Postgres en {time.monotonic() - start:.1f}s.")
+        return totals
+
+    def restore(self, raw_table: str, month_from: date, month_to: date, branches: list[str] | None = None) -> int:
+        """Reinserta en Postgres las versiones archivadas de los meses [month_from, month_to]. Devuelve las filas leídas."""
+        _, pq = _import_pyarrow()
+        branch_filter = "AND id_sucursal = ANY(%(branches)s)" if branches else ""
+        files = self.db_manager.fetch_all(f"""
+            SELECT file_path, row_count FROM public.etl_fudo_raw_archive
+            WHERE raw_table = %(raw_table)s AND partition_month BETWEEN %(month_from)s AND %(month_to)s {branch_filter}
+            ORDER BY partition_month, id_sucursal, archive_id;
+        """, {'raw_table': raw_table, 'month_from': month_from, 'month_to': month_to, 'branches': branches})
+        restored = 0
+        for file_path, _ in files:
+            path = os.path.join(self.base_dir, file_path)
+            if not os.path.exists(path):
+                logger.error(f"  [ARCHIVE] Falta el archivo '{path}' registrado en etl_fudo_raw_archive. Se omite.")
+                continue
+            file_rows = 0
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=self.batch_size, columns=ARCHIVE_COLUMNS):
+                rows = list(zip(*(batch.column(name).to_pylist() for name in ARCHIVE_COLUMNS)))
+                if rows:
+                    self.db_manager.execute_upsert(f"""
+                        INSERT INTO public.{raw_table} ({', '.join(ARCHIVE_COLUMNS)})
+                        VALUES %s
+                        ON CONFLICT DO NOTHING;
+                    """, rows)
+                file_rows += len(rows)
+            restored += file_rows
+            logger.info(f"  [ARCHIVE] '{file_path}': {file_rows} versiones restauradas.")
+        logger.info(f"  [ARCHIVE] '{raw_table}' [{month_from:%Y-%m}, {month_to:%Y-%m}]: {restored} versiones restauradas de {len(files)} archivos.")
+        return restored
@@ -0,0 +1,76 @@
+# fudo_etl/modules/record_preparation.py
+import logging
+import json
+import uuid
+from datetime import datetime, timezone
+from hashlib import md5
+
+from .metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Entidades cuyo 'last_updated_at_fudo' se toma de attributes.createdAt ('sales' usa closedAt o createdAt)
+CREATED_AT_ENTITIES = [
+    'customers', 'expenses', 'items', 'payments', 'products',
+    'discounts', 'ingredients', 'roles', 'tables', 'users',
+    'expense-categories', 'kitchens', 'product-categories',
+    'product-modifiers', 'rooms'
+]
+
+
+# Función auxiliar para parsear fechas de la API
+def parse_fudo_date(date_str: str | None) -> datetime | None:
+    """
+    Parsea una cadena de fecha de Fudo (ISO 8601 con 'Z') a un objeto datetime UTC.
+    Maneja None y errores de formato.
+    """
+    if date_str is None:
+        return None
+    try:
+        # Fudo usa 'Z' para UTC, Python fromisoformat necesita '+00:00'
+        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+    except ValueError:
+        logger.warning(f"No se pudo parsear la fecha de Fudo: '{date_str}'. Retornando None.")
+        return None
+
+
+def raw_table_for_entity(entity: str) -> str:
+    """Nombre de la tabla RAW de una entidad de la API (ej. 'payment-methods' -> 'fudo_raw_payment_methods')."""
+    return f"fudo_raw_{entity.replace('-', '_')}"
+
+
+def prepare_raw_records(entity: str, id_sucursal: str, records: list[dict]) -> list[dict]:
+    """
+    Convierte los registros crudos de la API en filas para insert_raw_data:
+    payload JSON canónico (sort_keys), checksum md5 y fecha de última actualización en Fudo.
+    """
+    with METRICS.timer('etl_prepare_seconds', {'entity': entity}):
+        return _prepare_raw_records(entity, id_sucursal, records)
+
+
+def _prepare_raw_records(entity: str, id_sucursal: str, records: list[dict]) -> list[dict]:
+    prepared_records = []
+    for record in records:
+        fudo_record_id = record.get('id', str(uuid.uuid4()))
+
+        last_updated_fudo = None
+        attributes = record.get('attributes', {})
+
+        if entity == 'sales':
+            last_updated_fudo = parse_fudo_date(attributes.get('closedAt')) or \
+                                parse_fudo_date(attributes.get('createdAt'))
+        elif entity in CREATED_AT_ENTITIES:
+            last_updated_fudo = parse_fudo_date(attributes.get('createdAt'))
+
+        payload_str = json.dumps(record, sort_keys=True)
+        payload_checksum = md5(payload_str.encode('utf-8')).hexdigest()
+
+        prepared_records.append({
+            'id_fudo': fudo_record_id,
+            'id_sucursal_fuente': id_sucursal,
+            'fecha_extraccion_utc': datetime.now(timezone.utc),
+            'payload_json': payload_str,
+            'last_updated_at_fudo': last_updated_fudo,
+            'payload_checksum': payload_checksum
+        })
+    return prepared_records
@@ -0,0 +1,55 @@
+# fudo_etl/modules/refresh_policy.py
+import logging
+from datetime import datetime, timedelta
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+
+class EntityRefreshPolicy:
+    """
+    Aplica la política de refresco por entidad (config_fudo_entity_refresh_policy) sobre la lista
+    de trabajo de una corrida: un par (sucursal, entidad) se extrae solo si nunca se chequeó o si
+    pasó su intervalo mínimo desde etl_fudo_extraction_status.last_checked_utc.
+    Las entidades sin política (o con la política inactiva) se extraen siempre.
+    """
+    def __init__(self, db_manager: DBManager, tolerance_ratio: float = 0.1):
+        self.db_manager = db_manager
+        # Tolerancia para que un intervalo igual a la frecuencia del scheduler no saltee corridas por segundos
+        self.tolerance_ratio = tolerance_ratio
+
+    def get_policies(self) -> dict[str, tuple[str, int]]:
+        """Devuelve {entity_name: (refresh_tier, min_interval_minutes)} de las políticas activas."""
+        rows = self.db_manager.fetch_all(
+            "SELECT entity_name, refresh_tier, min_interval_minutes "
+            "FROM public.config_fudo_entity_refresh_policy WHERE is_active = TRUE;"
+        )
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def _get_last_checks(self) -> dict[tuple[str, str], datetime]:
+        rows = self.db_manager.fetch_all(
+            "SELECT id_sucursal, entity_name, last_checked_utc FROM public.etl_fudo_extraction_status "
+            "WHERE last_checked_utc IS NOT NULL;"
+        )
+        return {(row[0], row[1]): row[2] for row in rows}
+
+    def filter_due(self, work_items: list[tuple[str, str]], now: datetime) -> list[tuple[str, str]]:
+        """Devuelve los pares (sucursal, entidad) que corresponde extraer en esta corrida."""
+        policies = self.get_policies()
+        last_checks = self._get_last_checks()
+
+        due_items, skipped = [], {}
+        for id_sucursal, entity in work_items:
+            tier, interval_minutes = policies.get(entity, ('hot', 0))
+            last_checked = last_checks.get((id_sucursal, entity))
+            min_interval = timedelta(minutes=interval_minutes * (1 - self.tolerance_ratio))
+            if interval_minutes <= 0 or last_checked is None or now - last_checked >= min_interval:
+                due_items.append((id_sucursal, entity))
+            else:
+                skipped.setdefault(tier, []).append(f"{id_sucursal}/{entity}")
+
+        for tier, items in skipped.items():
+            logger.info(f"  [REFRESH POLICY] Tier '{tier}': {len(items)} pares sin vencer, se omiten en esta corrida ({', '.join(items)}).")
+        logger.info(f"  [REFRESH POLICY] {len(due_items)} de {len(work_items)} pares (sucursal, entidad) a extraer.")
+        return due_items
@@ -0,0 +1,187 @@
+# fudo_etl/modules/rollup_manager.py
+import logging
+from datetime import datetime
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+# Tablas RAW cuyos cambios afectan a los agregados. Para cada una, el día "tocado"
+# se deriva de attributes.createdAt (el mismo campo que usan las MVs para date_order).
+# Los borrados detectados (etl_fudo_tombstones) no tocan la capa RAW: también cuentan como días tocados.
+ROLLUP_SOURCE_RAW_TABLES = ['fudo_raw_sales', 'fudo_raw_items', 'fudo_raw_payments']
+
+# Definición de cada rollup: (tabla destino, SELECT de agregación).
+# Los placeholders {day_join_<alias>} se reemplazan por un JOIN contra los días tocados
+# (modo incremental) o por una cadena vacía (reconstrucción completa).
+# El orden de columnas del SELECT debe coincidir con el de la tabla agg_* (updated_at_utc al final).
+# %(tz)s es la zona horaria con la que se agrupan días y horas.
+ROLLUP_DEFINITIONS = [
+    # Sucursal x Día: órdenes, líneas y pagos
+    ('agg_sales_branch_day', """
+        SELECT
+            so.id_sucursal,
+            so.date_local AS date_order,
+            COUNT(*) AS orders_count,
+            SUM(so.amount_total) AS amount_total,
+            AVG(so.amount_total) AS avg_ticket,
+            COALESCE(MAX(l.lines_count), 0) AS lines_count,
+            COALESCE(MAX(l.units_sold), 0) AS units_sold,
+            COALESCE(MAX(p.payments_amount), 0) AS payments_amount
+        FROM (
+            SELECT id_sucursal, amount_total, (date_order AT TIME ZONE %(tz)s)::DATE AS date_local
+            FROM public.mv_sales_order
+        ) so
+        {day_join_so}
+        LEFT JOIN (
+            SELECT l0.id_sucursal, l0.date_local, COUNT(*) AS lines_count, SUM(l0.qty) AS units_sold
+            FROM (
+                SELECT id_sucursal, qty, (date_order_time AT TIME ZONE %(tz)s)::DATE AS date_local
+                FROM public.mv_sales_order_line
+            ) l0
+            {day_join_l0}
+            GROUP BY l0.id_sucursal, l0.date_local
+        ) l ON l.id_sucursal = so.id_sucursal AND l.date_local = so.date_local
+        LEFT JOIN (
+            SELECT p0.id_sucursal, p0.date_local, SUM(p0.signed_amount) AS payments_amount
+            FROM (
+                SELECT id_sucursal, signed_amount, (payment_date AT TIME ZONE %(tz)s)::DATE AS date_local
+                FROM public.mv_pagos
+                WHERE transaction_type = 'SALE'
+            ) p0
+            {day_join_p0}
+            GROUP BY p0.id_sucursal, p0.date_local
+        ) p ON p.id_sucursal = so.id_sucursal AND p.date_local = so.date_local
+        GROUP BY so.id_sucursal, so.date_local
+    """),
+    # Sucursal x Día x Producto
+    ('agg_sales_branch_day_product', """
+        SELECT
+            sol.id_sucursal,
+            sol.date_local AS date_order,
+            sol.product_key_fk,
+            MAX(sol.id_product_fudo) AS id_product_fudo,
+            COUNT(*) AS lines_count,
+            SUM(sol.qty) AS units_sold,
+            SUM(sol.amount_total) AS amount_total
+        FROM (
+            SELECT id_sucursal, product_key_fk, id_product_fudo, qty, amount_total,
+                   (date_order_time AT TIME ZONE %(tz)s)::DATE AS date_local
+            FROM public.mv_sales_order_line
+        ) sol
+        {day_join_sol}
+        GROUP BY sol.id_sucursal, sol.date_local, sol.product_key_fk
+    """),
+    # Sucursal x Día x Medio de pago
+    ('agg_payments_branch_day_method', """
+        SELECT
+            pg.id_sucursal,
+            pg.date_local AS date_order,
+            pg.id_payment || '-' || pg.id_sucursal AS payment_method_key,
+            MAX(pg.id_payment) AS id_payment,
+            pg.transaction_type,
+            COUNT(*) AS payments_count,
+            SUM(pg.amount) AS amount,
+            SUM(pg.signed_amount) AS signed_amount
+        FROM (
+            SELECT id_sucursal, id_payment, transaction_type, amount, signed_amount,
+                   (payment_date AT TIME ZONE %(tz)s)::DATE AS date_local
+            FROM public.mv_pagos
+        ) pg
+        {day_join_pg}
+        GROUP BY pg.id_sucursal, pg.date_local, pg.id_payment || '-' || pg.id_sucursal, pg.transaction_type
+    """),
+    # Sucursal x Hora (día local + hora del día)
+    ('agg_sales_branch_hour', """
+        SELECT
+            so.id_sucursal,
+            so.date_local AS date_order,
+            so.hour_local AS hour_of_day,
+            COUNT(*) AS orders_count,
+            SUM(so.amount_total) AS amount_total
+        FROM (
+            SELECT id_sucursal, amount_total,
+                   (date_order AT TIME ZONE %(tz)s)::DATE AS date_local,
+                   EXTRACT(HOUR FROM (date_order AT TIME ZONE %(tz)s))::INTEGER AS hour_local
+            FROM public.mv_sales_order
+        ) so
+        {day_join_so}
+        GROUP BY so.id_sucursal, so.date_local, so.hour_local
+    """),
+]
+
+
+class RollupManager:
+    """
+    Mantiene las tablas de agregados (agg_*) que consume Power BI a partir de las MVs del DER.
+    En modo incremental solo se recalculan los (sucursal, día) tocados por la corrida actual.
+    """
+    def __init__(self, db_manager: DBManager, timezone_name: str):
+        self.db_manager = db_manager
+        self.timezone_name = timezone_name
+
+    def _touched_days_sql(self) -> str:
+        """SQL que crea la tabla temporal con los (sucursal, día) afectados desde %(since)s (cargas RAW y tombstones)."""
+        unions = "\n            UNION ALL\n".join(
+            f"""            SELECT id_sucursal_fuente, payload_json -> 'attributes' ->> 'createdAt' AS created_at
+            FROM public.{table} WHERE fecha_extraccion_utc >= %(since)s
+            UNION ALL
+            SELECT r.id_sucursal_fuente, r.payload_json -> 'attributes' ->> 'createdAt'
+            FROM public.etl_fudo_tombstones t
+            JOIN public.{table} r ON r.id_sucursal_fuente = t.id_sucursal AND r.id_fudo = t.id_fudo
+            WHERE t.raw_table = '{table}' AND t.detected_at_utc >= %(since)s"""
+            for table in ROLLUP_SOURCE_RAW_TABLES
+        )
+        return f"""
+        CREATE TEMP TABLE tmp_rollup_days ON COMMIT DROP AS
+        SELECT DISTINCT
+            c.id_sucursal_fuente AS id_sucursal,
+            (c.created_at::TIMESTAMP WITH TIME ZONE AT TIME ZONE %(tz)s)::DATE AS date_order
+        FROM (
+{unions}
+        ) c
+        WHERE c.created_at IS NOT NULL;
+        """
+
+    @staticmethod
+    def _render(select_sql: str, incremental: bool) -> str:
+        joins = {}
+        for alias in ('so', 'sol', 'pg', 'l0', 'p0'):
+            joins[f"day_join_{alias}"] = (
+                f"JOIN tmp_rollup_days d_{alias} ON d_{alias}.id_sucursal = {alias}.id_sucursal AND d_{alias}.date_order = {alias}.date_local"
+                if incremental else ""
+            )
+        return select_sql.format(**joins)
+
+    def refresh_rollups(self, since: datetime | None, full_rebuild: bool = False):
+        """
+        Actualiza los rollups.
+        - full_rebuild=True (o since=None): TRUNCATE + recálculo completo (reconciliación).
+        - Caso contrario: DELETE + INSERT solo para los (sucursal, día) con datos RAW extraídos desde 'since'.
+        Todo se ejecuta en una única transacción: Power BI ve los agregados anteriores hasta el COMMIT.
+        """
+        incremental = not full_rebuild and since is not None
+        mode = "incremental" if incremental else "reconstrucción completa"
+        logger.info(f"  Actualizando tablas de agregados (rollups) en modo {mode}...")
+
+        statements = []
+        if incremental:
+            statements.append(self._touched_days_sql())
+        for table_name, select_sql in ROLLUP_DEFINITIONS:
+            if incremental:
+                statements.append(f"""
+        DELETE FROM public.{table_name} a
+        USING tmp_rollup_days d
+        WHERE a.id_sucursal = d.id_sucursal AND a.date_order = d.date_order;
+                """)
+            else:
+                statements.append(f"TRUNCATE TABLE public.{table_name};")
+            statements.append(f"INSERT INTO public.{table_name} SELECT *, CURRENT_TIMESTAMP FROM ({self._render(select_sql, incremental)}) agg;")
+
+        params = {'tz': self.timezone_name, 'since': since}
+        try:
+            self.db_manager.execute_query("\n".join(statements), params)
+            logger.info(f"  Rollups actualizados exitosamente ({mode}).")
+        except Exception as e:
+            logger.error(f"  ERROR al actualizar los rollups: {e}", exc_info=True)
+            raise
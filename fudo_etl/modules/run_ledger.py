@@ -0,0 +1,135 @@
+# fudo_etl/modules/run_ledger.py
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+EMPTY_ITEM_STATS = {
+    'pages': 0, 'api_bytes': 0, 'retries': 0,
+    'rows_fetched': 0, 'rows_inserted': 0, 'rows_updated': 0, 'rows_skipped': 0,
+}
+
+
+class RunLedger:
+    """
+    Registro persistente de corridas (etl_fudo_runs) y de cada (corrida, sucursal, entidad)
+    (etl_fudo_run_items): inicio/fin, páginas, bytes de la API, filas extraídas/insertadas/
+    actualizadas/sin cambios, reintentos y resultado ('pending' | 'running' | 'success' | 'failed' | 'skipped').
+    Cada par asignado se registra 'pending' al inicio (register_planned_items): los que nunca llegan a
+    empezar (corte por timeout, SIGTERM) quedan visibles como no exitosos.
+
+    Permite re-intentar solo lo que falló en una corrida (--retry-failed) y omitir los pares
+    completados hace menos de N minutos (--skip-completed-within).
+    """
+    def __init__(self, db_manager: DBManager, run_id: str):
+        self.db_manager = db_manager
+        self.run_id = run_id
+
+    # --- Corrida ---
+    def start_run(self, started_at: datetime, phase: str, run_options: dict, execution_id: str, task_index: int):
+        self.db_manager.execute_query("""
+            INSERT INTO public.etl_fudo_runs (run_id, execution_id, task_index, phase, run_options, started_at_utc, status)
+            VALUES (%s, %s, %s, %s, %s::jsonb, %s, 'running')
+            ON CONFLICT (run_id) DO NOTHING;
+        """, (self.run_id, execution_id, task_index, phase, json.dumps(run_options, default=str), started_at))
+
+    def finish_run(self, failed: bool = False) -> str:
+        """Cierra la corrida: 'failed' si hubo un error fatal, 'partial' si algún par no terminó bien, si no 'success'."""
+        if failed:
+            status = 'failed'
+        else:
+            row = self.db_manager.fetch_one(
+                "SELECT COUNT(*) FROM public.etl_fudo_run_items WHERE run_id = %s AND outcome <> 'success';",
+                (self.run_id,)
+            )
+            status = 'partial' if row and row[0] else 'success'
+        self.db_manager.execute_query("""
+            UPDATE public.etl_fudo_runs SET finished_at_utc = CURRENT_TIMESTAMP, status = %s WHERE run_id = %s;
+        """, (status, self.run_id))
+        logger.info(f"  [LEDGER] Corrida '{self.run_id}' finalizada con estado '{status}'.")
+        return status
+
+    # --- Ítems (sucursal, entidad) ---
+    def register_planned_items(self, work_items: list[tuple[str, str]]):
+        """Registra como 'pending' todos los pares asignados a esta corrida, antes de empezar a extraerlos."""
+        if not work_items:
+            return
+        self.db_manager.execute_upsert("""
+            INSERT INTO public.etl_fudo_run_items (run_id, id_sucursal, entity_name, outcome)
+            VALUES %s
+            ON CONFLICT (run_id, id_sucursal, entity_name) DO NOTHING;
+        """, [(self.run_id, id_sucursal, entity_name, 'pending') for id_sucursal, entity_name in work_items])
+
+    def start_item(self, id_sucursal: str, entity_name: str, started_at: datetime | None = None):
+        self.db_manager.execute_query("""
+            INSERT INTO public.etl_fudo_run_items (run_id, id_sucursal, entity_name, started_at_utc, outcome)
+            VALUES (%s, %s, %s, %s, 'running')
+            ON CONFLICT (run_id, id_sucursal, entity_name) DO UPDATE SET
+                started_at_utc = EXCLUDED.started_at_utc, outcome = 'running';
+        """, (self.run_id, id_sucursal, entity_name, started_at or datetime.now(timezone.utc)))
+
+    def finish_item(self, id_sucursal: str, entity_name: str, outcome: str, stats: dict | None = None,
+                    error_message: str | None = None, started_at: datetime | None = None,
+                    finished_at: datetime | None = None):
+        """Registra el resultado de un par. stats usa las claves de EMPTY_ITEM_STATS (las faltantes quedan en 0)."""
+        stats = {**EMPTY_ITEM_STATS, **(stats or {})}
+        self.db_manager.execute_query("""
+            INSERT INTO public.etl_fudo_run_items (
+                run_id, id_sucursal, entity_name, started_at_utc, finished_at_utc, outcome,
+                pages, api_bytes, rows_fetched, rows_inserted, rows_updated, rows_skipped, retries, error_message
+            )
+            VALUES (%(run_id)s, %(id_sucursal)s, %(entity_name)s, COALESCE(%(started_at)s, %(finished_at)s), %(finished_at)s,
+                    %(outcome)s, %(pages)s, %(api_bytes)s, %(rows_fetched)s, %(rows_inserted)s, %(rows_updated)s,
+                    %(rows_skipped)s, %(retries)s, %(error_message)s)
+            ON CONFLICT (run_id, id_sucursal, entity_name) DO UPDATE SET
+                started_at_utc = COALESCE(%(started_at)s, public.etl_fudo_run_items.started_at_utc),
+                finished_at_utc = EXCLUDED.finished_at_utc,
+                outcome = EXCLUDED.outcome,
+                pages = EXCLUDED.pages,
+                api_bytes = EXCLUDED.api_bytes,
+                rows_fetched = EXCLUDED.rows_fetched,
+                rows_inserted = EXCLUDED.rows_inserted,
+                rows_updated = EXCLUDED.rows_updated,
+                rows_skipped = EXCLUDED.rows_skipped,
+                retries = EXCLUDED.retries,
+                error_message = EXCLUDED.error_message;
+        """, {
+            'run_id': self.run_id,
+            'id_sucursal': id_sucursal,
+            'entity_name': entity_name,
+            'started_at': started_at,
+            'finished_at': finished_at or datetime.now(timezone.utc),
+            'outcome': outcome,
+            'error_message': error_message[:1000] if error_message else None,
+            **{key: stats[key] for key in EMPTY_ITEM_STATS},
+        })
+
+    # --- Selección de trabajo ---
+    def get_unfinished_items(self, run_id: str) -> set[tuple[str, str]]:
+        """Pares (sucursal, entidad) de la corrida run_id que no terminaron con 'success' (incluidos los que quedaron 'pending')."""
+        if not self.db_manager.fetch_one("SELECT 1 FROM public.etl_fudo_runs WHERE run_id = %s;", (run_id,)):
+            raise ValueError(f"La corrida '{run_id}' no existe en etl_fudo_runs.")
+        rows = self.db_manager.fetch_all(
+            "SELECT id_sucursal, entity_name FROM public.etl_fudo_run_items WHERE run_id = %s AND outcome <> 'success';",
+            (run_id,)
+        )
+        return {(row[0], row[1]) for row in rows}
+
+    def filter_recently_completed(self, work_items: list[tuple[str, str]], within_minutes: int,
+                                  now: datetime) -> list[tuple[str, str]]:
+        """Quita los pares que alguna corrida completó con éxito en los últimos within_minutes minutos."""
+        rows = self.db_manager.fetch_all("""
+            SELECT DISTINCT id_sucursal, entity_name FROM public.etl_fudo_run_items
+            WHERE outcome = 'success' AND finished_at_utc >= %s AND run_id <> %s;
+        """, (now - timedelta(minutes=within_minutes), self.run_id))
+        recent = {(row[0], row[1]) for row in rows}
+        pending = [item for item in work_items if item not in recent]
+        if len(pending) < len(work_items):
+            logger.info(
+                f"  [LEDGER] {len(work_items) - len(pending)} pares completados en los últimos {within_minutes} minutos. "
+                f"Se omiten en esta corrida."
+            )
+        return pending
@@ -0,0 +1,120 @@
+# fudo_etl/modules/run_scheduler.py
+import logging
+import time
+
+from .db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+# Entidades que alimentan los hechos de ventas: se extraen primero en todas las sucursales
+CRITICAL_ENTITIES = ['sales', 'items', 'payments']
+
+
+class RunDeadline:
+    """
+    Presupuesto de tiempo de la corrida (ej. --task-timeout=7200s del Job) medido desde el inicio
+    del proceso. La extracción debe terminar antes de extraction_deadline para dejar siempre
+    transform_reserve_seconds a la transformación.
+    """
+    def __init__(self, total_seconds: float, transform_reserve_seconds: float, started_monotonic: float | None = None):
+        self.started_monotonic = started_monotonic if started_monotonic is not None else time.monotonic()
+        self.total_seconds = total_seconds
+        self.transform_reserve_seconds = transform_reserve_seconds
+        self.extraction_deadline = self.started_monotonic + total_seconds - transform_reserve_seconds
+
+    def remaining_for_extraction(self) -> float:
+        return self.extraction_deadline - time.monotonic()
+
+    def extraction_expired(self) -> bool:
+        return self.remaining_for_extraction() <= 0
+
+
+class BranchCircuitBreaker:
+    """Abre el circuito de una sucursal tras failure_threshold fallos consecutivos: el resto de sus entidades se omite."""
+    def __init__(self, failure_threshold: int = 3):
+        self.failure_threshold = failure_threshold
+        self._consecutive_failures = {}
+
+    def record_success(self, id_sucursal: str):
+        self._consecutive_failures[id_sucursal] = 0
+
+    def record_failure(self, id_sucursal: str):
+        failures = self._consecutive_failures.get(id_sucursal, 0) + 1
+        self._consecutive_failures[id_sucursal] = failures
+        if failures == self.failure_threshold:
+            logger.error(f"  [SCHEDULER] Circuito ABIERTO para la sucursal '{id_sucursal}' tras {failures} fallos consecutivos.")
+
+    def is_open(self, id_sucursal: str) -> bool:
+        return self._consecutive_failures.get(id_sucursal, 0) >= self.failure_threshold
+
+
+class RunScheduler:
+    """
+    Ordena y acota el trabajo de extracción para que entre en el timeout de la tarea:
+    - Primero las entidades críticas (sales, items, payments) de todas las sucursales, después el resto.
+    - Antes de empezar un par (sucursal, entidad) estima su duración con la histórica
+      (etl_fudo_extraction_status.last_duration_seconds) y lo omite si no entra en el tiempo restante.
+    - Omite las sucursales con el circuito abierto.
+    - La transformación conserva siempre su reserva (max entre la configurada y la última duración medida).
+    """
+    def __init__(self, deadline: RunDeadline, durations: dict[tuple[str, str], float],
+                 circuit_breaker: BranchCircuitBreaker, critical_entities: list[str] | None = None):
+        self.deadline = deadline
+        self.durations = durations
+        self.circuit_breaker = circuit_breaker
+        self.critical_entities = critical_entities or CRITICAL_ENTITIES
+        self.skipped = []
+
+    @staticmethod
+    def get_transform_reserve(db_manager: DBManager, configured_seconds: float, safety_factor: float = 1.2) -> float:
+        """Reserva para la transformación: la configurada o la última duración medida (con margen), la mayor."""
+        row = db_manager.fetch_one(
+            "SELECT last_duration_seconds FROM public.etl_fudo_phase_durations WHERE phase = 'transform';"
+        )
+        measured = float(row[0]) * safety_factor if row and row[0] is not None else 0.0
+        return max(configured_seconds, measured)
+
+    @staticmethod
+    def record_phase_duration(db_manager: DBManager, phase: str, duration_seconds: float):
+        db_manager.execute_query("""
+            INSERT INTO public.etl_fudo_phase_durations (phase, last_duration_seconds, updated_at_utc)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (phase) DO UPDATE SET
+                last_duration_seconds = EXCLUDED.last_duration_seconds,
+                updated_at_utc = EXCLUDED.updated_at_utc;
+        """, (phase, round(duration_seconds, 3)))
+
+    def plan_waves(self, entities_by_branch: dict[str, list[str]]) -> list[dict[str, list[str]]]:
+        """Divide el trabajo en dos oleadas: entidades críticas de todas las sucursales y luego el resto."""
+        critical, others = {}, {}
+        for id_sucursal, entities in entities_by_branch.items():
+            critical[id_sucursal] = [e for e in entities if e in self.critical_entities]
+            others[id_sucursal] = [e for e in entities if e not in self.critical_entities]
+        return [critical, others]
+
+    def estimated_seconds(self, id_sucursal: str, entity: str) -> float:
+        return self.durations.get((id_sucursal, entity), 0.0)
+
+    def should_start(self, id_sucursal: str, entity: str) -> bool:
+        """True si el par puede empezar sin comprometer la reserva de la transformación."""
+        if self.circuit_breaker.is_open(id_sucursal):
+            self.skipped.append((id_sucursal, entity, 'circuit_open'))
+            return False
+        remaining = self.deadline.remaining_for_extraction()
+        estimated = self.estimated_seconds(id_sucursal, entity)
+        if remaining <= 0 or estimated > remaining:
+            logger.warning(
+                f"  [SCHEDULER] Se omite '{entity}' ({id_sucursal}): estimado {estimated:.0f}s, "
+                f"quedan {max(remaining, 0):.0f}s antes de la reserva de transformación."
+            )
+            self.skipped.append((id_sucursal, entity, 'deadline'))
+            return False
+        return True
+
+    def log_summary(self):
+        if self.skipped:
+            logger.warning(f"  [SCHEDULER] {len(self.skipped)} pares (sucursal, entidad) omitidos: {self.skipped}")
+        logger.info(
+            f"  [SCHEDULER] Tiempo restante para extracción: {self.deadline.remaining_for_extraction():.0f}s "
+            f"(reserva de transformación: {self.deadline.transform_reserve_seconds:.0f}s)."
+        )
@@ -0,0 +1,199 @@
+# fudo_etl/modules/task_sharding.py
+import logging
+from datetime import datetime, timezone
+from hashlib import md5
+
+from .db_manager import DBManager
+from .etl_metadata_manager import ETLMetadataManager
+
+logger = logging.getLogger(__name__)
+
+
+def stable_shard_for(id_sucursal: str, entity_name: str, task_count: int) -> int:
+    """Tarea asignada a un (sucursal, entidad) por hash estable (no depende de PYTHONHASHSEED)."""
+    digest = md5(f"{id_sucursal}|{entity_name}".encode('utf-8')).hexdigest()
+    return int(digest, 16) % task_count
+
+
+class TaskShardCoordinator:
+    """
+    Ejecución en shards sobre las tareas paralelas de un Cloud Run Job
+    (CLOUD_RUN_TASK_INDEX / CLOUD_RUN_TASK_COUNT / CLOUD_RUN_EXECUTION).
+
+    - Reparte la lista de trabajo (sucursal, entidad) entre las tareas:
+        * 'hash': hash estable de cada par (no necesita coordinación).
+        * 'weighted': plan LPT (mayor duración primero, a la tarea menos cargada) con la duración
+          histórica de cada par. El primer shard que llega lo fija en etl_fudo_shard_plan y el resto
+          lo lee, así todas las tareas usan exactamente el mismo plan aunque las duraciones cambien.
+    - Coordina la transformación: cada tarea se marca 'done' al terminar su extracción (o 'failed' si
+      terminó con error o la detuvieron) y la última en terminar (bajo un advisory lock de la ejecución)
+      la reclama y corre MVs/rollups una sola vez. Las tareas 'failed' cuentan como terminadas: si la
+      última en terminar es una fallida, la reclama ella misma en mark_failed.
+    """
+    def __init__(self, db_manager: DBManager, task_index: int, task_count: int, execution_id: str,
+                 strategy: str = 'hash', default_duration_seconds: float = 60.0):
+        self.db_manager = db_manager
+        self.task_index = task_index
+        self.task_count = max(1, task_count)
+        self.execution_id = execution_id
+        self.strategy = strategy
+        self.default_duration_seconds = default_duration_seconds
+
+    @property
+    def is_sharded(self) -> bool:
+        return self.task_count > 1
+
+    def _lock_sql(self) -> str:
+        """Advisory lock transaccional por ejecución (se libera en el commit de execute_query)."""
+        return "SELECT pg_advisory_xact_lock(hashtext('etl_fudo_shard:' || %(execution_id)s));"
+
+    def _build_weighted_plan(self, work_items: list[tuple[str, str]]) -> dict[tuple[str, str], tuple[int, float]]:
+        """Plan LPT: {(sucursal, entidad): (task_index, segundos estimados)}."""
+        durations = ETLMetadataManager(self.db_manager).get_extraction_durations()
+        estimated = sorted(
+            ((durations.get(item, self.default_duration_seconds), item) for item in work_items),
+            key=lambda pair: (-pair[0], pair[1])
+        )
+        loads = [0.0] * self.task_count
+        plan = {}
+        for seconds, item in estimated:
+            target = min(range(self.task_count), key=lambda idx: (loads[idx], idx))
+            loads[target] += seconds
+            plan[item] = (target, seconds)
+        logger.info(f"  [SHARDS] Plan ponderado: carga estimada por tarea (s): {[round(load, 1) for load in loads]}")
+        return plan
+
+    def _get_or_create_weighted_plan(self, work_items: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        plan = self._build_weighted_plan(work_items)
+        items = list(plan.keys())
+        # Insert bajo advisory lock: solo el primer shard fija el plan de la ejecución
+        self.db_manager.execute_query(self._lock_sql() + """
+            INSERT INTO public.etl_fudo_shard_plan (execution_id, id_sucursal, entity_name, task_index, estimated_seconds)
+            SELECT %(execution_id)s, t.id_sucursal, t.entity_name, t.task_index, t.estimated_seconds
+            FROM unnest(%(branches)s::text[], %(entities)s::text[], %(tasks)s::int[], %(seconds)s::numeric[])
+                 AS t(id_sucursal, entity_name, task_index, estimated_seconds)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM public.etl_fudo_shard_plan WHERE execution_id = %(execution_id)s
+            );
+        """, {
+            'execution_id': self.execution_id,
+            'branches': [item[0] for item in items],
+            'entities': [item[1] for item in items],
+            'tasks': [plan[item][0] for item in items],
+            'seconds': [plan[item][1] for item in items],
+        })
+        rows = self.db_manager.fetch_all(
+            "SELECT id_sucursal, entity_name FROM public.etl_fudo_shard_plan WHERE execution_id = %s AND task_index = %s;",
+            (self.execution_id, self.task_index)
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    def assign_work(self, work_items: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        """Devuelve los pares (sucursal, entidad) que le tocan a esta tarea, en el orden original."""
+        if not self.is_sharded:
+            return list(work_items)
+
+        if self.strategy == 'weighted':
+            assigned = set(self._get_or_create_weighted_plan(work_items))
+        else:
+            assigned = {item for item in work_items if stable_shard_for(item[0], item[1], self.task_count) == self.task_index}
+
+        my_items = [item for item in work_items if item in assigned]
+        logger.info(
+            f"  [SHARDS] Tarea {self.task_index + 1}/{self.task_count} (ejecución '{self.execution_id}', "
+            f"estrategia '{self.strategy}'): {len(my_items)} de {len(work_items)} pares (sucursal, entidad)."
+        )
+        return my_items
+
+    def register_start(self, started_at: datetime):
+        """Registra la tarea como 'running' (idempotente ante reintentos de la misma tarea)."""
+        self.db_manager.execute_query("""
+            INSERT INTO public.etl_fudo_shard_runs (execution_id, task_index, task_count, status, started_at_utc)
+            VALUES (%s, %s, %s, 'running', %s)
+            ON CONFLICT (execution_id, task_index) DO UPDATE SET
+                status = 'running', finished_at_utc = NULL, error = NULL;
+        """, (self.execution_id, self.task_index, self.task_count, started_at))
+
+    def _claim_sql(self) -> str:
+        """Reclama la transformación para esta tarea si todas terminaron ('done' o 'failed') y nadie la reclamó."""
+        return """
+            UPDATE public.etl_fudo_shard_runs
+            SET transform_claimed = TRUE
+            WHERE execution_id = %(execution_id)s AND task_index = %(task_index)s
+              AND (SELECT COUNT(*) FROM public.etl_fudo_shard_runs
+                   WHERE execution_id = %(execution_id)s AND status IN ('done', 'failed')) >= %(task_count)s
+              AND NOT EXISTS (SELECT 1 FROM public.etl_fudo_shard_runs
+                              WHERE execution_id = %(execution_id)s AND transform_claimed);
+        """
+
+    def _get_claim(self) -> tuple[bool, datetime | None, list[str]]:
+        """(reclamó la transformación, inicio más temprano de la ejecución, tablas RAW cambiadas por todos los shards)."""
+        claimed = self.db_manager.fetch_one(
+            "SELECT transform_claimed FROM public.etl_fudo_shard_runs WHERE execution_id = %s AND task_index = %s;",
+            (self.execution_id, self.task_index)
+        )
+        if not claimed or not claimed[0]:
+            return False, None, []
+        summary = self.db_manager.fetch_one("""
+            SELECT MIN(started_at_utc),
+                   ARRAY(SELECT DISTINCT unnest(changed_tables) FROM public.etl_fudo_shard_runs
+                         WHERE execution_id = %s ORDER BY 1)
+            FROM public.etl_fudo_shard_runs
+            WHERE execution_id = %s;
+        """, (self.execution_id, self.execution_id))
+        for failed_index, error in self._get_failed_tasks():
+            logger.warning(f"  [SHARDS] La tarea {failed_index + 1}/{self.task_count} terminó con error ({error}); sus pares quedan para la próxima corrida.")
+        logger.info(f"  [SHARDS] Tarea {self.task_index + 1}/{self.task_count} es la última: ejecuta la transformación de la ejecución '{self.execution_id}'.")
+        return True, summary[0], list(summary[1] or [])
+
+    def mark_failed(self, error: str | None = None, changed_tables: list[str] | None = None) -> tuple[bool, datetime | None, list[str]]:
+        """
+        Estado terminal 'failed' (la tarea no llegó a finish_and_claim_transform): cuenta como terminada.
+        Si era la última en terminar, reclama la transformación bajo el mismo lock (igual que finish_and_claim_transform)
+        y devuelve (debe_transformar, inicio más temprano de la ejecución, tablas RAW cambiadas).
+        """
+        self.db_manager.execute_query(self._lock_sql() + """
+            UPDATE public.etl_fudo_shard_runs
+            SET status = 'failed', error = %(error)s, finished_at_utc = %(finished_at)s,
+                changed_tables = %(changed_tables)s::text[]
+            WHERE execution_id = %(execution_id)s AND task_index = %(task_index)s AND status = 'running';
+        """ + self._claim_sql(), {
+            'execution_id': self.execution_id,
+            'task_index': self.task_index,
+            'task_count': self.task_count,
+            'error': (error or '')[:1000] or None,
+            'changed_tables': changed_tables or [],
+            'finished_at': datetime.now(timezone.utc),
+        })
+        logger.error(f"  [SHARDS] Tarea {self.task_index + 1}/{self.task_count} marcada como 'failed': {error}")
+        return self._get_claim()
+
+    def _get_failed_tasks(self) -> list[tuple[int, str | None]]:
+        return self.db_manager.fetch_all(
+            "SELECT task_index, error FROM public.etl_fudo_shard_runs WHERE execution_id = %s AND status = 'failed' ORDER BY task_index;",
+            (self.execution_id,)
+        )
+
+    def finish_and_claim_transform(self, changed_tables: list[str]) -> tuple[bool, datetime | None, list[str]]:
+        """
+        Marca la tarea como 'done' y, si es la última en terminar, reclama la transformación.
+        Devuelve (debe_transformar, inicio más temprano de la ejecución, tablas RAW cambiadas por todos los shards).
+        """
+        params = {
+            'execution_id': self.execution_id,
+            'task_index': self.task_index,
+            'task_count': self.task_count,
+            'changed_tables': changed_tables,
+            'finished_at': datetime.now(timezone.utc),
+        }
+        # Todo en una transacción bajo el advisory lock: dos shards no pueden reclamar a la vez
+        self.db_manager.execute_query(self._lock_sql() + """
+            UPDATE public.etl_fudo_shard_runs
+            SET status = 'done', changed_tables = %(changed_tables)s::text[], finished_at_utc = %(finished_at)s
+            WHERE execution_id = %(execution_id)s AND task_index = %(task_index)s;
+        """ + self._claim_sql(), params)
+
+        claim = self._get_claim()
+        if not claim[0]:
+            logger.info(f"  [SHARDS] Tarea {self.task_index + 1}/{self.task_count} terminó su extracción; la transformación la ejecutará el último shard.")
+        return claim
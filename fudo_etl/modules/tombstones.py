@@ -0,0 +1,114 @@
+# fudo_etl/modules/tombstones.py
+import logging
+from datetime import datetime
+
+from .db_manager import DBManager
+from .fudo_api_client import FudoApiClient
+from .record_preparation import raw_table_for_entity
+
+logger = logging.getLogger(__name__)
+
+# Entidades reconciliadas por defecto: catálogos y gastos, donde los borrados en Fudo son habituales.
+# 'items' admite ventana (--since) para revisar solo las líneas recientes.
+DEFAULT_TOMBSTONE_ENTITIES = [
+    'products', 'product-categories', 'product-modifiers', 'payment-methods',
+    'discounts', 'expenses', 'expense-categories', 'ingredients',
+]
+
+
+class TombstoneReconciler:
+    """
+    Detección de borrados en Fudo sin descargar los payloads:
+
+    - Pagina la entidad pidiendo solo IDs (FudoApiClient.iter_entity_ids, con el sparse fieldset
+      mínimo donde la API lo admite) y compara por diferencia de conjuntos con los id_fudo vigentes
+      de la tabla RAW de la sucursal (opcionalmente solo los creados desde window_start).
+    - Los faltantes quedan en etl_fudo_tombstones, que las MVs excluyen; si un ID vuelve a aparecer
+      en un escaneo posterior, su tombstone se elimina.
+    - Salvaguardas: no se marca nada si el escaneo falla, si la API no devuelve ningún ID habiendo
+      claves en la DB, o si los faltantes superan max_missing_ratio (probable respuesta incompleta).
+    """
+    def __init__(self, db_manager: DBManager, api_client: FudoApiClient, max_missing_ratio: float = 0.2,
+                 dry_run: bool = False):
+        self.db_manager = db_manager
+        self.api_client = api_client
+        self.max_missing_ratio = max_missing_ratio
+        self.dry_run = dry_run
+
+    def _get_current_ids(self, raw_table: str, id_sucursal: str, window_start: datetime | None) -> set[str]:
+        """id_fudo de la tabla RAW (sin los ya marcados como borrados), opcionalmente creados desde window_start."""
+        window_condition = ""
+        params = [id_sucursal, raw_table]
+        if window_start:
+            window_condition = "AND (r.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE >= %s"
+            params.append(window_start)
+        rows = self.db_manager.fetch_all(f"""
+            SELECT DISTINCT r.id_fudo
+            FROM public.{raw_table} r
+            WHERE r.id_sucursal_fuente = %s
+              AND NOT EXISTS (
+                  SELECT 1 FROM public.etl_fudo_tombstones t
+                  WHERE t.raw_table = %s AND t.id_sucursal = r.id_sucursal_fuente AND t.id_fudo = r.id_fudo
+              )
+              {window_condition};
+        """, tuple(params))
+        return {row[0] for row in rows}
+
+    def _get_tombstoned_ids(self, raw_table: str, id_sucursal: str) -> set[str]:
+        rows = self.db_manager.fetch_all(
+            "SELECT id_fudo FROM public.etl_fudo_tombstones WHERE raw_table = %s AND id_sucursal = %s;",
+            (raw_table, id_sucursal)
+        )
+        return {row[0] for row in rows}
+
+    def reconcile(self, id_sucursal: str, entity_name: str, run_id: str,
+                  window_start: datetime | None = None) -> dict:
+        """Reconcilia una (sucursal, entidad). Devuelve los conteos del escaneo y el resultado ('applied' | 'dry_run' | 'aborted')."""
+        raw_table = raw_table_for_entity(entity_name)
+        # Los IDs de la DB se leen ANTES del escaneo: un registro creado en Fudo y cargado por otra corrida
+        # mientras se pagina la API no aparecería en api_ids y se marcaría como borrado por error
+        current_ids = self._get_current_ids(raw_table, id_sucursal, window_start)
+        tombstoned_ids = self._get_tombstoned_ids(raw_table, id_sucursal)
+        api_ids = set()
+        for page_ids in self.api_client.iter_entity_ids(entity_name, id_sucursal, window_start=window_start):
+            api_ids.update(page_ids)
+        missing_ids = current_ids - api_ids
+        resurrected_ids = tombstoned_ids & api_ids
+        result = {
+            'raw_table': raw_table, 'api_ids': len(api_ids), 'current_ids': len(current_ids),
+            'missing': len(missing_ids), 'resurrected': len(resurrected_ids), 'outcome': 'applied',
+            'resurrected_ids': sorted(resurrected_ids),
+        }
+
+        if current_ids and not api_ids:
+            result['outcome'] = 'aborted'
+            logger.error(f"  [TOMBSTONES] '{entity_name}' ({id_sucursal}): la API no devolvió IDs y la DB tiene {len(current_ids)}. No se marca nada.")
+            return result
+        if current_ids and len(missing_ids) / len(current_ids) > self.max_missing_ratio:
+            result['outcome'] = 'aborted'
+            logger.error(
+                f"  [TOMBSTONES] '{entity_name}' ({id_sucursal}): faltan {len(missing_ids)} de {len(current_ids)} IDs "
+                f"(> {self.max_missing_ratio:.0%}). Probable respuesta incompleta de la API: no se marca nada."
+            )
+            return result
+        if self.dry_run:
+            result['outcome'] = 'dry_run'
+            logger.info(f"  [TOMBSTONES] (dry-run) '{entity_name}' ({id_sucursal}): {len(missing_ids)} borrados, {len(resurrected_ids)} reaparecidos.")
+            return result
+
+        if missing_ids:
+            self.db_manager.execute_upsert("""
+                INSERT INTO public.etl_fudo_tombstones (raw_table, id_sucursal, id_fudo, detected_run_id)
+                VALUES %s
+                ON CONFLICT (raw_table, id_sucursal, id_fudo) DO NOTHING;
+            """, [(raw_table, id_sucursal, id_fudo, run_id) for id_fudo in sorted(missing_ids)])
+        if resurrected_ids:
+            self.db_manager.execute_query("""
+                DELETE FROM public.etl_fudo_tombstones
+                WHERE raw_table = %s AND id_sucursal = %s AND id_fudo = ANY(%s);
+            """, (raw_table, id_sucursal, sorted(resurrected_ids)))
+        logger.info(
+            f"  [TOMBSTONES] '{entity_name}' ({id_sucursal}): {len(api_ids)} IDs en la API, {len(current_ids)} vigentes en la DB, "
+            f"{len(missing_ids)} marcados como borrados, {len(resurrected_ids)} reaparecidos."
+        )
+        return result
@@ -1,10 +1,9 @@
-import sqlparse
-
 def split_sql_statements(sql_text: str) -> tuple[str, str]:
     """
     Divide un script SQL en CREATE/DROP y el resto.
     Retorna tuple(create_sql, other_sql)
     """
+    import sqlparse  # Import diferido: solo lo usa este helper
     statements = sqlparse.split(sql_text)
     create_stmts = []
     other_stmts = []
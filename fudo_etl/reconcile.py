@@ -0,0 +1,101 @@
+# fudo_etl/reconcile.py
+import argparse
+import logging
+from datetime import datetime, timezone
+
+from modules.config import load_config
+from modules.credentials_service import CredentialsService
+from modules.db_manager import DBManager
+from modules.fudo_api_client import FudoApiClient
+from modules.partitioned_facts import PartitionedFactManager
+from modules.tombstones import TombstoneReconciler, DEFAULT_TOMBSTONE_ENTITIES
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _parse_date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def run_reconcile(args: argparse.Namespace) -> bool:
+    """Reconcilia borrados por (sucursal, entidad). Devuelve False si alguna reconciliación falló o se abortó."""
+    config = load_config()
+    run_started_at = datetime.now(timezone.utc)
+    run_id = f"reconcile-{run_started_at.strftime('%Y%m%dT%H%M%SZ')}"
+    window_start = _parse_date(args.since) if args.since else None
+    max_missing_ratio = args.max_missing_ratio if args.max_missing_ratio is not None else config['tombstone_max_missing_ratio']
+
+    db_manager = DBManager(config['db_connection_string'])
+    credentials = None
+    try:
+        branches_config = db_manager.fetch_all(
+            "SELECT id_sucursal, fudo_branch_identifier, sucursal_name, "
+            "secret_manager_apikey_name, secret_manager_apisecret_name "
+            "FROM public.config_fudo_branches WHERE is_active = TRUE"
+        )
+        if args.branches:
+            branches_config = [branch_data for branch_data in branches_config if branch_data[0] in args.branches]
+        if not branches_config:
+            logger.warning("No hay sucursales activas para reconciliar.")
+            return True
+
+        credentials = CredentialsService(
+            db_manager, config['fudo_auth_endpoint'], config['gcp_project_id'],
+            db_connection_string=config['db_connection_string'],
+            max_workers=config['credentials_prefetch_workers'],
+            refresh_margin_minutes=config['token_refresh_margin_minutes']
+        )
+        credentials.prefetch(branches_config)
+
+        window_entities = FudoApiClient(config['fudo_api_base_url']).window_filter_entities
+        failed = 0
+        # {tabla RAW: [(sucursal, id_fudo)]} con tombstone eliminado: sus filas se reponen en las tablas de hechos
+        resurrected_keys = {}
+        for id_sucursal, _, sucursal_name, _, _ in branches_config:
+            api_client = FudoApiClient(config['fudo_api_base_url'], token_provider=credentials.token_provider(id_sucursal))
+            reconciler = TombstoneReconciler(db_manager, api_client, max_missing_ratio=max_missing_ratio, dry_run=args.dry_run)
+            logger.info(f"\n--- Reconciliando borrados de la sucursal: {sucursal_name} ({id_sucursal}) ---")
+            for entity_name in args.entities:
+                # La ventana solo aplica a las entidades que la API puede filtrar por createdAt
+                entity_window = window_start if entity_name in window_entities else None
+                try:
+                    result = reconciler.reconcile(id_sucursal, entity_name, run_id, window_start=entity_window)
+                except Exception as e:
+                    failed += 1
+                    db_manager.connection.rollback()
+                    logger.error(f"  [TOMBSTONES] ERROR reconciliando '{entity_name}' ({id_sucursal}): {e}", exc_info=True)
+                    continue
+                if result['outcome'] == 'aborted':
+                    failed += 1
+                elif result['outcome'] == 'applied' and result['resurrected_ids']:
+                    resurrected_keys.setdefault(result['raw_table'], []).extend(
+                        (id_sucursal, id_fudo) for id_fudo in result['resurrected_ids']
+                    )
+
+        if config['fact_layer_mode'] == 'partitioned' and not args.dry_run:
+            fact_manager = PartitionedFactManager(db_manager, config['fact_freeze_after_days'])
+            fact_manager.purge_tombstoned_rows(run_started_at)
+            fact_manager.rebuild_resurrected_partitions(resurrected_keys)
+
+        logger.info(f"  [TOMBSTONES] '{run_id}' terminó con {failed} reconciliaciones fallidas o abortadas.")
+        return failed == 0
+    finally:
+        if credentials:
+            credentials.stop()
+        db_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detección de registros borrados en Fudo por escaneo de solo IDs (tombstones).")
+    parser.add_argument("--branches", nargs="+", help="id_sucursal a reconciliar (por defecto, todas las activas).")
+    parser.add_argument("--entities", nargs="+", default=DEFAULT_TOMBSTONE_ENTITIES,
+                        help=f"Entidades a reconciliar (default: {' '.join(DEFAULT_TOMBSTONE_ENTITIES)}).")
+    parser.add_argument("--since", help="Solo registros creados desde esta fecha (ISO 8601); aplica a las entidades con filtro createdAt (ej. items).")
+    parser.add_argument("--max-missing-ratio", type=float,
+                        help="Proporción máxima de IDs faltantes antes de abortar (default TOMBSTONE_MAX_MISSING_RATIO).")
+    parser.add_argument("--dry-run", action="store_true", help="Solo informa los borrados detectados, sin marcarlos.")
+    args = parser.parse_args()
+    if not run_reconcile(args):
+        raise SystemExit(1)
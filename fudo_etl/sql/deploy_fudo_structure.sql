@@ -52,6 +52,185 @@ CREATE TABLE IF NOT EXISTS public.config_fudo_branches (
 );
 DELETE FROM public.config_fudo_branches WHERE id_sucursal = 'punto_criollo';
 
+-- Historial de tamaños de tablas/índices por corrida (etapa de mantenimiento post-carga)
+CREATE TABLE IF NOT EXISTS public.etl_fudo_table_size_history (
+    run_id VARCHAR(64) NOT NULL,
+    table_name VARCHAR(255) NOT NULL,
+    table_bytes BIGINT,
+    index_bytes BIGINT,
+    total_bytes BIGINT,
+    n_live_tup BIGINT,
+    n_dead_tup BIGINT,
+    measured_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, table_name)
+);
+CREATE INDEX IF NOT EXISTS idx_etl_fudo_table_size_history_table_fecha ON public.etl_fudo_table_size_history (table_name, measured_at_utc DESC);
+
+-- Duración de la última extracción de cada (sucursal, entidad): alimenta el plan ponderado de shards
+ALTER TABLE public.etl_fudo_extraction_status ADD COLUMN IF NOT EXISTS last_duration_seconds NUMERIC(12, 3);
+-- Última vez que la entidad se chequeó con éxito (haya traído registros o no): base de la política de refresco
+ALTER TABLE public.etl_fudo_extraction_status ADD COLUMN IF NOT EXISTS last_checked_utc TIMESTAMP WITH TIME ZONE;
+
+-- Backfill histórico por slices de fechas (backfill.py): progreso por slice para poder retomar
+CREATE TABLE IF NOT EXISTS public.etl_fudo_backfill_slices (
+    backfill_id VARCHAR(255) NOT NULL,
+    id_sucursal VARCHAR(255) NOT NULL,
+    entity_name VARCHAR(100) NOT NULL,
+    slice_start_utc TIMESTAMP WITH TIME ZONE NOT NULL,
+    slice_end_utc TIMESTAMP WITH TIME ZONE NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending', -- 'pending' | 'running' | 'done' | 'failed'
+    records_loaded INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (backfill_id, slice_start_utc)
+);
+
+-- Última duración medida por fase de la corrida: dimensiona la reserva de tiempo de la transformación (RunScheduler)
+CREATE TABLE IF NOT EXISTS public.etl_fudo_phase_durations (
+    phase VARCHAR(50) PRIMARY KEY,
+    last_duration_seconds NUMERIC(12, 3) NOT NULL,
+    updated_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Ledger de corridas: una fila por corrida y una por (corrida, sucursal, entidad) con conteos y resultado
+CREATE TABLE IF NOT EXISTS public.etl_fudo_runs (
+    run_id VARCHAR(64) PRIMARY KEY,
+    execution_id VARCHAR(255),
+    task_index INTEGER,
+    phase VARCHAR(20) NOT NULL,
+    run_options JSONB,
+    started_at_utc TIMESTAMP WITH TIME ZONE NOT NULL,
+    finished_at_utc TIMESTAMP WITH TIME ZONE,
+    status VARCHAR(20) NOT NULL DEFAULT 'running' -- 'running' | 'success' | 'partial' | 'failed'
+);
+
+CREATE TABLE IF NOT EXISTS public.etl_fudo_run_items (
+    run_id VARCHAR(64) NOT NULL REFERENCES public.etl_fudo_runs (run_id) ON DELETE CASCADE,
+    id_sucursal VARCHAR(255) NOT NULL,
+    entity_name VARCHAR(100) NOT NULL,
+    started_at_utc TIMESTAMP WITH TIME ZONE,
+    finished_at_utc TIMESTAMP WITH TIME ZONE,
+    outcome VARCHAR(20) NOT NULL DEFAULT 'running', -- 'pending' | 'running' | 'success' | 'failed' | 'skipped'
+    pages INTEGER NOT NULL DEFAULT 0,
+    api_bytes BIGINT NOT NULL DEFAULT 0,
+    rows_fetched INTEGER NOT NULL DEFAULT 0,
+    rows_inserted INTEGER NOT NULL DEFAULT 0,
+    rows_updated INTEGER NOT NULL DEFAULT 0,
+    rows_skipped INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    error_message TEXT,
+    PRIMARY KEY (run_id, id_sucursal, entity_name)
+);
+CREATE INDEX IF NOT EXISTS idx_etl_fudo_run_items_completed
+    ON public.etl_fudo_run_items (finished_at_utc, id_sucursal, entity_name) WHERE outcome = 'success';
+
+-- Métricas por etapa de cada corrida (modules/metrics.py): contadores e histogramas resumidos por serie
+CREATE TABLE IF NOT EXISTS public.etl_fudo_metrics (
+    run_id VARCHAR(64) NOT NULL,
+    metric_name VARCHAR(100) NOT NULL,
+    labels JSONB NOT NULL DEFAULT '{}'::jsonb,
+    metric_type VARCHAR(20) NOT NULL, -- 'counter' | 'histogram'
+    sample_count BIGINT NOT NULL,
+    sample_sum DOUBLE PRECISION NOT NULL,
+    sample_min DOUBLE PRECISION,
+    sample_max DOUBLE PRECISION,
+    buckets JSONB, -- {límite superior: cantidad acumulada}
+    recorded_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, metric_name, labels)
+);
+
+-- Changelog (CDC) de la capa RAW: una fila por registro escrito en cada corrida (insert_raw_data).
+-- change_type: 'insert' (id nuevo), 'new_version' (nueva versión de un id en tablas de solo-agregado), 'update' (fudo_raw_sales)
+CREATE TABLE IF NOT EXISTS public.etl_fudo_changelog (
+    changelog_id BIGSERIAL PRIMARY KEY,
+    run_id VARCHAR(255) NOT NULL, -- run_id de la corrida, 'follow-<ciclo>' o el backfill_id
+    raw_table VARCHAR(100) NOT NULL,
+    id_sucursal VARCHAR(255) NOT NULL,
+    id_fudo TEXT NOT NULL,
+    change_type VARCHAR(20) NOT NULL,
+    payload_checksum TEXT NOT NULL,
+    changed_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_etl_fudo_changelog_run ON public.etl_fudo_changelog (run_id, raw_table);
+CREATE INDEX IF NOT EXISTS idx_etl_fudo_changelog_changed_at ON public.etl_fudo_changelog (changed_at_utc);
+
+-- Checksum del último script DDL aplicado: si no cambió, el arranque omite el despliegue (DEPLOY_SKIP_UNCHANGED)
+CREATE TABLE IF NOT EXISTS public.etl_fudo_schema_deployments (
+    script_name VARCHAR(255) PRIMARY KEY,
+    script_md5 CHAR(32) NOT NULL,
+    deployed_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Registros borrados en Fudo (detectados por escaneo de solo IDs, ver reconcile.py): las MVs los excluyen
+CREATE TABLE IF NOT EXISTS public.etl_fudo_tombstones (
+    raw_table VARCHAR(100) NOT NULL,
+    id_sucursal VARCHAR(255) NOT NULL,
+    id_fudo TEXT NOT NULL,
+    detected_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    detected_run_id VARCHAR(255),
+    PRIMARY KEY (raw_table, id_sucursal, id_fudo)
+);
+
+-- Historia RAW archivada en Parquet (archive_raw.py): un registro por archivo escrito; restore lee de aquí
+CREATE TABLE IF NOT EXISTS public.etl_fudo_raw_archive (
+    archive_id VARCHAR(64) NOT NULL,
+    raw_table VARCHAR(100) NOT NULL,
+    id_sucursal VARCHAR(255) NOT NULL,
+    partition_month DATE NOT NULL,
+    file_path TEXT NOT NULL,
+    row_count BIGINT NOT NULL,
+    min_fecha_extraccion_utc TIMESTAMP WITH TIME ZONE,
+    max_fecha_extraccion_utc TIMESTAMP WITH TIME ZONE,
+    archived_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (archive_id, raw_table, id_sucursal, partition_month)
+);
+CREATE INDEX IF NOT EXISTS idx_etl_fudo_raw_archive_tabla_mes ON public.etl_fudo_raw_archive (raw_table, partition_month);
+
+-- Política de refresco por entidad: intervalo mínimo entre extracciones según su "tier"
+-- (hot: en cada corrida; warm: cada hora; cold: catálogos que cambian poco, una vez por día)
+CREATE TABLE IF NOT EXISTS public.config_fudo_entity_refresh_policy (
+    entity_name VARCHAR(100) PRIMARY KEY,
+    refresh_tier VARCHAR(20) NOT NULL, -- 'hot' | 'warm' | 'cold'
+    min_interval_minutes INTEGER NOT NULL DEFAULT 0,
+    is_active BOOLEAN DEFAULT TRUE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+-- Valores iniciales: DO NOTHING para no pisar ajustes hechos a mano
+INSERT INTO public.config_fudo_entity_refresh_policy (entity_name, refresh_tier, min_interval_minutes)
+VALUES
+    ('sales', 'hot', 0), ('items', 'hot', 0), ('payments', 'hot', 0),
+    ('customers', 'warm', 60), ('discounts', 'warm', 60), ('expenses', 'warm', 60),
+    ('ingredients', 'warm', 60), ('products', 'warm', 60), ('product-modifiers', 'warm', 60), ('users', 'warm', 60),
+    ('roles', 'cold', 1440), ('rooms', 'cold', 1440), ('kitchens', 'cold', 1440), ('tables', 'cold', 1440),
+    ('payment-methods', 'cold', 1440), ('product-categories', 'cold', 1440), ('expense-categories', 'cold', 1440)
+ON CONFLICT (entity_name) DO NOTHING;
+
+-- Ejecución en shards (tareas paralelas de Cloud Run Jobs)
+-- Estado de cada tarea dentro de una ejecución
+CREATE TABLE IF NOT EXISTS public.etl_fudo_shard_runs (
+    execution_id VARCHAR(255) NOT NULL,
+    task_index INTEGER NOT NULL,
+    task_count INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'running', -- 'running' | 'done' | 'failed'
+    changed_tables TEXT[],
+    started_at_utc TIMESTAMP WITH TIME ZONE NOT NULL,
+    finished_at_utc TIMESTAMP WITH TIME ZONE,
+    transform_claimed BOOLEAN NOT NULL DEFAULT FALSE, -- TRUE en la tarea que ejecutó la transformación
+    PRIMARY KEY (execution_id, task_index)
+);
+-- Error de las tareas que terminaron en 'failed' (cuentan como terminadas para reclamar la transformación)
+ALTER TABLE public.etl_fudo_shard_runs ADD COLUMN IF NOT EXISTS error TEXT;
+-- Plan de asignación (sucursal, entidad) -> tarea, fijado una única vez por ejecución
+CREATE TABLE IF NOT EXISTS public.etl_fudo_shard_plan (
+    execution_id VARCHAR(255) NOT NULL,
+    id_sucursal VARCHAR(255) NOT NULL,
+    entity_name VARCHAR(100) NOT NULL,
+    task_index INTEGER NOT NULL,
+    estimated_seconds NUMERIC(12, 3),
+    PRIMARY KEY (execution_id, id_sucursal, entity_name)
+);
+
 -- Insertar las sucursales Fudo iniciales
 INSERT INTO public.config_fudo_branches (id_sucursal, fudo_branch_identifier, sucursal_name, secret_manager_apikey_name, secret_manager_apisecret_name)
 VALUES ('chale', 'MUAxNTk0MzM=', 'Chale', 'FUDO_CHALE_APIKEY', 'FUDO_CHALE_APISECRET')
@@ -282,6 +461,28 @@ CREATE TABLE IF NOT EXISTS public.fudo_raw_users (
 CREATE INDEX IF NOT EXISTS idx_fudo_raw_users_id_sucursal_fecha ON public.fudo_raw_users (id_fudo, id_sucursal_fuente, fecha_extraccion_utc DESC);
 
 
+-- Índices BRIN sobre fecha_extraccion_utc: las filas RAW se insertan en orden de extracción, por lo que
+-- un BRIN (muy pequeño) alcanza para los escaneos incrementales "extraído desde X" (rollups, hechos).
+-- En fudo_raw_sales los UPDATE del ON CONFLICT degradan la correlación; el VACUUM post-carga lo mitiga.
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_customers_fecha_extraccion_brin ON public.fudo_raw_customers USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_discounts_fecha_extraccion_brin ON public.fudo_raw_discounts USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_expenses_fecha_extraccion_brin ON public.fudo_raw_expenses USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_expense_categories_fecha_extraccion_brin ON public.fudo_raw_expense_categories USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_ingredients_fecha_extraccion_brin ON public.fudo_raw_ingredients USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_items_fecha_extraccion_brin ON public.fudo_raw_items USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_kitchens_fecha_extraccion_brin ON public.fudo_raw_kitchens USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_payments_fecha_extraccion_brin ON public.fudo_raw_payments USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_payment_methods_fecha_extraccion_brin ON public.fudo_raw_payment_methods USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_product_categories_fecha_extraccion_brin ON public.fudo_raw_product_categories USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_product_modifiers_fecha_extraccion_brin ON public.fudo_raw_product_modifiers USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_products_fecha_extraccion_brin ON public.fudo_raw_products USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_roles_fecha_extraccion_brin ON public.fudo_raw_roles USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_rooms_fecha_extraccion_brin ON public.fudo_raw_rooms USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_sales_fecha_extraccion_brin ON public.fudo_raw_sales USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_tables_fecha_extraccion_brin ON public.fudo_raw_tables USING BRIN (fecha_extraccion_utc);
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_users_fecha_extraccion_brin ON public.fudo_raw_users USING BRIN (fecha_extraccion_utc);
+
+
 -- ----------------------------------------------------------------------
 -- 3. TABLAS Y VISTAS MATERIALIZADAS PARA LA CAPA ANALÍTICA (DER)
 -- ----------------------------------------------------------------------
@@ -373,32 +574,8 @@ ALTER TABLE public.Sales_order ADD COLUMN IF NOT EXISTS sale_type VARCHAR(50);
 ALTER TABLE public.Sales_order ADD COLUMN IF NOT EXISTS table_id TEXT;
 ALTER TABLE public.Sales_order ADD COLUMN IF NOT EXISTS waiter_id TEXT;
 
--- mv_sales_order
--- mv_sales_order
-DROP MATERIALIZED VIEW IF EXISTS public.mv_sales_order CASCADE;
-CREATE MATERIALIZED VIEW public.mv_sales_order AS
-SELECT DISTINCT ON (s.id_fudo, s.id_sucursal_fuente)
-    (s.payload_json ->> 'id')::FLOAT::INTEGER AS id_order,
-    s.id_sucursal_fuente AS id_sucursal,
-    (s.payload_json ->> 'id') || '-' || s.id_sucursal_fuente AS order_key,
-    0.0::FLOAT AS amount_tax,
-    (s.payload_json -> 'attributes' ->> 'total')::FLOAT AS amount_total,
-    (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS date_order,
-    (s.payload_json -> 'attributes' ->> 'saleType') AS sale_type,
-    (s.payload_json -> 'relationships' -> 'table' -> 'data' ->> 'id') AS table_id,
-    (s.payload_json -> 'relationships' -> 'waiter' -> 'data' ->> 'id') AS waiter_id,
-    (s.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS created_at,
-    (s.payload_json -> 'attributes' ->> 'closedAt')::TIMESTAMP WITH TIME ZONE AS closed_at
-FROM public.fudo_raw_sales s
-WHERE
-    s.payload_json ->> 'id' IS NOT NULL AND
-    s.id_sucursal_fuente IS NOT NULL AND
-    (s.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL AND
-    (s.payload_json -> 'attributes' ->> 'total') IS NOT NULL AND
-    (s.payload_json -> 'attributes' ->> 'saleState') IS NOT NULL AND
-    (s.payload_json -> 'attributes' ->> 'saleState') != 'CANCELED'
-ORDER BY s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc DESC;
-CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_sales_order_order_key ON public.mv_sales_order (order_key);
+-- mv_sales_order: la crea la transformación (MV o vista sobre fact_sales_order según FACT_LAYER_MODE).
+-- El despliegue no la toca: así no se reconstruye el historial completo ni se borran vistas que dependan de ella.
 -- Pagos (DER)
 CREATE TABLE IF NOT EXISTS public.Pagos (
   id INTEGER PRIMARY KEY,
@@ -409,40 +586,7 @@ CREATE TABLE IF NOT EXISTS public.Pagos (
   id_sucursal VARCHAR(255) NOT NULL
 );
 
--- mv_pagos (DER)
--- mv_pagos (DER)
-DROP MATERIALIZED VIEW IF EXISTS public.mv_pagos CASCADE;
-CREATE MATERIALIZED VIEW public.mv_pagos AS
-SELECT DISTINCT ON (p.id_fudo, p.id_sucursal_fuente)
-    (p.payload_json ->> 'id')::FLOAT::INTEGER AS id,
-    p.id_sucursal_fuente AS id_sucursal,
-    (p.payload_json ->> 'id') || '-' || p.id_sucursal_fuente AS payment_key,
-    (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER AS pos_order_id,
-    (p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_payment,
-    (p.payload_json -> 'attributes' ->> 'amount')::FLOAT AS amount,
-    
-    CASE WHEN (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') IS NOT NULL THEN 'EXPENSE'
-         WHEN (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') IS NOT NULL THEN 'SALE'
-         ELSE 'OTHER' END AS transaction_type,
-
-    CASE WHEN (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') IS NOT NULL THEN -((p.payload_json -> 'attributes' ->> 'amount')::FLOAT)
-         ELSE (p.payload_json -> 'attributes' ->> 'amount')::FLOAT END AS signed_amount,
-
-    (p.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS payment_date,
-    (p.payload_json -> 'relationships' -> 'expense' -> 'data' ->> 'id') AS expense_id,
-    (
-        (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') || '-' || p.id_sucursal_fuente
-    ) AS order_key_fk
-FROM public.fudo_raw_payments p
-LEFT JOIN public.fudo_raw_sales frs ON (p.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER = (frs.payload_json ->> 'id')::FLOAT::INTEGER
-                                    AND p.id_sucursal_fuente = frs.id_sucursal_fuente
-WHERE p.payload_json ->> 'id' IS NOT NULL 
-  AND (p.payload_json -> 'attributes' ->> 'amount') IS NOT NULL 
-  AND (p.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL
-  AND (p.payload_json -> 'relationships' -> 'paymentMethod' -> 'data' ->> 'id') IS NOT NULL
-  AND (p.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN IS NOT TRUE
-ORDER BY p.id_fudo, p.id_sucursal_fuente, p.fecha_extraccion_utc DESC;
-CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_pagos_payment_key ON public.mv_pagos (payment_key);
+-- mv_pagos: la crea la transformación (MV o vista sobre fact_pagos según FACT_LAYER_MODE)
 -- Sales_order_line (DER)
 CREATE TABLE IF NOT EXISTS public.Sales_order_line (
   id_order_line INTEGER PRIMARY KEY,
@@ -459,65 +603,7 @@ CREATE TABLE IF NOT EXISTS public.Sales_order_line (
   order_line_key TEXT UNIQUE NOT NULL
 );
 
--- mv_sales_order_line
-DROP MATERIALIZED VIEW IF EXISTS public.mv_sales_order_line CASCADE;
-            CREATE MATERIALIZED VIEW public.mv_sales_order_line AS
-            SELECT DISTINCT ON (i.id_fudo, i.id_sucursal_fuente)
-                -- ID de la línea de orden (del ítem)
-                (i.payload_json ->> 'id')::FLOAT::INTEGER AS id_order_line_fudo, -- <--- ¡Asegurarnos de que este esté!
-                i.id_sucursal_fuente AS id_sucursal,
-                (i.payload_json ->> 'id') || '-' || i.id_sucursal_fuente AS order_line_key,
-                
-                -- ID de la venta (del relationships.sale)
-                (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_order_fudo, -- <--- ¡Asegurarnos de que este esté!
-                
-                (
-                    (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') || '-' || i.id_sucursal_fuente
-                ) AS order_key_fk,
-                (i.payload_json -> 'attributes' ->> 'createdAt')::TIMESTAMP WITH TIME ZONE AS date_order_time,
-                (i.payload_json -> 'attributes' ->> 'createdAt')::DATE AS date_order,
-                
-                -- ID del producto (del relationships.product)
-                (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id')::FLOAT::INTEGER AS id_product_fudo, -- <--- ¡Asegurarnos de que este esté!
-                
-                (
-                    (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') || '-' || i.id_sucursal_fuente
-                ) AS product_key_fk,
-                
-                -- Cantidad y precio original de la API (campos auxiliares)
-                COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) AS qty_from_api,
-                COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) AS price_from_api,
-                
-                -- Precio unitario corregido
-                CASE
-                    WHEN COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0 
-                    THEN COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) / COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0)
-                    ELSE 0.0
-                END AS price_unit, 
-                
-                -- Cantidad final (siempre entero)
-                COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT::INTEGER), 0) AS qty, -- Esta línea suele estar bien, pero si Fudo manda "3.0" aquí fallaría.
-                                                                                               -- Si falla, cambiar a ::FLOAT::INTEGER también.
-                
-                -- Monto total de la línea
-                (
-                    CASE
-                        WHEN COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0 
-                        THEN COALESCE(((i.payload_json -> 'attributes' ->> 'price')::FLOAT), 0) / COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0)
-                        ELSE 0.0
-                    END
-                ) * COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) AS amount_total
-            FROM public.fudo_raw_items i
-            WHERE i.payload_json ->> 'id' IS NOT NULL 
-              AND (i.payload_json -> 'relationships' -> 'sale' -> 'data' ->> 'id') IS NOT NULL
-              AND (i.payload_json -> 'relationships' -> 'product' -> 'data' ->> 'id') IS NOT NULL
-              AND (i.payload_json -> 'attributes' ->> 'createdAt') IS NOT NULL
-              AND (i.payload_json -> 'attributes' ->> 'price') IS NOT NULL
-              AND (i.payload_json -> 'attributes' ->> 'quantity') IS NOT NULL
-              AND (i.payload_json -> 'attributes' ->> 'canceled')::BOOLEAN IS NOT TRUE
-              AND COALESCE(((i.payload_json -> 'attributes' ->> 'quantity')::FLOAT), 0) > 0
-            ORDER BY i.id_fudo, i.id_sucursal_fuente, i.fecha_extraccion_utc DESC;
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_sales_order_line_order_line_key ON public.mv_sales_order_line (order_line_key);
+-- mv_sales_order_line: la crea la transformación (MV o vista sobre fact_sales_order_line según FACT_LAYER_MODE)
 
 -- mv_expense_categories (NUEVA MV - CON CLAVE SINTÉTICA Y ÍNDICE ÚNICO)
 DROP MATERIALIZED VIEW IF EXISTS public.mv_expense_categories CASCADE;
@@ -587,6 +673,7 @@ CREATE TABLE IF NOT EXISTS public.Expenses (
               AND e.id_sucursal_fuente IS NOT NULL
             ORDER BY e.id_fudo, e.id_sucursal_fuente, e.fecha_extraccion_utc DESC;
             CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_expenses_id_sucursal ON public.mv_expenses (id_expense, id_sucursal); 
+            CREATE INDEX IF NOT EXISTS idx_mv_expenses_sucursal_fecha ON public.mv_expenses (id_sucursal, expense_date);
 -- Product_categories (Tabla Lógica del DER - para categorización de productos)
 CREATE TABLE IF NOT EXISTS public.Product_categories (
   id_product_category INTEGER,
@@ -942,4 +1029,141 @@ SELECT
     (s.payload_json -> 'relationships' -> 'saleIdentifier' -> 'data' ->> 'id') AS sale_identifier_id,
     s.payload_json AS original_payload
 FROM public.fudo_raw_sales s
-ORDER BY s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc DESC;
\ No newline at end of file
+ORDER BY s.id_fudo, s.id_sucursal_fuente, s.fecha_extraccion_utc DESC;
+
+-- ----------------------------------------------------------------------
+-- 5. TABLAS DE AGREGADOS (ROLLUPS) PARA POWER BI
+-- Se mantienen incrementalmente desde modules/rollup_manager.py: solo se recalculan
+-- los (sucursal, día) tocados en cada corrida. Días y horas en ANALYTICS_TIMEZONE.
+-- El orden de columnas debe coincidir con ROLLUP_DEFINITIONS.
+-- ----------------------------------------------------------------------
+
+-- Sucursal x Día
+CREATE TABLE IF NOT EXISTS public.agg_sales_branch_day (
+    id_sucursal VARCHAR(255) NOT NULL,
+    date_order DATE NOT NULL,
+    orders_count INTEGER NOT NULL,
+    amount_total FLOAT,
+    avg_ticket FLOAT,
+    lines_count INTEGER NOT NULL,
+    units_sold BIGINT NOT NULL,
+    payments_amount FLOAT,
+    updated_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_sucursal, date_order)
+);
+
+-- Sucursal x Día x Producto
+CREATE TABLE IF NOT EXISTS public.agg_sales_branch_day_product (
+    id_sucursal VARCHAR(255) NOT NULL,
+    date_order DATE NOT NULL,
+    product_key_fk TEXT NOT NULL,
+    id_product_fudo INTEGER,
+    lines_count INTEGER NOT NULL,
+    units_sold BIGINT NOT NULL,
+    amount_total FLOAT,
+    updated_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_sucursal, date_order, product_key_fk)
+);
+CREATE INDEX IF NOT EXISTS idx_agg_sales_branch_day_product_product ON public.agg_sales_branch_day_product (product_key_fk);
+
+-- Sucursal x Día x Medio de pago
+CREATE TABLE IF NOT EXISTS public.agg_payments_branch_day_method (
+    id_sucursal VARCHAR(255) NOT NULL,
+    date_order DATE NOT NULL,
+    payment_method_key TEXT NOT NULL,
+    id_payment INTEGER,
+    transaction_type VARCHAR(20) NOT NULL,
+    payments_count INTEGER NOT NULL,
+    amount FLOAT,
+    signed_amount FLOAT,
+    updated_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_sucursal, date_order, payment_method_key, transaction_type)
+);
+
+-- Sucursal x Hora
+CREATE TABLE IF NOT EXISTS public.agg_sales_branch_hour (
+    id_sucursal VARCHAR(255) NOT NULL,
+    date_order DATE NOT NULL,
+    hour_of_day INTEGER NOT NULL,
+    orders_count INTEGER NOT NULL,
+    amount_total FLOAT,
+    updated_at_utc TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_sucursal, date_order, hour_of_day)
+);
+
+
+-- ----------------------------------------------------------------------
+-- 6. TABLAS DE HECHOS PARTICIONADAS POR MES (FACT_LAYER_MODE=partitioned)
+-- Las particiones mensuales (fact_*_pYYYYMM) las crea y reconstruye modules/partitioned_facts.py.
+-- Los índices definidos sobre la tabla padre se propagan a cada partición.
+-- ----------------------------------------------------------------------
+
+-- Índices de expresión sobre createdAt en las tablas RAW fuente (prefiltro por mes al reconstruir particiones)
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_sales_created_at ON public.fudo_raw_sales ((payload_json -> 'attributes' ->> 'createdAt'));
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_items_created_at ON public.fudo_raw_items ((payload_json -> 'attributes' ->> 'createdAt'));
+CREATE INDEX IF NOT EXISTS idx_fudo_raw_payments_created_at ON public.fudo_raw_payments ((payload_json -> 'attributes' ->> 'createdAt'));
+
+CREATE TABLE IF NOT EXISTS public.fact_sales_order (
+    id_order INTEGER,
+    id_sucursal VARCHAR(255) NOT NULL,
+    order_key TEXT NOT NULL,
+    amount_tax FLOAT,
+    amount_total FLOAT,
+    date_order TIMESTAMP WITH TIME ZONE NOT NULL,
+    sale_type TEXT,
+    table_id TEXT,
+    waiter_id TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    closed_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (order_key, date_order)
+) PARTITION BY RANGE (date_order);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_order_sucursal_fecha ON public.fact_sales_order (id_sucursal, date_order);
+
+CREATE TABLE IF NOT EXISTS public.fact_sales_order_line (
+    id_order_line_fudo INTEGER,
+    id_sucursal VARCHAR(255) NOT NULL,
+    order_line_key TEXT NOT NULL,
+    id_order_fudo INTEGER,
+    order_key_fk TEXT,
+    date_order_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    date_order DATE,
+    id_product_fudo INTEGER,
+    product_key_fk TEXT,
+    qty_from_api FLOAT,
+    price_from_api FLOAT,
+    price_unit FLOAT,
+    qty INTEGER,
+    amount_total FLOAT,
+    PRIMARY KEY (order_line_key, date_order_time)
+) PARTITION BY RANGE (date_order_time);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_order_line_sucursal_fecha ON public.fact_sales_order_line (id_sucursal, date_order_time);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_order_line_order_key_fk ON public.fact_sales_order_line (order_key_fk);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_order_line_product_key_fk ON public.fact_sales_order_line (product_key_fk);
+
+CREATE TABLE IF NOT EXISTS public.fact_pagos (
+    id INTEGER,
+    id_sucursal VARCHAR(255) NOT NULL,
+    payment_key TEXT NOT NULL,
+    pos_order_id INTEGER,
+    id_payment INTEGER,
+    amount FLOAT,
+    transaction_type VARCHAR(20),
+    signed_amount FLOAT,
+    payment_date TIMESTAMP WITH TIME ZONE NOT NULL,
+    expense_id TEXT,
+    order_key_fk TEXT,
+    PRIMARY KEY (payment_key, payment_date)
+) PARTITION BY RANGE (payment_date);
+CREATE INDEX IF NOT EXISTS idx_fact_pagos_sucursal_fecha ON public.fact_pagos (id_sucursal, payment_date);
+CREATE INDEX IF NOT EXISTS idx_fact_pagos_order_key_fk ON public.fact_pagos (order_key_fk);
+
+-- Registro de particiones: meses reconstruidos y congelados (meses cerrados)
+CREATE TABLE IF NOT EXISTS public.etl_fudo_fact_partitions (
+    fact_table VARCHAR(100) NOT NULL,
+    partition_month DATE NOT NULL,
+    partition_name VARCHAR(255) NOT NULL,
+    is_frozen BOOLEAN NOT NULL DEFAULT FALSE,
+    row_count BIGINT,
+    last_rebuilt_utc TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (fact_table, partition_month)
+);
@@ -0,0 +1,6 @@
+# fudo_etl/tests/conftest.py
+import os
+import sys
+
+# Los tests importan los módulos como main.py (modules.x, devtools.x): fudo_etl/ va al sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,39 @@
+# fudo_etl/tests/test_backfill.py
+from datetime import datetime, timezone
+
+from modules.backfill import HistoricalBackfill
+
+
+def _backfill(range_start: datetime, range_end: datetime, slice_days: int) -> HistoricalBackfill:
+    return HistoricalBackfill({}, 'b1', 'sales', range_start, range_end, slice_days=slice_days)
+
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_plan_slices_covers_range_without_gaps_and_shortens_last_slice():
+    slices = _backfill(_utc(2024, 1, 1), _utc(2024, 1, 20), slice_days=7).plan_slices()
+    assert slices == [
+        (_utc(2024, 1, 1), _utc(2024, 1, 8)),
+        (_utc(2024, 1, 8), _utc(2024, 1, 15)),
+        (_utc(2024, 1, 15), _utc(2024, 1, 20)),
+    ]
+
+
+def test_plan_slices_exact_multiple_and_short_range():
+    assert len(_backfill(_utc(2024, 1, 1), _utc(2024, 1, 29), slice_days=7).plan_slices()) == 4
+    assert _backfill(_utc(2024, 1, 1, 10), _utc(2024, 1, 1, 18), slice_days=7).plan_slices() == [
+        (_utc(2024, 1, 1, 10), _utc(2024, 1, 1, 18))
+    ]
+
+
+def test_plan_slices_empty_range():
+    assert _backfill(_utc(2024, 1, 1), _utc(2024, 1, 1), slice_days=7).plan_slices() == []
+    assert _backfill(_utc(2024, 2, 1), _utc(2024, 1, 1), slice_days=7).plan_slices() == []
+
+
+def test_backfill_id_is_stable_for_the_same_request():
+    first = _backfill(_utc(2024, 1, 1), _utc(2024, 3, 1), slice_days=7)
+    second = _backfill(_utc(2024, 1, 1), _utc(2024, 3, 1), slice_days=7)
+    assert first.backfill_id == second.backfill_id == 'b1:sales:2024-01-01:2024-03-01:7d'
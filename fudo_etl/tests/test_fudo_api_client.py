@@ -0,0 +1,110 @@
+# fudo_etl/tests/test_fudo_api_client.py
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+from modules.fudo_api_client import FudoApiClient
+
+
+class _Response:
+    def __init__(self, status_code: int, data: list | None = None):
+        self.status_code = status_code
+        self._data = data or []
+        self.content = b'{}'
+        self.text = ''
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(response=self)
+
+    def json(self):
+        return {'data': self._data}
+
+
+class _Session:
+    """Responde en orden las respuestas dadas y guarda el header Authorization de cada GET."""
+    def __init__(self, responses: list[_Response]):
+        self.responses = list(responses)
+        self.authorizations = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.authorizations.append(headers['Authorization'])
+        return self.responses.pop(0)
+
+
+def _client(responses: list[_Response], token_provider=None) -> FudoApiClient:
+    client = FudoApiClient('https://api.example.invalid', token_provider=token_provider)
+    client.session = _Session(responses)
+    client.inter_page_delay = 0
+    client.set_auth_token('old-token')
+    return client
+
+
+def test_401_refreshes_token_and_retries_same_page():
+    rejected = []
+
+    def token_provider(rejected_token):
+        rejected.append(rejected_token)
+        return 'new-token'
+
+    client = _client([_Response(401), _Response(200, [{'id': '1'}])], token_provider)
+    pages = list(client.iter_data_pages('customers', 'b1'))
+
+    assert pages == [[{'id': '1'}]]
+    assert rejected == ['old-token']
+    assert client.session.authorizations == ['Bearer old-token', 'Bearer new-token']
+    assert client.auth_token == 'new-token'
+
+
+def test_second_401_on_same_page_is_raised():
+    client = _client([_Response(401), _Response(401)], lambda rejected_token: 'new-token')
+    with pytest.raises(requests.exceptions.HTTPError):
+        list(client.iter_data_pages('customers', 'b1'))
+    assert len(client.session.authorizations) == 2
+
+
+def test_401_without_token_provider_is_raised():
+    client = _client([_Response(401)])
+    with pytest.raises(requests.exceptions.HTTPError):
+        list(client.iter_data_pages('customers', 'b1'))
+    assert client.session.authorizations == ['Bearer old-token']
+
+
+_SINCE = datetime(2024, 3, 1, tzinfo=timezone.utc)
+_UNTIL = datetime(2024, 3, 31, 23, 59, 59, 500000, tzinfo=timezone.utc)
+
+
+def _record(created_at: str | None) -> dict:
+    return {'id': '1', 'attributes': {'createdAt': created_at}}
+
+
+def _check(records: list[dict], since=_SINCE, until=_UNTIL):
+    FudoApiClient._check_window(records, 'createdAt', since, until, 'items', 'b1', 1)
+
+
+def test_check_window_accepts_records_inside_window():
+    _check([_record('2024-03-01T00:00:00Z'), _record('2024-03-15T12:00:00.123Z'), _record('2024-03-31T23:59:59Z')])
+
+
+def test_check_window_tolerates_second_precision_of_api_filter():
+    # until se envía truncado a segundos: un registro dentro de ese segundo no es un filtro ignorado
+    _check([_record('2024-03-31T23:59:59.900Z'), _record('2024-04-01T00:00:00Z')])
+
+
+def test_check_window_rejects_record_before_since():
+    with pytest.raises(ValueError):
+        _check([_record('2024-03-10T00:00:00Z'), _record('2024-02-29T23:59:59Z')])
+
+
+def test_check_window_rejects_record_after_until():
+    with pytest.raises(ValueError):
+        _check([_record('2024-04-01T00:00:01Z')])
+
+
+def test_check_window_open_ended_and_unparseable_values():
+    _check([_record('2030-01-01T00:00:00Z')], until=None)
+    _check([_record(None), _record('not-a-date'), {'id': '2'}])
+    # Sin zona horaria se interpreta como UTC
+    with pytest.raises(ValueError):
+        _check([_record('2024-02-01T00:00:00')])
@@ -0,0 +1,25 @@
+# fudo_etl/tests/test_landing_zone.py
+import json
+import os
+
+from modules.landing_zone import LandingZoneLoader, LandingZoneWriter
+
+
+def test_write_page_round_trip(tmp_path):
+    writer = LandingZoneWriter(str(tmp_path), "run-1")
+    records = [{'id': '1', 'attributes': {'name': 'Café ñ'}}, {'id': '2', 'attributes': {}}]
+    path = writer.write_page('b1', 'sales', 1, records)
+    assert path == os.path.join(str(tmp_path), "run-1", "b1", "sales", "page_00001.ndjson.gz")
+    assert not os.path.exists(f"{path}.tmp")
+    assert LandingZoneLoader.read_page(path) == records
+
+
+def test_spool_pages_and_manifest(tmp_path):
+    writer = LandingZoneWriter(str(tmp_path), "run-1")
+    paths = writer.spool_pages('b1', 'items', iter([[{'id': '1'}], [{'id': '2'}, {'id': '3'}]]))
+    assert [os.path.basename(path) for path in paths] == ["page_00001.ndjson.gz", "page_00002.ndjson.gz"]
+    with open(writer.write_manifest(), encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert manifest['run_id'] == "run-1"
+    assert manifest['total_records'] == 3
+    assert [item['records'] for item in manifest['files']] == [1, 2]
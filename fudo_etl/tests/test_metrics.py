@@ -0,0 +1,39 @@
+# fudo_etl/tests/test_metrics.py
+from modules.metrics import MetricsRegistry
+
+
+def test_render_openmetrics_counters_and_labels():
+    registry = MetricsRegistry()
+    registry.inc('fudo_api_pages', 2, {'entity': 'sales'})
+    registry.inc('fudo_api_pages', 1, {'entity': 'sales'})
+    registry.inc('fudo_api_pages', 1, {'entity': 'items'})
+    lines = registry.render_openmetrics().splitlines()
+    assert "# TYPE fudo_api_pages counter" in lines
+    assert 'fudo_api_pages_total{entity="items"} 1' in lines
+    assert 'fudo_api_pages_total{entity="sales"} 3' in lines
+    assert lines[-1] == "# EOF"
+
+
+def test_render_openmetrics_histogram_is_cumulative():
+    registry = MetricsRegistry()
+    for value in (0.001, 0.5, 1000.0):
+        registry.observe('custom_seconds', value)
+    text = registry.render_openmetrics()
+    bucket_counts = [int(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith('custom_seconds_bucket')]
+    assert bucket_counts == sorted(bucket_counts)
+    assert 'custom_seconds_bucket{le="+Inf"} 3' in text
+    assert 'custom_seconds_count 3' in text
+    assert 'custom_seconds_sum 1000.501000' in text
+
+
+def test_render_openmetrics_escapes_label_values():
+    registry = MetricsRegistry()
+    registry.inc('etl_db_load_rows', 1, {'table': 'a"b\\c\nd'})
+    assert 'etl_db_load_rows_total{table="a\\"b\\\\c\\nd"} 1' in registry.render_openmetrics()
+
+
+def test_reset_clears_series():
+    registry = MetricsRegistry()
+    registry.inc('fudo_api_pages')
+    registry.reset()
+    assert registry.render_openmetrics() == "# EOF\n"
@@ -0,0 +1,30 @@
+# fudo_etl/tests/test_parquet_export.py
+from datetime import datetime, timedelta, timezone
+
+from modules.parquet_export import AnalyticParquetExporter
+
+
+def _removal(days_ago: float, with_timestamp: bool = True) -> dict:
+    removed_at = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    entry = {'table': 'mv_pagos', 'partition': 'id_sucursal=b1/month=2024-01',
+             'export_id': removed_at.strftime('%Y%m%dT%H%M%S%fZ')}
+    if with_timestamp:
+        entry['removed_at_utc'] = removed_at.isoformat()
+    return entry
+
+
+def test_removed_entries_survive_exports_until_retention():
+    exporter = AnalyticParquetExporter(None, 'exports', removed_retention_days=30)
+    recent, old = _removal(2), _removal(45)
+    assert exporter._prune_removed([old, recent]) == [recent]
+
+
+def test_removed_entries_without_timestamp_are_dated_by_export_id():
+    exporter = AnalyticParquetExporter(None, 'exports', removed_retention_days=30)
+    recent, old = _removal(1, with_timestamp=False), _removal(60, with_timestamp=False)
+    assert exporter._prune_removed([old, recent]) == [recent]
+
+
+def test_zero_retention_keeps_every_removal():
+    entries = [_removal(400), _removal(1)]
+    assert AnalyticParquetExporter(None, 'exports', removed_retention_days=0)._prune_removed(entries) == entries
@@ -0,0 +1,56 @@
+# fudo_etl/tests/test_refresh_policy.py
+from datetime import datetime, timedelta, timezone
+
+from modules.refresh_policy import EntityRefreshPolicy
+
+NOW = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class _PolicyDB:
+    """Responde las políticas activas y los last_checked_utc según la tabla consultada."""
+    def __init__(self, policies: list[tuple], last_checks: list[tuple]):
+        self.policies = policies
+        self.last_checks = last_checks
+
+    def fetch_all(self, query, params=None):
+        return self.policies if 'config_fudo_entity_refresh_policy' in query else self.last_checks
+
+
+def test_entities_without_policy_or_history_are_always_due():
+    db = _PolicyDB(
+        policies=[('products', 'cold', 1440)],
+        last_checks=[('b1', 'sales', NOW - timedelta(minutes=1))],
+    )
+    items = [('b1', 'sales'), ('b1', 'products')]
+    assert EntityRefreshPolicy(db).filter_due(items, NOW) == items
+
+
+def test_entities_inside_their_interval_are_skipped():
+    db = _PolicyDB(
+        policies=[('products', 'cold', 1440), ('customers', 'warm', 60)],
+        last_checks=[
+            ('b1', 'products', NOW - timedelta(hours=2)),
+            ('b2', 'products', NOW - timedelta(days=2)),
+            ('b1', 'customers', NOW - timedelta(minutes=30)),
+        ],
+    )
+    items = [('b1', 'products'), ('b2', 'products'), ('b1', 'customers')]
+    assert EntityRefreshPolicy(db).filter_due(items, NOW) == [('b2', 'products')]
+
+
+def test_tolerance_keeps_interval_equal_to_schedule_due():
+    # Intervalo de 60 min con corridas cada 60 min: una corrida que arranca unos segundos antes no se saltea
+    db = _PolicyDB(
+        policies=[('customers', 'warm', 60)],
+        last_checks=[('b1', 'customers', NOW - timedelta(minutes=59, seconds=30))],
+    )
+    assert EntityRefreshPolicy(db).filter_due([('b1', 'customers')], NOW) == [('b1', 'customers')]
+    assert EntityRefreshPolicy(db, tolerance_ratio=0).filter_due([('b1', 'customers')], NOW) == []
+
+
+def test_zero_interval_policy_is_always_due():
+    db = _PolicyDB(
+        policies=[('sales', 'hot', 0)],
+        last_checks=[('b1', 'sales', NOW)],
+    )
+    assert EntityRefreshPolicy(db).filter_due([('b1', 'sales')], NOW) == [('b1', 'sales')]
@@ -0,0 +1,96 @@
+# fudo_etl/tests/test_run_scheduler.py
+import time
+
+from modules.run_scheduler import BranchCircuitBreaker, RunDeadline, RunScheduler
+
+
+def _scheduler(remaining_seconds: float, durations: dict | None = None, failure_threshold: int = 3) -> RunScheduler:
+    deadline = RunDeadline(remaining_seconds, 0, started_monotonic=time.monotonic())
+    return RunScheduler(deadline, durations or {}, BranchCircuitBreaker(failure_threshold))
+
+
+def test_deadline_keeps_transform_reserve():
+    deadline = RunDeadline(100, 30, started_monotonic=time.monotonic())
+    assert 60 < deadline.remaining_for_extraction() <= 70
+    assert not deadline.extraction_expired()
+    assert RunDeadline(100, 30, started_monotonic=time.monotonic() - 80).extraction_expired()
+
+
+def test_plan_waves_puts_critical_entities_first():
+    scheduler = _scheduler(3600)
+    waves = scheduler.plan_waves({
+        'b1': ['products', 'sales', 'items'],
+        'b2': ['payments', 'customers'],
+    })
+    assert waves == [
+        {'b1': ['sales', 'items'], 'b2': ['payments']},
+        {'b1': ['products'], 'b2': ['customers']},
+    ]
+
+
+def test_plan_waves_honours_custom_critical_entities():
+    deadline = RunDeadline(3600, 0)
+    scheduler = RunScheduler(deadline, {}, BranchCircuitBreaker(), critical_entities=['products'])
+    assert scheduler.plan_waves({'b1': ['sales', 'products']}) == [{'b1': ['products']}, {'b1': ['sales']}]
+
+
+def test_should_start_without_history_fits():
+    scheduler = _scheduler(3600)
+    assert scheduler.should_start('b1', 'sales')
+    assert scheduler.skipped == []
+
+
+def test_should_start_skips_pair_longer_than_remaining_time():
+    scheduler = _scheduler(600, durations={('b1', 'items'): 1200.0, ('b1', 'sales'): 300.0})
+    assert not scheduler.should_start('b1', 'items')
+    assert scheduler.should_start('b1', 'sales')
+    assert scheduler.skipped == [('b1', 'items', 'deadline')]
+
+
+def test_should_start_skips_everything_after_deadline():
+    deadline = RunDeadline(100, 0, started_monotonic=time.monotonic() - 200)
+    scheduler = RunScheduler(deadline, {}, BranchCircuitBreaker())
+    assert not scheduler.should_start('b1', 'sales')
+    assert scheduler.skipped == [('b1', 'sales', 'deadline')]
+
+
+def test_should_start_skips_branch_with_open_circuit():
+    scheduler = _scheduler(3600, failure_threshold=2)
+    scheduler.circuit_breaker.record_failure('b1')
+    scheduler.circuit_breaker.record_failure('b1')
+    assert not scheduler.should_start('b1', 'sales')
+    assert scheduler.should_start('b2', 'sales')
+    assert scheduler.skipped == [('b1', 'sales', 'circuit_open')]
+
+
+def test_circuit_breaker_opens_after_consecutive_failures():
+    breaker = BranchCircuitBreaker(failure_threshold=3)
+    breaker.record_failure('b1')
+    breaker.record_failure('b1')
+    assert not breaker.is_open('b1')
+    breaker.record_failure('b1')
+    assert breaker.is_open('b1')
+    assert not breaker.is_open('b2')
+
+
+def test_circuit_breaker_success_resets_failures():
+    breaker = BranchCircuitBreaker(failure_threshold=2)
+    breaker.record_failure('b1')
+    breaker.record_success('b1')
+    breaker.record_failure('b1')
+    assert not breaker.is_open('b1')
+
+
+def test_pipeline_fetcher_skips_entities_of_open_circuit_branch():
+    from modules.pipeline import ExtractLoadPipeline
+
+    scheduler = _scheduler(3600, failure_threshold=1)
+    scheduler.circuit_breaker.record_failure('b1')
+    pipeline = ExtractLoadPipeline('postgresql://unused', 'https://api.example.invalid', scheduler=scheduler)
+    pipeline._register('b1', 'sales')
+    pipeline._fetch_branch({'id_sucursal': 'b1', 'token': 'token', 'entities': [('sales', None)]})
+
+    progress = pipeline._progress[('b1', 'sales')]
+    assert progress['skipped'] and progress['pages_sent'] == 0
+    assert pipeline.page_queue.empty()
+    assert scheduler.skipped == [('b1', 'sales', 'circuit_open')]
@@ -0,0 +1,43 @@
+# fudo_etl/tests/test_synthetic_data.py
+from datetime import timedelta
+
+import pytest
+
+from devtools.synthetic_data import SyntheticFudoDataset
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return SyntheticFudoDataset(seed=7, branches=2, items_total=2000, products_per_branch=20, days=30)
+
+
+@pytest.mark.parametrize("entity", ['sales', 'items', 'payments', 'tables'])
+def test_created_at_is_increasing_by_position(dataset, entity):
+    created = [dataset.created_at('mock_01', entity, position) for position in range(dataset.count('mock_01', entity))]
+    assert created == sorted(created)
+
+
+@pytest.mark.parametrize("entity", ['sales', 'items', 'payments'])
+def test_position_range_matches_linear_filter(dataset, entity):
+    total = dataset.count('mock_01', entity)
+    created = [dataset.created_at('mock_01', entity, position) for position in range(total)]
+    since = dataset.start + timedelta(days=10)
+    until = dataset.start + timedelta(days=12, hours=6)
+    expected = [position for position, ts in enumerate(created) if since <= ts <= until]
+    lo, hi = dataset._position_range('mock_01', entity, since, until)
+    assert list(range(lo, hi)) == expected
+
+
+def test_position_range_open_bounds_and_empty_window(dataset):
+    total = dataset.count('mock_02', 'sales')
+    assert dataset._position_range('mock_02', 'sales', None, None) == (0, total)
+    before_start = dataset.start - timedelta(days=1)
+    lo, hi = dataset._position_range('mock_02', 'sales', None, before_start)
+    assert lo == hi == 0
+    lo, hi = dataset._position_range('mock_02', 'sales', dataset.start + timedelta(days=5), before_start)
+    assert lo == hi
+
+
+def test_records_are_deterministic(dataset):
+    other = SyntheticFudoDataset(seed=7, branches=2, items_total=2000, products_per_branch=20, days=30)
+    assert dataset.record('mock_01', 'items', 42) == other.record('mock_01', 'items', 42)
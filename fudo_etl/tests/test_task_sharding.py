@@ -0,0 +1,66 @@
+# fudo_etl/tests/test_task_sharding.py
+from modules.task_sharding import TaskShardCoordinator, stable_shard_for
+
+
+class _DurationsDB:
+    """Devuelve las duraciones históricas (etl_fudo_extraction_status) de get_extraction_durations."""
+    def __init__(self, durations: dict[tuple[str, str], float]):
+        self.rows = [(branch, entity, seconds) for (branch, entity), seconds in durations.items()]
+
+    def fetch_all(self, query, params=None):
+        return self.rows
+
+
+def _coordinator(durations: dict, task_count: int, default_duration_seconds: float = 60.0) -> TaskShardCoordinator:
+    return TaskShardCoordinator(_DurationsDB(durations), 0, task_count, 'exec-1', strategy='weighted',
+                                default_duration_seconds=default_duration_seconds)
+
+
+def test_weighted_plan_assigns_longest_first_to_least_loaded_task():
+    coordinator = _coordinator({
+        ('b1', 'sales'): 100.0,
+        ('b2', 'sales'): 80.0,
+        ('b1', 'items'): 60.0,
+        ('b2', 'items'): 30.0,
+        ('b1', 'products'): 10.0,
+    }, task_count=2)
+    plan = coordinator._build_weighted_plan(
+        [('b1', 'products'), ('b2', 'items'), ('b1', 'items'), ('b2', 'sales'), ('b1', 'sales')]
+    )
+    assert plan == {
+        ('b1', 'sales'): (0, 100.0),
+        ('b2', 'sales'): (1, 80.0),
+        ('b1', 'items'): (1, 60.0),
+        ('b2', 'items'): (0, 30.0),
+        ('b1', 'products'): (0, 10.0),
+    }
+
+
+def test_weighted_plan_uses_default_duration_without_history():
+    coordinator = _coordinator({('b1', 'sales'): 90.0}, task_count=2, default_duration_seconds=45.0)
+    plan = coordinator._build_weighted_plan([('b1', 'sales'), ('b2', 'sales'), ('b3', 'sales')])
+    assert plan[('b1', 'sales')] == (0, 90.0)
+    assert plan[('b2', 'sales')] == (1, 45.0)
+    assert plan[('b3', 'sales')] == (1, 45.0)
+
+
+def test_weighted_plan_ties_break_by_item_and_task_index():
+    items = [('b2', 'sales'), ('b1', 'sales'), ('b1', 'items')]
+    plan = _coordinator({}, task_count=3)._build_weighted_plan(items)
+    assert plan == {('b1', 'items'): (0, 60.0), ('b1', 'sales'): (1, 60.0), ('b2', 'sales'): (2, 60.0)}
+
+
+def test_single_task_keeps_all_work_in_order():
+    items = [('b1', 'sales'), ('b2', 'items')]
+    coordinator = TaskShardCoordinator(_DurationsDB({}), 0, 1, 'exec-1', strategy='weighted')
+    assert coordinator.assign_work(items) == items
+
+
+def test_hash_shards_are_stable_and_cover_every_item():
+    items = [(f"b{n}", entity) for n in range(10) for entity in ('sales', 'items', 'payments')]
+    shards = [
+        TaskShardCoordinator(None, index, 3, 'exec-1').assign_work(items)
+        for index in range(3)
+    ]
+    assert sorted(item for shard in shards for item in shard) == sorted(items)
+    assert stable_shard_for('b1', 'sales', 3) == stable_shard_for('b1', 'sales', 3)